@@ -7,7 +7,20 @@ from sqlalchemy import pool
 
 from alembic import context
 
-from app.models import Product, Order, StockMovement
+from app.models import (
+    Product,
+    Order,
+    OrderItem,
+    StockMovement,
+    OutboxEvent,
+    StockReservationPart,
+    StockLease,
+    StockSnapshot,
+    StockSnapshotRun,
+    StockReconciliationRun,
+    StockReconciliationState,
+    StockDiscrepancy,
+)
 from app.db.base import Base
 
 # ensure project root is on sys.path so we can import `app` package
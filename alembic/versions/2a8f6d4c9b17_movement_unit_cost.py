@@ -0,0 +1,29 @@
+"""movement unit cost
+
+Revision ID: 2a8f6d4c9b17
+Revises: 9e3c5a7b1f24
+Create Date: 2026-10-18 17:48:03.917254
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2a8f6d4c9b17"
+down_revision: Union[str, Sequence[str], None] = "9e3c5a7b1f24"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("stock_movements", sa.Column("unit_cost", sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("stock_movements", "unit_cost")
@@ -0,0 +1,38 @@
+"""outbox
+
+Revision ID: 3f6a9c2e1b7d
+Revises: 60914b7a199c
+Create Date: 2026-10-18 09:12:41.502113
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f6a9c2e1b7d"
+down_revision: Union[str, Sequence[str], None] = "60914b7a199c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "outbox",
+        sa.Column("event_id", sa.Integer(), nullable=False),
+        sa.Column("routing_key", sa.String(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("event_id"),
+    )
+    op.create_index(op.f("ix_outbox_event_id"), "outbox", ["event_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_outbox_event_id"), table_name="outbox")
+    op.drop_table("outbox")
@@ -0,0 +1,32 @@
+"""product version
+
+Revision ID: 5d7f2b8c3e91
+Revises: c4e1a7d95b20
+Create Date: 2026-10-18 16:05:21.448103
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d7f2b8c3e91"
+down_revision: Union[str, Sequence[str], None] = "c4e1a7d95b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "products",
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("products", "version")
@@ -21,9 +21,22 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    pass
+    # created_at também é preenchido pelo banco (INSERT ... SELECT, COPY).
+    for table in ("orders", "stock_movements"):
+        with op.batch_alter_table(table) as batch:
+            batch.alter_column(
+                "created_at",
+                existing_type=sa.DateTime(timezone=True),
+                server_default=sa.text("CURRENT_TIMESTAMP"),
+            )
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    pass
+    for table in ("orders", "stock_movements"):
+        with op.batch_alter_table(table) as batch:
+            batch.alter_column(
+                "created_at",
+                existing_type=sa.DateTime(timezone=True),
+                server_default=None,
+            )
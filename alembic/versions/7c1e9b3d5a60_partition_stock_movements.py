@@ -0,0 +1,209 @@
+"""partition stock movements
+
+Revision ID: 7c1e9b3d5a60
+Revises: 2a8f6d4c9b17
+Create Date: 2026-10-18 18:31:09.664105
+
+No Postgres, ``stock_movements`` vira uma tabela particionada por mês em
+``created_at`` (``stock_movements_yYYYYmMM`` e uma partição DEFAULT), com
+BRIN em ``created_at`` e B-tree em ``(product_id, created_at)``. As funções
+``stock_movements_create_partition``/``stock_movements_ensure_partitions``
+criam as partições futuras. A conversão copia a tabela inteira: rode em uma
+janela de manutenção. Em outros bancos só os índices são criados.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c1e9b3d5a60"
+down_revision: Union[str, Sequence[str], None] = "2a8f6d4c9b17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    "movement_id, product_id, quantity, movement_type, lease_id, unit_cost, created_at"
+)
+
+CREATE_PARTITION = """
+CREATE OR REPLACE FUNCTION stock_movements_create_partition(for_month date)
+RETURNS text AS $$
+DECLARE
+    start_at timestamptz :=
+        date_trunc('month', for_month::timestamp) AT TIME ZONE 'UTC';
+    end_at timestamptz := start_at + interval '1 month';
+    partition_name text := format(
+        'stock_movements_y%sm%s',
+        to_char(for_month, 'YYYY'),
+        to_char(for_month, 'MM')
+    );
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE stock_movements INCLUDING DEFAULTS)', partition_name
+    );
+    -- Linhas do mês que caíram na partição DEFAULT antes de ela existir.
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM stock_movements_default '
+        'WHERE created_at >= %L AND created_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        start_at, end_at, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE stock_movements ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, start_at, end_at
+    );
+    RETURN partition_name;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+ENSURE_PARTITIONS = """
+CREATE OR REPLACE FUNCTION stock_movements_ensure_partitions(months_ahead integer)
+RETURNS void AS $$
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        PERFORM stock_movements_create_partition(
+            ((now() AT TIME ZONE 'UTC') + make_interval(months => i))::date
+        );
+    END LOOP;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _create_indexes():
+    op.create_index(
+        "ix_stock_movements_product_created",
+        "stock_movements",
+        ["product_id", "created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_stock_movements_created_brin",
+        "stock_movements",
+        ["created_at"],
+        unique=False,
+        postgresql_using="brin",
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        _create_indexes()
+        return
+
+    op.execute("ALTER TABLE stock_movements RENAME TO stock_movements_legacy")
+    op.execute(
+        "ALTER TABLE stock_movements_legacy "
+        "RENAME CONSTRAINT stock_movements_pkey TO stock_movements_legacy_pkey"
+    )
+    op.execute("DROP INDEX IF EXISTS ix_stock_movements_movement_id")
+    op.execute("DROP INDEX IF EXISTS ix_stock_movements_lease_id")
+    # A chave primária de uma tabela particionada precisa conter a chave de
+    # partição. A sequence antiga continua gerando movement_id.
+    op.execute(
+        """
+        CREATE TABLE stock_movements (
+            movement_id integer NOT NULL
+                DEFAULT nextval('stock_movements_movement_id_seq'),
+            product_id integer NOT NULL REFERENCES products (product_id),
+            quantity integer NOT NULL,
+            movement_type varchar NOT NULL,
+            lease_id integer REFERENCES stock_leases (lease_id),
+            unit_cost double precision,
+            created_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (movement_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute(
+        "ALTER SEQUENCE stock_movements_movement_id_seq "
+        "OWNED BY stock_movements.movement_id"
+    )
+    op.execute(
+        "CREATE TABLE stock_movements_default PARTITION OF stock_movements DEFAULT"
+    )
+    op.execute(CREATE_PARTITION)
+    op.execute(ENSURE_PARTITIONS)
+    # Um mês por partição, do movimento mais antigo até três meses à frente.
+    op.execute(
+        """
+        SELECT stock_movements_create_partition(first_day::date)
+        FROM generate_series(
+            date_trunc(
+                'month',
+                COALESCE(
+                    (SELECT min(created_at) FROM stock_movements_legacy), now()
+                ) AT TIME ZONE 'UTC'
+            ),
+            date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+            interval '1 month'
+        ) AS first_day
+        """
+    )
+    op.execute(
+        f"INSERT INTO stock_movements ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM stock_movements_legacy"
+    )
+    op.execute("DROP TABLE stock_movements_legacy")
+    # Índices no pai viram índices particionados, criados em cada partição.
+    _create_indexes()
+    op.create_index(
+        "ix_stock_movements_lease_id", "stock_movements", ["lease_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index("ix_stock_movements_created_brin", table_name="stock_movements")
+        op.drop_index(
+            "ix_stock_movements_product_created", table_name="stock_movements"
+        )
+        return
+
+    op.execute("ALTER TABLE stock_movements RENAME TO stock_movements_partitioned")
+    op.execute(
+        "ALTER TABLE stock_movements_partitioned "
+        "RENAME CONSTRAINT stock_movements_pkey TO stock_movements_partitioned_pkey"
+    )
+    op.execute("DROP INDEX ix_stock_movements_lease_id")
+    op.execute("DROP INDEX ix_stock_movements_product_created")
+    op.execute("DROP INDEX ix_stock_movements_created_brin")
+    op.execute(
+        """
+        CREATE TABLE stock_movements (
+            movement_id integer NOT NULL
+                DEFAULT nextval('stock_movements_movement_id_seq')
+                PRIMARY KEY,
+            product_id integer NOT NULL REFERENCES products (product_id),
+            quantity integer NOT NULL,
+            movement_type varchar NOT NULL,
+            lease_id integer REFERENCES stock_leases (lease_id),
+            unit_cost double precision,
+            created_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    op.execute(
+        "ALTER SEQUENCE stock_movements_movement_id_seq "
+        "OWNED BY stock_movements.movement_id"
+    )
+    op.execute(
+        f"INSERT INTO stock_movements ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM stock_movements_partitioned"
+    )
+    op.execute("DROP TABLE stock_movements_partitioned")
+    op.execute("DROP FUNCTION stock_movements_ensure_partitions(integer)")
+    op.execute("DROP FUNCTION stock_movements_create_partition(date)")
+    op.create_index(
+        "ix_stock_movements_movement_id", "stock_movements", ["movement_id"]
+    )
+    op.create_index("ix_stock_movements_lease_id", "stock_movements", ["lease_id"])
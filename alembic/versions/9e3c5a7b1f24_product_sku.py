@@ -0,0 +1,31 @@
+"""product sku
+
+Revision ID: 9e3c5a7b1f24
+Revises: 5d7f2b8c3e91
+Create Date: 2026-10-18 17:12:40.215336
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9e3c5a7b1f24"
+down_revision: Union[str, Sequence[str], None] = "5d7f2b8c3e91"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("products", sa.Column("sku", sa.String(), nullable=True))
+    op.create_unique_constraint("uq_products_sku", "products", ["sku"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("uq_products_sku", "products", type_="unique")
+    op.drop_column("products", "sku")
@@ -0,0 +1,39 @@
+"""opening movements
+
+Revision ID: a7c3e5f9b214
+Revises: f1b3d5e7a920
+Create Date: 2026-10-18 22:05:41.318206
+
+Produtos cadastrados antes de o saldo inicial virar movimentação ganham uma
+``abertura`` no razão (ver ``app.services.ledger_service``); os snapshots de
+saldo são descartados e refeitos pelo snapshot_worker.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy.orm import Session
+
+from app.services.ledger_service import OPENING, backfill_openings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7c3e5f9b214"
+down_revision: Union[str, Sequence[str], None] = "f1b3d5e7a920"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A sessão usa a transação da migração, sem commit próprio.
+    with Session(bind=op.get_bind()) as db:
+        count = backfill_openings(db)
+    print(f"[migration] {count} aberturas gravadas")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(f"DELETE FROM stock_movements WHERE movement_type = '{OPENING}'")
+    op.execute("DELETE FROM stock_snapshots")
+    op.execute("DELETE FROM stock_snapshot_runs")
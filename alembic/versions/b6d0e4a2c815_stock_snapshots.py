@@ -0,0 +1,44 @@
+"""stock snapshots
+
+Revision ID: b6d0e4a2c815
+Revises: 7c1e9b3d5a60
+Create Date: 2026-10-18 19:20:36.118402
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b6d0e4a2c815"
+down_revision: Union[str, Sequence[str], None] = "7c1e9b3d5a60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "stock_snapshots",
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("snapshot_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.product_id"]),
+        sa.PrimaryKeyConstraint("product_id", "snapshot_at"),
+    )
+    op.create_table(
+        "stock_snapshot_runs",
+        sa.Column("watermark", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("products", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("watermark"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("stock_snapshot_runs")
+    op.drop_table("stock_snapshots")
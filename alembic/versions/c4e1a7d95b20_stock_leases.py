@@ -0,0 +1,64 @@
+"""stock leases
+
+Revision ID: c4e1a7d95b20
+Revises: 8b2d4e6f0a13
+Create Date: 2026-10-18 14:12:47.530914
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e1a7d95b20"
+down_revision: Union[str, Sequence[str], None] = "8b2d4e6f0a13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "stock_leases",
+        sa.Column("lease_id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("holder", sa.String(), nullable=False),
+        sa.Column("granted", sa.Integer(), nullable=False),
+        sa.Column("returned", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("renewed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.product_id"]),
+        sa.PrimaryKeyConstraint("lease_id"),
+    )
+    op.create_index(
+        op.f("ix_stock_leases_lease_id"), "stock_leases", ["lease_id"], unique=False
+    )
+    op.add_column("stock_movements", sa.Column("lease_id", sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        "stock_movements_lease_id_fkey",
+        "stock_movements",
+        "stock_leases",
+        ["lease_id"],
+        ["lease_id"],
+    )
+    op.create_index(
+        op.f("ix_stock_movements_lease_id"),
+        "stock_movements",
+        ["lease_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_stock_movements_lease_id"), table_name="stock_movements")
+    op.drop_constraint(
+        "stock_movements_lease_id_fkey", "stock_movements", type_="foreignkey"
+    )
+    op.drop_column("stock_movements", "lease_id")
+    op.drop_index(op.f("ix_stock_leases_lease_id"), table_name="stock_leases")
+    op.drop_table("stock_leases")
@@ -21,9 +21,56 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    pass
+    # Bancos antigos foram criados com Base.metadata.create_all e marcados
+    # com ``alembic stamp``: as tabelas já existentes são mantidas.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if "products" not in existing:
+        op.create_table(
+            "products",
+            sa.Column("product_id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("quantity_on_hand", sa.Integer(), nullable=False),
+            sa.Column("average_cost", sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint("product_id"),
+        )
+        op.create_index(
+            op.f("ix_products_product_id"), "products", ["product_id"], unique=False
+        )
+    if "orders" not in existing:
+        op.create_table(
+            "orders",
+            sa.Column("order_id", sa.Integer(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint("order_id"),
+        )
+        op.create_index(
+            op.f("ix_orders_order_id"), "orders", ["order_id"], unique=False
+        )
+    if "stock_movements" not in existing:
+        op.create_table(
+            "stock_movements",
+            sa.Column("movement_id", sa.Integer(), nullable=False),
+            sa.Column("product_id", sa.Integer(), nullable=False),
+            sa.Column("quantity", sa.Integer(), nullable=False),
+            sa.Column("movement_type", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.ForeignKeyConstraint(["product_id"], ["products.product_id"]),
+            sa.PrimaryKeyConstraint("movement_id"),
+        )
+        op.create_index(
+            op.f("ix_stock_movements_movement_id"),
+            "stock_movements",
+            ["movement_id"],
+            unique=False,
+        )
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    pass
+    op.drop_index(op.f("ix_stock_movements_movement_id"), table_name="stock_movements")
+    op.drop_table("stock_movements")
+    op.drop_index(op.f("ix_orders_order_id"), table_name="orders")
+    op.drop_table("orders")
+    op.drop_index(op.f("ix_products_product_id"), table_name="products")
+    op.drop_table("products")
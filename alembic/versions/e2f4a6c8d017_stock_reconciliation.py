@@ -0,0 +1,87 @@
+"""stock reconciliation
+
+Revision ID: e2f4a6c8d017
+Revises: b6d0e4a2c815
+Create Date: 2026-10-18 20:02:51.370448
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e2f4a6c8d017"
+down_revision: Union[str, Sequence[str], None] = "b6d0e4a2c815"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "stock_reconciliation_runs",
+        sa.Column("run_id", sa.Integer(), nullable=False),
+        sa.Column("since_movement_id", sa.Integer(), nullable=True),
+        sa.Column("movement_watermark", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("products_checked", sa.Integer(), nullable=False),
+        sa.Column("discrepancies", sa.Integer(), nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("run_id"),
+    )
+    op.create_index(
+        op.f("ix_stock_reconciliation_runs_run_id"),
+        "stock_reconciliation_runs",
+        ["run_id"],
+        unique=False,
+    )
+    op.create_table(
+        "stock_reconciliation_state",
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("last_movement_id", sa.Integer(), nullable=True),
+        sa.Column("balanced", sa.Boolean(), nullable=False),
+        sa.Column("difference", sa.Integer(), nullable=False),
+        sa.Column("checked_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.product_id"]),
+        sa.PrimaryKeyConstraint("product_id"),
+    )
+    op.create_table(
+        "stock_discrepancies",
+        sa.Column("discrepancy_id", sa.Integer(), nullable=False),
+        sa.Column("run_id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity_on_hand", sa.Integer(), nullable=False),
+        sa.Column("ledger_quantity", sa.Integer(), nullable=False),
+        sa.Column("leased_quantity", sa.Integer(), nullable=False),
+        sa.Column("difference", sa.Integer(), nullable=False),
+        sa.Column("detected_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.product_id"]),
+        sa.ForeignKeyConstraint(["run_id"], ["stock_reconciliation_runs.run_id"]),
+        sa.PrimaryKeyConstraint("discrepancy_id"),
+    )
+    for column in ("discrepancy_id", "run_id", "product_id"):
+        op.create_index(
+            op.f(f"ix_stock_discrepancies_{column}"),
+            "stock_discrepancies",
+            [column],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in ("discrepancy_id", "run_id", "product_id"):
+        op.drop_index(
+            op.f(f"ix_stock_discrepancies_{column}"), table_name="stock_discrepancies"
+        )
+    op.drop_table("stock_discrepancies")
+    op.drop_table("stock_reconciliation_state")
+    op.drop_index(
+        op.f("ix_stock_reconciliation_runs_run_id"),
+        table_name="stock_reconciliation_runs",
+    )
+    op.drop_table("stock_reconciliation_runs")
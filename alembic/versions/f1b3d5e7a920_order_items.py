@@ -0,0 +1,46 @@
+"""order items
+
+Revision ID: f1b3d5e7a920
+Revises: e2f4a6c8d017
+Create Date: 2026-10-18 21:14:07.512903
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f1b3d5e7a920"
+down_revision: Union[str, Sequence[str], None] = "e2f4a6c8d017"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Pedidos anteriores não ganham itens: eles só existiam nos eventos.
+    op.create_table(
+        "order_items",
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.Column("line", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["order_id"], ["orders.order_id"]),
+        sa.PrimaryKeyConstraint("order_id", "line"),
+    )
+    op.create_index(
+        "ix_order_items_product_order",
+        "order_items",
+        ["product_id", "order_id"],
+        unique=False,
+        postgresql_include=["quantity"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_order_items_product_order", table_name="order_items")
+    op.drop_table("order_items")
@@ -1,23 +1,63 @@
-from typing import List
+import tempfile
+from typing import List, Optional
 
 import logging
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    HTTPException,
+    Depends,
+    Query,
+    Request,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.schemas.order import OrderCreate, OrderRead
-from app.services.order_service import create_order
-from app.db.session import get_db
+from app.core.config import settings
+from app.core.json_stream import iter_json_file, iter_json_stream
+from app.schemas.order import (
+    OrderBatchRead,
+    OrderCreate,
+    OrderItemsRead,
+    OrderPage,
+    OrderRead,
+)
+from app.services.availability_service import (
+    check_availability,
+    check_availability_async,
+)
+from app.services.order_service import (
+    create_order,
+    create_order_async,
+    create_orders_batch,
+    create_orders_batch_async,
+    dispatch_outbox_async,
+    get_order_items,
+    get_order_items_async,
+    list_orders_with_product,
+    list_orders_with_product_async,
+)
+from app.db.session import get_async_db, get_db
 
 logger = logging.getLogger(__name__)
 
 
 router = APIRouter(prefix="/orders", tags=["orders"])
+async_router = APIRouter(prefix="/orders", tags=["orders"])
+
+
+def _eager_dispatch() -> bool:
+    # No modo fused não há broker: o outbox_relay, que hospeda o pipeline, publica.
+    return settings.outbox_eager_dispatch and settings.messaging_mode != "fused"
 
 
 @router.post("/", response_model=OrderRead, status_code=status.HTTP_201_CREATED)
 def create_order_endpoint(order: OrderCreate, db: Session = Depends(get_db)):
     try:
         items: List[dict] = [item.dict() for item in order.items]
+        check_availability(db, items)
         created = create_order(db, items, order.email)
         return created
     except Exception as exc:
@@ -25,3 +65,156 @@ def create_order_endpoint(order: OrderCreate, db: Session = Depends(get_db)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
         ) from exc
+
+
+@async_router.post("/", response_model=OrderRead, status_code=status.HTTP_201_CREATED)
+async def create_order_endpoint_async(
+    order: OrderCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        items: List[dict] = [item.dict() for item in order.items]
+        await check_availability_async(db, items)
+        created, event_id = await create_order_async(db, items, order.email)
+    except Exception as exc:
+        logger.exception("Erro ao criar pedido: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+        ) from exc
+    if _eager_dispatch():
+        background_tasks.add_task(dispatch_outbox_async, [event_id])
+    return created
+
+
+def _batch_response(results: list, event_ids: list) -> dict:
+    created = len(event_ids)
+    return {
+        "created": created,
+        "rejected": len(results) - created,
+        "results": results,
+    }
+
+
+def _bad_request(exc: ValueError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+
+async def create_orders_batch_endpoint(request: Request, db: Session = Depends(get_db)):
+    """Recebe um array JSON (ou NDJSON) de pedidos. O corpo vai para um
+    arquivo temporário (em disco acima de ``ORDER_BATCH_SPOOL_BYTES``) e o
+    lote roda no thread pool com a sessão síncrona."""
+    with tempfile.SpooledTemporaryFile(
+        max_size=settings.order_batch_spool_bytes
+    ) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        try:
+            results, event_ids = await run_in_threadpool(
+                create_orders_batch, db, iter_json_file(spool)
+            )
+        except ValueError as exc:
+            raise _bad_request(exc) from exc
+    return _batch_response(results, event_ids)
+
+
+async def create_orders_batch_endpoint_async(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Recebe um array JSON (ou NDJSON) de pedidos, lido em streaming."""
+    try:
+        results, event_ids = await create_orders_batch_async(
+            db, iter_json_stream(request.stream())
+        )
+    except ValueError as exc:
+        raise _bad_request(exc) from exc
+    if event_ids and _eager_dispatch():
+        background_tasks.add_task(dispatch_outbox_async, event_ids)
+    return _batch_response(results, event_ids)
+
+
+# No modo sync o lote usa SessionLocal e os eventos ficam para o outbox_relay,
+# como em POST /orders; o engine assíncrono só é criado no modo async.
+for _router, _endpoint in (
+    (router, create_orders_batch_endpoint),
+    (async_router, create_orders_batch_endpoint_async),
+):
+    _router.add_api_route(
+        "/batch",
+        _endpoint,
+        methods=["POST"],
+        response_model=OrderBatchRead,
+        status_code=status.HTTP_201_CREATED,
+        openapi_extra={
+            "requestBody": {
+                "content": {
+                    "application/json": {
+                        "schema": {
+                            "type": "array",
+                            "items": {"$ref": "#/components/schemas/OrderCreate"},
+                        }
+                    },
+                    "application/x-ndjson": {},
+                },
+                "required": True,
+            }
+        },
+    )
+
+
+class ProductOrdersParams:
+    """Parâmetros de ``GET /orders?product_id=`` comuns aos dois modos da API."""
+
+    def __init__(
+        self,
+        product_id: int = Query(..., description="Pedidos que contêm o produto"),
+        after: Optional[int] = Query(None, description="Cursor: último order_id"),
+        limit: Optional[int] = Query(None, ge=1, le=settings.order_page_max_size),
+    ):
+        self.product_id = product_id
+        self.after = after
+        self.limit = limit or settings.order_page_size
+
+
+@router.get("/", response_model=OrderPage)
+def list_endpoint(
+    params: ProductOrdersParams = Depends(), db: Session = Depends(get_db)
+):
+    return list_orders_with_product(
+        db, params.product_id, limit=params.limit, after=params.after
+    )
+
+
+@async_router.get("/", response_model=OrderPage)
+async def list_endpoint_async(
+    params: ProductOrdersParams = Depends(), db: AsyncSession = Depends(get_async_db)
+):
+    return await list_orders_with_product_async(
+        db, params.product_id, limit=params.limit, after=params.after
+    )
+
+
+def _order_not_found(order_id: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Pedido {order_id} não encontrado",
+    )
+
+
+@router.get("/{order_id}/items", response_model=OrderItemsRead)
+def items_endpoint(order_id: int, db: Session = Depends(get_db)):
+    order = get_order_items(db, order_id)
+    if order is None:
+        raise _order_not_found(order_id)
+    return order
+
+
+@async_router.get("/{order_id}/items", response_model=OrderItemsRead)
+async def items_endpoint_async(order_id: int, db: AsyncSession = Depends(get_async_db)):
+    order = await get_order_items_async(db, order_id)
+    if order is None:
+        raise _order_not_found(order_id)
+    return order
@@ -1,11 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException
+import tempfile
+from dataclasses import asdict
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.schemas.product import ProductCreate, ProductRead
-from app.services.product_service import create_product
-from app.db.session import get_db
+from app.core.config import settings
+from app.schemas.product import (
+    ProductCreate,
+    ProductImportRead,
+    ProductPage,
+    ProductRead,
+)
+from app.services import product_cache
+from app.schemas.stock import StockBalanceRead
+from app.services.product_import import import_products
+from app.services.snapshot_service import stock_at
+from app.services.product_service import (
+    create_product,
+    create_product_async,
+    list_products,
+    list_products_async,
+    parse_fields,
+    stream_products_ndjson,
+    stream_products_ndjson_async,
+)
+from app.db.session import get_async_db, get_db
 
 
 router = APIRouter(prefix="/products", tags=["products"])
+async_router = APIRouter(prefix="/products", tags=["products"])
+
+NDJSON = "application/x-ndjson"
 
 
 @router.post("/", response_model=ProductRead)
@@ -15,3 +44,175 @@ def create(product: ProductCreate, db: Session = Depends(get_db)):
         return created
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@async_router.post("/", response_model=ProductRead)
+async def create_async(
+    product: ProductCreate, db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        created = await create_product_async(db, product)
+        return created
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+class ListParams:
+    """Parâmetros de ``GET /products`` comuns aos dois modos da API."""
+
+    def __init__(
+        self,
+        request: Request,
+        after: Optional[int] = Query(None, description="Cursor: último product_id"),
+        limit: Optional[int] = Query(None, ge=1, le=settings.product_page_max_size),
+        min_quantity: Optional[int] = Query(None),
+        max_quantity: Optional[int] = Query(None),
+        fields: Optional[str] = Query(None, description="Ex.: product_id,name"),
+        format: Optional[str] = Query(None, regex="^(json|ndjson)$"),
+    ):
+        try:
+            self.fields = parse_fields(fields)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        self.ndjson = format == "ndjson" or (
+            format is None and NDJSON in request.headers.get("accept", "")
+        )
+        self.limit = limit
+        self.filters = {
+            "fields": self.fields,
+            "after": after,
+            "min_quantity": min_quantity,
+            "max_quantity": max_quantity,
+        }
+
+
+@router.get("/", response_model=ProductPage)
+def list_endpoint(params: ListParams = Depends(), db: Session = Depends(get_db)):
+    if params.ndjson:
+        # Exportação: sem limite por padrão, lida em blocos via cursor no servidor.
+        return StreamingResponse(
+            stream_products_ndjson(db, limit=params.limit, **params.filters),
+            media_type=NDJSON,
+        )
+    return list_products(
+        db, limit=params.limit or settings.product_page_size, **params.filters
+    )
+
+
+@async_router.get("/", response_model=ProductPage)
+async def list_endpoint_async(
+    params: ListParams = Depends(), db: AsyncSession = Depends(get_async_db)
+):
+    if params.ndjson:
+        return StreamingResponse(
+            stream_products_ndjson_async(db, limit=params.limit, **params.filters),
+            media_type=NDJSON,
+        )
+    return await list_products_async(
+        db, limit=params.limit or settings.product_page_size, **params.filters
+    )
+
+
+async def import_endpoint(
+    request: Request,
+    format: Optional[str] = Query(None, regex="^(csv|ndjson)$"),
+    db: Session = Depends(get_db),
+):
+    """Importação em massa. O corpo vai para um arquivo temporário (em disco
+    acima de ``PRODUCT_IMPORT_SPOOL_BYTES``) e é importado em blocos."""
+    fmt = format or (
+        "ndjson" if NDJSON in request.headers.get("content-type", "") else "csv"
+    )
+    with tempfile.SpooledTemporaryFile(
+        max_size=settings.product_import_spool_bytes
+    ) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        report = await run_in_threadpool(import_products, db, spool, fmt)
+    return asdict(report)
+
+
+# Nos dois modos a importação roda no thread pool com a sessão síncrona.
+for _router in (router, async_router):
+    _router.add_api_route(
+        "/import",
+        import_endpoint,
+        methods=["POST"],
+        response_model=ProductImportRead,
+        openapi_extra={
+            "requestBody": {
+                "content": {"text/csv": {}, NDJSON: {}},
+                "required": True,
+            }
+        },
+    )
+
+
+def _not_modified(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return "*" in candidates or tag in candidates
+
+
+def _read_response(request: Request, response: Response, product):
+    if product is None:
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+    tag = product_cache.etag(product)
+    if _not_modified(request, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    response.headers["ETag"] = tag
+    return product
+
+
+@router.get("/cache/stats")
+@async_router.get("/cache/stats")
+def cache_stats_endpoint():
+    """Contadores de hit/miss do cache de leitura, para ajuste de tamanho/TTL."""
+    return product_cache.stats()
+
+
+@router.get("/{product_id}", response_model=ProductRead)
+def read_endpoint(
+    product_id: int, request: Request, response: Response, db: Session = Depends(get_db)
+):
+    return _read_response(request, response, product_cache.get_product(db, product_id))
+
+
+@async_router.get("/{product_id}", response_model=ProductRead)
+async def read_endpoint_async(
+    product_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    return _read_response(
+        request, response, await product_cache.get_product_async(db, product_id)
+    )
+
+
+def _balance_response(balance):
+    if balance is None:
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+    return balance
+
+
+@router.get("/{product_id}/stock", response_model=StockBalanceRead)
+def stock_at_endpoint(
+    product_id: int,
+    at: Optional[datetime] = Query(None, description="Padrão: agora"),
+    db: Session = Depends(get_db),
+):
+    """Saldo do produto em uma data, a partir do snapshot mais próximo."""
+    return _balance_response(stock_at(db, product_id, at))
+
+
+@async_router.get("/{product_id}/stock", response_model=StockBalanceRead)
+async def stock_at_endpoint_async(
+    product_id: int,
+    at: Optional[datetime] = Query(None, description="Padrão: agora"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return _balance_response(await db.run_sync(stock_at, product_id, at))
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.schemas.stock import StockReceiptCreate, StockReceiptRead
+from app.services.stock_service import ProductNotFoundError, receive_stock
+from app.db.session import get_db
+
+
+router = APIRouter(prefix="/stock", tags=["stock"])
+async_router = APIRouter(prefix="/stock", tags=["stock"])
+
+
+def create_receipt_endpoint(receipt: StockReceiptCreate, db: Session = Depends(get_db)):
+    try:
+        products = receive_stock(db, [item.dict() for item in receipt.items])
+    except ProductNotFoundError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)
+        ) from exc
+    return {"products": products}
+
+
+# Nos dois modos a entrada roda no thread pool com a sessão síncrona: as
+# retentativas de deadlock dormem com time.sleep e travariam o event loop.
+for _router in (router, async_router):
+    _router.add_api_route(
+        "/receipts",
+        create_receipt_endpoint,
+        methods=["POST"],
+        response_model=StockReceiptRead,
+        status_code=status.HTTP_201_CREATED,
+    )
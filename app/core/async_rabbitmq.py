@@ -0,0 +1,86 @@
+"""
+Publicação assíncrona (aio-pika) para as rotas com ``API_MODE=async``.
+
+Uma conexão robusta por processo com um canal em modo publisher confirms:
+as publicações de um lote são enviadas juntas e as confirmações aguardadas
+com ``asyncio.gather``, sem bloquear o event loop.
+"""
+
+import asyncio
+import os
+from typing import Iterable, Optional, Tuple
+
+import aio_pika
+from app.core.config import settings
+from app.core.rabbitmq import EXCHANGE_NAME, encode
+
+
+class AsyncPublisher:
+    def __init__(self):
+        self._connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self._exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        self._lock = asyncio.Lock()
+
+    async def _get_exchange(self) -> aio_pika.abc.AbstractExchange:
+        if self._exchange is not None:
+            return self._exchange
+        async with self._lock:
+            if self._exchange is None:
+                self._connection = await aio_pika.connect_robust(
+                    host=settings.rabbitmq_host,
+                    port=settings.rabbitmq_port,
+                    login=settings.rabbitmq_user,
+                    password=settings.rabbitmq_password,
+                )
+                channel = await self._connection.channel(publisher_confirms=True)
+                self._exchange = await channel.declare_exchange(
+                    EXCHANGE_NAME, aio_pika.ExchangeType.TOPIC, durable=True
+                )
+        return self._exchange
+
+    async def publish_many(self, events: Iterable[Tuple[str, dict]]) -> int:
+        exchange = await self._get_exchange()
+        confirms = []
+        for routing_key, payload in events:
+            body, content_type, content_encoding = encode(payload)
+            confirms.append(
+                exchange.publish(
+                    aio_pika.Message(
+                        body,
+                        content_type=content_type,
+                        content_encoding=content_encoding,
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    ),
+                    routing_key=routing_key,
+                )
+            )
+        await asyncio.gather(*confirms)
+        return len(confirms)
+
+    async def publish(self, routing_key: str, payload: dict):
+        await self.publish_many([(routing_key, payload)])
+
+    async def close(self):
+        if self._connection is not None:
+            await self._connection.close()
+        self._connection = None
+        self._exchange = None
+
+
+_publisher: Optional[AsyncPublisher] = None
+_publisher_pid: Optional[int] = None
+
+
+def get_async_publisher() -> AsyncPublisher:
+    global _publisher, _publisher_pid  # pylint: disable=global-statement
+    if _publisher is None or _publisher_pid != os.getpid():
+        _publisher = AsyncPublisher()
+        _publisher_pid = os.getpid()
+    return _publisher
+
+
+async def close_async_publisher():
+    global _publisher  # pylint: disable=global-statement
+    if _publisher is not None and _publisher_pid == os.getpid():
+        await _publisher.close()
+    _publisher = None
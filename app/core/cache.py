@@ -0,0 +1,105 @@
+"""
+Estruturas de cache em memória, por processo e seguras entre threads.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Cache LRU com expiração por entrada.
+
+    Acima de ``maxsize`` entradas a menos usada recentemente é descartada;
+    entradas mais velhas que ``ttl_s`` são tratadas como ausentes.
+    """
+
+    def __init__(self, maxsize: int, ttl_s: float, clock=time.monotonic):
+        self._maxsize = maxsize
+        self._ttl = ttl_s
+        self._clock = clock
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= self._clock():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self._clock() + self._ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def adjust(self, key, delta) -> bool:
+        """Soma ``delta`` a uma entrada existente, sem renovar o TTL."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False
+            value, expires_at = entry
+            self._data[key] = (value + delta, expires_at)
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def invalidate_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self._maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class IdBitmap:
+    """Conjunto compacto de IDs inteiros não negativos (1 bit por ID)."""
+
+    def __init__(self, ids=()):
+        self._bits = bytearray()
+        self._lock = threading.Lock()
+        for id_ in ids:
+            self.add(id_)
+
+    def add(self, id_: int):
+        if id_ < 0:
+            # Como no ``in``: fora da faixa, nunca é membro (nem corrompe bits).
+            return
+        byte, bit = divmod(id_, 8)
+        with self._lock:
+            if byte >= len(self._bits):
+                self._bits.extend(bytes(byte + 1 - len(self._bits)))
+            self._bits[byte] |= 1 << bit
+
+    def __contains__(self, id_: int) -> bool:
+        byte, bit = divmod(id_, 8)
+        return 0 <= byte < len(self._bits) and bool(self._bits[byte] >> bit & 1)
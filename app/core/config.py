@@ -8,10 +8,100 @@ class Settings(BaseSettings):
     postgres_host: str = "postgres"
     postgres_port: int = 5432
 
+    db_retry_attempts: int = 5
+    db_retry_base_delay_ms: int = 20
+    db_async_pool_size: int = 20
+    db_async_max_overflow: int = 20
+
     rabbitmq_host: str = "rabbitmq"
     rabbitmq_port: int = 5672
     rabbitmq_user: str = "guest"
     rabbitmq_password: str = "guest"
+    rabbitmq_pool_size: int = 4
+    rabbitmq_confirm_batch_size: int = 500
+    rabbitmq_publish_retries: int = 3
+    # "json" ou "packed"; os consumidores aceitam os dois.
+    rabbitmq_codec: str = "json"
+    # Corpos a partir desse tamanho vão com zlib (0 desativa).
+    rabbitmq_compress_min_bytes: int = 0
+
+    outbox_batch_size: int = 500
+    outbox_poll_interval_ms: int = 200
+    # Com API_MODE=async, publica o evento logo após a resposta (o relay
+    # continua cobrindo falhas).
+    outbox_eager_dispatch: bool = True
+    order_batch_chunk_size: int = 1000
+    # Acima disso o corpo de POST /orders/batch (modo sync) vai para disco.
+    order_batch_spool_bytes: int = 8 * 1024 * 1024
+    order_page_size: int = 100
+    order_page_max_size: int = 1000
+    # Claim-check: pedidos com pelo menos N linhas viajam só com a referência
+    # aos itens (0 desativa). Armazenamento "db" (order_items) ou "blob".
+    claim_check_min_items: int = 1000
+    claim_check_store: str = "db"
+    claim_check_blob_dir: str = "./var/claim_check"
+    claim_check_cache_size: int = 1000
+    claim_check_cache_ttl_s: float = 600.0
+    product_page_size: int = 100
+    product_page_max_size: int = 1000
+    product_stream_chunk_size: int = 1000
+    product_cache_size: int = 10_000
+    product_cache_ttl_s: float = 30.0
+    product_import_chunk_size: int = 5000
+    product_import_max_errors: int = 1000
+    # Acima disso o corpo de POST /products/import vai para disco.
+    product_import_spool_bytes: int = 8 * 1024 * 1024
+
+    # "rabbitmq" (workers separados) ou "fused" (pipeline em memória no
+    # processo do outbox_relay, sem broker).
+    messaging_mode: str = "rabbitmq"
+    fused_queue_size: int = 1000
+
+    worker_concurrency: int = 8
+    worker_prefetch_count: int = 32
+    worker_adaptive_prefetch: bool = True
+    worker_prefetch_min: int = 1
+    worker_prefetch_max: int = 256
+    worker_prefetch_buffer_ms: int = 100
+    worker_ack_batch_size: int = 16
+    worker_ack_interval_ms: int = 50
+    worker_drain_timeout_s: int = 30
+    # Erro no handler: espera em filas <fila>.retry.<atraso>ms com atrasos de
+    # base × fator^n (1s, 5s, 25s, 125s); esgotadas, vai para <fila>.dead.
+    worker_retry_attempts: int = 4
+    worker_retry_base_delay_ms: int = 1000
+    worker_retry_backoff_factor: int = 5
+
+    # "locking" (SELECT ... FOR UPDATE) ou "conditional" (UPDATE condicional)
+    stock_reservation_engine: str = "locking"
+    movement_copy_threshold: int = 1000
+    # Meses à frente com partição de stock_movements criada pelo stock_worker.
+    stock_movement_partitions_ahead: int = 3
+    stock_snapshot_interval_s: int = 300
+    # Movimentações mais novas que isso ficam para a próxima rodada.
+    stock_snapshot_lag_s: int = 60
+    stock_reconciliation_workers: int = 4
+    stock_reconciliation_chunk_size: int = 1000
+    stock_reconciliation_lag_s: int = 60
+    # 0 desativa o particionamento; STOCK_WORKER_SHARDS vazio = todos os shards
+    stock_partitions: int = 0
+    stock_worker_shards: str = ""
+    stock_batch_size: int = 50
+    stock_batch_wait_ms: int = 20
+    stock_escrow_enabled: bool = False
+    stock_escrow_hot_rate: float = 50.0
+    stock_escrow_block: int = 100
+    stock_escrow_interval_ms: int = 200
+    stock_escrow_stale_s: int = 30
+
+    availability_cache_enabled: bool = True
+    availability_listener_enabled: bool = True
+    availability_cache_size: int = 100_000
+    availability_cache_ttl_s: float = 5.0
+    availability_ids_refresh_s: float = 300.0
+
+    # "sync" (rotas def + SessionLocal) ou "async" (async def + AsyncSession)
+    api_mode: str = "sync"
 
     app_host: str = "0.0.0.0"
     app_port: int = 8000
@@ -0,0 +1,96 @@
+"""
+Leitura incremental de corpos JSON grandes.
+
+Aceita um array JSON (``[{...}, {...}]``) ou NDJSON (um objeto por linha) e
+devolve cada elemento assim que ele chega, sem montar a lista inteira.
+"""
+
+import codecs
+import json
+from typing import AsyncIterator, BinaryIO, Iterator
+
+_WHITESPACE = " \t\r\n"
+
+# Estados do array: logo após "[", após ",", após um elemento, após "]".
+_OPEN, _ITEM, _SEPARATOR, _DONE = range(4)
+
+
+class JSONStreamDecoder:
+    def __init__(self, max_item_bytes: int = 1 << 20):
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._max_item = max_item_bytes
+        self._array = None  # definido pelo primeiro caractere do corpo
+        self._state = _OPEN
+
+    def feed(self, chunk: bytes) -> list:
+        self._buffer += self._text.decode(chunk)
+        buffer = self._buffer
+        items = []
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+
+            if self._array is None:
+                self._array = char == "["
+                pos += self._array
+                continue
+            if self._state == _DONE:
+                raise ValueError("Conteúdo após o fim do array JSON")
+            if self._array and self._state != _ITEM and char == "]":
+                self._state = _DONE
+                pos += 1
+                continue
+            if self._array and self._state == _SEPARATOR:
+                if char != ",":
+                    raise ValueError(f"Esperado ',' ou ']' no caractere {char!r}")
+                self._state = _ITEM
+                pos += 1
+                continue
+
+            try:
+                item, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                item, end = None, None
+            # Número/literal no fim do buffer pode continuar no próximo pedaço.
+            if end is None or (
+                end == len(buffer) and not isinstance(item, (dict, list))
+            ):
+                # Elemento incompleto: espera o próximo pedaço do corpo.
+                if len(buffer) - pos > self._max_item:
+                    raise ValueError("Elemento JSON inválido ou grande demais")
+                break
+            pos = end
+            items.append(item)
+            if self._array:
+                self._state = _SEPARATOR
+        self._buffer = buffer[pos:]
+        return items
+
+    def close(self):
+        self._buffer += self._text.decode(b"", final=True)
+        if self._buffer.strip():
+            raise ValueError("JSON incompleto ou inválido no fim do corpo")
+        if self._array and self._state != _DONE:
+            raise ValueError("Array JSON não foi fechado")
+
+
+async def iter_json_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator:
+    decoder = JSONStreamDecoder()
+    async for chunk in chunks:
+        for item in decoder.feed(chunk):
+            yield item
+    decoder.close()
+
+
+def iter_json_file(file: BinaryIO, chunk_size: int = 64 * 1024) -> Iterator:
+    """Versão síncrona de ``iter_json_stream`` para um arquivo binário."""
+    decoder = JSONStreamDecoder()
+    while chunk := file.read(chunk_size):
+        yield from decoder.feed(chunk)
+    decoder.close()
@@ -0,0 +1,789 @@
+"""
+Broker AMQP em memória, no lugar do RabbitMQ em testes e benchmarks.
+
+Implementa a parte do ``pika.BlockingConnection`` usada pelo projeto:
+exchanges topic/direct/fanout (e o default), filas duráveis, exclusivas e
+auto-delete, ``basic_qos`` (prefetch por canal ou por consumidor), ack/nack
+com redelivery, ``basic_get``, transações (``tx_select``/``tx_commit``),
+``consume`` com ``inactivity_timeout`` e os argumentos ``x-message-ttl`` e
+``x-dead-letter-exchange``/``x-dead-letter-routing-key`` (com cabeçalho
+``x-death``). Como no pika, os callbacks rodam na thread que chama
+``process_data_events``; mensagens vencidas saem da fila nela e em
+``wait_idle``.
+
+Latência e falhas podem ser injetadas: ``connect_ms`` (handshake), ``rtt_ms``
+(cada operação síncrona), ``publish_failure_rate`` (a conexão cai no publish
+ou no commit e a transação é descartada) e ``redelivery_rate`` (o ack se
+perde e a mensagem volta como ``redelivered``)::
+
+    broker = MemoryBroker(rtt_ms=0.3, publish_failure_rate=0.01, seed=1)
+    rabbitmq.use_connection_factory(broker.connect)
+"""
+
+import copy
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Optional
+
+import pika
+from pika.exceptions import (
+    ChannelClosedByBroker,
+    ChannelWrongStateError,
+    ConnectionClosedByBroker,
+    ConnectionWrongStateError,
+)
+from pika.spec import Basic, Queue
+
+from app.core.rabbitmq import topic_matches
+
+_DEFAULT_PROPERTIES = pika.BasicProperties()
+# Sem prefetch, cada process_data_events entrega no máximo isto por consumidor.
+_UNLIMITED_BATCH = 256
+
+
+class _Message:
+    __slots__ = (
+        "exchange",
+        "routing_key",
+        "body",
+        "properties",
+        "redelivered",
+        "enqueued_at",
+        "expires_at",
+    )
+
+    def __init__(self, exchange: str, routing_key: str, body: bytes, properties):
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.body = body
+        self.properties = properties
+        self.redelivered = False
+        self.enqueued_at = time.perf_counter()
+        self.expires_at = None
+
+
+class _Queue:
+    def __init__(self, name, durable, exclusive, auto_delete, arguments, owner):
+        self.name = name
+        self.durable = durable
+        self.exclusive = exclusive
+        self.auto_delete = auto_delete
+        self.arguments = arguments or {}
+        self.owner = owner
+        self.messages: deque = deque()
+        self.consumers: list = []
+        self.unacked = 0
+        self.stats = {
+            "published": 0,
+            "delivered": 0,
+            "acked": 0,
+            "requeued": 0,
+            "rejected": 0,
+            "expired": 0,
+        }
+        # Espera de cada entrega (publicação/devolução até a entrega), em ms.
+        self.wait_ms: list[float] = []
+
+    @property
+    def single_active(self) -> bool:
+        return bool(self.arguments.get("x-single-active-consumer"))
+
+    @property
+    def ttl(self) -> Optional[float]:
+        ttl_ms = self.arguments.get("x-message-ttl")
+        return None if ttl_ms is None else ttl_ms / 1000
+
+
+class _Consumer:
+    __slots__ = (
+        "tag",
+        "channel",
+        "queue",
+        "callback",
+        "auto_ack",
+        "prefetch",
+        "unacked",
+    )
+
+    def __init__(self, tag, channel, queue, callback, auto_ack, prefetch):
+        self.tag = tag
+        self.channel = channel
+        self.queue = queue
+        self.callback = callback
+        self.auto_ack = auto_ack
+        self.prefetch = prefetch
+        self.unacked = 0
+
+
+def _matches(exchange_type: str, pattern: str, routing_key: str) -> bool:
+    if exchange_type == "fanout":
+        return True
+    if exchange_type == "topic":
+        return topic_matches(pattern, routing_key)
+    return pattern == routing_key
+
+
+class MemoryBroker:
+    def __init__(
+        self,
+        rtt_ms: float = 0.0,
+        connect_ms: float = 0.0,
+        publish_failure_rate: float = 0.0,
+        redelivery_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.rtt = rtt_ms / 1000
+        self.connect_delay = connect_ms / 1000
+        self.publish_failure_rate = publish_failure_rate
+        self.redelivery_rate = redelivery_rate
+        # Um lock para todo o estado; as threads esperam entregas nele.
+        self.cond = threading.Condition()
+        self._random = random.Random(seed)
+        self._exchanges: dict[str, str] = {"": "direct"}
+        self._bindings: dict[str, list[tuple[str, str]]] = {"": []}
+        self._routes: dict[tuple, list[_Queue]] = {}
+        self._queues: dict[str, _Queue] = {}
+        self._ids = itertools.count(1)
+        self.connections = 0
+        self.failures = 0
+
+    def connect(self) -> "MemoryConnection":
+        """Abre uma conexão; use no lugar de ``get_connection``."""
+        if self.connect_delay:
+            time.sleep(self.connect_delay)
+        with self.cond:
+            self.connections += 1
+        return MemoryConnection(self)
+
+    def round_trip(self):
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    # Os métodos abaixo são chamados com ``cond`` travado.
+
+    def roll(self, rate: float) -> bool:
+        return rate > 0 and self._random.random() < rate
+
+    def exchange_type(self, name: str) -> str:
+        try:
+            return self._exchanges[name]
+        except KeyError:
+            raise ChannelClosedByBroker(
+                404, f"NOT_FOUND - no exchange '{name}'"
+            ) from None
+
+    def queue(self, name: str) -> _Queue:
+        try:
+            return self._queues[name]
+        except KeyError:
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{name}'") from None
+
+    def declare_exchange(self, name: str, exchange_type: str):
+        current = self._exchanges.setdefault(name, exchange_type)
+        if current != exchange_type:
+            raise ChannelClosedByBroker(
+                406,
+                f"PRECONDITION_FAILED - inequivalent arg 'type' for exchange '{name}'",
+            )
+        self._bindings.setdefault(name, [])
+
+    def declare_queue(
+        self, name, durable, exclusive, auto_delete, arguments, owner
+    ) -> _Queue:
+        name = name or f"amq.gen-{next(self._ids)}"
+        queue = self._queues.get(name)
+        if queue is None:
+            queue = _Queue(name, durable, exclusive, auto_delete, arguments, owner)
+            self._queues[name] = queue
+            self._routes.clear()
+        elif queue.exclusive and queue.owner is not owner:
+            raise ChannelClosedByBroker(
+                405, f"RESOURCE_LOCKED - queue '{name}' is exclusive"
+            )
+        elif queue.durable != durable or queue.arguments != (arguments or {}):
+            raise ChannelClosedByBroker(
+                406, f"PRECONDITION_FAILED - inequivalent arg for queue '{name}'"
+            )
+        return queue
+
+    def bind(self, queue: str, exchange: str, routing_key: str):
+        self.exchange_type(exchange)
+        self.queue(queue)
+        binding = (routing_key, queue)
+        if binding not in self._bindings[exchange]:
+            self._bindings[exchange].append(binding)
+            self._routes.clear()
+
+    def delete_queue(self, queue: _Queue):
+        if self._queues.get(queue.name) is not queue:
+            return
+        del self._queues[queue.name]
+        for exchange, bindings in self._bindings.items():
+            self._bindings[exchange] = [
+                binding for binding in bindings if binding[1] != queue.name
+            ]
+        self._routes.clear()
+
+    def drop_exclusive(self, owner: "MemoryConnection"):
+        for queue in list(self._queues.values()):
+            if queue.exclusive and queue.owner is owner:
+                self.delete_queue(queue)
+
+    def route(self, exchange: str, routing_key: str) -> list[_Queue]:
+        key = (exchange, routing_key)
+        queues = self._routes.get(key)
+        if queues is None:
+            exchange_type = self.exchange_type(exchange)
+            if exchange == "":
+                names = [routing_key] if routing_key in self._queues else []
+            else:
+                names = [
+                    queue
+                    for pattern, queue in self._bindings[exchange]
+                    if _matches(exchange_type, pattern, routing_key)
+                ]
+            queues = [self._queues[name] for name in dict.fromkeys(names)]
+            self._routes[key] = queues
+        return queues
+
+    def publish(self, exchange: str, routing_key: str, body: bytes, properties):
+        for queue in self.route(exchange, routing_key):
+            message = _Message(exchange, routing_key, body, properties)
+            if queue.ttl is not None:
+                message.expires_at = time.monotonic() + queue.ttl
+            queue.messages.append(message)
+            queue.stats["published"] += 1
+        self.cond.notify_all()
+
+    def dead_letter(self, queue: _Queue, message: _Message, reason: str):
+        """Republica no ``x-dead-letter-exchange`` da fila (sem ele, descarta)."""
+        exchange = queue.arguments.get("x-dead-letter-exchange")
+        if exchange is None or exchange not in self._exchanges:
+            return
+        routing_key = queue.arguments.get(
+            "x-dead-letter-routing-key", message.routing_key
+        )
+        properties = copy.copy(message.properties)
+        headers = dict(properties.headers or {})
+        deaths = [dict(death) for death in headers.get("x-death", [])]
+        for death in deaths:
+            if death["queue"] == queue.name and death["reason"] == reason:
+                death["count"] += 1
+                break
+        else:
+            deaths.insert(
+                0,
+                {
+                    "queue": queue.name,
+                    "reason": reason,
+                    "count": 1,
+                    "exchange": message.exchange,
+                    "routing-keys": [message.routing_key],
+                },
+            )
+        headers["x-death"] = deaths
+        properties.headers = headers
+        self.publish(exchange, routing_key, message.body, properties)
+
+    def expire(self) -> Optional[float]:
+        """Tira as mensagens vencidas; retorna os segundos até o próximo vencimento."""
+        now = time.monotonic()
+        next_expiry = None
+        for queue in list(self._queues.values()):
+            if queue.ttl is None:
+                continue
+            # Como no RabbitMQ, só a cabeça da fila é verificada.
+            while queue.messages and queue.messages[0].expires_at <= now:
+                message = queue.messages.popleft()
+                queue.stats["expired"] += 1
+                self.dead_letter(queue, message, "expired")
+            if queue.messages:
+                wait = queue.messages[0].expires_at - now
+                next_expiry = wait if next_expiry is None else min(next_expiry, wait)
+        return next_expiry
+
+    def requeue(self, queue: _Queue, message: _Message):
+        message.redelivered = True
+        message.enqueued_at = time.perf_counter()
+        queue.messages.appendleft(message)
+        queue.stats["requeued"] += 1
+
+    # Inspeção
+
+    def message_count(self, queue: str) -> int:
+        with self.cond:
+            self.expire()
+            return len(self.queue(queue).messages)
+
+    def consumer_count(self, queue: str) -> int:
+        with self.cond:
+            target = self._queues.get(queue)
+            return len(target.consumers) if target else 0
+
+    def queue_stats(self) -> dict[str, dict]:
+        with self.cond:
+            self.expire()
+            return {
+                queue.name: {
+                    **queue.stats,
+                    "ready": len(queue.messages),
+                    "unacked": queue.unacked,
+                    "wait_ms": list(queue.wait_ms),
+                }
+                for queue in self._queues.values()
+            }
+
+    def wait_idle(self, timeout: Optional[float] = None, queues=None) -> bool:
+        """Espera as filas (todas ou as de ``queues``) esvaziarem sem entregas pendentes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while True:
+                next_expiry = self.expire()
+                if all(
+                    not queue.messages and not queue.unacked
+                    for queue in self._queues.values()
+                    if queues is None or queue.name in queues
+                ):
+                    return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(_earliest(remaining, next_expiry))
+
+
+def _earliest(*timeouts: Optional[float]) -> Optional[float]:
+    present = [timeout for timeout in timeouts if timeout is not None]
+    return min(present) if present else None
+
+
+class MemoryConnection:
+    def __init__(self, broker: MemoryBroker):
+        self._broker = broker
+        self._channels: list["MemoryChannel"] = []
+        self._callbacks: deque = deque()
+        self._channel_numbers = itertools.count(1)
+        self.is_open = True
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    def _check_open(self):
+        if not self.is_open:
+            raise ConnectionWrongStateError("Connection is closed.")
+
+    def channel(self) -> "MemoryChannel":
+        self._broker.round_trip()
+        with self._broker.cond:
+            self._check_open()
+            channel = MemoryChannel(self._broker, self, next(self._channel_numbers))
+            self._channels.append(channel)
+            return channel
+
+    def add_callback_threadsafe(self, callback):
+        with self._broker.cond:
+            self._check_open()
+            self._callbacks.append(callback)
+            self._broker.cond.notify_all()
+
+    def process_data_events(self, time_limit: Optional[float] = 0):
+        """Roda callbacks e entregas pendentes; sem nada, espera até ``time_limit``."""
+        cond = self._broker.cond
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        with cond:
+            while True:
+                self._check_open()
+                next_expiry = self._broker.expire()
+                callbacks = list(self._callbacks)
+                self._callbacks.clear()
+                deliveries = []
+                for channel in self._channels:
+                    channel.collect(deliveries)
+                if callbacks or deliveries:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return
+                cond.wait(_earliest(remaining, next_expiry))
+        for callback in callbacks:
+            callback()
+        for consumer, method, message in deliveries:
+            consumer.callback(
+                consumer.channel, method, message.properties, message.body
+            )
+
+    def sleep(self, duration: float):
+        deadline = time.monotonic() + duration
+        while (remaining := deadline - time.monotonic()) > 0:
+            self.process_data_events(time_limit=remaining)
+
+    def close(self):
+        self._broker.round_trip()
+        with self._broker.cond:
+            self._check_open()
+            self.close_locked()
+
+    def close_locked(self):
+        if not self.is_open:
+            return
+        self.is_open = False
+        for channel in self._channels:
+            channel.close_locked()
+        self._callbacks.clear()
+        self._broker.drop_exclusive(self)
+        self._broker.cond.notify_all()
+
+
+class MemoryChannel:
+    def __init__(self, broker: MemoryBroker, connection: MemoryConnection, number):
+        self._broker = broker
+        self._connection = connection
+        self.channel_number = number
+        self._open = True
+        self._consumers: dict[str, _Consumer] = {}
+        self._unacked: dict[int, tuple[_Consumer, _Message]] = {}
+        self._delivery_tags = itertools.count(1)
+        self._consumer_tags = itertools.count(1)
+        self._channel_prefetch = 0
+        self._consumer_prefetch = 0
+        self._tx: Optional[list] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._open and self._connection.is_open
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    @contextmanager
+    def _locked(self):
+        """Trava o broker; um erro do broker fecha o canal, como no AMQP."""
+        with self._broker.cond:
+            if not self.is_open:
+                raise ChannelWrongStateError("Channel is closed.")
+            try:
+                yield
+            except ChannelClosedByBroker:
+                self.close_locked()
+                raise
+
+    def _maybe_fail(self):
+        if self._broker.roll(self._broker.publish_failure_rate):
+            self._broker.failures += 1
+            self._connection.close_locked()
+            raise ConnectionClosedByBroker(320, "CONNECTION_FORCED - falha injetada")
+
+    # Topologia
+
+    def exchange_declare(
+        self,
+        exchange,
+        exchange_type="direct",
+        passive=False,
+        durable=False,
+        auto_delete=False,
+        internal=False,
+        arguments=None,
+    ):
+        self._broker.round_trip()
+        with self._locked():
+            if passive:
+                self._broker.exchange_type(exchange)
+            else:
+                exchange_type = getattr(exchange_type, "value", exchange_type)
+                self._broker.declare_exchange(exchange, exchange_type)
+
+    def queue_declare(
+        self,
+        queue,
+        passive=False,
+        durable=False,
+        exclusive=False,
+        auto_delete=False,
+        arguments=None,
+    ):
+        self._broker.round_trip()
+        with self._locked():
+            if passive:
+                target = self._broker.queue(queue)
+            else:
+                target = self._broker.declare_queue(
+                    queue, durable, exclusive, auto_delete, arguments, self._connection
+                )
+            return SimpleNamespace(
+                method=Queue.DeclareOk(
+                    queue=target.name,
+                    message_count=len(target.messages),
+                    consumer_count=len(target.consumers),
+                )
+            )
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        self._broker.round_trip()
+        with self._locked():
+            self._broker.bind(
+                queue, exchange, queue if routing_key is None else routing_key
+            )
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False):
+        self._broker.round_trip()
+        with self._locked():
+            if global_qos:
+                self._channel_prefetch = prefetch_count
+            else:
+                # Vale para os consumidores criados depois, como no RabbitMQ.
+                self._consumer_prefetch = prefetch_count
+            self._broker.cond.notify_all()
+
+    # Publicação
+
+    def basic_publish(
+        self, exchange, routing_key, body, properties=None, mandatory=False
+    ):
+        if isinstance(body, str):
+            body = body.encode()
+        message = (exchange, routing_key, body, properties or _DEFAULT_PROPERTIES)
+        with self._locked():
+            self._broker.exchange_type(exchange)
+            if self._tx is not None:
+                self._tx.append(message)
+                return
+            self._maybe_fail()
+            self._broker.publish(*message)
+
+    def tx_select(self):
+        self._broker.round_trip()
+        with self._locked():
+            if self._tx is None:
+                self._tx = []
+
+    def tx_commit(self):
+        self._broker.round_trip()
+        with self._locked():
+            if self._tx is None:
+                raise ChannelClosedByBroker(
+                    406, "PRECONDITION_FAILED - channel is not transactional"
+                )
+            pending, self._tx = self._tx, []
+            self._maybe_fail()
+            for message in pending:
+                self._broker.publish(*message)
+
+    def tx_rollback(self):
+        self._broker.round_trip()
+        with self._locked():
+            if self._tx is not None:
+                self._tx = []
+
+    # Consumo
+
+    def basic_consume(
+        self,
+        queue,
+        on_message_callback,
+        auto_ack=False,
+        exclusive=False,
+        consumer_tag=None,
+        arguments=None,
+    ) -> str:
+        self._broker.round_trip()
+        with self._locked():
+            target = self._broker.queue(queue)
+            if exclusive and target.consumers:
+                raise ChannelClosedByBroker(
+                    403, f"ACCESS_REFUSED - queue '{queue}' in exclusive use"
+                )
+            tag = (
+                consumer_tag or f"ctag{self.channel_number}.{next(self._consumer_tags)}"
+            )
+            consumer = _Consumer(
+                tag,
+                self,
+                target,
+                on_message_callback,
+                auto_ack,
+                self._consumer_prefetch,
+            )
+            target.consumers.append(consumer)
+            self._consumers[tag] = consumer
+            self._broker.cond.notify_all()
+            return tag
+
+    def basic_cancel(self, consumer_tag):
+        self._broker.round_trip()
+        with self._locked():
+            self._cancel(consumer_tag)
+
+    def _cancel(self, consumer_tag):
+        consumer = self._consumers.pop(consumer_tag, None)
+        if consumer is None:
+            return
+        queue = consumer.queue
+        queue.consumers.remove(consumer)
+        if queue.auto_delete and not queue.consumers:
+            self._broker.delete_queue(queue)
+
+    def consume(
+        self,
+        queue,
+        auto_ack=False,
+        exclusive=False,
+        arguments=None,
+        inactivity_timeout=None,
+    ):
+        """Gerador de ``(method, properties, body)``; ``(None, None, None)`` no timeout."""
+        received: deque = deque()
+        tag = self.basic_consume(
+            queue,
+            lambda _ch, method, properties, body: received.append(
+                (method, properties, body)
+            ),
+            auto_ack=auto_ack,
+            exclusive=exclusive,
+            arguments=arguments,
+        )
+        try:
+            while True:
+                if not received:
+                    self._connection.process_data_events(time_limit=inactivity_timeout)
+                if received:
+                    yield received.popleft()
+                elif inactivity_timeout is not None:
+                    yield None, None, None
+        finally:
+            if self.is_open:
+                self.basic_cancel(tag)
+
+    def basic_get(self, queue, auto_ack=False):
+        """Tira uma mensagem da fila: ``(method, properties, body)`` ou ``None``s."""
+        self._broker.round_trip()
+        with self._locked():
+            self._broker.expire()
+            target = self._broker.queue(queue)
+            if not target.messages:
+                return None, None, None
+            message = target.messages.popleft()
+            tag = next(self._delivery_tags)
+            target.stats["delivered"] += 1
+            if auto_ack:
+                target.stats["acked"] += 1
+            else:
+                # Consumidor avulso só para o ack/nack achar a fila.
+                getter = _Consumer(None, self, target, None, False, 0)
+                getter.unacked = 1
+                self._unacked[tag] = (getter, message)
+                target.unacked += 1
+            method = Basic.GetOk(
+                delivery_tag=tag,
+                redelivered=message.redelivered,
+                exchange=message.exchange,
+                routing_key=message.routing_key,
+                message_count=len(target.messages),
+            )
+            return method, message.properties, message.body
+
+    def _room(self, consumer: _Consumer) -> int:
+        if consumer.auto_ack:
+            return _UNLIMITED_BATCH
+        room = _UNLIMITED_BATCH
+        if self._channel_prefetch:
+            room = min(room, self._channel_prefetch - len(self._unacked))
+        if consumer.prefetch:
+            room = min(room, consumer.prefetch - consumer.unacked)
+        return room
+
+    def collect(self, deliveries: list):
+        """Tira das filas o que os consumidores do canal podem receber agora."""
+        if not self.is_open:
+            return
+        now = time.perf_counter()
+        for consumer in list(self._consumers.values()):
+            queue = consumer.queue
+            if queue.single_active and queue.consumers[0] is not consumer:
+                continue
+            for _ in range(min(self._room(consumer), len(queue.messages))):
+                message = queue.messages.popleft()
+                tag = next(self._delivery_tags)
+                queue.stats["delivered"] += 1
+                queue.wait_ms.append((now - message.enqueued_at) * 1000)
+                if consumer.auto_ack:
+                    queue.stats["acked"] += 1
+                else:
+                    self._unacked[tag] = (consumer, message)
+                    consumer.unacked += 1
+                    queue.unacked += 1
+                method = Basic.Deliver(
+                    consumer_tag=consumer.tag,
+                    delivery_tag=tag,
+                    redelivered=message.redelivered,
+                    exchange=message.exchange,
+                    routing_key=message.routing_key,
+                )
+                deliveries.append((consumer, method, message))
+
+    def _settle(self, delivery_tag: int, multiple: bool) -> list:
+        if multiple:
+            tags = [
+                tag for tag in self._unacked if not delivery_tag or tag <= delivery_tag
+            ]
+        elif delivery_tag in self._unacked:
+            tags = [delivery_tag]
+        else:
+            raise ChannelClosedByBroker(
+                406, f"PRECONDITION_FAILED - unknown delivery tag {delivery_tag}"
+            )
+        settled = []
+        for tag in tags:
+            consumer, message = self._unacked.pop(tag)
+            consumer.unacked -= 1
+            consumer.queue.unacked -= 1
+            settled.append((consumer.queue, message))
+        self._broker.cond.notify_all()
+        return settled
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        with self._locked():
+            for queue, message in self._settle(delivery_tag, multiple):
+                if self._broker.roll(self._broker.redelivery_rate):
+                    self._broker.requeue(queue, message)  # ack perdido
+                else:
+                    queue.stats["acked"] += 1
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        with self._locked():
+            for queue, message in self._settle(delivery_tag, multiple):
+                if requeue:
+                    self._broker.requeue(queue, message)
+                else:
+                    queue.stats["rejected"] += 1
+                    self._broker.dead_letter(queue, message, "rejected")
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self.basic_nack(delivery_tag=delivery_tag, multiple=False, requeue=requeue)
+
+    def close(self):
+        self._broker.round_trip()
+        with self._locked():
+            self.close_locked()
+
+    def close_locked(self):
+        """Cancela os consumidores e devolve as entregas sem ack às filas."""
+        if not self._open:
+            return
+        self._open = False
+        for tag in list(self._consumers):
+            self._cancel(tag)
+        for queue, message in reversed(
+            [(consumer.queue, message) for consumer, message in self._unacked.values()]
+        ):
+            queue.unacked -= 1
+            self._broker.requeue(queue, message)
+        self._unacked.clear()
+        self._tx = None
+        self._broker.cond.notify_all()
@@ -1,12 +1,165 @@
+import atexit
 import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Iterable, Optional, Tuple
+
 import pika
+from pika.exceptions import AMQPChannelError, AMQPConnectionError
 from app.core.config import settings
 
 
 EXCHANGE_NAME = "stock_events"
 
+# Codecs de mensagem, escolhidos pelo produtor (RABBITMQ_CODEC) e anunciados
+# em content_type/content_encoding. O consumidor decodifica pelo que veio na
+# mensagem (sem content_type = JSON), então workers novos leem tudo: na
+# migração, atualize os consumidores antes de trocar o codec dos produtores.
+JSON = "application/json"
+PACKED = "application/x-estoque-packed"
+ZLIB = "zlib"
+CODECS = {"json": JSON, "packed": PACKED}
+# Modo fused: o corpo é o próprio payload, entregue em memória.
+LOCAL = "application/x-in-process"
+
+# Packed: cabeçalho JSON com os campos comuns + listas de pares de inteiros
+# (ex.: items, deltas) como int32 little-endian.
+_PACKED_VERSION = 1
+_PACKED_HEADER = struct.Struct("<BI")
+_COUNT = struct.Struct("<I")
+_INT32 = (-(2**31), 2**31 - 1)
+
+
+def _pair_fields(value) -> Optional[tuple]:
+    """Nomes dos campos se ``value`` é uma lista de dicts ``{a: int, b: int}``."""
+    if not isinstance(value, list) or not value or not isinstance(value[0], dict):
+        return None
+    fields = tuple(value[0])
+    if len(fields) != 2:
+        return None
+    low, high = _INT32
+    for entry in value:
+        if not isinstance(entry, dict) or tuple(entry) != fields:
+            return None
+        for number in entry.values():
+            if type(number) is not int or not low <= number <= high:
+                return None
+    return fields
+
+
+def _encode_packed(payload: dict) -> bytes:
+    header = {"d": {}, "p": {}}
+    arrays = []
+    for key, value in payload.items():
+        fields = _pair_fields(value)
+        if fields is None:
+            header["d"][key] = value
+            continue
+        a, b = fields
+        header["p"][key] = fields
+        flat = [number for entry in value for number in (entry[a], entry[b])]
+        arrays.append(_COUNT.pack(len(value)))
+        arrays.append(struct.pack(f"<{len(flat)}i", *flat))
+    encoded = json.dumps(header, separators=(",", ":")).encode()
+    return b"".join(
+        [_PACKED_HEADER.pack(_PACKED_VERSION, len(encoded)), encoded, *arrays]
+    )
+
+
+def _decode_packed(body: bytes) -> dict:
+    version, size = _PACKED_HEADER.unpack_from(body)
+    if version != _PACKED_VERSION:
+        raise ValueError(f"versão de packed desconhecida: {version}")
+    offset = _PACKED_HEADER.size
+    header = json.loads(body[offset : offset + size])
+    offset += size
+    payload = header["d"]
+    for key, (a, b) in header["p"].items():
+        (count,) = _COUNT.unpack_from(body, offset)
+        offset += _COUNT.size
+        flat = struct.unpack_from(f"<{2 * count}i", body, offset)
+        offset += 8 * count
+        pairs = iter(flat)
+        payload[key] = [{a: first, b: second} for first, second in zip(pairs, pairs)]
+    return payload
+
+
+def encode(payload: dict, codec: str = None) -> tuple:
+    """Serializa o payload; retorna ``(body, content_type, content_encoding)``.
+
+    Corpos a partir de ``rabbitmq_compress_min_bytes`` (0 desliga) vão
+    comprimidos com zlib.
+    """
+    content_type = CODECS[codec or settings.rabbitmq_codec]
+    if content_type == PACKED:
+        body = _encode_packed(payload)
+    else:
+        body = json.dumps(payload, separators=(",", ":")).encode()
+    threshold = settings.rabbitmq_compress_min_bytes
+    if threshold and len(body) >= threshold:
+        return zlib.compress(body, 1), content_type, ZLIB
+    return body, content_type, None
+
+
+class InvalidMessage(ValueError):
+    """Corpo que nenhuma tentativa vai conseguir ler."""
+
+
+def decode(body: bytes, properties=None) -> dict:
+    """Lê uma mensagem pelo ``content_type``/``content_encoding`` recebidos.
+
+    Qualquer corpo inválido vira ``InvalidMessage`` (um ``ValueError``).
+    """
+    content_type = getattr(properties, "content_type", None) or JSON
+    if content_type == LOCAL:
+        return body
+    content_encoding = getattr(properties, "content_encoding", None)
+    try:
+        if content_encoding == ZLIB:
+            body = zlib.decompress(body)
+        elif content_encoding:
+            raise InvalidMessage(f"content_encoding não suportado: {content_encoding}")
+        if content_type == PACKED:
+            return _decode_packed(body)
+        if content_type != JSON:
+            raise InvalidMessage(f"content_type não suportado: {content_type}")
+        return json.loads(body)
+    except InvalidMessage:
+        raise
+    except (zlib.error, struct.error, KeyError, TypeError, ValueError) as exc:
+        raise InvalidMessage(f"mensagem inválida ({content_type}): {exc!r}") from exc
+
+
+_PROPERTIES = {
+    (content_type, content_encoding): pika.BasicProperties(
+        content_type=content_type,
+        content_encoding=content_encoding,
+        delivery_mode=2,
+    )
+    for content_type in CODECS.values()
+    for content_encoding in (None, ZLIB)
+}
+
+
+# Substituto do RabbitMQ (ex.: ``MemoryBroker.connect``) em testes e benchmarks.
+_connection_factory = None
+
+
+def use_connection_factory(factory):
+    """Faz ``get_connection`` usar ``factory()`` (None volta ao RabbitMQ)."""
+    global _connection_factory  # pylint: disable=global-statement
+    _connection_factory = factory
+    # Conexões do pool apontam para o broker anterior.
+    close_publisher()
+
 
 def get_connection():
+    if _connection_factory is not None:
+        return _connection_factory()
     parameters = pika.ConnectionParameters(
         host=settings.rabbitmq_host,
         port=settings.rabbitmq_port,
@@ -19,16 +172,240 @@ def get_connection():
     return pika.BlockingConnection(parameters)
 
 
-def publish_event(routing_key: str, payload: dict):
-    connection = get_connection()
-    channel = connection.channel()
+def declare_topology(channel):
+    """Declara o exchange principal (idempotente)."""
     channel.exchange_declare(
         exchange=EXCHANGE_NAME, exchange_type="topic", durable=True
     )
-    channel.basic_publish(
-        exchange=EXCHANGE_NAME,
-        routing_key=routing_key,
-        body=json.dumps(payload),
-        properties=pika.BasicProperties(delivery_mode=2),
-    )
-    connection.close()
+
+
+def topic_matches(pattern: str, routing_key: str) -> bool:
+    """Casa ``routing_key`` com um binding de exchange topic do AMQP."""
+    return _match(pattern.split("."), routing_key.split("."))
+
+
+def _match(pattern: list[str], words: list[str]) -> bool:
+    # "*" casa uma palavra, "#" casa zero ou mais.
+    if not pattern:
+        return not words
+    head, rest = pattern[0], pattern[1:]
+    if head == "#":
+        return any(_match(rest, words[skip:]) for skip in range(len(words) + 1))
+    if not words:
+        return False
+    return (head == "*" or head == words[0]) and _match(rest, words[1:])
+
+
+class _PooledChannel:
+    __slots__ = ("connection", "channel")
+
+    def __init__(self, connection, channel):
+        self.connection = connection
+        self.channel = channel
+
+    def is_healthy(self) -> bool:
+        if not (self.connection.is_open and self.channel.is_open):
+            return False
+        try:
+            # Processa heartbeats pendentes e detecta conexões derrubadas
+            # enquanto estavam paradas no pool.
+            self.connection.process_data_events(time_limit=0)
+        except (AMQPConnectionError, AMQPChannelError):
+            return False
+        return True
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+
+class Publisher:
+    """Pool de conexões/canais de publicação, seguro para uso entre threads.
+
+    Cada canal fica em modo transacional (``tx_select``): o ``tx_commit`` só
+    retorna depois que o broker aceitou todas as mensagens do lote, o que dá
+    confirmação em lote com um único round trip. O ``BlockingChannel`` do pika
+    só oferece confirmação síncrona mensagem a mensagem no ``confirm_delivery``.
+    """
+
+    def __init__(self, pool_size=None, batch_size=None, retries=None):
+        self._size = pool_size or settings.rabbitmq_pool_size
+        self._batch_size = batch_size or settings.rabbitmq_confirm_batch_size
+        self._retries = (
+            settings.rabbitmq_publish_retries if retries is None else retries
+        )
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # Separado de _lock: a declaração espera o broker.
+        self._topology_lock = threading.Lock()
+        self._topology_declared = False
+        self._pid = os.getpid()
+
+    def _open(self) -> _PooledChannel:
+        connection = get_connection()
+        try:
+            channel = connection.channel()
+            if not self._topology_declared:
+                # Outras threads esperam a declaração terminar; se ela falhar,
+                # o próximo canal aberto tenta de novo.
+                with self._topology_lock:
+                    if not self._topology_declared:
+                        declare_topology(channel)
+                        self._topology_declared = True
+            channel.tx_select()
+        except Exception:
+            try:
+                connection.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+            raise
+        return _PooledChannel(connection, channel)
+
+    def _acquire(self) -> _PooledChannel:
+        while True:
+            try:
+                pooled = self._pool.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self._size
+                    if can_create:
+                        self._created += 1
+                if not can_create:
+                    # Timeout curto para reavaliar a capacidade caso outra
+                    # thread descarte uma conexão quebrada.
+                    try:
+                        pooled = self._pool.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                else:
+                    try:
+                        return self._open()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+
+            if pooled.is_healthy():
+                return pooled
+            self._discard(pooled)
+
+    def _release(self, pooled: _PooledChannel):
+        self._pool.put(pooled)
+
+    def _discard(self, pooled: _PooledChannel):
+        pooled.close()
+        with self._lock:
+            self._created -= 1
+
+    def _publish_batch(self, batch: list):
+        for attempt in range(self._retries + 1):
+            pooled = None
+            try:
+                pooled = self._acquire()
+                for exchange, routing_key, body, properties in batch:
+                    pooled.channel.basic_publish(
+                        exchange=exchange,
+                        routing_key=routing_key,
+                        body=body,
+                        properties=properties,
+                    )
+                pooled.channel.tx_commit()
+            except (AMQPConnectionError, AMQPChannelError) as exc:
+                # Mensagens fora de um commit são descartadas pelo broker
+                # quando o canal cai, então o lote inteiro é republicado.
+                if pooled is not None:
+                    self._discard(pooled)
+                if attempt == self._retries:
+                    raise
+                print(f"[rabbitmq] falha ao publicar ({exc!r}), reconectando...")
+                time.sleep(min(0.05 * 2**attempt, 1.0))
+                continue
+            except Exception:
+                if pooled is not None:
+                    self._discard(pooled)
+                raise
+            self._release(pooled)
+            return
+
+    def publish(self, routing_key: str, payload: dict):
+        self.publish_many([(routing_key, payload)])
+
+    def publish_many(self, events: Iterable[Tuple[str, dict]]) -> int:
+        """Publica vários eventos, com um commit a cada ``batch_size``."""
+        published = 0
+        batch = []
+        for routing_key, payload in events:
+            body, content_type, content_encoding = encode(payload)
+            properties = _PROPERTIES[content_type, content_encoding]
+            batch.append((EXCHANGE_NAME, routing_key, body, properties))
+            if len(batch) >= self._batch_size:
+                self._publish_batch(batch)
+                published += len(batch)
+                batch = []
+        if batch:
+            self._publish_batch(batch)
+            published += len(batch)
+        return published
+
+    def publish_raw(self, exchange: str, routing_key: str, body: bytes, properties):
+        """Publica um corpo já serializado (ex.: republicação para retry)."""
+        self._publish_batch([(exchange, routing_key, body, properties)])
+
+    def close(self):
+        while True:
+            try:
+                pooled = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+# Pipeline em processo (MESSAGING_MODE=fused) que recebe as publicações.
+_local_bus = None
+
+
+def use_local_bus(bus):
+    """Desvia ``publish_event``/``publish_many`` para ``bus`` (None = broker)."""
+    global _local_bus  # pylint: disable=global-statement
+    _local_bus = bus
+
+
+def get_publisher() -> Publisher:
+    global _publisher  # pylint: disable=global-statement
+    with _publisher_lock:
+        # Conexões AMQP não podem ser compartilhadas com processos filhos.
+        if _publisher is None or _publisher._pid != os.getpid():
+            _publisher = Publisher()
+        return _publisher
+
+
+def close_publisher():
+    global _publisher  # pylint: disable=global-statement
+    with _publisher_lock:
+        if _publisher is not None and _publisher._pid == os.getpid():
+            _publisher.close()
+        _publisher = None
+
+
+atexit.register(close_publisher)
+
+
+def publish_event(routing_key: str, payload: dict):
+    publish_many([(routing_key, payload)])
+
+
+def publish_many(events: Iterable[Tuple[str, dict]]) -> int:
+    if _local_bus is not None:
+        return _local_bus.publish_many(events)
+    return get_publisher().publish_many(events)
+
+
+def republish(exchange: str, routing_key: str, body: bytes, properties):
+    """Publica no broker um corpo recebido, mantendo codec e cabeçalhos."""
+    get_publisher().publish_raw(exchange, routing_key, body, properties)
@@ -0,0 +1,115 @@
+"""
+Manutenção das partições mensais de ``stock_movements`` (só Postgres).
+
+As partições futuras são criadas pela função do banco
+``stock_movements_ensure_partitions``; movimentos de meses sem partição caem
+na ``stock_movements_default`` e são movidos quando o mês é criado. Meses
+antigos podem ser desanexados e arquivados (em outro schema ou em um
+``.csv.gz``), tirando-os das consultas e da manutenção da tabela ativa.
+
+Antes de desanexar um mês, o saldo e o custo médio de cada produto no fim
+dele viram uma ``abertura`` no mês seguinte, para o razão ativo continuar
+fechando com ``quantity_on_hand``.
+"""
+
+import gzip
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services import ledger_service
+
+_PARTITION = re.compile(r"^stock_movements_y(\d{4})m(\d{2})$")
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Mês de uma partição ``stock_movements_yYYYYmMM`` (None para as demais)."""
+    match = _PARTITION.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def _month_end(month: date) -> datetime:
+    """Primeiro instante (UTC) do mês seguinte a ``month``."""
+    year, index = divmod(month.year * 12 + month.month, 12)
+    return datetime(year, index + 1, 1, tzinfo=timezone.utc)
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def ensure_partitions(db: Session, months_ahead: int) -> None:
+    """Garante as partições do mês atual e dos ``months_ahead`` seguintes."""
+    if not _is_postgres(db):
+        return
+    db.execute(
+        text("SELECT stock_movements_ensure_partitions(:months)"),
+        {"months": months_ahead},
+    )
+    db.commit()
+
+
+def movement_partitions(db: Session) -> list[tuple[str, date]]:
+    """Partições mensais anexadas, da mais antiga para a mais nova."""
+    if not _is_postgres(db):
+        return []
+    names = db.scalars(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'stock_movements'::regclass"
+        )
+    )
+    months = [(name, partition_month(name)) for name in names]
+    return sorted((name, month) for name, month in months if month is not None)
+
+
+def _dump(db: Session, name: str, dump_dir: str) -> str:
+    path = os.path.join(dump_dir, f"{name}.csv.gz")
+    cursor = db.connection().connection.cursor()
+    try:
+        with gzip.open(path, "wb") as target:
+            cursor.copy_expert(
+                f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER)', target
+            )
+    finally:
+        cursor.close()
+    return path
+
+
+def archive_partitions(
+    db: Session, before: date, schema: str = "archive", dump_dir: str = None
+) -> list[str]:
+    """Desanexa as partições de meses anteriores a ``before``.
+
+    Sem ``dump_dir`` a partição vai para o schema ``schema``; com ``dump_dir``
+    ela é exportada para ``<dump_dir>/<partição>.csv.gz`` e removida. Cada
+    partição é tratada e confirmada separadamente, junto com a abertura que
+    leva o saldo dela para o mês seguinte; se algum produto não tem saldo
+    inicial na partição, nada dela é arquivado.
+    """
+    archived = []
+    for name, month in movement_partitions(db):
+        if month >= before:
+            break
+        try:
+            ledger_service.carry_forward(db, name, _month_end(month))
+            db.execute(text(f'ALTER TABLE stock_movements DETACH PARTITION "{name}"'))
+            if dump_dir:
+                _dump(db, name, dump_dir)
+                db.execute(text(f'DROP TABLE "{name}"'))
+            else:
+                db.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema}"'))
+                db.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{schema}"'))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        print(f"[partitions] {name} arquivada")
+        archived.append(name)
+    return archived
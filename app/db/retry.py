@@ -0,0 +1,44 @@
+import random
+import time
+from typing import Callable, TypeVar
+
+from sqlalchemy.exc import DBAPIError
+from app.core.config import settings
+
+
+T = TypeVar("T")
+
+# deadlock_detected, serialization_failure
+RETRYABLE_SQLSTATES = {"40P01", "40001"}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Indica se o erro do banco some ao repetir a transação."""
+    if not isinstance(exc, DBAPIError):
+        return False
+    sqlstate = getattr(exc.orig, "pgcode", None) or getattr(exc.orig, "sqlstate", None)
+    return sqlstate in RETRYABLE_SQLSTATES
+
+
+def run_with_retry(fn: Callable[[], T], attempts: int = None) -> T:
+    """Executa a transação ``fn`` repetindo em deadlock/serialização.
+
+    Usa backoff exponencial com jitter completo para que as transações que
+    colidiram não tentem de novo ao mesmo tempo.
+    """
+    attempts = attempts or settings.db_retry_attempts
+    base_delay = settings.db_retry_base_delay_ms / 1000
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except DBAPIError as exc:
+            attempt += 1
+            if not is_retryable(exc) or attempt >= attempts:
+                raise
+            delay = random.uniform(0, base_delay * 2**attempt)
+            print(
+                f"[db] conflito de transação ({exc.orig.__class__.__name__}), "
+                f"nova tentativa em {delay * 1000:.0f}ms"
+            )
+            time.sleep(delay)
@@ -1,4 +1,7 @@
+from typing import Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
@@ -7,11 +10,31 @@ DATABASE_URL = (
     f"postgresql://{settings.postgres_user}:{settings.postgres_password}@"
     f"{settings.postgres_host}:{settings.postgres_port}/{settings.postgres_db}"
 )
+ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
 
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Usado pelas rotas com API_MODE=async e pelo despacho imediato do outbox.
+# Criado no primeiro uso: no modo sync nem o asyncpg nem o pool são carregados.
+_async_sessionmaker: Optional[async_sessionmaker] = None
+
+
+def async_session() -> AsyncSession:
+    global _async_sessionmaker  # pylint: disable=global-statement
+    if _async_sessionmaker is None:
+        async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            pool_pre_ping=True,
+            pool_size=settings.db_async_pool_size,
+            max_overflow=settings.db_async_max_overflow,
+        )
+        _async_sessionmaker = async_sessionmaker(
+            async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_sessionmaker()
+
 
 def get_db():
     db = SessionLocal()
@@ -19,3 +42,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with async_session() as db:
+        yield db
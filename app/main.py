@@ -1,7 +1,27 @@
 from fastapi import FastAPI
-from app.api.routes import orders, products
+from app.api.routes import orders, products, stock
+from app.core.async_rabbitmq import close_async_publisher
+from app.core.config import settings
+from app.services import availability_service
 
 
 app = FastAPI(title="Sistema de Estoque Assíncrono")
-app.include_router(orders.router)
-app.include_router(products.router)
+if settings.api_mode == "async":
+    app.include_router(orders.async_router)
+    app.include_router(products.async_router)
+    app.include_router(stock.async_router)
+else:
+    app.include_router(orders.router)
+    app.include_router(products.router)
+    app.include_router(stock.router)
+
+
+@app.on_event("startup")
+def start_availability_listener():
+    availability_service.start_listener()
+
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    availability_service.stop_listener()
+    await close_async_publisher()
@@ -1,6 +1,28 @@
 # Import all models here so they are registered with Base.metadata
 from app.models.product import Product
 from app.models.order import Order
+from app.models.order_item import OrderItem
 from app.models.stock_movement import StockMovement
+from app.models.outbox import OutboxEvent
+from app.models.stock_reservation_part import StockReservationPart
+from app.models.stock_lease import StockLease
+from app.models.stock_snapshot import StockSnapshot
+from app.models.stock_snapshot_run import StockSnapshotRun
+from app.models.stock_reconciliation_run import StockReconciliationRun
+from app.models.stock_reconciliation_state import StockReconciliationState
+from app.models.stock_discrepancy import StockDiscrepancy
 
-__all__ = ["Product", "Order", "StockMovement"]
+__all__ = [
+    "Product",
+    "Order",
+    "OrderItem",
+    "StockMovement",
+    "OutboxEvent",
+    "StockReservationPart",
+    "StockLease",
+    "StockSnapshot",
+    "StockSnapshotRun",
+    "StockReconciliationRun",
+    "StockReconciliationState",
+    "StockDiscrepancy",
+]
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer
+from app.db.base import Base
+
+
+class OrderItem(Base):
+    """Linha de um pedido, na ordem em que veio na requisição.
+
+    A chave primária ``(order_id, line)`` atende "itens do pedido Y" e o
+    índice ``(product_id, order_id)`` atende "pedidos com o produto X".
+    """
+
+    __tablename__ = "order_items"
+    __table_args__ = (
+        # INCLUDE deixa a busca por produto só no índice (Postgres).
+        Index(
+            "ix_order_items_product_order",
+            "product_id",
+            "order_id",
+            postgresql_include=["quantity"],
+        ),
+    )
+
+    order_id = Column(Integer, ForeignKey("orders.order_id"), primary_key=True)
+    line = Column(Integer, primary_key=True)
+    # Sem FK: pedidos com produto inexistente são aceitos e recusados pelo worker.
+    product_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False)
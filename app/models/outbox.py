@@ -0,0 +1,14 @@
+from datetime import datetime
+from sqlalchemy import JSON, Column, DateTime, Integer, String
+from app.db.base import Base
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox"
+
+    event_id = Column(Integer, primary_key=True, index=True)
+    routing_key = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+    )
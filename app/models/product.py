@@ -7,5 +7,9 @@ class Product(Base):
 
     product_id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
+    # Código do fornecedor; chave do upsert na importação em massa.
+    sku = Column(String, unique=True, nullable=True)
     quantity_on_hand = Column(Integer, default=0, nullable=False)
     average_cost = Column(Float, default=0.0, nullable=False)
+    # Incrementado a cada alteração da linha; vira o ETag de GET /products/{id}.
+    version = Column(Integer, default=1, nullable=False)
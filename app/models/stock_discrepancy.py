@@ -0,0 +1,30 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, ForeignKey, Integer
+from app.db.base import Base
+
+
+class StockDiscrepancy(Base):
+    """Produto cujo saldo não bate com o razão de movimentações.
+
+    ``difference = quantity_on_hand - (ledger_quantity - leased_quantity)``.
+    """
+
+    __tablename__ = "stock_discrepancies"
+
+    discrepancy_id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(
+        Integer,
+        ForeignKey("stock_reconciliation_runs.run_id"),
+        nullable=False,
+        index=True,
+    )
+    product_id = Column(
+        Integer, ForeignKey("products.product_id"), nullable=False, index=True
+    )
+    quantity_on_hand = Column(Integer, nullable=False)
+    ledger_quantity = Column(Integer, nullable=False)
+    leased_quantity = Column(Integer, nullable=False)
+    difference = Column(Integer, nullable=False)
+    detected_at = Column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+    )
@@ -0,0 +1,27 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from app.db.base import Base
+
+
+class StockLease(Base):
+    """Bloco de unidades de um produto reservado para um stock_worker.
+
+    O saldo da lease é ``granted - returned`` menos as saídas gravadas com
+    o seu ``lease_id``; enquanto ela está ativa essas unidades não aparecem
+    em ``Product.quantity_on_hand``.
+    """
+
+    __tablename__ = "stock_leases"
+
+    lease_id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.product_id"), nullable=False)
+    holder = Column(String, nullable=False)
+    granted = Column(Integer, default=0, nullable=False)
+    returned = Column(Integer, default=0, nullable=False)
+    status = Column(String, default="active", nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+    )
+    renewed_at = Column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+    )
@@ -1,15 +1,33 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
 from app.db.base import Base
 
 
 class StockMovement(Base):
+    """Movimentação de estoque (append-only).
+
+    No Postgres a tabela é particionada por mês em ``created_at`` (ver a
+    migração ``7c1e9b3d5a60``) e a chave primária real é
+    ``(movement_id, created_at)``. Tipos: ``entrada``, ``saida``, ``estorno``
+    e ``abertura`` (saldo inicial de produtos antigos ou de meses arquivados).
+    """
+
     __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index("ix_stock_movements_product_created", "product_id", "created_at"),
+        Index("ix_stock_movements_created_brin", "created_at", postgresql_using="brin"),
+    )
 
-    movement_id = Column(Integer, primary_key=True, index=True)
+    movement_id = Column(Integer, primary_key=True)
     product_id = Column(Integer, ForeignKey("products.product_id"), nullable=False)
     quantity = Column(Integer, nullable=False)
     movement_type = Column(String, nullable=False)
+    # Saídas atendidas pela cota local de um stock_worker (modo escrow).
+    lease_id = Column(
+        Integer, ForeignKey("stock_leases.lease_id"), nullable=True, index=True
+    )
+    # Custo unitário das entradas; as saídas saem pelo custo médio corrente.
+    unit_cost = Column(Float, nullable=True)
     created_at = Column(
         DateTime(timezone=True), default=datetime.utcnow, nullable=False
     )
@@ -0,0 +1,24 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, String
+from app.db.base import Base
+
+
+class StockReconciliationRun(Base):
+    """Rodada de conciliação entre ``quantity_on_hand`` e as movimentações.
+
+    ``movement_watermark`` é o maior ``movement_id`` coberto pela rodada; a
+    próxima só olha produtos com movimentações acima dele.
+    """
+
+    __tablename__ = "stock_reconciliation_runs"
+
+    run_id = Column(Integer, primary_key=True, index=True)
+    since_movement_id = Column(Integer, nullable=True)
+    movement_watermark = Column(Integer, nullable=True)
+    status = Column(String, default="running", nullable=False)
+    products_checked = Column(Integer, default=0, nullable=False)
+    discrepancies = Column(Integer, default=0, nullable=False)
+    started_at = Column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+    )
+    finished_at = Column(DateTime(timezone=True), nullable=True)
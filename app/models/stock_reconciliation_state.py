@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer
+from app.db.base import Base
+
+
+class StockReconciliationState(Base):
+    """Última conciliação de cada produto (marca d'água por produto)."""
+
+    __tablename__ = "stock_reconciliation_state"
+
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    last_movement_id = Column(Integer, nullable=True)
+    balanced = Column(Boolean, default=True, nullable=False)
+    difference = Column(Integer, default=0, nullable=False)
+    checked_at = Column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+    )
@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String
+from app.db.base import Base
+
+
+class StockReservationPart(Base):
+    """Resultado de cada shard em um pedido dividido entre filas de estoque."""
+
+    __tablename__ = "stock_reservation_parts"
+
+    order_id = Column(Integer, ForeignKey("orders.order_id"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False)
+    items = Column(JSON, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+    )
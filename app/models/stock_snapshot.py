@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer
+from app.db.base import Base
+
+
+class StockSnapshot(Base):
+    """Saldo de um produto somando todas as movimentações até ``snapshot_at``.
+
+    Só produtos com movimentações desde o snapshot anterior ganham uma linha
+    nova a cada rodada; o saldo vigente é o da linha mais recente.
+    """
+
+    __tablename__ = "stock_snapshots"
+
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    snapshot_at = Column(DateTime(timezone=True), primary_key=True)
+    quantity = Column(Integer, nullable=False)
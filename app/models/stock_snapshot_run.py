@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer
+from app.db.base import Base
+
+
+class StockSnapshotRun(Base):
+    """Marca d'água de cada rodada de snapshots de saldo."""
+
+    __tablename__ = "stock_snapshot_runs"
+
+    watermark = Column(DateTime(timezone=True), primary_key=True)
+    products = Column(Integer, default=0, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+    )
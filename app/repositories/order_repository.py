@@ -1,5 +1,49 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.order import Order
+from app.models.order_item import OrderItem
+
+
+def add_order(db: Session, status: str = "pending") -> Order:
+    """Adicionar um pedido à transação corrente, sem commit."""
+    order = Order(status=status)
+    db.add(order)
+    db.flush()
+    return order
+
+
+async def add_order_async(db: AsyncSession, status: str = "pending") -> Order:
+    """Versão assíncrona de ``add_order``."""
+    order = Order(status=status)
+    db.add(order)
+    await db.flush()
+    return order
+
+
+def _orders_insert(count: int, status: str):
+    table = Order.__table__
+    created_at = datetime.utcnow()
+    return (
+        insert(table).returning(table.c.order_id, sort_by_parameter_order=True),
+        [{"status": status, "created_at": created_at}] * count,
+    )
+
+
+def add_orders(db: Session, count: int, status: str = "pending") -> list[int]:
+    """Insere ``count`` pedidos em um INSERT multi-linha e retorna os ids."""
+    return db.scalars(*_orders_insert(count, status)).all()
+
+
+async def add_orders_async(
+    db: AsyncSession, count: int, status: str = "pending"
+) -> list[int]:
+    """Versão assíncrona de ``add_orders``."""
+    result = await db.scalars(*_orders_insert(count, status))
+    return result.all()
 
 
 def create_order(db: Session, status: str = "pending") -> Order:
@@ -13,3 +57,91 @@ def create_order(db: Session, status: str = "pending") -> Order:
     except Exception:
         db.rollback()
         raise
+
+
+def item_rows(order_id: int, items: list[dict]) -> list[dict]:
+    """Linhas de ``order_items`` de um pedido, numeradas na ordem recebida."""
+    return [
+        {
+            "order_id": order_id,
+            "line": line,
+            "product_id": item["product_id"],
+            "quantity": item["quantity"],
+        }
+        for line, item in enumerate(items, start=1)
+    ]
+
+
+def add_items(db: Session, rows: list[dict]):
+    """Grava os itens em um INSERT multi-linha, sem commit."""
+    if rows:
+        db.execute(insert(OrderItem.__table__), rows)
+
+
+async def add_items_async(db: AsyncSession, rows: list[dict]):
+    """Versão assíncrona de ``add_items``."""
+    if rows:
+        await db.execute(insert(OrderItem.__table__), rows)
+
+
+def orders_with_product_query(
+    product_id: int, after: Optional[int] = None, limit: Optional[int] = None
+):
+    """Pedidos que contêm o produto, em ordem de order_id (keyset em ``after``).
+
+    A página é montada só sobre ``(product_id, order_id)`` e depois juntada a
+    ``orders``, então o custo não depende de quantos pedidos o produto tem.
+    """
+    items = OrderItem.__table__
+    orders = Order.__table__
+    page = (
+        select(items.c.order_id, func.sum(items.c.quantity).label("quantity"))
+        .where(items.c.product_id == product_id)
+        .group_by(items.c.order_id)
+        .order_by(items.c.order_id)
+    )
+    if after is not None:
+        page = page.where(items.c.order_id > after)
+    if limit is not None:
+        page = page.limit(limit)
+    page = page.subquery()
+    return (
+        select(
+            orders.c.order_id,
+            orders.c.status,
+            orders.c.created_at,
+            page.c.quantity,
+        )
+        .join(page, page.c.order_id == orders.c.order_id)
+        .order_by(orders.c.order_id)
+    )
+
+
+def order_items_query(order_id: int):
+    items = OrderItem.__table__
+    return (
+        select(items.c.product_id, items.c.quantity)
+        .where(items.c.order_id == order_id)
+        .order_by(items.c.line)
+    )
+
+
+def list_orders_with_product(db: Session, product_id: int, **page) -> list[dict]:
+    result = db.execute(orders_with_product_query(product_id, **page))
+    return [dict(row) for row in result.mappings()]
+
+
+def list_order_items(db: Session, order_id: int) -> list[dict]:
+    return [dict(row) for row in db.execute(order_items_query(order_id)).mappings()]
+
+
+async def list_orders_with_product_async(
+    db: AsyncSession, product_id: int, **page
+) -> list[dict]:
+    result = await db.execute(orders_with_product_query(product_id, **page))
+    return [dict(row) for row in result.mappings()]
+
+
+async def list_order_items_async(db: AsyncSession, order_id: int) -> list[dict]:
+    result = await db.execute(order_items_query(order_id))
+    return [dict(row) for row in result.mappings()]
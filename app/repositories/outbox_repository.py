@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.outbox import OutboxEvent
+
+
+def add_event(db: Session, routing_key: str, payload: dict) -> OutboxEvent:
+    """Registra o evento na transação corrente, sem commit."""
+    event = OutboxEvent(routing_key=routing_key, payload=payload)
+    db.add(event)
+    return event
+
+
+def claim_batch(db: Session, limit: int) -> list:
+    """Trava um lote de eventos pendentes, pulando os já travados por outro relay."""
+    stmt = (
+        select(OutboxEvent.event_id, OutboxEvent.routing_key, OutboxEvent.payload)
+        .order_by(OutboxEvent.event_id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return db.execute(stmt).all()
+
+
+def delete_events(db: Session, event_ids: list[int]):
+    db.execute(delete(OutboxEvent).where(OutboxEvent.event_id.in_(event_ids)))
+
+
+def _events_insert(events: list[tuple]):
+    table = OutboxEvent.__table__
+    created_at = datetime.utcnow()
+    return (
+        insert(table).returning(table.c.event_id, sort_by_parameter_order=True),
+        [
+            {"routing_key": routing_key, "payload": payload, "created_at": created_at}
+            for routing_key, payload in events
+        ],
+    )
+
+
+def add_events(db: Session, events: list[tuple]) -> list[int]:
+    """Insere ``(routing_key, payload)`` em um INSERT multi-linha, sem commit."""
+    return db.scalars(*_events_insert(events)).all()
+
+
+async def add_events_async(db: AsyncSession, events: list[tuple]) -> list[int]:
+    """Versão assíncrona de ``add_events``."""
+    result = await db.scalars(*_events_insert(events))
+    return result.all()
+
+
+async def claim_events_async(db: AsyncSession, event_ids: list[int]) -> list:
+    """Trava os eventos informados que ainda não foram publicados pelo relay."""
+    stmt = (
+        select(OutboxEvent.event_id, OutboxEvent.routing_key, OutboxEvent.payload)
+        .where(OutboxEvent.event_id.in_(event_ids))
+        .order_by(OutboxEvent.event_id)
+        .with_for_update(skip_locked=True)
+    )
+    return (await db.execute(stmt)).all()
+
+
+async def delete_events_async(db: AsyncSession, event_ids: list[int]):
+    await db.execute(delete(OutboxEvent).where(OutboxEvent.event_id.in_(event_ids)))
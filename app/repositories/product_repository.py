@@ -1,18 +1,254 @@
+import csv
+import io
+from typing import NamedTuple, Optional, Sequence
+
+from sqlalchemy import (
+    Column,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    case,
+    literal_column,
+    select,
+    text,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.product import Product
+from app.repositories.stock_lease_repository import held_units
+from app.repositories.stock_movement_repository import MovementRow, insert_movements
+from app.services import product_cache
+
+
+def _opening_entry(product: Product) -> list[MovementRow]:
+    """Saldo inicial vira uma entrada, para o custo médio poder ser refeito
+    só a partir das movimentações."""
+    if not product.quantity_on_hand:
+        return []
+    return [
+        MovementRow(
+            product.product_id,
+            product.quantity_on_hand,
+            "entrada",
+            unit_cost=product.average_cost,
+        )
+    ]
 
 
 def create_product(
-    db: Session, name: str, quantity_on_hand: int = 0, average_cost: float = 0.0
+    db: Session,
+    name: str,
+    quantity_on_hand: int = 0,
+    average_cost: float = 0.0,
+    sku: Optional[str] = None,
 ) -> Product:
     product = Product(
-        name=name, quantity_on_hand=quantity_on_hand, average_cost=average_cost
+        name=name,
+        quantity_on_hand=quantity_on_hand,
+        average_cost=average_cost,
+        sku=sku,
     )
     try:
         db.add(product)
+        db.flush()
+        insert_movements(db, _opening_entry(product))
         db.commit()
         db.refresh(product)
+        product_cache.invalidate(product.product_id)
         return product
     except Exception:
         db.rollback()
         raise
+
+
+async def create_product_async(
+    db: AsyncSession,
+    name: str,
+    quantity_on_hand: int = 0,
+    average_cost: float = 0.0,
+    sku: Optional[str] = None,
+) -> Product:
+    product = Product(
+        name=name,
+        quantity_on_hand=quantity_on_hand,
+        average_cost=average_cost,
+        sku=sku,
+    )
+    try:
+        db.add(product)
+        await db.flush()
+        await db.run_sync(insert_movements, _opening_entry(product))
+        await db.commit()
+        product_cache.invalidate(product.product_id)
+        return product
+    except Exception:
+        await db.rollback()
+        raise
+
+
+PRODUCT_FIELDS = (
+    "product_id",
+    "sku",
+    "name",
+    "quantity_on_hand",
+    "average_cost",
+    "version",
+)
+
+
+def products_query(
+    fields: Sequence[str] = PRODUCT_FIELDS,
+    after: Optional[int] = None,
+    min_quantity: Optional[int] = None,
+    max_quantity: Optional[int] = None,
+    limit: Optional[int] = None,
+):
+    """SELECT em ordem de product_id, a partir do cursor ``after`` (keyset)."""
+    table = Product.__table__
+    stmt = select(*(table.c[field] for field in fields)).order_by(table.c.product_id)
+    if after is not None:
+        stmt = stmt.where(table.c.product_id > after)
+    if min_quantity is not None:
+        stmt = stmt.where(table.c.quantity_on_hand >= min_quantity)
+    if max_quantity is not None:
+        stmt = stmt.where(table.c.quantity_on_hand <= max_quantity)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def list_products(db: Session, **filters) -> list[dict]:
+    return [dict(row) for row in db.execute(products_query(**filters)).mappings()]
+
+
+def iter_product_chunks(db: Session, chunk_size: int, **filters):
+    """Lê as linhas com cursor no servidor, ``chunk_size`` por vez."""
+    result = db.execute(
+        products_query(**filters).execution_options(yield_per=chunk_size)
+    ).mappings()
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+async def list_products_async(db: AsyncSession, **filters) -> list[dict]:
+    result = await db.execute(products_query(**filters))
+    return [dict(row) for row in result.mappings()]
+
+
+async def iter_product_chunks_async(db: AsyncSession, chunk_size: int, **filters):
+    result = await db.stream(
+        products_query(**filters).execution_options(yield_per=chunk_size)
+    )
+    try:
+        async for partition in result.mappings().partitions():
+            yield partition
+    finally:
+        await result.close()
+
+
+def weighted_average_cost(quantity, unit_cost, held=0):
+    """Expressão SQL do custo médio após entrar ``quantity`` a ``unit_cost``.
+
+    Usada no SET de um UPDATE/upsert: as colunas do produto ainda têm os
+    valores anteriores à alteração. ``held`` são as unidades do produto em
+    leases do escrow: fora de ``quantity_on_hand``, mas no saldo do razão.
+    """
+    table = Product.__table__
+    current = table.c.quantity_on_hand + held
+    total = current + quantity
+    return case(
+        (
+            total > 0,
+            (current * table.c.average_cost + quantity * unit_cost) / total,
+        ),
+        else_=unit_cost,
+    )
+
+
+class ProductImportRow(NamedTuple):
+    """Produto a importar, já validado e único por ``sku`` no bloco."""
+
+    sku: str
+    name: str
+    quantity_on_hand: int
+    average_cost: float
+
+
+_IMPORT_COLUMNS = ("sku", "name", "quantity_on_hand", "average_cost")
+_STAGING = Table(
+    "product_import_staging",
+    MetaData(),
+    Column("sku", String),
+    Column("name", String),
+    Column("quantity_on_hand", Integer),
+    Column("average_cost", Float),
+)
+
+
+def _on_conflict(stmt):
+    """Produto existente: soma o saldo, recalcula o custo médio ponderado e
+    incrementa a versão."""
+    table = Product.__table__
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.sku],
+        set_={
+            "name": excluded.name,
+            "quantity_on_hand": table.c.quantity_on_hand + excluded.quantity_on_hand,
+            "average_cost": weighted_average_cost(
+                excluded.quantity_on_hand,
+                excluded.average_cost,
+                # Linha existente; Column faria a subconsulta ler a tabela de novo.
+                held_units(literal_column(f"{table.name}.product_id")),
+            ),
+            "version": table.c.version + 1,
+        },
+    ).returning(table.c.product_id, table.c.sku)
+
+
+def upsert_products(db: Session, rows: Sequence[ProductImportRow]) -> dict[str, int]:
+    """Insere ou atualiza os produtos por ``sku`` e devolve ``sku -> product_id``.
+
+    No Postgres as linhas entram por COPY em uma tabela temporária e o upsert
+    é um único ``INSERT ... SELECT ... ON CONFLICT``. Não faz commit.
+    """
+    if not rows:
+        return {}
+    table = Product.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        _copy_staging(db, rows)
+        stmt = postgresql.insert(table).from_select(
+            _IMPORT_COLUMNS, select(*(_STAGING.c[name] for name in _IMPORT_COLUMNS))
+        )
+    else:
+        stmt = sqlite.insert(table).values([row._asdict() for row in rows])
+    return {sku: product_id for product_id, sku in db.execute(_on_conflict(stmt))}
+
+
+def _copy_staging(db: Session, rows: Sequence[ProductImportRow]):
+    # ON COMMIT DELETE ROWS: a tabela é da conexão e esvazia a cada bloco.
+    db.execute(
+        text(
+            f"CREATE TEMP TABLE IF NOT EXISTS {_STAGING.name} "
+            "(sku text, name text, quantity_on_hand integer, "
+            "average_cost double precision) ON COMMIT DELETE ROWS"
+        )
+    )
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {_STAGING.name} ({', '.join(_IMPORT_COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
@@ -0,0 +1,201 @@
+from datetime import datetime
+from typing import Optional, Sequence
+
+from sqlalchemy import and_, func, insert, or_, select, union
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models.product import Product
+from app.models.stock_discrepancy import StockDiscrepancy
+from app.models.stock_lease import StockLease
+from app.models.stock_movement import StockMovement
+from app.models.stock_reconciliation_run import StockReconciliationRun
+from app.models.stock_reconciliation_state import StockReconciliationState
+from app.models.stock_snapshot import StockSnapshot
+from app.repositories.stock_snapshot_repository import signed_quantity
+
+
+def movement_watermark(db: Session, before: datetime) -> Optional[int]:
+    """Maior ``movement_id`` gravado até ``before``."""
+    return db.scalar(
+        select(func.max(StockMovement.movement_id)).where(
+            StockMovement.created_at <= before
+        )
+    )
+
+
+def last_watermark(db: Session) -> Optional[int]:
+    """Marca d'água da última rodada concluída."""
+    return db.scalar(
+        select(StockReconciliationRun.movement_watermark)
+        .where(StockReconciliationRun.status == "done")
+        .order_by(StockReconciliationRun.run_id.desc())
+        .limit(1)
+    )
+
+
+def product_id_range(db: Session) -> tuple[Optional[int], Optional[int]]:
+    return tuple(
+        db.execute(
+            select(func.min(Product.product_id), func.max(Product.product_id))
+        ).one()
+    )
+
+
+def candidates(
+    db: Session,
+    low: int,
+    high: int,
+    since: Optional[int],
+    watermark: Optional[int],
+) -> list[int]:
+    """Produtos de ``[low, high]`` a conferir: os movimentados em
+    ``(since, watermark]`` e os que estavam divergentes. Sem ``since``,
+    todos os produtos da faixa."""
+    if since is None:
+        query = select(Product.product_id).where(Product.product_id.between(low, high))
+        return list(db.scalars(query.order_by(Product.product_id)))
+
+    pending = select(StockReconciliationState.product_id).where(
+        StockReconciliationState.balanced.is_(False),
+        StockReconciliationState.product_id.between(low, high),
+    )
+    if watermark is None or watermark <= since:
+        return sorted(db.scalars(pending))
+    moved = select(StockMovement.product_id).where(
+        StockMovement.movement_id > since,
+        StockMovement.movement_id <= watermark,
+        StockMovement.product_id.between(low, high),
+    )
+    return sorted(db.scalars(union(moved, pending)))
+
+
+def balances(db: Session, product_ids: Sequence[int]):
+    """Saldo gravado, saldo do razão e unidades em leases de cada produto,
+    em uma única consulta.
+
+    O razão parte do último snapshot do produto e soma as movimentações
+    posteriores. ``leased_quantity`` são as unidades de leases ativas ainda
+    não consumidas, que estão fora de ``quantity_on_hand``.
+    """
+    latest = (
+        select(
+            StockSnapshot.product_id,
+            func.max(StockSnapshot.snapshot_at).label("snapshot_at"),
+        )
+        .where(StockSnapshot.product_id.in_(product_ids))
+        .group_by(StockSnapshot.product_id)
+        .subquery()
+    )
+    snapshots = (
+        select(
+            StockSnapshot.product_id, StockSnapshot.snapshot_at, StockSnapshot.quantity
+        )
+        .join(
+            latest,
+            and_(
+                StockSnapshot.product_id == latest.c.product_id,
+                StockSnapshot.snapshot_at == latest.c.snapshot_at,
+            ),
+        )
+        .subquery()
+    )
+    moved = (
+        select(StockMovement.product_id, func.sum(signed_quantity()).label("delta"))
+        .outerjoin(snapshots, snapshots.c.product_id == StockMovement.product_id)
+        .where(
+            StockMovement.product_id.in_(product_ids),
+            or_(
+                snapshots.c.snapshot_at.is_(None),
+                StockMovement.created_at > snapshots.c.snapshot_at,
+            ),
+        )
+        .group_by(StockMovement.product_id)
+        .subquery()
+    )
+    granted = (
+        select(
+            StockLease.product_id,
+            func.sum(StockLease.granted - StockLease.returned).label("units"),
+        )
+        .where(StockLease.status == "active", StockLease.product_id.in_(product_ids))
+        .group_by(StockLease.product_id)
+        .subquery()
+    )
+    consumed = (
+        select(
+            StockMovement.product_id, func.sum(StockMovement.quantity).label("units")
+        )
+        .join(StockLease, StockLease.lease_id == StockMovement.lease_id)
+        .where(
+            StockLease.status == "active",
+            StockMovement.movement_type == "saida",
+            StockMovement.product_id.in_(product_ids),
+        )
+        .group_by(StockMovement.product_id)
+        .subquery()
+    )
+    return db.execute(
+        select(
+            Product.product_id,
+            Product.quantity_on_hand,
+            (
+                func.coalesce(snapshots.c.quantity, 0) + func.coalesce(moved.c.delta, 0)
+            ).label("ledger_quantity"),
+            (
+                func.coalesce(granted.c.units, 0) - func.coalesce(consumed.c.units, 0)
+            ).label("leased_quantity"),
+        )
+        .outerjoin(snapshots, snapshots.c.product_id == Product.product_id)
+        .outerjoin(moved, moved.c.product_id == Product.product_id)
+        .outerjoin(granted, granted.c.product_id == Product.product_id)
+        .outerjoin(consumed, consumed.c.product_id == Product.product_id)
+        .where(Product.product_id.in_(product_ids))
+        .order_by(Product.product_id)
+    ).all()
+
+
+def record_results(db: Session, run_id: int, watermark: Optional[int], rows) -> int:
+    """Atualiza o estado por produto e grava as divergências. Não faz commit.
+
+    Retorna quantas divergências foram encontradas.
+    """
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+    states = []
+    discrepancies = []
+    for row in rows:
+        difference = row.quantity_on_hand - (row.ledger_quantity - row.leased_quantity)
+        states.append(
+            {
+                "product_id": row.product_id,
+                "last_movement_id": watermark,
+                "balanced": difference == 0,
+                "difference": difference,
+                "checked_at": now,
+            }
+        )
+        if difference:
+            discrepancies.append(
+                {
+                    **row._asdict(),
+                    "run_id": run_id,
+                    "difference": difference,
+                    "detected_at": now,
+                }
+            )
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(StockReconciliationState).values(states)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[StockReconciliationState.product_id],
+            set_={
+                name: stmt.excluded[name]
+                for name in ("last_movement_id", "balanced", "difference", "checked_at")
+            },
+        )
+    )
+    if discrepancies:
+        db.execute(insert(StockDiscrepancy), discrepancies)
+    return len(discrepancies)
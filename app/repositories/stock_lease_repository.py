@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.models.product import Product
+from app.models.stock_lease import StockLease
+from app.models.stock_movement import StockMovement
+
+
+def grant(db: Session, product_id: int, holder: str, units: int) -> tuple:
+    """Transfere até ``units`` do produto para a lease ativa de ``holder``.
+
+    Retorna ``(lease_id, unidades obtidas)``; ``(None, 0)`` se não há saldo.
+    Não faz commit.
+    """
+    product = (
+        db.query(Product)
+        .filter(Product.product_id == product_id)
+        .with_for_update()
+        .one_or_none()
+    )
+    taken = min(units, product.quantity_on_hand) if product else 0
+    if taken <= 0:
+        return None, 0
+    product.quantity_on_hand -= taken
+    product.version += 1
+
+    lease = (
+        db.query(StockLease)
+        .filter(
+            StockLease.product_id == product_id,
+            StockLease.holder == holder,
+            StockLease.status == "active",
+        )
+        .with_for_update()
+        .one_or_none()
+    )
+    if lease is None:
+        lease = StockLease(product_id=product_id, holder=holder, granted=0)
+        db.add(lease)
+    lease.granted += taken
+    lease.renewed_at = datetime.utcnow()
+    db.flush()
+    return lease.lease_id, taken
+
+
+def consumed(db: Session, lease_id: int) -> int:
+    return db.scalar(
+        select(func.coalesce(func.sum(StockMovement.quantity), 0)).where(
+            StockMovement.lease_id == lease_id,
+            StockMovement.movement_type == "saida",
+        )
+    )
+
+
+def close(db: Session, lease_id: int, renewed_before: Optional[datetime] = None) -> int:
+    """Devolve ao produto o saldo não consumido e encerra a lease.
+
+    Com ``renewed_before`` só encerra se a lease não foi renovada desde então
+    (conferido sob o lock: uma renovação concorrente vence). Retorna as
+    unidades devolvidas. Não faz commit.
+    """
+    query = db.query(StockLease).filter(StockLease.lease_id == lease_id)
+    if renewed_before is not None:
+        query = query.filter(StockLease.renewed_at < renewed_before)
+    lease = query.with_for_update().one_or_none()
+    if lease is None or lease.status != "active":
+        return 0
+    remaining = lease.granted - lease.returned - consumed(db, lease_id)
+    products = Product.__table__
+    db.execute(
+        update(products)
+        .where(products.c.product_id == lease.product_id)
+        .values(
+            quantity_on_hand=products.c.quantity_on_hand + remaining,
+            version=products.c.version + 1,
+        )
+    )
+    lease.returned += remaining
+    lease.status = "closed"
+    db.flush()
+    return remaining
+
+
+def renew(db: Session, holder: str) -> set[int]:
+    """Renova as leases ativas de ``holder`` e retorna os ids ainda ativos."""
+    table = StockLease.__table__
+    return set(
+        db.scalars(
+            update(table)
+            .where(table.c.holder == holder, table.c.status == "active")
+            .values(renewed_at=datetime.utcnow())
+            .returning(table.c.lease_id)
+        )
+    )
+
+
+def stale_leases(db: Session, max_age_s: float, exclude_holder: Optional[str] = None):
+    """Leases ativas sem renovação há mais de ``max_age_s`` (worker parado)."""
+    query = select(StockLease.lease_id).where(
+        StockLease.status == "active",
+        StockLease.renewed_at < datetime.utcnow() - timedelta(seconds=max_age_s),
+    )
+    if exclude_holder is not None:
+        query = query.where(StockLease.holder != exclude_holder)
+    return list(db.scalars(query))
+
+
+def held_units(product_id):
+    """Unidades das leases ativas do produto ainda não consumidas.
+
+    Estão no saldo do razão, mas fora de ``quantity_on_hand``. Subconsulta
+    escalar correlacionada com ``product_id`` (coluna ou valor).
+    """
+    granted = (
+        select(func.coalesce(func.sum(StockLease.granted - StockLease.returned), 0))
+        .where(StockLease.product_id == product_id, StockLease.status == "active")
+        .scalar_subquery()
+    )
+    consumed = (
+        select(func.coalesce(func.sum(StockMovement.quantity), 0))
+        .join(StockLease, StockLease.lease_id == StockMovement.lease_id)
+        .where(
+            StockLease.product_id == product_id,
+            StockLease.status == "active",
+            StockMovement.movement_type == "saida",
+        )
+        .scalar_subquery()
+    )
+    return granted - consumed
+
+
+def held_by_product(db: Session, product_ids) -> dict[int, int]:
+    """``held_units`` de vários produtos em uma consulta."""
+    active = (StockLease.status == "active", StockLease.product_id.in_(product_ids))
+    consumed = (
+        select(StockMovement.lease_id, func.sum(StockMovement.quantity).label("units"))
+        .where(
+            StockMovement.movement_type == "saida",
+            StockMovement.lease_id.in_(select(StockLease.lease_id).where(*active)),
+        )
+        .group_by(StockMovement.lease_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            StockLease.product_id,
+            func.sum(
+                StockLease.granted
+                - StockLease.returned
+                - func.coalesce(consumed.c.units, 0)
+            ),
+        )
+        .outerjoin(consumed, consumed.c.lease_id == StockLease.lease_id)
+        .where(*active)
+        .group_by(StockLease.product_id)
+    )
+    return {product_id: int(units) for product_id, units in rows}
+
+
+def outstanding_by_product(db: Session, product_ids) -> dict[int, int]:
+    """Unidades concedidas e não devolvidas (inclui as já consumidas)."""
+    rows = db.execute(
+        select(
+            StockLease.product_id,
+            func.sum(StockLease.granted - StockLease.returned),
+        )
+        .where(StockLease.status == "active", StockLease.product_id.in_(product_ids))
+        .group_by(StockLease.product_id)
+    )
+    return {product_id: int(units) for product_id, units in rows}
@@ -0,0 +1,120 @@
+import csv
+import io
+from datetime import datetime
+from typing import NamedTuple, Optional, Sequence
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.stock_movement import StockMovement
+
+
+class MovementRow(NamedTuple):
+    """Movimentação a gravar, sem rastreamento pelo ORM."""
+
+    product_id: int
+    quantity: int
+    movement_type: str
+    lease_id: Optional[int] = None
+    # Custo unitário das entradas (base do custo médio ponderado).
+    unit_cost: Optional[float] = None
+
+
+class MovementRecord(NamedTuple):
+    """Movimentação gravada, imutável e desacoplada da sessão."""
+
+    movement_id: int
+    product_id: int
+    quantity: int
+    movement_type: str
+    created_at: datetime
+    lease_id: Optional[int] = None
+    unit_cost: Optional[float] = None
+
+
+_COLUMNS = (
+    "movement_id",
+    "product_id",
+    "quantity",
+    "movement_type",
+    "lease_id",
+    "unit_cost",
+    "created_at",
+)
+
+
+def _record(movement_id: int, row: MovementRow, created_at: datetime):
+    return MovementRecord(
+        movement_id,
+        row.product_id,
+        row.quantity,
+        row.movement_type,
+        created_at,
+        row.lease_id,
+        row.unit_cost,
+    )
+
+
+def insert_movements(db: Session, rows: Sequence[MovementRow]) -> list[MovementRecord]:
+    """Grava as movimentações em um INSERT multi-linha com RETURNING.
+
+    No Postgres, lotes a partir de ``movement_copy_threshold`` linhas usam
+    COPY. Nada é adicionado ao identity map da sessão.
+    """
+    if not rows:
+        return []
+    created_at = datetime.utcnow()
+    if (
+        db.get_bind().dialect.name == "postgresql"
+        and len(rows) >= settings.movement_copy_threshold
+    ):
+        return _copy_movements(db, rows, created_at)
+
+    table = StockMovement.__table__
+    movement_ids = db.scalars(
+        insert(table).returning(table.c.movement_id, sort_by_parameter_order=True),
+        [{**row._asdict(), "created_at": created_at} for row in rows],
+    ).all()
+    return [
+        _record(movement_id, row, created_at)
+        for movement_id, row in zip(movement_ids, rows)
+    ]
+
+
+def movements_csv(records: Sequence[MovementRecord]) -> io.StringIO:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        # Campo vazio sem aspas vira NULL no COPY (lease_id/unit_cost opcionais).
+        writer.writerow(
+            [getattr(record, name) for name in _COLUMNS[:-1]]
+            + [record.created_at.isoformat()]
+        )
+    buffer.seek(0)
+    return buffer
+
+
+def _copy_movements(
+    db: Session, rows: Sequence[MovementRow], created_at: datetime
+) -> list[MovementRecord]:
+    # COPY não tem RETURNING: os ids são reservados antes na sequence.
+    movement_ids = db.scalars(
+        text(
+            "SELECT nextval(pg_get_serial_sequence('stock_movements', 'movement_id')) "
+            "FROM generate_series(1, :n)"
+        ),
+        {"n": len(rows)},
+    ).all()
+    records = [
+        _record(movement_id, row, created_at)
+        for movement_id, row in zip(movement_ids, rows)
+    ]
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY stock_movements ({', '.join(_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            movements_csv(records),
+        )
+    finally:
+        cursor.close()
+    return records
@@ -0,0 +1,110 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, case, func, insert, literal, select, text
+from sqlalchemy.orm import Session
+from app.models.stock_movement import StockMovement
+from app.models.stock_snapshot import StockSnapshot
+from app.models.stock_snapshot_run import StockSnapshotRun
+
+# Chave do advisory lock que impede duas rodadas de snapshot simultâneas.
+_BUILD_LOCK_KEY = 7_301_018
+
+
+def signed_quantity():
+    """Quantidade com sinal: saídas baixam o saldo; entradas e estornos somam."""
+    return case(
+        (StockMovement.movement_type == "saida", -StockMovement.quantity),
+        else_=StockMovement.quantity,
+    )
+
+
+def lock_builds(db: Session):
+    """Serializa as rodadas até o fim da transação (só Postgres)."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _BUILD_LOCK_KEY})
+
+
+def last_watermark(db: Session) -> Optional[datetime]:
+    return db.scalar(select(func.max(StockSnapshotRun.watermark)))
+
+
+def insert_snapshots(
+    db: Session, since: Optional[datetime], watermark: datetime
+) -> int:
+    """Grava o saldo em ``watermark`` dos produtos movimentados em
+    ``(since, watermark]``: último snapshot do produto + variação no período.
+    Sem snapshot (descartado ao arquivar partições), o ponto de partida é a
+    soma das movimentações até ``since``.
+
+    Um único ``INSERT ... SELECT``; não faz commit. Retorna as linhas gravadas.
+    """
+    deltas = select(
+        StockMovement.product_id, func.sum(signed_quantity()).label("delta")
+    ).where(StockMovement.created_at <= watermark)
+    if since is not None:
+        deltas = deltas.where(StockMovement.created_at > since)
+    deltas = deltas.group_by(StockMovement.product_id).subquery()
+
+    previous = (
+        select(StockSnapshot.quantity)
+        .where(StockSnapshot.product_id == deltas.c.product_id)
+        .order_by(StockSnapshot.snapshot_at.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    if since is not None:
+        history = (
+            select(func.sum(signed_quantity()))
+            .where(
+                StockMovement.product_id == deltas.c.product_id,
+                StockMovement.created_at <= since,
+            )
+            .scalar_subquery()
+        )
+        previous = func.coalesce(previous, history)
+    result = db.execute(
+        insert(StockSnapshot).from_select(
+            ["product_id", "snapshot_at", "quantity"],
+            select(
+                deltas.c.product_id,
+                literal(watermark, DateTime(timezone=True)),
+                func.coalesce(previous, 0) + deltas.c.delta,
+            ),
+        )
+    )
+    db.add(StockSnapshotRun(watermark=watermark, products=result.rowcount))
+    return result.rowcount
+
+
+def balance_at(
+    db: Session, product_id: int, at: datetime
+) -> tuple[Optional[int], Optional[datetime]]:
+    """Saldo do produto em ``at``: snapshot mais próximo anterior + as
+    movimentações entre ele e ``at``. Retorna ``(saldo, snapshot_at)``.
+
+    Antes da ``abertura`` que inicia o razão retido (meses arquivados ou
+    anteriores ao saldo inicial) o saldo é desconhecido: ``(None, None)``.
+    """
+    snapshot = db.execute(
+        select(StockSnapshot.snapshot_at, StockSnapshot.quantity)
+        .where(StockSnapshot.product_id == product_id, StockSnapshot.snapshot_at <= at)
+        .order_by(StockSnapshot.snapshot_at.desc())
+        .limit(1)
+    ).first()
+    movements = select(func.coalesce(func.sum(signed_quantity()), 0)).where(
+        StockMovement.product_id == product_id, StockMovement.created_at <= at
+    )
+    if snapshot is None:
+        first = db.execute(
+            select(StockMovement.movement_type, StockMovement.created_at)
+            .where(StockMovement.product_id == product_id)
+            .order_by(StockMovement.created_at, StockMovement.movement_id)
+            .limit(1)
+        ).first()
+        opened_later = first is not None and first.movement_type == "abertura"
+        if opened_later and first.created_at > at:
+            return None, None
+        return db.scalar(movements), None
+    movements = movements.where(StockMovement.created_at > snapshot.snapshot_at)
+    return snapshot.quantity + db.scalar(movements), snapshot.snapshot_at
@@ -1,4 +1,5 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr, Field
 
 
@@ -9,7 +10,7 @@ class OrderItem(BaseModel):
 
 class OrderCreate(BaseModel):
     email: EmailStr = Field(..., description="Email do cliente para notificação")
-    items: List[OrderItem]
+    items: List[OrderItem] = Field(..., min_items=1)
 
 
 class OrderRead(BaseModel):
@@ -18,3 +19,30 @@ class OrderRead(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class OrderItemsRead(OrderRead):
+    items: List[OrderItem]
+
+
+class OrderWithProduct(OrderRead):
+    created_at: datetime
+    quantity: int = Field(..., description="Quantidade do produto no pedido")
+
+
+class OrderPage(BaseModel):
+    items: List[OrderWithProduct]
+    next_cursor: Optional[int] = None
+
+
+class OrderBatchResult(BaseModel):
+    index: int = Field(..., description="Posição do pedido no lote")
+    order_id: Optional[int] = Field(None, description="ID do pedido criado")
+    status: str = Field(..., description="pending ou rejected")
+    detail: Optional[str] = Field(None, description="Motivo da rejeição")
+
+
+class OrderBatchRead(BaseModel):
+    created: int
+    rejected: int
+    results: List[OrderBatchResult]
@@ -1,14 +1,34 @@
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 
 
 class ProductCreate(BaseModel):
     name: str
+    sku: Optional[str] = None
     quantity_on_hand: int = 0
     average_cost: float = 0.0
 
 
 class ProductRead(ProductCreate):
     product_id: int
+    version: int = 1
 
     class Config:
         orm_mode = True
+
+
+class ProductPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[int] = None
+
+
+class ProductImportError(BaseModel):
+    line: int
+    error: str
+
+
+class ProductImportRead(BaseModel):
+    rows: int
+    imported: int
+    rejected: int
+    errors: List[ProductImportError]
@@ -0,0 +1,38 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class StockReceiptItem(BaseModel):
+    product_id: int = Field(..., description="ID do produto")
+    quantity: int = Field(..., gt=0, description="Quantidade recebida")
+    unit_cost: float = Field(..., ge=0, description="Custo unitário da entrada")
+
+
+class StockReceiptCreate(BaseModel):
+    items: List[StockReceiptItem] = Field(..., min_items=1)
+
+
+class ProductStockRead(BaseModel):
+    product_id: int
+    quantity_on_hand: int
+    average_cost: float
+
+
+class StockReceiptRead(BaseModel):
+    products: List[ProductStockRead]
+
+
+class StockBalanceRead(BaseModel):
+    product_id: int
+    at: datetime
+    quantity: Optional[int] = Field(
+        ...,
+        description=(
+            "Saldo somando as movimentações até at; null se at é anterior ao "
+            "início do razão retido (meses arquivados)"
+        ),
+    )
+    snapshot_at: Optional[datetime] = Field(
+        None, description="Snapshot usado como ponto de partida"
+    )
@@ -0,0 +1,250 @@
+"""
+Cache de disponibilidade de estoque para rejeitar pedidos cedo.
+
+Cada processo guarda ``product_id -> quantity_on_hand`` em um cache LRU com
+TTL, preenchido sob demanda a partir do banco, e um bitmap com os IDs de
+produtos existentes. O bitmap é carregado em páginas uma vez e depois só
+recebe os IDs acima do maior já visto (produtos são criados com IDs
+crescentes); IDs removidos continuam marcados, mas a leitura do saldo no
+banco os recusa. O ``stock_worker`` publica ``stock.updated`` com a
+variação de cada produto após reservas e estornos; o listener aplica essas
+variações nas entradas em cache.
+
+O cache é só uma checagem antecipada: a reserva no ``stock_worker`` continua
+sendo a decisão final. Antes de rejeitar por falta de estoque o saldo é
+relido do banco, então um cache defasado não recusa pedidos válidos.
+"""
+
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.cache import IdBitmap, TTLCache
+from app.core.config import settings
+from app.core.rabbitmq import (
+    EXCHANGE_NAME,
+    declare_topology,
+    decode,
+    get_connection,
+)
+from app.models.product import Product
+from app.repositories import stock_lease_repository
+from app.services import product_cache
+from app.services.stock_service import InsufficientStockError, ProductNotFoundError
+
+STOCK_UPDATED = "stock.updated"
+# IDs por consulta ao carregar o bitmap.
+_IDS_PAGE = 50_000
+
+_cache = TTLCache(settings.availability_cache_size, settings.availability_cache_ttl_s)
+_ids_lock = threading.Lock()
+_known_ids: Optional[IdBitmap] = None
+# Maior product_id já carregado no bitmap. IDs acima dele podem ser produtos
+# criados depois e são consultados no banco.
+_known_upper = 0
+_known_loaded_at = 0.0
+
+_listener: Optional[threading.Thread] = None
+_listener_stop = threading.Event()
+
+
+def reset():
+    """Descarta o cache e o bitmap (usado nos testes e ao reconectar)."""
+    global _known_ids, _known_upper  # pylint: disable=global-statement
+    _cache.clear()
+    with _ids_lock:
+        _known_ids = None
+        _known_upper = 0
+
+
+def _ids_after(db: Session, after: int):
+    """IDs de produto maiores que ``after``, em páginas por chave."""
+    while True:
+        page = list(
+            db.scalars(
+                select(Product.product_id)
+                .where(Product.product_id > after)
+                .order_by(Product.product_id)
+                .limit(_IDS_PAGE)
+            )
+        )
+        yield from page
+        if len(page) < _IDS_PAGE:
+            return
+        after = page[-1]
+
+
+def _ensure_known_ids(db: Session) -> tuple[IdBitmap, int]:
+    global _known_ids, _known_upper, _known_loaded_at  # pylint: disable=global-statement
+    with _ids_lock:
+        known, upper = _known_ids, _known_upper
+        fresh = (
+            known is not None
+            and time.monotonic() - _known_loaded_at
+            <= settings.availability_ids_refresh_s
+        )
+        if fresh:
+            return known, upper
+    # A consulta fica fora do lock: no caminho assíncrono ela cede o event
+    # loop e outra corrotina da mesma thread poderia tentar pegar o lock.
+    if known is None:
+        known, upper = IdBitmap(), 0
+    for product_id in _ids_after(db, upper):
+        known.add(product_id)
+        upper = product_id
+    with _ids_lock:
+        # Outra carga inicial pode ter terminado antes; fica a primeira.
+        if _known_ids is None or _known_ids is known:
+            _known_ids = known
+            _known_upper = max(_known_upper, upper)
+            _known_loaded_at = time.monotonic()
+        return _known_ids, _known_upper
+
+
+def _load(db: Session, product_ids: list[int], known: IdBitmap) -> dict[int, int]:
+    rows = db.execute(
+        select(Product.product_id, Product.quantity_on_hand).where(
+            Product.product_id.in_(product_ids)
+        )
+    )
+    # Unidades arrendadas pelo escrow não aparecem em quantity_on_hand; somar
+    # as leases dá um limite superior do saldo, o bastante para esta checagem.
+    leased = stock_lease_repository.outstanding_by_product(db, product_ids)
+    loaded = {}
+    for product_id, quantity in rows:
+        quantity += leased.get(product_id, 0)
+        loaded[product_id] = quantity
+        _cache.set(product_id, quantity)
+        known.add(product_id)
+    return loaded
+
+
+def check_availability(db: Session, items: list[dict]):
+    """Levanta ``ProductNotFoundError``/``InsufficientStockError`` se o pedido
+    certamente não pode ser atendido."""
+    if not settings.availability_cache_enabled:
+        return
+
+    quantities: dict[int, int] = {}
+    for item in items:
+        quantities[item["product_id"]] = (
+            quantities.get(item["product_id"], 0) + item["quantity"]
+        )
+
+    known, upper = _ensure_known_ids(db)
+    for product_id in quantities:
+        if product_id <= upper and product_id not in known:
+            raise ProductNotFoundError(f"Produto {product_id} não encontrado")
+
+    available = {}
+    to_load = []
+    for product_id, quantity in quantities.items():
+        cached = _cache.get(product_id)
+        if cached is None or cached < quantity:
+            to_load.append(product_id)
+        else:
+            available[product_id] = cached
+    if to_load:
+        available.update(_load(db, to_load, known))
+
+    for product_id, quantity in quantities.items():
+        if product_id not in available:
+            raise ProductNotFoundError(f"Produto {product_id} não encontrado")
+        if available[product_id] < quantity:
+            raise InsufficientStockError(
+                f"Estoque insuficiente para produto {product_id}"
+            )
+
+
+async def check_availability_async(db: AsyncSession, items: list[dict]):
+    """``check_availability`` sobre uma ``AsyncSession`` (driver assíncrono)."""
+    if settings.availability_cache_enabled:
+        await db.run_sync(check_availability, items)
+
+
+def stock_updated_event(movements, sign: int = -1) -> tuple[str, dict]:
+    """Evento ``stock.updated`` com a variação líquida de cada produto."""
+    deltas: dict[int, int] = {}
+    for movement in movements:
+        deltas[movement.product_id] = (
+            deltas.get(movement.product_id, 0) + sign * movement.quantity
+        )
+    return STOCK_UPDATED, {
+        "deltas": [
+            {"product_id": product_id, "delta": delta}
+            for product_id, delta in sorted(deltas.items())
+        ]
+    }
+
+
+def apply_update(payload: dict):
+    for entry in payload.get("deltas", []):
+        _cache.adjust(entry["product_id"], entry["delta"])
+        product_cache.invalidate(entry["product_id"])
+
+
+def _listen():
+    delay = 1.0
+    while not _listener_stop.is_set():
+        connection = None
+        try:
+            connection = get_connection()
+            channel = connection.channel()
+            declare_topology(channel)
+            result = channel.queue_declare(queue="", exclusive=True, auto_delete=True)
+            queue = result.method.queue
+            channel.queue_bind(
+                exchange=EXCHANGE_NAME, queue=queue, routing_key=STOCK_UPDATED
+            )
+            # Eventos perdidos enquanto desconectado deixariam o cache defasado.
+            _cache.clear()
+            product_cache.clear()
+            delay = 1.0
+            print("[availability] escutando stock.updated")
+            for method, properties, body in channel.consume(
+                queue, auto_ack=True, inactivity_timeout=1
+            ):
+                if _listener_stop.is_set():
+                    break
+                if method is None:
+                    continue
+                try:
+                    apply_update(decode(body, properties))
+                except (ValueError, KeyError, TypeError) as exc:
+                    print("[availability] evento inválido:", exc)
+        except Exception as exc:
+            print(f"[availability] listener desconectado ({exc!r}), reconectando...")
+            _cache.clear()
+            _listener_stop.wait(delay)
+            delay = min(delay * 2, 30.0)
+        finally:
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+
+def start_listener():
+    global _listener  # pylint: disable=global-statement
+    if not (
+        settings.availability_cache_enabled and settings.availability_listener_enabled
+    ):
+        return
+    if settings.messaging_mode == "fused":
+        # Sem broker: no pipeline fused o stock.updated é aplicado em processo.
+        return
+    if _listener is not None and _listener.is_alive():
+        return
+    _listener_stop.clear()
+    _listener = threading.Thread(
+        target=_listen, name="availability-listener", daemon=True
+    )
+    _listener.start()
+
+
+def stop_listener():
+    _listener_stop.set()
@@ -0,0 +1,182 @@
+"""
+Claim-check para pedidos grandes.
+
+Pedidos com pelo menos ``CLAIM_CHECK_MIN_ITEMS`` linhas não levam ``items``
+nos eventos: a mensagem carrega ``order_id``, a versão dos itens (hash do
+conteúdo) e um resumo. Os itens ficam em ``order_items`` (``store=db``,
+gravados na transação do pedido) ou em um blob local endereçado pelo hash
+(``store=blob``, diretório compartilhado pelos workers).
+
+Quem precisa das linhas chama ``load_items``/``load_many``; o resultado fica
+em um cache por processo indexado por ``(order_id, versão)``, que nunca fica
+defasado porque os itens de um pedido não mudam.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from sqlalchemy import select
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.order_item import OrderItem
+
+STORES = ("db", "blob")
+
+_cache = TTLCache(settings.claim_check_cache_size, settings.claim_check_cache_ttl_s)
+
+
+def reset():
+    _cache.clear()
+
+
+def _encode(items: list[dict]) -> bytes:
+    return json.dumps(items, separators=(",", ":"), sort_keys=True).encode()
+
+
+def summarize(items: list[dict]) -> dict:
+    return {
+        "lines": len(items),
+        "units": sum(item["quantity"] for item in items),
+        "products": len({item["product_id"] for item in items}),
+    }
+
+
+def should_claim(items: list[dict]) -> bool:
+    threshold = settings.claim_check_min_items
+    return threshold > 0 and len(items) >= threshold
+
+
+def _blob_path(version: str) -> str:
+    return os.path.join(settings.claim_check_blob_dir, version[:2], version)
+
+
+def _write_blob(version: str, data: bytes):
+    path = _blob_path(version)
+    if os.path.exists(path):
+        return  # mesmo conteúdo, mesmo endereço
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def order_payload(order_id: int, email: str, items: list[dict]) -> dict:
+    """Payload de ``order.created``: com os itens ou, acima do limite, a referência.
+
+    No ``store=blob`` o blob é gravado aqui, antes do commit do pedido; um
+    rollback deixa só um arquivo órfão.
+    """
+    payload = {"order_id": order_id, "email": email}
+    if not should_claim(items):
+        payload["items"] = items
+        return payload
+    store = settings.claim_check_store
+    if store not in STORES:
+        raise ValueError(f"CLAIM_CHECK_STORE inválido: {store}")
+    data = _encode(items)
+    version = hashlib.sha256(data).hexdigest()
+    if store == "blob":
+        _write_blob(version, data)
+    payload["items_ref"] = {"store": store, "version": version}
+    payload["summary"] = summarize(items)
+    return payload
+
+
+def forward(data: dict, **fields) -> dict:
+    """Repassa ``order_id``/``email`` e os itens (ou a referência) do pedido."""
+    payload = {"order_id": data.get("order_id"), "email": data.get("email")}
+    if "items_ref" in data:
+        payload["items_ref"] = data["items_ref"]
+        payload["summary"] = data.get("summary")
+    else:
+        payload["items"] = data.get("items", [])
+    payload.update(fields)
+    return payload
+
+
+def _key(data: dict) -> tuple:
+    return data["order_id"], data["items_ref"]["version"]
+
+
+def _read_blob(version: str) -> list[dict]:
+    with open(_blob_path(version), "rb") as file:
+        return json.loads(file.read())
+
+
+def _load_from_db(order_ids: list[int]) -> dict[int, list[dict]]:
+    """Itens de vários pedidos em uma consulta, na ordem das linhas."""
+    items = OrderItem.__table__
+    loaded: dict[int, list[dict]] = {order_id: [] for order_id in order_ids}
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(items.c.order_id, items.c.product_id, items.c.quantity)
+            .where(items.c.order_id.in_(order_ids))
+            .order_by(items.c.order_id, items.c.line)
+        )
+        for order_id, product_id, quantity in rows:
+            loaded[order_id].append({"product_id": product_id, "quantity": quantity})
+    finally:
+        db.close()
+    return loaded
+
+
+def load_many(payloads: list[dict]) -> list:
+    """Itens de cada payload, buscando os que faltam no cache de uma vez.
+
+    Um pedido cujos itens não existem no armazenamento aparece como
+    ``LookupError`` na posição correspondente, sem derrubar os demais.
+    """
+    resolved: list = []
+    missing_db: dict[int, tuple] = {}
+    for data in payloads:
+        if "items_ref" not in data:
+            resolved.append(data.get("items", []))
+            continue
+        items = _cache.get(_key(data))
+        if items is None and data["items_ref"]["store"] == "blob":
+            try:
+                items = _read_blob(data["items_ref"]["version"])
+            except FileNotFoundError:
+                items = LookupError(
+                    f"Itens do pedido {data['order_id']} não encontrados"
+                )
+            else:
+                _cache.set(_key(data), items)
+        if items is None:
+            missing_db[data["order_id"]] = _key(data)
+        resolved.append(items)
+
+    if missing_db:
+        loaded = _load_from_db(list(missing_db))
+        for order_id, key in missing_db.items():
+            if loaded[order_id]:
+                _cache.set(key, loaded[order_id])
+            else:
+                loaded[order_id] = LookupError(
+                    f"Itens do pedido {order_id} não encontrados"
+                )
+        resolved = [
+            loaded[data["order_id"]] if items is None else items
+            for data, items in zip(payloads, resolved)
+        ]
+    return resolved
+
+
+def load_items(data: dict) -> list[dict]:
+    items = load_many([data])[0]
+    if isinstance(items, Exception):
+        raise items
+    return items
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
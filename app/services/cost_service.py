@@ -0,0 +1,96 @@
+"""
+Recálculo offline do custo médio ponderado a partir das movimentações.
+
+Percorre ``stock_movements`` uma única vez, em ordem de
+``(product_id, created_at, movement_id)`` e com cursor no servidor, e
+reproduz o custo médio móvel de cada produto: entradas (e a ``abertura``)
+recalculam a média com o ``unit_cost``; saídas e estornos só mudam o saldo.
+Os custos divergentes são gravados em lotes de UPDATE; produtos cujo
+histórico não começa com o saldo inicial ficam de fora.
+
+O saldo do histórico inclui as unidades em leases do escrow; o recebimento
+também pondera por ``quantity_on_hand`` mais essas unidades.
+"""
+
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+from app.models.product import Product
+from app.models.stock_movement import StockMovement
+from app.services import ledger_service
+
+# Diferença abaixo disso é arredondamento, não custo divergente.
+_TOLERANCE = 1e-9
+
+
+def replay_average_costs(
+    movements: Iterable,
+) -> Iterator[tuple[int, Optional[float]]]:
+    """Recebe ``(product_id, quantity, movement_type, unit_cost)`` ordenados
+    por produto e devolve ``(product_id, custo médio final)``; ``None`` para
+    históricos que não começam com o saldo inicial."""
+    for product_id, _quantity, cost in ledger_service.replay(movements):
+        yield product_id, cost
+
+
+def recompute_average_costs(db: Session, chunk_size: int = 5000) -> int:
+    """Regrava ``average_cost`` dos produtos cujo custo diverge do histórico.
+
+    Produtos com histórico incompleto são ignorados, nunca regravados.
+    Retorna quantos produtos foram corrigidos.
+    """
+    movements = db.execute(
+        select(
+            StockMovement.product_id,
+            StockMovement.quantity,
+            StockMovement.movement_type,
+            StockMovement.unit_cost,
+            Product.average_cost,
+        )
+        .join(Product, Product.product_id == StockMovement.product_id)
+        .order_by(
+            StockMovement.product_id,
+            StockMovement.created_at,
+            StockMovement.movement_id,
+        )
+        .execution_options(yield_per=chunk_size)
+    )
+    # Custo gravado hoje, só dos produtos em curso (no máximo dois).
+    stored: dict[int, float] = {}
+
+    def history():
+        for product_id, quantity, movement_type, unit_cost, average_cost in movements:
+            stored[product_id] = average_cost
+            yield product_id, quantity, movement_type, unit_cost
+
+    products = Product.__table__
+    stmt = (
+        update(products)
+        .where(products.c.product_id == bindparam("pid"))
+        .values(average_cost=bindparam("cost"), version=products.c.version + 1)
+    )
+
+    changed = []
+    fixed = skipped = 0
+    for product_id, cost in replay_average_costs(history()):
+        current = stored.pop(product_id)
+        if cost is None:
+            skipped += 1
+            continue
+        if abs(current - cost) > _TOLERANCE:
+            changed.append({"pid": product_id, "cost": cost})
+        if len(changed) >= chunk_size:
+            db.connection().execute(stmt, changed)
+            fixed += len(changed)
+            changed = []
+    if changed:
+        db.connection().execute(stmt, changed)
+        fixed += len(changed)
+    db.commit()
+    if skipped:
+        print(
+            f"[cost_service] {skipped} produtos sem saldo inicial no razão "
+            "ficaram de fora (rode a migração de abertura)"
+        )
+    return fixed
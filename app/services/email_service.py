@@ -4,7 +4,22 @@ from email.mime.multipart import MIMEMultipart
 from app.core.config import settings
 
 
+class EmailRejected(Exception):
+    """O servidor SMTP recusou a mensagem de forma definitiva (código 5xx)."""
+
+
+def _is_permanent(exc: Exception) -> bool:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _msg in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
 def send_email(to: str, subject: str, body: str) -> bool:
+    """Envia o email; retorna False se o SMTP não estiver configurado.
+
+    Falhas no envio sobem para quem chamou (``EmailRejected`` quando o
+    servidor recusa em definitivo) para que a mensagem seja repetida.
+    """
     if not settings.smtp_host:
         print("[email_service] SMTP não configurado, email não enviado.")
         return False
@@ -22,12 +37,14 @@ def send_email(to: str, subject: str, body: str) -> bool:
             if settings.smtp_user and settings.smtp_password:
                 server.login(settings.smtp_user, settings.smtp_password)
             server.sendmail(settings.smtp_from, to, msg.as_string())
-
-        print(f"[email_service] Email enviado para {to}")
-        return True
     except Exception as exc:
         print(f"[email_service] Erro ao enviar email: {exc}")
-        return False
+        if _is_permanent(exc):
+            raise EmailRejected(str(exc)) from exc
+        raise
+
+    print(f"[email_service] Email enviado para {to}")
+    return True
 
 
 def send_order_processed_email(order_id: int, to: str) -> bool:
@@ -44,6 +61,25 @@ Sistema de Estoque
     return send_email(to, subject, body)
 
 
+def send_order_rejected_email(
+    order_id: int, to: str, reason: str | None = None
+) -> bool:
+    """Envia email avisando que o pedido foi recusado por falta de estoque."""
+    subject = f"Pedido #{order_id} não pôde ser atendido"
+    body = f"""Olá!
+
+Não foi possível atender o seu pedido #{order_id}.
+
+Motivo: {reason or 'Não especificado'}
+
+Nenhuma cobrança foi realizada.
+
+Atenciosamente,
+Sistema de Estoque
+"""
+    return send_email(to, subject, body)
+
+
 def send_payment_failed_email(
     order_id: int, to: str, reason: str | None = None
 ) -> bool:
@@ -0,0 +1,196 @@
+"""
+Saldo de abertura do razão de movimentações (``stock_movements``).
+
+Custo médio refeito, snapshots e conciliação somam o razão desde o início,
+então cada produto precisa que o seu histórico comece com o saldo inicial.
+Produtos cadastrados antes de o saldo inicial virar movimentação ganham uma
+``abertura`` logo antes da primeira movimentação, com a quantidade que fecha
+o razão com ``quantity_on_hand`` (mais as unidades em leases) e o custo médio
+atual. A abertura conta como uma entrada.
+
+Ao arquivar um mês de ``stock_movements``, o saldo e o custo médio de cada
+produto no fim do mês viram uma ``abertura`` no primeiro instante do mês
+seguinte, e os snapshots anteriores a ele são descartados.
+"""
+
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import and_, column, delete, func, insert, or_, select, table
+from sqlalchemy.orm import Session
+from app.models.product import Product
+from app.models.stock_movement import StockMovement
+from app.models.stock_snapshot import StockSnapshot
+from app.models.stock_snapshot_run import StockSnapshotRun
+from app.repositories.stock_lease_repository import held_units
+from app.repositories.stock_snapshot_repository import signed_quantity
+
+OPENING = "abertura"
+# Movimentações que recalculam o custo médio.
+ENTRY_TYPES = ("entrada", OPENING)
+
+
+def replay(movements: Iterable) -> Iterator[tuple[int, int, Optional[float]]]:
+    """Recebe ``(product_id, quantity, movement_type, unit_cost)`` ordenados
+    por produto e devolve ``(product_id, saldo, custo médio)``.
+
+    O custo só é confiável se o histórico começa com uma entrada (ou a
+    ``abertura``) com ``unit_cost``; nos demais casos ele sai ``None``.
+    """
+    current: Optional[int] = None
+    quantity, cost, complete = 0, 0.0, False
+    for product_id, moved, movement_type, unit_cost in movements:
+        if product_id != current:
+            if current is not None:
+                yield current, quantity, cost if complete else None
+            current, quantity, cost = product_id, 0, 0.0
+            complete = movement_type in ENTRY_TYPES and unit_cost is not None
+        if movement_type in ENTRY_TYPES:
+            # Entrada antiga sem custo não altera a média.
+            unit_cost = cost if unit_cost is None else unit_cost
+            if quantity <= 0:
+                cost = unit_cost
+            else:
+                cost = (quantity * cost + moved * unit_cost) / (quantity + moved)
+            quantity += moved
+        elif movement_type == "saida":
+            quantity -= moved
+        else:
+            quantity += moved
+    if current is not None:
+        yield current, quantity, cost if complete else None
+
+
+def _first_movements():
+    ranked = select(
+        StockMovement.product_id,
+        StockMovement.movement_type,
+        StockMovement.unit_cost,
+        StockMovement.created_at,
+        func.row_number()
+        .over(
+            partition_by=StockMovement.product_id,
+            order_by=(StockMovement.created_at, StockMovement.movement_id),
+        )
+        .label("position"),
+    ).subquery()
+    return select(ranked).where(ranked.c.position == 1).subquery()
+
+
+def missing_openings(db: Session):
+    """Produtos cujo razão não começa com uma entrada com custo.
+
+    Retorna ``(product_id, quantidade que falta, average_cost, primeira
+    movimentação)``; a data é ``None`` para produtos sem movimentações.
+    """
+    first = _first_movements()
+    net = (
+        select(StockMovement.product_id, func.sum(signed_quantity()).label("quantity"))
+        .group_by(StockMovement.product_id)
+        .subquery()
+    )
+    missing = (
+        Product.quantity_on_hand
+        + held_units(Product.product_id)
+        - func.coalesce(net.c.quantity, 0)
+    )
+    return db.execute(
+        select(
+            Product.product_id,
+            missing.label("quantity"),
+            Product.average_cost,
+            first.c.created_at,
+        )
+        .outerjoin(first, first.c.product_id == Product.product_id)
+        .outerjoin(net, net.c.product_id == Product.product_id)
+        .where(
+            or_(
+                and_(first.c.product_id.is_(None), missing > 0),
+                and_(
+                    first.c.product_id.is_not(None),
+                    or_(
+                        first.c.movement_type.not_in(ENTRY_TYPES),
+                        first.c.unit_cost.is_(None),
+                    ),
+                ),
+            )
+        )
+        .order_by(Product.product_id)
+    ).all()
+
+
+def backfill_openings(db: Session, chunk_size: int = 5000) -> int:
+    """Grava as aberturas que faltam e descarta os snapshots, refeitos do zero
+    na próxima rodada. Não faz commit; retorna quantas aberturas gravou."""
+    now = datetime.utcnow()
+    rows = [
+        {
+            "product_id": product_id,
+            # Razão acima do saldo é divergência; fica para a conciliação.
+            "quantity": max(quantity, 0),
+            "movement_type": OPENING,
+            "unit_cost": average_cost,
+            "created_at": (
+                now if first_at is None else first_at - timedelta(microseconds=1)
+            ),
+        }
+        for product_id, quantity, average_cost, first_at in missing_openings(db)
+    ]
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(StockMovement.__table__), rows[start : start + chunk_size])
+    if rows:
+        db.execute(delete(StockSnapshot))
+        db.execute(delete(StockSnapshotRun))
+    return len(rows)
+
+
+def carry_forward(db: Session, source: str, cutoff: datetime) -> int:
+    """Grava em ``cutoff`` a abertura de cada produto movimentado em
+    ``source`` (a partição que vai ser arquivada), com o saldo e o custo
+    médio no fim dela, e descarta os snapshots anteriores a ``cutoff``.
+
+    Recusa se algum produto não tem o saldo inicial em ``source``. Não faz
+    commit; retorna quantas aberturas gravou.
+    """
+    archived = table(
+        source,
+        column("movement_id"),
+        column("product_id"),
+        column("quantity"),
+        column("movement_type"),
+        column("unit_cost"),
+        column("created_at"),
+    )
+    history = db.execute(
+        select(
+            archived.c.product_id,
+            archived.c.quantity,
+            archived.c.movement_type,
+            archived.c.unit_cost,
+        ).order_by(archived.c.product_id, archived.c.created_at, archived.c.movement_id)
+    )
+    rows = []
+    incomplete = []
+    for product_id, quantity, cost in replay(history):
+        if cost is None:
+            incomplete.append(product_id)
+            continue
+        rows.append(
+            {
+                "product_id": product_id,
+                "quantity": quantity,
+                "movement_type": OPENING,
+                "unit_cost": cost,
+                "created_at": cutoff,
+            }
+        )
+    if incomplete:
+        raise ValueError(
+            f"{len(incomplete)} produtos sem saldo inicial em {source} "
+            f"(ex.: {incomplete[:5]}); rode a migração a7c3e5f9b214"
+        )
+    for start in range(0, len(rows), 5000):
+        db.execute(insert(StockMovement.__table__), rows[start : start + 5000])
+    # Eles somariam de novo o período que a abertura já resume.
+    db.execute(delete(StockSnapshot).where(StockSnapshot.snapshot_at < cutoff))
+    return len(rows)
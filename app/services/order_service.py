@@ -1,17 +1,251 @@
+from typing import AsyncIterator, Iterable, Optional
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.rabbitmq import publish_event
-from app.repositories import order_repository
+from app.core.async_rabbitmq import get_async_publisher
+from app.core.config import settings
+from app.db.session import async_session
+from app.models.order import Order
+from app.repositories import order_repository, outbox_repository
+from app.schemas.order import OrderCreate
+from app.services import claim_check
+from app.services.availability_service import (
+    check_availability,
+    check_availability_async,
+)
+from app.services.stock_service import StockError
 
 
 def create_order(db: Session, items: list[dict], email: str):
-    """Criar um pedido e publicar o evento."""
-    order = order_repository.create_order(db, status="pending")
+    """Criar um pedido e registrar o evento order.created no outbox.
+
+    Pedido, itens e evento são gravados na mesma transação; a publicação no
+    broker fica a cargo do ``outbox_relay``.
+    """
+    try:
+        order = order_repository.add_order(db, status="pending")
+        order_repository.add_items(
+            db, order_repository.item_rows(order.order_id, items)
+        )
+
+        payload = claim_check.order_payload(order.order_id, email, items)
+
+        outbox_repository.add_event(db, "order.created", payload)
+        db.commit()
+        return order
+    except Exception:
+        db.rollback()
+        raise
+
+
+async def create_order_async(db: AsyncSession, items: list[dict], email: str):
+    """Versão assíncrona de ``create_order``.
+
+    Retorna o pedido e o id do evento no outbox, que pode ser despachado
+    na hora com ``dispatch_outbox_async``.
+    """
+    try:
+        order = await order_repository.add_order_async(db, status="pending")
+        await order_repository.add_items_async(
+            db, order_repository.item_rows(order.order_id, items)
+        )
+
+        payload = claim_check.order_payload(order.order_id, email, items)
+
+        event = outbox_repository.add_event(db, "order.created", payload)
+        await db.flush()
+        event_id = event.event_id
+        await db.commit()
+        return order, event_id
+    except Exception:
+        await db.rollback()
+        raise
+
+
+def _chunk_rows(order_ids: list[int], chunk: list) -> tuple[list, list]:
+    """Linhas de ``order_items`` e eventos ``order.created`` de um bloco."""
+    rows = []
+    events = []
+    for order_id, (_index, email, items) in zip(order_ids, chunk):
+        rows.extend(order_repository.item_rows(order_id, items))
+        events.append(
+            ("order.created", claim_check.order_payload(order_id, email, items))
+        )
+    return rows, events
+
+
+def _chunk_results(order_ids: list[int], chunk: list) -> list[dict]:
+    return [
+        {"index": index, "order_id": order_id, "status": "pending"}
+        for order_id, (index, _email, _items) in zip(order_ids, chunk)
+    ]
+
+
+def _parse_order(raw) -> tuple[str, list[dict]]:
+    order = OrderCreate.parse_obj(raw)
+    return order.email, [item.dict() for item in order.items]
+
+
+def _rejected(index: int, exc: Exception) -> dict:
+    return {"index": index, "status": "rejected", "detail": str(exc)}
+
+
+# Erros que rejeitam só o pedido, sem abortar o lote.
+_ORDER_ERRORS = (ValidationError, StockError, TypeError)
+
+
+def _insert_chunk(db: Session, chunk: list, results: list) -> list[int]:
+    order_ids = order_repository.add_orders(db, len(chunk))
+    rows, events = _chunk_rows(order_ids, chunk)
+    order_repository.add_items(db, rows)
+    event_ids = outbox_repository.add_events(db, events)
+    results.extend(_chunk_results(order_ids, chunk))
+    return event_ids
+
+
+async def _insert_chunk_async(
+    db: AsyncSession, chunk: list, results: list
+) -> list[int]:
+    order_ids = await order_repository.add_orders_async(db, len(chunk))
+    rows, events = _chunk_rows(order_ids, chunk)
+    await order_repository.add_items_async(db, rows)
+    event_ids = await outbox_repository.add_events_async(db, events)
+    results.extend(_chunk_results(order_ids, chunk))
+    return event_ids
+
+
+def create_orders_batch(db: Session, raw_orders: Iterable):
+    """Cria um lote de pedidos em uma única transação.
+
+    ``raw_orders`` é consumido aos poucos (ex.: corpo da requisição lido em
+    streaming); a cada ``order_batch_chunk_size`` pedidos válidos é feito
+    um INSERT multi-linha de pedidos, um de itens e outro de eventos no
+    outbox. Pedidos inválidos ou sem estoque aparecem como ``rejected`` no
+    resultado.
+
+    Retorna ``(resultados por índice, ids dos eventos no outbox)``.
+    """
+    results = []
+    event_ids = []
+    chunk = []
+    try:
+        for index, raw in enumerate(raw_orders):
+            try:
+                email, items = _parse_order(raw)
+                check_availability(db, items)
+            except _ORDER_ERRORS as exc:
+                results.append(_rejected(index, exc))
+                continue
+            chunk.append((index, email, items))
+            if len(chunk) >= settings.order_batch_chunk_size:
+                event_ids.extend(_insert_chunk(db, chunk, results))
+                chunk = []
+        if chunk:
+            event_ids.extend(_insert_chunk(db, chunk, results))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    results.sort(key=lambda result: result["index"])
+    return results, event_ids
+
+
+async def create_orders_batch_async(db: AsyncSession, raw_orders: AsyncIterator):
+    """Versão assíncrona de ``create_orders_batch``."""
+    results = []
+    event_ids = []
+    chunk = []
+    index = 0
+    try:
+        async for raw in raw_orders:
+            try:
+                email, items = _parse_order(raw)
+                await check_availability_async(db, items)
+            except _ORDER_ERRORS as exc:
+                results.append(_rejected(index, exc))
+            else:
+                chunk.append((index, email, items))
+                if len(chunk) >= settings.order_batch_chunk_size:
+                    event_ids.extend(await _insert_chunk_async(db, chunk, results))
+                    chunk = []
+            index += 1
+        if chunk:
+            event_ids.extend(await _insert_chunk_async(db, chunk, results))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    results.sort(key=lambda result: result["index"])
+    return results, event_ids
+
+
+def _page(rows: list[dict], limit: int) -> dict:
+    next_cursor = rows[-1]["order_id"] if len(rows) == limit else None
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+def list_orders_with_product(
+    db: Session, product_id: int, limit: int, after: Optional[int] = None
+) -> dict:
+    rows = order_repository.list_orders_with_product(
+        db, product_id, after=after, limit=limit
+    )
+    return _page(rows, limit)
+
+
+async def list_orders_with_product_async(
+    db: AsyncSession, product_id: int, limit: int, after: Optional[int] = None
+) -> dict:
+    rows = await order_repository.list_orders_with_product_async(
+        db, product_id, after=after, limit=limit
+    )
+    return _page(rows, limit)
+
+
+def get_order_items(db: Session, order_id: int) -> Optional[dict]:
+    """Pedido com seus itens, ou ``None`` se o pedido não existe."""
+    order = db.get(Order, order_id)
+    if order is None:
+        return None
+    items = order_repository.list_order_items(db, order_id)
+    return {"order_id": order.order_id, "status": order.status, "items": items}
+
+
+async def get_order_items_async(db: AsyncSession, order_id: int) -> Optional[dict]:
+    order = await db.get(Order, order_id)
+    if order is None:
+        return None
+    items = await order_repository.list_order_items_async(db, order_id)
+    return {"order_id": order.order_id, "status": order.status, "items": items}
+
 
-    payload = {
-        "order_id": order.order_id,
-        "email": email,
-        "items": items,
-    }
+async def dispatch_outbox_async(event_ids: list[int]):
+    """Publica os eventos sem esperar o ``outbox_relay``.
 
-    publish_event("order.created", payload)
-    return order
+    Os eventos são travados com SKIP LOCKED, então o relay não publica os
+    mesmos em paralelo; em caso de falha eles ficam no outbox para o relay.
+    Lotes grandes são publicados em partes de ``outbox_batch_size``.
+    """
+    batch_size = settings.outbox_batch_size
+    async with async_session() as db:
+        for start in range(0, len(event_ids), batch_size):
+            try:
+                events = await outbox_repository.claim_events_async(
+                    db, event_ids[start : start + batch_size]
+                )
+                if events:
+                    await get_async_publisher().publish_many(
+                        (event.routing_key, event.payload) for event in events
+                    )
+                    await outbox_repository.delete_events_async(
+                        db, [event.event_id for event in events]
+                    )
+                await db.commit()
+            except Exception as exc:
+                await db.rollback()
+                print(
+                    "[order_service] despacho imediato falhou, fica para o relay:",
+                    exc,
+                )
+                return
@@ -0,0 +1,64 @@
+"""
+Cache de leitura de produtos (``GET /products/{id}``).
+
+Guarda ``ProductRead`` por ``product_id`` em um LRU limitado. Cada produto
+tem um contador ``version`` incrementado a cada alteração da linha, usado
+como ETag. As entradas são invalidadas na criação do produto, após cada
+commit que altera estoque neste processo e, nos demais processos, pelos
+eventos ``stock.updated`` recebidos pelo listener de disponibilidade; o TTL
+limita o que escapar dessas invalidações (ex.: leases do escrow).
+"""
+
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.product import Product
+from app.schemas.product import ProductRead
+
+_cache = TTLCache(settings.product_cache_size, settings.product_cache_ttl_s)
+
+
+def etag(product: ProductRead) -> str:
+    return f'"{product.product_id}-{product.version}"'
+
+
+def _query(product_id: int):
+    return select(Product).where(Product.product_id == product_id)
+
+
+def _store(product: Optional[Product]) -> Optional[ProductRead]:
+    if product is None:
+        return None
+    cached = ProductRead.from_orm(product)
+    _cache.set(product.product_id, cached)
+    return cached
+
+
+def get_product(db: Session, product_id: int) -> Optional[ProductRead]:
+    cached = _cache.get(product_id)
+    if cached is not None:
+        return cached
+    return _store(db.scalars(_query(product_id)).first())
+
+
+async def get_product_async(db: AsyncSession, product_id: int) -> Optional[ProductRead]:
+    cached = _cache.get(product_id)
+    if cached is not None:
+        return cached
+    return _store((await db.scalars(_query(product_id))).first())
+
+
+def invalidate(*product_ids: int):
+    _cache.invalidate_many(product_ids)
+
+
+def clear():
+    _cache.clear()
+
+
+def stats() -> dict:
+    return _cache.stats()
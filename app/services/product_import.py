@@ -0,0 +1,164 @@
+"""
+Importação em massa de produtos a partir de CSV ou NDJSON.
+
+O arquivo é lido em streaming e validado com ``ProductCreate`` em blocos de
+``PRODUCT_IMPORT_CHUNK_SIZE`` linhas. Cada bloco é gravado em uma transação
+própria: upsert por ``sku`` (saldo somado, custo médio ponderado) e uma
+movimentação de ``entrada`` por produto, tudo em operações de lote. A
+memória usada depende do tamanho do bloco, não do arquivo.
+
+Linhas inválidas entram no relatório (até ``PRODUCT_IMPORT_MAX_ERRORS``) e
+não interrompem a importação. Uma falha do banco interrompe: os blocos já
+confirmados permanecem gravados.
+"""
+
+import codecs
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.repositories.product_repository import ProductImportRow, upsert_products
+from app.repositories.stock_movement_repository import MovementRow, insert_movements
+from app.schemas.product import ProductCreate
+from app.services import product_cache
+
+FORMATS = ("csv", "ndjson")
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    imported: int = 0
+    rejected: int = 0
+    errors: list[dict] = field(default_factory=list)
+
+    def reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < settings.product_import_max_errors:
+            self.errors.append({"line": line, "error": error})
+
+
+def _read_csv(stream: BinaryIO) -> Iterator[tuple[int, object]]:
+    reader = csv.DictReader(codecs.getreader("utf-8-sig")(stream))
+    for row in reader:
+        # Campo vazio = campo ausente (vale o default do schema).
+        yield reader.line_num, {
+            key.strip(): value
+            for key, value in row.items()
+            if key is not None and value not in ("", None)
+        }
+
+
+def _read_ndjson(stream: BinaryIO) -> Iterator[tuple[int, object]]:
+    for line, text in enumerate(codecs.getreader("utf-8-sig")(stream), start=1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError as exc:
+            yield line, exc
+
+
+_READERS = {"csv": _read_csv, "ndjson": _read_ndjson}
+
+
+def _validate(data) -> tuple[Optional[ProductCreate], Optional[str]]:
+    if isinstance(data, ValueError):
+        return None, f"JSON inválido: {data}"
+    try:
+        product = ProductCreate.parse_obj(data)
+    except ValidationError as exc:
+        return None, "; ".join(
+            f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+            for error in exc.errors()
+        )
+    if not product.sku or not product.sku.strip():
+        return None, "sku: obrigatório na importação"
+    if not product.name.strip():
+        return None, "name: não pode ser vazio"
+    if product.quantity_on_hand < 0:
+        return None, "quantity_on_hand: não pode ser negativo"
+    return product, None
+
+
+def _merge(products: list[ProductCreate]) -> list[ProductImportRow]:
+    """Junta as linhas repetidas de um SKU no bloco (o upsert não aceita a
+    mesma chave duas vezes no mesmo comando)."""
+    merged: dict[str, ProductImportRow] = {}
+    for product in products:
+        sku = product.sku.strip()
+        current = merged.get(sku)
+        quantity, cost = product.quantity_on_hand, product.average_cost
+        if current is not None:
+            total = current.quantity_on_hand + quantity
+            if total > 0:
+                cost = (
+                    current.quantity_on_hand * current.average_cost + quantity * cost
+                ) / total
+            quantity = total
+        merged[sku] = ProductImportRow(sku, product.name, quantity, cost)
+    return list(merged.values())
+
+
+def _load_chunk(db: Session, products: list[ProductCreate]):
+    rows = _merge(products)
+    try:
+        product_ids = upsert_products(db, rows)
+        insert_movements(
+            db,
+            [
+                MovementRow(
+                    product_ids[row.sku],
+                    row.quantity_on_hand,
+                    "entrada",
+                    unit_cost=row.average_cost,
+                )
+                for row in rows
+                if row.quantity_on_hand > 0
+            ],
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    product_cache.invalidate(*product_ids.values())
+
+
+def import_products(
+    db: Session,
+    stream: BinaryIO,
+    fmt: str = "csv",
+    on_progress: Optional[Callable[[ImportReport], None]] = None,
+) -> ImportReport:
+    """Importa o arquivo (binário, UTF-8) e devolve o relatório.
+
+    ``on_progress`` é chamado após cada bloco gravado.
+    """
+    if fmt not in _READERS:
+        raise ValueError(f"Formato não suportado: {fmt}")
+    report = ImportReport()
+    chunk: list[ProductCreate] = []
+
+    def flush():
+        _load_chunk(db, chunk)
+        report.imported += len(chunk)
+        chunk.clear()
+        if on_progress is not None:
+            on_progress(report)
+
+    for line, data in _READERS[fmt](stream):
+        report.rows += 1
+        product, error = _validate(data)
+        if error is not None:
+            report.reject(line, error)
+            continue
+        chunk.append(product)
+        if len(chunk) >= settings.product_import_chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return report
@@ -1,5 +1,11 @@
+import json
+from typing import AsyncIterator, Iterator, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.repositories import product_repository
+from app.repositories.product_repository import PRODUCT_FIELDS
 from app.schemas.product import ProductCreate
 
 
@@ -9,4 +15,61 @@ def create_product(db: Session, product_in: ProductCreate):
         name=product_in.name,
         quantity_on_hand=product_in.quantity_on_hand,
         average_cost=product_in.average_cost,
+        sku=product_in.sku,
     )
+
+
+async def create_product_async(db: AsyncSession, product_in: ProductCreate):
+    return await product_repository.create_product_async(
+        db,
+        name=product_in.name,
+        quantity_on_hand=product_in.quantity_on_hand,
+        average_cost=product_in.average_cost,
+        sku=product_in.sku,
+    )
+
+
+def parse_fields(fields: Optional[str]) -> tuple:
+    """Projeção pedida em ``?fields=a,b``; o product_id (cursor) sempre vem."""
+    if not fields:
+        return PRODUCT_FIELDS
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in PRODUCT_FIELDS]
+    if unknown:
+        raise ValueError(f"Campos desconhecidos: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(["product_id", *requested]))
+
+
+def _page(rows: list[dict], limit: int) -> dict:
+    next_cursor = rows[-1]["product_id"] if len(rows) == limit else None
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+def _ndjson(partition) -> bytes:
+    return "".join(json.dumps(dict(row)) + "\n" for row in partition).encode()
+
+
+def list_products(db: Session, limit: int, **filters) -> dict:
+    return _page(product_repository.list_products(db, limit=limit, **filters), limit)
+
+
+def stream_products_ndjson(db: Session, **filters) -> Iterator[bytes]:
+    """Exporta em NDJSON com memória constante (um bloco de linhas por vez)."""
+    for partition in product_repository.iter_product_chunks(
+        db, settings.product_stream_chunk_size, **filters
+    ):
+        yield _ndjson(partition)
+
+
+async def list_products_async(db: AsyncSession, limit: int, **filters) -> dict:
+    rows = await product_repository.list_products_async(db, limit=limit, **filters)
+    return _page(rows, limit)
+
+
+async def stream_products_ndjson_async(
+    db: AsyncSession, **filters
+) -> AsyncIterator[bytes]:
+    async for partition in product_repository.iter_product_chunks_async(
+        db, settings.product_stream_chunk_size, **filters
+    ):
+        yield _ndjson(partition)
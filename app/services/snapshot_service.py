@@ -0,0 +1,66 @@
+"""
+Snapshots periódicos de saldo para consultas de estoque em uma data.
+
+Cada rodada grava, com marca d'água ``agora - STOCK_SNAPSHOT_LAG_S``, o saldo
+dos produtos que tiveram movimentações desde a rodada anterior, lendo só
+esse intervalo de ``stock_movements``. O atraso deixa de fora movimentações
+de transações ainda abertas. Uma consulta em ``T`` parte do snapshot mais
+recente do produto até ``T`` e soma apenas as movimentações posteriores;
+antes da ``abertura`` que inicia o razão (meses arquivados) o saldo é
+desconhecido.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.product import Product
+from app.repositories import stock_snapshot_repository
+
+
+def _utc(value: datetime) -> datetime:
+    """Datas com fuso viram UTC sem fuso, como as gravadas pelos serviços."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def build_snapshots(db: Session, now: datetime = None) -> int:
+    """Executa uma rodada incremental; retorna quantos produtos ganharam snapshot."""
+    watermark = _utc(now or datetime.utcnow()) - timedelta(
+        seconds=settings.stock_snapshot_lag_s
+    )
+    try:
+        stock_snapshot_repository.lock_builds(db)
+        since = stock_snapshot_repository.last_watermark(db)
+        if since is not None and watermark <= since:
+            db.rollback()
+            return 0
+        count = stock_snapshot_repository.insert_snapshots(db, since, watermark)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return count
+
+
+def stock_at(db: Session, product_id: int, at: datetime = None) -> Optional[dict]:
+    """Saldo do produto em ``at`` (padrão: agora); None se o produto não existe.
+
+    ``quantity`` sai None quando ``at`` é anterior ao razão retido.
+    """
+    at = _utc(at) if at is not None else datetime.utcnow()
+    exists = db.scalar(
+        select(Product.product_id).where(Product.product_id == product_id)
+    )
+    if exists is None:
+        return None
+    quantity, snapshot_at = stock_snapshot_repository.balance_at(db, product_id, at)
+    return {
+        "product_id": product_id,
+        "at": at,
+        "quantity": quantity,
+        "snapshot_at": snapshot_at,
+    }
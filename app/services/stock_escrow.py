@@ -0,0 +1,235 @@
+"""
+Modo escrow para SKUs quentes (``STOCK_ESCROW_ENABLED``).
+
+Quando a taxa de reservas de um produto passa de ``STOCK_ESCROW_HOT_RATE``
+por segundo, o worker arrenda um bloco de ``STOCK_ESCROW_BLOCK`` unidades em
+uma transação (``stock_leases``) e passa a atender as reservas desse produto
+pela cota em memória: cada reserva grava só a sua ``StockMovement`` (com o
+``lease_id``), sem tocar na linha do produto. Uma thread em segundo plano
+renova as leases, reabastece a cota quando ela cai abaixo da metade do bloco
+e devolve o saldo quando o produto esfria ou o worker encerra.
+
+Leases de workers que pararam de renovar por ``STOCK_ESCROW_STALE_S`` são
+devolvidas pelos demais workers; o ``close`` confere ``renewed_at`` sob o
+lock da lease, então uma renovação concorrente vence. As reservas não tocam
+na lease: o worker só atende pela cota até metade de ``STOCK_ESCROW_STALE_S``
+depois da última renovação bem-sucedida, bem antes de outro worker poder
+considerá-la abandonada. Sem renovar a tempo, as reservas seguem pela linha
+do produto; leases que sumiram na renovação têm a cota descartada.
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.repositories import stock_lease_repository
+
+
+class _Quota:
+    __slots__ = ("lease_id", "remaining", "in_flight", "draining")
+
+    def __init__(self, lease_id: int):
+        self.lease_id = lease_id
+        self.remaining = 0
+        self.in_flight = 0
+        self.draining = False
+
+
+class Escrow:
+    """Cotas locais de produtos quentes, seguras entre threads."""
+
+    def __init__(self, holder: str = None, clock=time.monotonic):
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}"
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._quotas: dict[int, _Quota] = {}
+        self._counts: dict[int, int] = {}
+        self._hot: set[int] = set()
+        self._window_started = clock()
+        # Até quando as cotas podem ser usadas sem nova renovação.
+        self._valid_until = 0.0
+
+    def record(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                self._counts[product_id] = self._counts.get(product_id, 0) + 1
+
+    def take(self, quantities: dict[int, int]) -> dict[int, int]:
+        """Debita da cota local os produtos que ela cobre por inteiro.
+
+        Retorna ``product_id -> lease_id`` dos produtos atendidos.
+        """
+        taken = {}
+        with self._lock:
+            if self._clock() >= self._valid_until:
+                return taken
+            for product_id, quantity in quantities.items():
+                quota = self._quotas.get(product_id)
+                if quota and not quota.draining and quota.remaining >= quantity:
+                    quota.remaining -= quantity
+                    quota.in_flight += 1
+                    taken[product_id] = quota.lease_id
+        return taken
+
+    def give_back(self, taken: dict[int, int], quantities: dict[int, int]):
+        """Desfaz ``take`` de uma transação que não foi gravada."""
+        with self._lock:
+            for product_id, lease_id in taken.items():
+                quota = self._quotas.get(product_id)
+                if quota and quota.lease_id == lease_id:
+                    quota.remaining += quantities[product_id]
+                    quota.in_flight -= 1
+
+    def settle(self, taken: dict[int, int]):
+        """Marca como gravadas as saídas de uma transação confirmada."""
+        with self._lock:
+            for product_id, lease_id in taken.items():
+                quota = self._quotas.get(product_id)
+                if quota and quota.lease_id == lease_id:
+                    quota.in_flight -= 1
+
+    def leased_products(self) -> set[int]:
+        with self._lock:
+            return {
+                product_id
+                for product_id, quota in self._quotas.items()
+                if not quota.draining and quota.remaining > 0
+            }
+
+    def _update_hot(self):
+        now = self._clock()
+        elapsed = max(now - self._window_started, 1e-6)
+        threshold = settings.stock_escrow_hot_rate
+        with self._lock:
+            rates = {pid: count / elapsed for pid, count in self._counts.items()}
+            self._counts = {}
+            self._window_started = now
+            # Histerese: só esfria abaixo da metade do limite.
+            self._hot = {
+                pid
+                for pid, rate in rates.items()
+                if rate >= threshold or (pid in self._hot and rate >= threshold / 2)
+            }
+            return set(self._hot)
+
+    def maintain(self, db):
+        """Renova, reabastece e devolve leases. Faz commit na sessão."""
+        hot = self._update_hot()
+        block = settings.stock_escrow_block
+
+        # Medido antes do UPDATE: a validade nunca passa da renovação gravada.
+        renewing = self._clock()
+        active = stock_lease_repository.renew(db, self.holder)
+        with self._lock:
+            for product_id, quota in list(self._quotas.items()):
+                if quota.lease_id not in active:
+                    # Lease devolvida por outro worker: não pode mais ser usada.
+                    print(f"[stock_escrow] lease {quota.lease_id} perdida")
+                    del self._quotas[product_id]
+                else:
+                    quota.draining = product_id not in hot
+            drained = [
+                (product_id, quota.lease_id)
+                for product_id, quota in self._quotas.items()
+                if quota.draining and quota.in_flight == 0
+            ]
+            refill = [
+                product_id
+                for product_id in hot
+                if product_id not in self._quotas
+                or (
+                    not self._quotas[product_id].draining
+                    and self._quotas[product_id].remaining < block / 2
+                )
+            ]
+        db.commit()
+        with self._lock:
+            self._valid_until = renewing + settings.stock_escrow_stale_s / 2
+
+        for product_id, lease_id in drained:
+            with self._lock:
+                self._quotas.pop(product_id, None)
+            returned = stock_lease_repository.close(db, lease_id)
+            db.commit()
+            print(f"[stock_escrow] produto {product_id}: devolvidas {returned}")
+
+        for product_id in refill:
+            with self._lock:
+                quota = self._quotas.get(product_id)
+                missing = block - (quota.remaining if quota else 0)
+            lease_id, units = stock_lease_repository.grant(
+                db, product_id, self.holder, missing
+            )
+            db.commit()
+            if units:
+                with self._lock:
+                    quota = self._quotas.setdefault(product_id, _Quota(lease_id))
+                    quota.remaining += units
+                print(f"[stock_escrow] produto {product_id}: +{units} unidades")
+
+        stale_before = datetime.utcnow() - timedelta(
+            seconds=settings.stock_escrow_stale_s
+        )
+        for lease_id in stock_lease_repository.stale_leases(
+            db, settings.stock_escrow_stale_s, exclude_holder=self.holder
+        ):
+            returned = stock_lease_repository.close(
+                db, lease_id, renewed_before=stale_before
+            )
+            db.commit()
+            print(f"[stock_escrow] lease {lease_id} abandonada: devolvidas {returned}")
+
+    def release_all(self, db):
+        """Devolve todas as leases deste worker (encerramento)."""
+        with self._lock:
+            quotas = list(self._quotas.values())
+            self._quotas = {}
+        for quota in quotas:
+            stock_lease_repository.close(db, quota.lease_id)
+        db.commit()
+
+
+escrow = Escrow()
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def _loop():
+    interval = settings.stock_escrow_interval_ms / 1000
+    while not _stop.wait(interval):
+        db = SessionLocal()
+        try:
+            escrow.maintain(db)
+        except Exception as exc:
+            db.rollback()
+            print("[stock_escrow] erro na manutenção das leases:", exc)
+        finally:
+            db.close()
+
+
+def start():
+    global _thread  # pylint: disable=global-statement
+    if not settings.stock_escrow_enabled or _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="stock-escrow", daemon=True)
+    _thread.start()
+
+
+def stop():
+    global _thread  # pylint: disable=global-statement
+    if _thread is None:
+        return
+    _stop.set()
+    _thread.join()
+    _thread = None
+    db = SessionLocal()
+    try:
+        escrow.release_all(db)
+    finally:
+        db.close()
@@ -0,0 +1,144 @@
+"""
+Particionamento das reservas de estoque por hash do product_id.
+
+Com ``STOCK_PARTITIONS > 0`` cada pedido é dividido por shard e publicado em
+``stock.reserve.<shard>``. Cada shard tem uma fila com um único consumidor
+ativo, então cada SKU é alterado por um só consumidor por vez. Pedidos que
+cruzam shards são consolidados pelo ``stock_merge_worker``: se alguma parte
+falhar, as partes reservadas são estornadas via ``stock.release.<shard>``.
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.order import Order
+from app.models.stock_reservation_part import StockReservationPart
+from app.repositories import outbox_repository
+
+RESERVE_PREFIX = "stock.reserve."
+RELEASE_PREFIX = "stock.release."
+PART_RESERVED = "stock.part.reserved"
+PART_FAILED = "stock.part.failed"
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach).
+
+    Ao passar de N para N+1 shards, só ~1/(N+1) das chaves mudam de shard.
+    """
+    key &= _MASK64
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & _MASK64
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(product_id: int, partitions: int = None) -> int:
+    return jump_hash(product_id, partitions or settings.stock_partitions)
+
+
+def owned_shards(spec: str, partitions: int) -> list[int]:
+    """Interpreta ``"0,2,4-7"``; vazio significa todos os shards."""
+    if not spec.strip():
+        return list(range(partitions))
+    shards = set()
+    for part in spec.split(","):
+        start, _, end = part.strip().partition("-")
+        shards.update(range(int(start), int(end or start) + 1))
+    invalid = [shard for shard in shards if not 0 <= shard < partitions]
+    if invalid:
+        raise ValueError(f"Shards fora do intervalo 0..{partitions - 1}: {invalid}")
+    return sorted(shards)
+
+
+def split_items(items: list[dict], partitions: int = None) -> dict[int, list[dict]]:
+    parts: dict[int, list[dict]] = {}
+    for item in items:
+        parts.setdefault(shard_for(item["product_id"], partitions), []).append(item)
+    return dict(sorted(parts.items()))
+
+
+def reservation_events(data: dict, partitions: int = None) -> list[tuple[str, dict]]:
+    """Divide o pedido em uma mensagem ``stock.reserve.<shard>`` por shard."""
+    parts = split_items(data.get("items", []), partitions)
+    shards = list(parts)
+    return [
+        (
+            f"{RESERVE_PREFIX}{shard}",
+            {
+                "order_id": data.get("order_id"),
+                "email": data.get("email"),
+                "shard": shard,
+                "parts": shards,
+                "items": items,
+            },
+        )
+        for shard, items in parts.items()
+    ]
+
+
+def part_event(data: dict, error: Exception = None) -> tuple[str, dict]:
+    payload = {
+        "order_id": data.get("order_id"),
+        "email": data.get("email"),
+        "shard": data["shard"],
+        "parts": data["parts"],
+        "items": data["items"],
+    }
+    if error is not None:
+        payload["reason"] = str(error)
+        return PART_FAILED, payload
+    return PART_RESERVED, payload
+
+
+def merge_part(db: Session, part: dict, reserved: bool) -> bool:
+    """Registra o resultado de uma parte; retorna True se fechou o pedido.
+
+    O lock na linha do pedido serializa as partes do mesmo pedido. Os eventos
+    de conclusão (``order.processed`` ou os estornos) vão para o outbox na
+    mesma transação do registro da última parte.
+    """
+    order_id = part["order_id"]
+    db.execute(
+        select(Order.order_id).where(Order.order_id == order_id).with_for_update()
+    )
+
+    if db.get(StockReservationPart, (order_id, part["shard"])) is not None:
+        return False  # reentrega de uma parte já registrada
+
+    db.add(
+        StockReservationPart(
+            order_id=order_id,
+            shard=part["shard"],
+            status="reserved" if reserved else "failed",
+            items=part["items"],
+        )
+    )
+    db.flush()
+
+    recorded = db.scalars(
+        select(StockReservationPart).where(StockReservationPart.order_id == order_id)
+    ).all()
+    if len(recorded) < len(part["parts"]):
+        return False
+
+    if all(row.status == "reserved" for row in recorded):
+        items = [item for row in recorded for item in row.items]
+        outbox_repository.add_event(
+            db,
+            "order.processed",
+            {"order_id": order_id, "email": part.get("email"), "items": items},
+        )
+    else:
+        for row in recorded:
+            if row.status == "reserved":
+                outbox_repository.add_event(
+                    db,
+                    f"{RELEASE_PREFIX}{row.shard}",
+                    {"order_id": order_id, "shard": row.shard, "items": row.items},
+                )
+    return True
@@ -1,47 +1,397 @@
+from contextlib import contextmanager
+from sqlalchemy import Float, Integer, column, select, update, values
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.retry import is_retryable, run_with_retry
 from app.db.session import get_db
 from app.models.product import Product
-from app.models.stock_movement import StockMovement
+from app.repositories import stock_lease_repository
+from app.repositories.product_repository import weighted_average_cost
+from app.services import product_cache
+from app.services.stock_escrow import escrow
+from app.repositories.stock_movement_repository import (
+    MovementRecord,
+    MovementRow,
+    insert_movements,
+)
 
 
-def reserve_stock(items: list[dict]):
-    print("[stock_service] reservando estoque para itens:", items)
+class StockError(Exception):
+    """Erro de negócio na reserva: repetir a operação não resolve."""
+
+
+class ProductNotFoundError(StockError):
+    pass
+
+
+class InsufficientStockError(StockError):
+    pass
+
+
+@contextmanager
+def _session():
     db_gen = get_db()
     db = next(db_gen)
-    movements = []
     try:
-        for item in items:
-            product = (
-                db.query(Product)
-                .filter(Product.product_id == item["product_id"])
-                .with_for_update()
-                .one_or_none()
-            )
+        yield db
+    finally:
+        try:
+            next(db_gen)
+        except StopIteration:
+            pass
+
+
+def _merge_items(items: list[dict]) -> dict[int, int]:
+    """Soma as quantidades por produto, em ordem de product_id."""
+    merged: dict[int, int] = {}
+    for item in items:
+        merged[item["product_id"]] = (
+            merged.get(item["product_id"], 0) + item["quantity"]
+        )
+    return dict(sorted(merged.items()))
+
+
+def _lock_products(db: Session, product_ids) -> dict[int, Product]:
+    """Trava todas as linhas em uma consulta, sempre em ordem de product_id.
 
-            if not product:
-                raise Exception(f"Produto {item['product_id']} não encontrado")
+    Como todas as transações adquirem os locks na mesma ordem, dois pedidos
+    com os mesmos produtos em ordem diferente não entram em deadlock.
+    """
+    ids = sorted(set(product_ids))
+    if not ids:
+        return {}
+    products = (
+        db.query(Product)
+        .filter(Product.product_id.in_(ids))
+        .order_by(Product.product_id)
+        .with_for_update()
+        .all()
+    )
+    return {product.product_id: product for product in products}
 
-            if product.quantity_on_hand < item["quantity"]:
-                raise Exception(
-                    f"Estoque insuficiente para produto {product.product_id}"
+
+def _raise_unmatched(db: Session, quantities: dict[int, int], matched: set[int]):
+    missing = [product_id for product_id in quantities if product_id not in matched]
+    existing = set(
+        db.scalars(select(Product.product_id).where(Product.product_id.in_(missing)))
+    )
+    for product_id in missing:
+        if product_id not in existing:
+            raise ProductNotFoundError(f"Produto {product_id} não encontrado")
+    raise InsufficientStockError(f"Estoque insuficiente para produto {missing[0]}")
+
+
+def _conditional_decrement_stmt(quantities: dict[int, int]):
+    """UPDATE ... FROM (VALUES ...) que baixa todos os produtos do pedido."""
+    products = Product.__table__
+    requested = values(
+        column("product_id", Integer), column("quantity", Integer), name="v"
+    ).data(list(quantities.items()))
+    return (
+        update(products)
+        .where(
+            products.c.product_id == requested.c.product_id,
+            products.c.quantity_on_hand >= requested.c.quantity,
+        )
+        .values(
+            quantity_on_hand=products.c.quantity_on_hand - requested.c.quantity,
+            version=products.c.version + 1,
+        )
+        .returning(products.c.product_id)
+    )
+
+
+def _saidas(quantities: dict[int, int], leases: dict[int, int]) -> list[MovementRow]:
+    return [
+        MovementRow(product_id, quantity, "saida", leases.get(product_id))
+        for product_id, quantity in quantities.items()
+    ]
+
+
+def _touch(db: Session, product_ids):
+    """Marca produtos alterados para invalidar o cache de leitura no commit."""
+    db.info.setdefault("touched_products", set()).update(product_ids)
+
+
+def _decrement_conditional(db: Session, quantities: dict[int, int]):
+    """Baixa sem SELECT ... FOR UPDATE: a própria baixa checa o saldo.
+
+    Uma linha que não casa com ``quantity_on_hand >= :q`` significa estoque
+    insuficiente (ou produto inexistente); a exceção desfaz a transação.
+    """
+    if not quantities:
+        return
+    _touch(db, quantities)
+    if db.get_bind().dialect.name == "postgresql":
+        matched = set(db.scalars(_conditional_decrement_stmt(quantities)))
+    else:
+        products = Product.__table__
+        matched = set()
+        for product_id, quantity in quantities.items():
+            updated = db.execute(
+                update(products)
+                .where(
+                    products.c.product_id == product_id,
+                    products.c.quantity_on_hand >= quantity,
+                )
+                .values(
+                    quantity_on_hand=products.c.quantity_on_hand - quantity,
+                    version=products.c.version + 1,
                 )
+                .returning(products.c.product_id)
+            ).scalar_one_or_none()
+            if updated is not None:
+                matched.add(updated)
+
+    if len(matched) < len(quantities):
+        _raise_unmatched(db, quantities, matched)
+
 
-            product.quantity_on_hand -= item["quantity"]
+def _decrement_locked(
+    db: Session, quantities: dict[int, int], locked: dict[int, Product] = None
+):
+    if not quantities:
+        return
+    _touch(db, quantities)
+    if locked is None:
+        locked = _lock_products(db, quantities)
+    else:
+        # Produtos fora do lock do lote (ex.: cota do escrow esgotada).
+        missing = [product_id for product_id in quantities if product_id not in locked]
+        if missing:
+            locked.update(_lock_products(db, missing))
 
-            movement = StockMovement(
-                product_id=product.product_id,
-                quantity=item["quantity"],
-                movement_type="saida",
+    # Valida tudo antes de alterar qualquer linha.
+    for product_id, quantity in quantities.items():
+        product = locked.get(product_id)
+        if not product:
+            raise ProductNotFoundError(f"Produto {product_id} não encontrado")
+        if product.quantity_on_hand < quantity:
+            raise InsufficientStockError(
+                f"Estoque insuficiente para produto {product_id}"
             )
-            db.add(movement)
-            movements.append(movement)
 
-        db.commit()
-        return movements
+    for product_id, quantity in quantities.items():
+        locked[product_id].quantity_on_hand -= quantity
+        locked[product_id].version += 1
+    db.flush()
+
+
+def _reserve_items(
+    db: Session, items: list[dict], locked: dict[int, Product] = None
+) -> list[MovementRecord]:
+    quantities = _merge_items(items)
+    leases = escrow.take(quantities) if settings.stock_escrow_enabled else {}
+    try:
+        # Produtos cobertos pela cota do escrow não tocam na linha do produto.
+        rest = {pid: qty for pid, qty in quantities.items() if pid not in leases}
+        if settings.stock_reservation_engine == "conditional":
+            _decrement_conditional(db, rest)
+        else:
+            _decrement_locked(db, rest, locked)
+        movements = insert_movements(db, _saidas(quantities, leases))
     except Exception:
-        db.rollback()
+        escrow.give_back(leases, quantities)
         raise
-    finally:
+    if leases:
+        db.info.setdefault("escrow", []).append((leases, quantities))
+    if settings.stock_escrow_enabled:
+        # A taxa de reservas só conta o que foi gravado, não as retentativas.
+        db.info.setdefault("reserved", []).append(quantities)
+    return movements
+
+
+def _transaction(db: Session, fn):
+    def attempt():
         try:
-            next(db_gen)
-        except StopIteration:
-            pass
+            result = fn()
+            db.commit()
+        except Exception:
+            db.rollback()
+            db.info.pop("touched_products", None)
+            db.info.pop("reserved", None)
+            for leases, quantities in db.info.pop("escrow", ()):
+                escrow.give_back(leases, quantities)
+            raise
+        product_cache.invalidate(*db.info.pop("touched_products", ()))
+        for leases, _quantities in db.info.pop("escrow", ()):
+            escrow.settle(leases)
+        for quantities in db.info.pop("reserved", ()):
+            escrow.record(quantities)
+        return result
+
+    return run_with_retry(attempt)
+
+
+def reserve_stock(items: list[dict]):
+    print("[stock_service] reservando estoque para itens:", items)
+    with _session() as db:
+        return _transaction(db, lambda: _reserve_items(db, items))
+
+
+def _release_items(db: Session, items: list[dict]) -> list[MovementRecord]:
+    quantities = _merge_items(items)
+    _touch(db, quantities)
+    products = Product.__table__
+    for product_id, quantity in quantities.items():
+        db.execute(
+            update(products)
+            .where(products.c.product_id == product_id)
+            .values(
+                quantity_on_hand=products.c.quantity_on_hand + quantity,
+                version=products.c.version + 1,
+            )
+        )
+    return insert_movements(
+        db,
+        [
+            MovementRow(product_id, quantity, "estorno")
+            for product_id, quantity in quantities.items()
+        ],
+    )
+
+
+def release_stock(items: list[dict]) -> list[MovementRecord]:
+    """Devolve ao estoque itens reservados anteriormente (movimento de estorno)."""
+    print("[stock_service] estornando itens:", items)
+    with _session() as db:
+        return _transaction(db, lambda: _release_items(db, items))
+
+
+def _merge_receipts(items: list[dict]) -> dict[int, tuple[int, float]]:
+    """Soma as quantidades por produto; o custo vira a média ponderada das linhas."""
+    merged: dict[int, tuple[int, float]] = {}
+    for item in items:
+        quantity, cost = merged.get(item["product_id"], (0, 0.0))
+        total = quantity + item["quantity"]
+        merged[item["product_id"]] = (
+            total,
+            (quantity * cost + item["quantity"] * item["unit_cost"]) / total,
+        )
+    return dict(sorted(merged.items()))
+
+
+def _receipt_stmt(receipts: dict[int, tuple[int, float]], held: dict[int, int]):
+    """UPDATE ... FROM (VALUES ...) que dá entrada em todos os produtos.
+
+    ``held`` são as unidades de cada produto em leases do escrow.
+    """
+    products = Product.__table__
+    received = values(
+        column("product_id", Integer),
+        column("quantity", Integer),
+        column("unit_cost", Float),
+        column("held", Integer),
+        name="v",
+    ).data(
+        [(pid, qty, cost, held.get(pid, 0)) for pid, (qty, cost) in receipts.items()]
+    )
+    return (
+        update(products)
+        .where(products.c.product_id == received.c.product_id)
+        .values(
+            average_cost=weighted_average_cost(
+                received.c.quantity, received.c.unit_cost, received.c.held
+            ),
+            quantity_on_hand=products.c.quantity_on_hand + received.c.quantity,
+            version=products.c.version + 1,
+        )
+        .returning(
+            products.c.product_id,
+            products.c.quantity_on_hand,
+            products.c.average_cost,
+        )
+    )
+
+
+def _receive_items(db: Session, items: list[dict]) -> list[dict]:
+    receipts = _merge_receipts(items)
+    _touch(db, receipts)
+    # Concessão e devolução de lease mudam saldo e lease juntos, sem alterar
+    # a soma: ler as leases antes do UPDATE não perde nada.
+    held = stock_lease_repository.held_by_product(db, list(receipts))
+    if db.get_bind().dialect.name == "postgresql":
+        rows = db.execute(_receipt_stmt(receipts, held)).all()
+    else:
+        products = Product.__table__
+        rows = []
+        for product_id, (quantity, cost) in receipts.items():
+            row = db.execute(
+                update(products)
+                .where(products.c.product_id == product_id)
+                .values(
+                    average_cost=weighted_average_cost(
+                        quantity, cost, held.get(product_id, 0)
+                    ),
+                    quantity_on_hand=products.c.quantity_on_hand + quantity,
+                    version=products.c.version + 1,
+                )
+                .returning(
+                    products.c.product_id,
+                    products.c.quantity_on_hand,
+                    products.c.average_cost,
+                )
+            ).one_or_none()
+            if row is not None:
+                rows.append(row)
+
+    found = {row.product_id for row in rows}
+    for product_id in receipts:
+        if product_id not in found:
+            raise ProductNotFoundError(f"Produto {product_id} não encontrado")
+    insert_movements(
+        db,
+        [
+            MovementRow(product_id, quantity, "entrada", unit_cost=cost)
+            for product_id, (quantity, cost) in receipts.items()
+        ],
+    )
+    return sorted((row._asdict() for row in rows), key=lambda row: row["product_id"])
+
+
+def receive_stock(db: Session, items: list[dict]) -> list[dict]:
+    """Dá entrada nos itens em uma transação, atualizando saldo e custo médio.
+
+    Retorna ``product_id``/``quantity_on_hand``/``average_cost`` de cada produto.
+    """
+    print(f"[stock_service] entrada de {len(items)} itens")
+    return _transaction(db, lambda: _receive_items(db, items))
+
+
+def _reserve_orders(db: Session, orders: list[list[dict]]) -> list:
+    locked = None
+    if settings.stock_reservation_engine != "conditional":
+        # Trava de uma vez os produtos do lote inteiro, na ordem de product_id.
+        # Produtos atendidos pela cota do escrow ficam de fora.
+        leased = escrow.leased_products() if settings.stock_escrow_enabled else ()
+        locked = _lock_products(
+            db,
+            (
+                item["product_id"]
+                for items in orders
+                for item in items
+                if item["product_id"] not in leased
+            ),
+        )
+    results = []
+    for items in orders:
+        try:
+            with db.begin_nested():
+                results.append(_reserve_items(db, items, locked))
+        except Exception as exc:
+            if is_retryable(exc):
+                raise
+            results.append(exc)
+    return results
+
+
+def reserve_stock_batch(orders: list[list[dict]]) -> list:
+    """Reserva o estoque de vários pedidos em uma única transação.
+
+    Cada pedido roda em um savepoint: uma falha desfaz só aquele pedido e
+    aparece como a exceção na posição correspondente do resultado. Os demais
+    são gravados juntos em um único commit.
+    """
+    print(f"[stock_service] reservando estoque para {len(orders)} pedidos")
+    with _session() as db:
+        return _transaction(db, lambda: _reserve_orders(db, orders))
@@ -0,0 +1,56 @@
+"""
+Importa um catálogo de produtos em massa (CSV ou NDJSON).
+
+    python -m app.tools.import_products catalogo.csv
+    python -m app.tools.import_products catalogo.ndjson
+    zcat catalogo.csv.gz | python -m app.tools.import_products - --format csv
+
+CSV com cabeçalho ``sku,name,quantity_on_hand,average_cost``; NDJSON com um
+objeto por linha e os mesmos campos. Produtos com ``sku`` já cadastrado têm o
+saldo somado e o custo médio recalculado.
+"""
+
+import argparse
+import sys
+
+from app.db.session import SessionLocal
+from app.services.product_import import FORMATS, ImportReport, import_products
+
+
+def _progress(report: ImportReport):
+    print(
+        f"[import_products] {report.rows} linhas lidas, "
+        f"{report.imported} importadas, {report.rejected} com erro"
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="arquivo a importar ou '-' para stdin")
+    parser.add_argument(
+        "--format", choices=FORMATS, help="padrão: pela extensão do arquivo"
+    )
+    args = parser.parse_args(argv)
+
+    fmt = args.format or (
+        "ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv"
+    )
+    stream = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    db = SessionLocal()
+    try:
+        report = import_products(db, stream, fmt, on_progress=_progress)
+    finally:
+        db.close()
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+    for error in report.errors:
+        print(f"[import_products] linha {error['line']}: {error['error']}")
+    if report.rejected > len(report.errors):
+        print(f"[import_products] ... e mais {report.rejected - len(report.errors)}")
+    _progress(report)
+    return 1 if report.rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
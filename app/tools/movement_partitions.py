@@ -0,0 +1,60 @@
+"""
+Partições mensais de ``stock_movements`` (Postgres).
+
+    python -m app.tools.movement_partitions list
+    python -m app.tools.movement_partitions ensure --months-ahead 3
+    python -m app.tools.movement_partitions archive --before 2025-01
+    python -m app.tools.movement_partitions archive --before 2025-01 --dump-dir /backups
+
+``archive`` desanexa os meses anteriores a ``--before`` e os move para o
+schema ``archive`` (ou exporta para ``.csv.gz`` e remove, com ``--dump-dir``).
+Antes, o saldo e o custo médio de cada produto no fim do mês arquivado são
+gravados como uma ``abertura`` no mês seguinte, e os snapshots anteriores a
+ela são descartados; o razão ativo segue fechando sem os meses arquivados.
+"""
+
+import argparse
+import sys
+from datetime import date, datetime
+
+from app.core.config import settings
+from app.db import partitions
+from app.db.session import SessionLocal
+
+
+def _month(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    ensure = commands.add_parser("ensure")
+    ensure.add_argument(
+        "--months-ahead", type=int, default=settings.stock_movement_partitions_ahead
+    )
+    archive = commands.add_parser("archive")
+    archive.add_argument("--before", type=_month, required=True, help="AAAA-MM")
+    archive.add_argument("--schema", default="archive")
+    archive.add_argument("--dump-dir")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "ensure":
+            partitions.ensure_partitions(db, args.months_ahead)
+        elif args.command == "archive":
+            archived = partitions.archive_partitions(
+                db, args.before, schema=args.schema, dump_dir=args.dump_dir
+            )
+            print(f"[partitions] {len(archived)} partições arquivadas")
+        for name, month in partitions.movement_partitions(db):
+            print(f"[partitions] {name} ({month:%Y-%m})")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
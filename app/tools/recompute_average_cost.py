@@ -0,0 +1,33 @@
+"""
+Refaz o custo médio ponderado de todos os produtos a partir do histórico
+de movimentações (``stock_movements``), em uma única leitura ordenada.
+
+    python -m app.tools.recompute_average_cost
+
+Rode com a API e os workers parados: entradas gravadas durante a execução
+podem ser sobrescritas.
+"""
+
+import argparse
+import sys
+
+from app.db.session import SessionLocal
+from app.services.cost_service import recompute_average_costs
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        fixed = recompute_average_costs(db, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    print(f"[recompute_average_cost] {fixed} produtos com custo médio corrigido")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Concilia ``quantity_on_hand`` com o razão de movimentações.
+
+    python -m app.tools.reconcile_stock
+    python -m app.tools.reconcile_stock --workers 8 --full
+    python -m app.tools.reconcile_stock --every 300
+
+As divergências ficam em ``stock_discrepancies`` (por rodada) e o estado de
+cada produto em ``stock_reconciliation_state``.
+"""
+
+import argparse
+import sys
+import time
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services.reconciliation_service import run_reconciliation
+
+
+def _run_once(workers: int, full: bool) -> int:
+    db = SessionLocal()
+    try:
+        started = time.monotonic()
+        run = run_reconciliation(db, workers=workers, full=full)
+        print(
+            f"[reconcile_stock] rodada {run.run_id}: {run.products_checked} produtos "
+            f"conferidos, {run.discrepancies} divergências "
+            f"({time.monotonic() - started:.1f}s)"
+        )
+        return run.discrepancies
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers", type=int, default=settings.stock_reconciliation_workers
+    )
+    parser.add_argument("--full", action="store_true", help="confere todos os produtos")
+    parser.add_argument("--every", type=float, help="repete a cada N segundos")
+    args = parser.parse_args(argv)
+
+    discrepancies = _run_once(args.workers, args.full)
+    while args.every:
+        time.sleep(args.every)
+        try:
+            _run_once(args.workers, full=False)
+        except Exception as exc:
+            print("[reconcile_stock] error:", exc)
+    return 1 if discrepancies else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+"""
+Devolve as mensagens da dead-letter de uma fila (``<fila>.dead``) para a
+própria fila, com o contador de tentativas zerado.
+
+    python -m app.tools.replay_dead_letters stock_queue --limit 100
+    python -m app.tools.replay_dead_letters notify_queue --dry-run
+
+Corrija a causa antes (ex.: SMTP recusando o remetente): mensagens que
+falharem de novo voltam para a dead-letter depois de todas as tentativas.
+"""
+
+import argparse
+import sys
+
+from app.workers.retry import replay
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("queue")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="só lista, sem mover as mensagens"
+    )
+    args = parser.parse_args(argv)
+
+    moved = replay(args.queue, limit=args.limit, dry_run=args.dry_run)
+    action = "encontradas" if args.dry_run else "devolvidas"
+    print(f"[replay_dead_letters] {moved} mensagens {action} em {args.queue}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+Modo fused: o pipeline inteiro em um processo, sem broker.
+
+Com ``MESSAGING_MODE=fused`` os handlers registrados pelos workers (order,
+payment, stock, stock_merge e notify) rodam no mesmo processo do
+``outbox_relay``. Cada fila vira uma ``asyncio.Queue`` limitada a
+``FUSED_QUEUE_SIZE`` mensagens, ligada às routing keys com a mesma semântica
+do exchange topic ``stock_events`` (``*`` = uma palavra, ``#`` = zero ou
+mais). ``publish_event``/``publish_many`` entregam nessas filas: quem publica
+em uma fila cheia espera (backpressure).
+
+Cada fila tem seu próprio pool de threads (uma só com
+``x-single-active-consumer``): um estágio bloqueado publicando no seguinte
+não ocupa as threads de quem precisa consumir. Acks/nacks seguem a mesma
+convenção do ``WorkerRuntime``: sem ack explícito a mensagem é confirmada e
+``basic_nack(requeue=True)`` devolve à fila. Erro no handler reentrega a
+mensagem depois dos mesmos atrasos de ``WORKER_RETRY_*``, contados em
+memória; sem broker não há dead-letter, então mensagens rejeitadas, com
+``PermanentError`` ou sem tentativas restantes são registradas e descartadas.
+"""
+
+import asyncio
+import concurrent.futures
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Iterable, Optional, Tuple
+
+from app.core import rabbitmq
+from app.core.rabbitmq import topic_matches
+from app.core.config import settings
+from app.services import availability_service
+from app.workers import retry
+from app.workers.runtime import QueueHandler, register, registered_handlers
+
+WORKER_MODULES = (
+    "app.workers.order_worker",
+    "app.workers.payment_worker",
+    "app.workers.stock_worker",
+    "app.workers.stock_merge_worker",
+    "app.workers.notify_worker",
+)
+
+AVAILABILITY_QUEUE = "fused.availability"
+
+# Mensagens em memória não passam por codec: o corpo é o próprio payload.
+_PROPERTIES = SimpleNamespace(content_type=rabbitmq.LOCAL, content_encoding=None)
+
+
+class Delivery:
+    """Substituto do ``method`` do pika para uma mensagem em memória."""
+
+    __slots__ = ("delivery_tag", "routing_key", "attempts")
+
+    def __init__(self, delivery_tag: int, routing_key: str):
+        self.delivery_tag = delivery_tag
+        self.routing_key = routing_key
+        self.attempts = 0
+
+
+class FusedChannel:
+    """Canal entregue aos handlers: resolve as entregas de um lote."""
+
+    def __init__(self, pipeline: "FusedPipeline", handler, deliveries: list):
+        self._pipeline = pipeline
+        self._handler = handler
+        self._unsettled = {
+            method.delivery_tag: (method, body) for method, _props, body in deliveries
+        }
+
+    @property
+    def settled(self) -> bool:
+        return not self._unsettled
+
+    def basic_ack(self, delivery_tag=None, multiple=False):
+        self._settle(delivery_tag, requeue=False)
+
+    def basic_nack(self, delivery_tag=None, multiple=False, requeue=True):
+        self._settle(delivery_tag, requeue=requeue)
+
+    def basic_reject(self, delivery_tag=None, requeue=True):
+        self._settle(delivery_tag, requeue=requeue)
+
+    def schedule_retry(self, exc: Exception, delivery_tag=None):
+        tags = list(self._unsettled) if delivery_tag is None else [delivery_tag]
+        for tag in tags:
+            if tag in self._unsettled:
+                method, body = self._unsettled.pop(tag)
+                self._pipeline.retry_later(self._handler, method, body, exc)
+
+    def _settle(self, delivery_tag, requeue: bool):
+        if delivery_tag is None:
+            tags = list(self._unsettled)
+        elif delivery_tag in self._unsettled:
+            tags = [delivery_tag]
+        else:
+            return
+        for tag in tags:
+            method, body = self._unsettled.pop(tag)
+            if requeue:
+                self._pipeline.requeue(self._handler, method, body)
+
+
+class FusedPipeline:
+    def __init__(
+        self,
+        handlers: list[QueueHandler],
+        queue_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        name: str = "fused",
+    ):
+        self.handlers = handlers
+        self.name = name
+        self._queue_size = queue_size or settings.fused_queue_size
+        self._concurrency = concurrency or settings.worker_concurrency
+        self._routes: dict[str, list[QueueHandler]] = {}
+        self._routes_lock = threading.Lock()
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._executors: dict[str, ThreadPoolExecutor] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._delayed: set[asyncio.Task] = set()
+        # Mensagens enfileiradas ou em execução (só mexido pelo event loop).
+        self._pending = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._tags = 0
+        self._tags_lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread: Optional[threading.Thread] = None
+
+    def _threads_for(self, handler: QueueHandler) -> int:
+        if (handler.arguments or {}).get("x-single-active-consumer"):
+            return 1
+        return self._concurrency
+
+    def start(self) -> "FusedPipeline":
+        ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run_loop, args=(ready,), name=f"{self.name}-loop", daemon=True
+        )
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def _run_loop(self, ready: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        for handler in self.handlers:
+            threads = self._threads_for(handler)
+            self._queues[handler.queue] = asyncio.Queue(self._queue_size)
+            self._executors[handler.queue] = ThreadPoolExecutor(
+                max_workers=threads, thread_name_prefix=f"{self.name}-{handler.queue}"
+            )
+            self._tasks.extend(
+                self._loop.create_task(self._consume(handler)) for _ in range(threads)
+            )
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    def _route(self, routing_key: str) -> list[QueueHandler]:
+        with self._routes_lock:
+            handlers = self._routes.get(routing_key)
+            if handlers is None:
+                handlers = [
+                    handler
+                    for handler in self.handlers
+                    if any(
+                        topic_matches(pattern, routing_key)
+                        for pattern in handler.routing_keys
+                    )
+                ]
+                self._routes[routing_key] = handlers
+            return handlers
+
+    def _next_tag(self) -> int:
+        with self._tags_lock:
+            self._tags += 1
+            return self._tags
+
+    async def _put(self, handler: QueueHandler, method: Delivery, body):
+        self._pending += 1
+        self._idle.clear()
+        await self._queues[handler.queue].put((method, _PROPERTIES, body))
+
+    async def _put_all(self, events: list):
+        for handler, method, body in events:
+            await self._put(handler, method, body)
+
+    def publish_many(self, events: Iterable[Tuple[str, dict]]) -> int:
+        """Entrega os eventos nas filas ligadas; bloqueia enquanto alguma estiver cheia."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("publish_many não pode ser chamado no event loop")
+        routed = []
+        published = 0
+        for routing_key, payload in events:
+            published += 1
+            for handler in self._route(routing_key):
+                routed.append(
+                    (handler, Delivery(self._next_tag(), routing_key), payload)
+                )
+        if routed:
+            asyncio.run_coroutine_threadsafe(self._put_all(routed), self._loop).result()
+        return published
+
+    def requeue(self, handler: QueueHandler, method: Delivery, body):
+        # Não espera a vaga: quem devolve pode ser a própria thread do consumidor.
+        asyncio.run_coroutine_threadsafe(self._put(handler, method, body), self._loop)
+
+    def retry_later(self, handler: QueueHandler, method: Delivery, body, exc):
+        delays = retry.delays_ms()
+        if retry.is_permanent(exc) or method.attempts >= len(delays):
+            print(
+                f"[{self.name}] descartando {method.routing_key} de {handler.queue}"
+                f" após {method.attempts} tentativas: {exc!r}"
+            )
+            return
+        delay_ms = delays[method.attempts]
+        method.attempts += 1
+        asyncio.run_coroutine_threadsafe(
+            self._put_later(handler, method, body, delay_ms / 1000), self._loop
+        )
+
+    async def _put_later(self, handler: QueueHandler, method: Delivery, body, delay):
+        # Conta como pendente durante a espera: join() aguarda as retentativas.
+        self._pending += 1
+        self._idle.clear()
+        task = asyncio.current_task()
+        self._delayed.add(task)
+        try:
+            await asyncio.sleep(delay)
+            await self._put(handler, method, body)
+        finally:
+            self._delayed.discard(task)
+            self._pending -= 1
+            if not self._pending:
+                self._idle.set()
+
+    async def _next_batch(self, handler: QueueHandler, queue: asyncio.Queue) -> list:
+        batch = [await queue.get()]
+        if handler.batch_size <= 1:
+            return batch
+        deadline = self._loop.time() + handler.batch_wait_ms / 1000
+        while len(batch) < handler.batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _consume(self, handler: QueueHandler):
+        queue = self._queues[handler.queue]
+        executor = self._executors[handler.queue]
+        while True:
+            batch = await self._next_batch(handler, queue)
+            try:
+                await self._loop.run_in_executor(
+                    executor, self._execute, handler, batch
+                )
+            finally:
+                self._pending -= len(batch)
+                if not self._pending:
+                    self._idle.set()
+
+    def _execute(self, handler: QueueHandler, deliveries: list):
+        channel = FusedChannel(self, handler, deliveries)
+        try:
+            if handler.batch_size > 1:
+                handler.callback(channel, deliveries)
+            else:
+                handler.callback(channel, *deliveries[0])
+            if not channel.settled:
+                channel.basic_ack()
+        except Exception as exc:
+            print(f"[{self.name}] erro no handler de {handler.queue}: {exc}")
+            channel.schedule_retry(exc)
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Espera todas as filas esvaziarem; retorna False no timeout."""
+        future = asyncio.run_coroutine_threadsafe(self._idle.wait(), self._loop)
+        try:
+            future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return False
+        return True
+
+    async def _cancel_consumers(self):
+        tasks = self._tasks + list(self._delayed)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _wait_executors(self, timeout: Optional[float]) -> bool:
+        """Espera os handlers em execução (até ``timeout``); False se sobrou algum."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        waiter = threading.Thread(
+            target=lambda: [
+                executor.shutdown(wait=True) for executor in self._executors.values()
+            ],
+            name=f"{self.name}-shutdown",
+            daemon=True,
+        )
+        waiter.start()
+        waiter.join(timeout)
+        return not waiter.is_alive()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Drena as filas (até ``timeout``) e encerra o loop e as threads."""
+        if self._thread is None:
+            return
+        if not self.join(timeout):
+            print(f"[{self.name}] encerrando com mensagens pendentes")
+        asyncio.run_coroutine_threadsafe(self._cancel_consumers(), self._loop).result()
+        # O loop segue rodando: handlers em execução ainda publicam e fazem ack.
+        if not self._wait_executors(timeout):
+            print(f"[{self.name}] handlers ainda em execução após {timeout}s")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._thread = None
+
+
+def _apply_stock_update(_ch, _method, properties, body):
+    availability_service.apply_update(rabbitmq.decode(body, properties))
+
+
+def load_handlers() -> list[QueueHandler]:
+    """Importa os workers (que registram seus handlers) e retorna todos."""
+    for module in WORKER_MODULES:
+        importlib.import_module(module)
+    # Substitui o listener de stock.updated do cache de disponibilidade.
+    register(AVAILABILITY_QUEUE, routing_keys=["stock.updated"])(_apply_stock_update)
+    return registered_handlers()
+
+
+def start_pipeline(handlers: Optional[list[QueueHandler]] = None) -> FusedPipeline:
+    """Sobe o pipeline e passa a entregar as publicações do processo nele."""
+    pipeline = FusedPipeline(handlers or load_handlers()).start()
+    rabbitmq.use_local_bus(pipeline)
+    queues = ", ".join(handler.queue for handler in pipeline.handlers)
+    print(f"[fused] pipeline em processo com as filas {queues}")
+    return pipeline
+
+
+def stop_pipeline(pipeline: FusedPipeline):
+    """Drena as filas (os handlers ainda publicam no pipeline) e encerra."""
+    pipeline.stop(settings.worker_drain_timeout_s)
+    rabbitmq.use_local_bus(None)
@@ -1,51 +1,44 @@
-import json
-from app.core.rabbitmq import EXCHANGE_NAME, get_connection
 from app.core.config import settings
+from app.core.rabbitmq import decode
 from app.services.email_service import (
+    EmailRejected,
     send_order_processed_email,
+    send_order_rejected_email,
     send_payment_failed_email,
 )
+from app.workers.retry import PermanentError
+from app.workers.runtime import register, run_worker
 
 QUEUE_NAME = "notify_queue"
 
 
-def callback(ch, method, _properties, body):
+@register(
+    QUEUE_NAME, routing_keys=["order.processed", "order.rejected", "payment.failed"]
+)
+def callback(ch, method, properties, body):
+    data = decode(body, properties)
+    order_id = data.get("order_id")
+    email = data.get("email") or settings.notify_email
+    print("[notify_worker] Recebido:", data)
+
+    # Falhas transitórias (SMTP fora do ar, timeout) sobem para o runtime, que
+    # agenda a retentativa; recusas definitivas vão direto para a dead-letter.
     try:
-        data = json.loads(body)
-        order_id = data.get("order_id")
-        email = data.get("email") or settings.notify_email
-        print("[notify_worker] Recebido:", data)
-
         if method.routing_key == "order.processed":
             send_order_processed_email(order_id, email)
 
+        if method.routing_key == "order.rejected":
+            reason = data.get("reason") or "Motivo não informado"
+            send_order_rejected_email(order_id, email, reason)
+
         if method.routing_key == "payment.failed":
             reason = data.get("reason") or data.get("error") or "Motivo não informado"
             send_payment_failed_email(order_id, email, reason)
-
-    except Exception as exc:
-        print(f"[notify_worker] Erro ao processar mensagem: {exc}")
+    except EmailRejected as exc:
+        raise PermanentError(str(exc)) from exc
 
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
 
 if __name__ == "__main__":
-    connection = get_connection()
-    channel = connection.channel()
-
-    channel.exchange_declare(
-        exchange=EXCHANGE_NAME, exchange_type="topic", durable=True
-    )
-    channel.queue_declare(queue=QUEUE_NAME, durable=True)
-    channel.queue_bind(
-        exchange=EXCHANGE_NAME, queue=QUEUE_NAME, routing_key="order.processed"
-    )
-    channel.queue_bind(
-        exchange=EXCHANGE_NAME, queue=QUEUE_NAME, routing_key="payment.failed"
-    )
-
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue=QUEUE_NAME, on_message_callback=callback)
-
-    print("[notify_worker] aguardando mensagens...")
-    channel.start_consuming()
+    run_worker(QUEUE_NAME, name="notify_worker")
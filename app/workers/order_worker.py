@@ -1,33 +1,50 @@
-import json
-from app.core.rabbitmq import EXCHANGE_NAME, get_connection, publish_event
+from app.core.rabbitmq import decode, publish_event
+from app.db.session import SessionLocal
+from app.services import availability_service, claim_check
+from app.services.stock_service import StockError
+from app.workers.runtime import register, run_worker
 
 
 QUEUE_NAME = "order_queue"
 
 
-def callback(ch, method, _properties, body):
-    data = json.loads(body)
+def _check_availability(items: list[dict]):
+    db = SessionLocal()
+    try:
+        availability_service.check_availability(db, items)
+    finally:
+        db.close()
+
+
+@register(QUEUE_NAME, routing_keys=["order.created"])
+def callback(ch, method, properties, body):
+    data = decode(body, properties)
     print("[order_worker] Recebido:", data)
 
+    try:
+        _check_availability(claim_check.load_items(data))
+    except StockError as exc:
+        # Rejeita antes de cobrar o pagamento.
+        print(f"[order_worker] pedido {data.get('order_id')} rejeitado:", exc)
+        publish_event(
+            "order.rejected",
+            {
+                "order_id": data.get("order_id"),
+                "email": data.get("email"),
+                "reason": str(exc),
+            },
+        )
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        return
+    except Exception as exc:
+        # O cache é só uma checagem antecipada; a reserva decide no final.
+        print("[order_worker] falha ao checar disponibilidade:", exc)
+
     publish_event("payment.processing", data)
 
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
 
 if __name__ == "__main__":
-    connection = get_connection()
-    channel = connection.channel()
-    channel.exchange_declare(
-        exchange=EXCHANGE_NAME, exchange_type="topic", durable=True
-    )
-
-    channel.queue_declare(queue=QUEUE_NAME, durable=True)
-    channel.queue_bind(
-        exchange=EXCHANGE_NAME, queue=QUEUE_NAME, routing_key="order.created"
-    )
-
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue=QUEUE_NAME, on_message_callback=callback)
-
-    print("[order_worker] Esperando mensagens...")
-    channel.start_consuming()
+    availability_service.start_listener()
+    run_worker(QUEUE_NAME, name="order_worker")
@@ -0,0 +1,69 @@
+import time
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.rabbitmq import publish_many
+from app.db.session import SessionLocal
+from app.repositories import outbox_repository
+
+
+def relay_once(db: Session, batch_size: int) -> int:
+    """Publica um lote do outbox e remove os eventos publicados.
+
+    Entrega at-least-once: se o commit falhar depois da publicação, o lote
+    é publicado de novo na próxima rodada.
+    """
+    try:
+        events = outbox_repository.claim_batch(db, batch_size)
+        if not events:
+            db.rollback()
+            return 0
+
+        publish_many((event.routing_key, event.payload) for event in events)
+        outbox_repository.delete_events(db, [event.event_id for event in events])
+        db.commit()
+        return len(events)
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _relay_loop():
+    batch_size = settings.outbox_batch_size
+    poll_interval = settings.outbox_poll_interval_ms / 1000
+    print("[outbox_relay] drenando outbox...")
+    while True:
+        db = SessionLocal()
+        try:
+            relayed = relay_once(db, batch_size)
+        except Exception as exc:
+            print("[outbox_relay] error:", exc)
+            relayed = 0
+        finally:
+            db.close()
+
+        # Lote cheio: provavelmente há mais eventos, segue sem esperar.
+        if relayed < batch_size:
+            time.sleep(poll_interval)
+
+
+def run():
+    if settings.messaging_mode != "fused":
+        _relay_loop()
+        return
+
+    # Modo fused: este processo também roda os handlers de todos os workers.
+    from app.workers import fused, stock_worker
+
+    pipeline = fused.start_pipeline()
+    stock_worker.start_background()
+    try:
+        _relay_loop()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stock_worker.stop_background()
+        fused.stop_pipeline(pipeline)
+
+
+if __name__ == "__main__":
+    run()
@@ -1,16 +1,27 @@
-import json
-from app.core.rabbitmq import EXCHANGE_NAME, get_connection, publish_event
+from app.core.config import settings
+from app.core.rabbitmq import decode, publish_event, publish_many
+from app.services import claim_check
 from app.services.payment_service import process_payment
+from app.services.stock_partitioning import reservation_events
+from app.workers.runtime import register, run_worker
 
 QUEUE_NAME = "payment_queue"
 
 
-def callback(ch, method, _properties, body):
-    data = json.loads(body)
+@register(QUEUE_NAME, routing_keys=["payment.processing"])
+def callback(ch, method, properties, body):
+    data = decode(body, properties)
     print("[payment_worker] Recebido:", data)
     try:
         process_payment(data)
-        publish_event("payment.completed", data)
+        if settings.stock_partitions > 0:
+            # Roteia as partes do pedido direto para as filas de cada shard;
+            # cada parte leva as próprias linhas. Ninguém consome
+            # payment.completed nesse modo.
+            items = claim_check.load_items(data)
+            publish_many(reservation_events({**data, "items": items}))
+        else:
+            publish_event("payment.completed", data)
     except Exception as exc:
         print("[payment_worker] error:", exc)
         publish_event("payment.failed", data)
@@ -19,22 +30,4 @@ def callback(ch, method, _properties, body):
 
 
 if __name__ == "__main__":
-    connection = get_connection()
-    channel = connection.channel()
-
-    channel.exchange_declare(
-        exchange=EXCHANGE_NAME, exchange_type="topic", durable=True
-    )
-
-    channel.queue_declare(queue=QUEUE_NAME, durable=True)
-    channel.queue_bind(
-        exchange=EXCHANGE_NAME,
-        queue=QUEUE_NAME,
-        routing_key="payment.processing",
-    )
-
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue=QUEUE_NAME, on_message_callback=callback)
-
-    print("[payment_worker] Esperando mensagens...")
-    channel.start_consuming()
+    run_worker(QUEUE_NAME, name="payment_worker")
@@ -0,0 +1,183 @@
+"""
+Retentativas e dead-letter das filas dos workers.
+
+Para cada fila ``Q`` o runtime declara o exchange ``Q.retry`` (direct) com:
+
+- uma fila de espera por nível, ``Q.retry.<atraso>ms``, com ``x-message-ttl``
+  igual ao atraso e dead-letter de volta para ``Q`` pelo exchange padrão. Os
+  atrasos crescem exponencialmente: ``WORKER_RETRY_BASE_DELAY_MS`` ×
+  ``WORKER_RETRY_BACKOFF_FACTOR``^n, com ``WORKER_RETRY_ATTEMPTS`` níveis;
+- a fila ``Q.dead`` (routing key ``dead``) para mensagens venenosas.
+
+Quando o handler levanta exceção, a mensagem vai para o próximo nível com
+``x-retry-count`` incrementado e a routing key original no cabeçalho, e a
+entrega é confirmada: a fila principal segue andando enquanto a mensagem
+espera fora dela. ``PermanentError``, mensagens ilegíveis, rejeições sem
+requeue e tentativas esgotadas vão para ``Q.dead``; ``replay`` (CLI
+``python -m app.tools.replay_dead_letters``) as devolve para ``Q``.
+"""
+
+from typing import Optional
+
+import pika
+
+from app.core import rabbitmq
+from app.core.config import settings
+
+RETRY_COUNT = "x-retry-count"
+ORIGINAL_ROUTING_KEY = "x-original-routing-key"
+LAST_ERROR = "x-last-error"
+DEAD = "dead"
+
+
+class PermanentError(Exception):
+    """Falha que não some repetindo: a mensagem vai direto para a dead-letter."""
+
+
+def retry_exchange(queue: str) -> str:
+    return f"{queue}.retry"
+
+
+def dead_letter_queue(queue: str) -> str:
+    return f"{queue}.dead"
+
+
+def tier_queue(queue: str, delay_ms: int) -> str:
+    # O atraso no nome evita redeclarar uma fila existente com outro TTL.
+    return f"{queue}.retry.{delay_ms}ms"
+
+
+def delays_ms() -> list[int]:
+    return [
+        int(
+            settings.worker_retry_base_delay_ms
+            * settings.worker_retry_backoff_factor**n
+        )
+        for n in range(settings.worker_retry_attempts)
+    ]
+
+
+def declare(channel, queue: str):
+    """Declara o exchange de retry, os níveis de espera e a dead-letter de ``queue``."""
+    exchange = retry_exchange(queue)
+    channel.exchange_declare(exchange=exchange, exchange_type="direct", durable=True)
+    for delay in delays_ms():
+        name = tier_queue(queue, delay)
+        channel.queue_declare(
+            queue=name,
+            durable=True,
+            arguments={
+                "x-message-ttl": delay,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": queue,
+            },
+        )
+        channel.queue_bind(exchange=exchange, queue=name, routing_key=str(delay))
+    dead = dead_letter_queue(queue)
+    channel.queue_declare(queue=dead, durable=True)
+    channel.queue_bind(exchange=exchange, queue=dead, routing_key=DEAD)
+
+
+def _headers(properties) -> dict:
+    return dict(getattr(properties, "headers", None) or {})
+
+
+def retry_count(properties) -> int:
+    return _headers(properties).get(RETRY_COUNT, 0)
+
+
+def original_routing_key(method, properties) -> str:
+    headers = _headers(properties)
+    if ORIGINAL_ROUTING_KEY in headers:
+        return headers[ORIGINAL_ROUTING_KEY]
+    return method.routing_key
+
+
+def restore_routing_key(method, properties):
+    """Mensagens que voltam da espera chegam com a routing key da fila."""
+    headers = getattr(properties, "headers", None)
+    if headers and ORIGINAL_ROUTING_KEY in headers:
+        method.routing_key = headers[ORIGINAL_ROUTING_KEY]
+
+
+def _properties(properties, headers: dict) -> pika.BasicProperties:
+    return pika.BasicProperties(
+        content_type=getattr(properties, "content_type", None),
+        content_encoding=getattr(properties, "content_encoding", None),
+        delivery_mode=2,
+        headers=headers,
+    )
+
+
+def is_permanent(exc: BaseException) -> bool:
+    return isinstance(exc, (PermanentError, rabbitmq.InvalidMessage))
+
+
+def schedule(queue: str, method, properties, body: bytes, exc: BaseException) -> str:
+    """Publica a entrega no próximo nível de espera ou na dead-letter.
+
+    Retorna a routing key usada (o atraso em ms ou ``dead``).
+    """
+    headers = _headers(properties)
+    attempt = headers.get(RETRY_COUNT, 0)
+    delays = delays_ms()
+    headers[ORIGINAL_ROUTING_KEY] = original_routing_key(method, properties)
+    headers[LAST_ERROR] = repr(exc)[:500]
+    if is_permanent(exc) or attempt >= len(delays):
+        routing_key = DEAD
+    else:
+        routing_key = str(delays[attempt])
+        headers[RETRY_COUNT] = attempt + 1
+    rabbitmq.republish(
+        retry_exchange(queue), routing_key, body, _properties(properties, headers)
+    )
+    return routing_key
+
+
+def dead_letter(queue: str, method, properties, body: bytes, reason: str):
+    """Guarda a entrega em ``Q.dead`` (ex.: rejeitada pelo handler)."""
+    headers = _headers(properties)
+    headers[ORIGINAL_ROUTING_KEY] = original_routing_key(method, properties)
+    headers[LAST_ERROR] = reason[:500]
+    rabbitmq.republish(
+        retry_exchange(queue), DEAD, body, _properties(properties, headers)
+    )
+
+
+def replay(queue: str, limit: Optional[int] = None, dry_run: bool = False) -> int:
+    """Devolve as mensagens de ``Q.dead`` para ``Q`` com o contador zerado.
+
+    Cada mensagem é republicada e confirmada na mesma transação AMQP. Com
+    ``dry_run`` só lista; as mensagens voltam para a dead-letter ao fechar.
+    """
+    connection = rabbitmq.get_connection()
+    moved = 0
+    try:
+        channel = connection.channel()
+        channel.tx_select()
+        while limit is None or moved < limit:
+            method, properties, body = channel.basic_get(dead_letter_queue(queue))
+            if method is None:
+                break
+            headers = _headers(properties)
+            routing_key = original_routing_key(method, properties)
+            print(
+                f"[retry] {queue}: {routing_key} após {headers.get(RETRY_COUNT, 0)}"
+                f" tentativas, último erro: {headers.get(LAST_ERROR)}"
+            )
+            moved += 1
+            if dry_run:
+                continue
+            headers.pop(RETRY_COUNT, None)
+            headers[ORIGINAL_ROUTING_KEY] = routing_key
+            channel.basic_publish(
+                exchange="",
+                routing_key=queue,
+                body=body,
+                properties=_properties(properties, headers),
+            )
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+            channel.tx_commit()
+    finally:
+        connection.close()
+    return moved
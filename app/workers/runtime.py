@@ -0,0 +1,446 @@
+"""
+Runtime compartilhado dos workers.
+
+Cada worker registra o handler da sua fila com ``@register`` e chama
+``run_worker``. Handlers com ``batch_size > 1`` recebem as entregas em lotes
+de até ``batch_size`` mensagens ou ``batch_wait_ms`` de espera. O runtime
+cuida da conexão, da topologia, da execução dos handlers em um pool de
+threads limitado, dos acks cumulativos e do desligamento gracioso
+(SIGTERM/SIGINT). Exceções no handler e rejeições sem requeue seguem a
+topologia de retry/dead-letter de ``app/workers/retry.py``.
+"""
+
+import math
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.core.rabbitmq import EXCHANGE_NAME, declare_topology, get_connection
+from app.workers import retry
+
+
+@dataclass(frozen=True)
+class QueueHandler:
+    queue: str
+    routing_keys: tuple
+    callback: Callable
+    batch_size: int = 1
+    batch_wait_ms: int = 0
+    arguments: Optional[dict] = field(default=None, compare=False)
+
+
+_registry: dict[str, QueueHandler] = {}
+
+
+def register(
+    queue: str,
+    routing_keys: list[str],
+    batch_size: int = 1,
+    batch_wait_ms: int = 0,
+    arguments: Optional[dict] = None,
+):
+    """Registra ``callback(ch, method, properties, body)`` para a fila.
+
+    Com ``batch_size > 1`` a assinatura é ``callback(ch, deliveries)``, onde
+    ``deliveries`` é uma lista de ``(method, properties, body)``.
+    ``arguments`` vão para o ``queue_declare`` (ex.: x-single-active-consumer).
+    """
+
+    def decorator(callback):
+        _registry[queue] = QueueHandler(
+            queue, tuple(routing_keys), callback, batch_size, batch_wait_ms, arguments
+        )
+        return callback
+
+    return decorator
+
+
+def get_handler(queue: str) -> QueueHandler:
+    try:
+        return _registry[queue]
+    except KeyError:
+        raise LookupError(f"Nenhum handler registrado para a fila {queue}") from None
+
+
+def registered_handlers() -> list[QueueHandler]:
+    return list(_registry.values())
+
+
+class AckTracker:
+    """Consolida acks em ``basic_ack(multiple=True)``.
+
+    As delivery tags de um canal são crescentes, mas com handlers concorrentes
+    elas terminam fora de ordem. Um ack cumulativo só pode cobrir o prefixo
+    contíguo de entregas já resolvidas; nacks são enviados individualmente.
+    Só deve ser usado pela thread da conexão.
+    """
+
+    def __init__(self):
+        self._outstanding = deque()
+        self._settled: dict[int, bool] = {}
+        self._unsent_acks = 0
+
+    def __len__(self):
+        return len(self._outstanding)
+
+    @property
+    def unsent_acks(self) -> int:
+        return self._unsent_acks
+
+    def delivered(self, delivery_tag: int):
+        self._outstanding.append(delivery_tag)
+
+    def ack(self, delivery_tag: int):
+        self._settled[delivery_tag] = True
+        self._unsent_acks += 1
+
+    def nack(self, channel, delivery_tag: int, requeue: bool):
+        channel.basic_nack(delivery_tag=delivery_tag, multiple=False, requeue=requeue)
+        self._settled[delivery_tag] = False
+
+    def flush(self, channel) -> int:
+        """Envia um ack cumulativo para o prefixo resolvido; retorna a tag."""
+        last_ack = 0
+        while self._outstanding and self._outstanding[0] in self._settled:
+            tag = self._outstanding.popleft()
+            if self._settled.pop(tag):
+                last_ack = tag
+                self._unsent_acks -= 1
+        if last_ack:
+            channel.basic_ack(delivery_tag=last_ack, multiple=True)
+        return last_ack
+
+
+def adaptive_prefetch(
+    concurrency: int, latency_ms: float, buffer_ms: float, minimum: int, maximum: int
+) -> int:
+    """Prefetch que mantém ~``buffer_ms`` de trabalho na fila de cada thread.
+
+    Handlers rápidos ganham prefetch maior (escondendo o round trip até o
+    broker); handlers lentos ficam perto de ``concurrency`` e não retêm
+    mensagens que outras réplicas poderiam processar.
+    """
+    per_thread = 1 + math.ceil(buffer_ms / max(latency_ms, 0.1))
+    return max(minimum, concurrency, min(maximum, concurrency * per_thread))
+
+
+class DeliveryChannel:
+    """Canal entregue aos handlers no lugar do canal do pika.
+
+    O canal do pika não é thread-safe; os acks/nacks feitos aqui são
+    repassados para a thread da conexão. Nack/reject sem requeue manda a
+    entrega para a dead-letter da fila em vez de descartá-la.
+    """
+
+    def __init__(self, runtime: "WorkerRuntime", queue: str, deliveries: list):
+        self._runtime = runtime
+        self._queue = queue
+        self._unsettled = {
+            method.delivery_tag: (method, properties, body)
+            for method, properties, body in deliveries
+        }
+
+    @property
+    def settled(self) -> bool:
+        return not self._unsettled
+
+    def basic_ack(self, delivery_tag=None, multiple=False):
+        self._settle(delivery_tag, ack=True, requeue=False)
+
+    def basic_nack(self, delivery_tag=None, multiple=False, requeue=True):
+        self._settle(delivery_tag, ack=False, requeue=requeue)
+
+    def basic_reject(self, delivery_tag=None, requeue=True):
+        self._settle(delivery_tag, ack=False, requeue=requeue)
+
+    def schedule_retry(self, exc: Exception, delivery_tag=None):
+        """Agenda nova tentativa (ou dead-letter) da entrega ou das pendentes."""
+        tags = list(self._unsettled) if delivery_tag is None else [delivery_tag]
+        for tag in tags:
+            if tag not in self._unsettled:
+                continue
+            method, properties, body = self._unsettled[tag]
+            try:
+                target = retry.schedule(self._queue, method, properties, body, exc)
+            except Exception as publish_exc:
+                # Sem onde guardar a mensagem, ela volta para a fila.
+                print(f"[{self._runtime.name}] falha ao agendar retry: {publish_exc!r}")
+                self._settle(tag, ack=False, requeue=True)
+                continue
+            print(f"[{self._runtime.name}] {self._queue} #{tag} -> retry {target}")
+            self._settle(tag, ack=True, requeue=False)
+
+    def _settle(self, delivery_tag, ack: bool, requeue: bool):
+        # Sem delivery_tag, resolve todas as entregas ainda pendentes.
+        if delivery_tag is None:
+            tags = list(self._unsettled)
+        elif delivery_tag in self._unsettled:
+            tags = [delivery_tag]
+        else:
+            return
+        for tag in tags:
+            method, properties, body = self._unsettled.pop(tag)
+            if ack or requeue:
+                settle = partial(self._runtime.on_settled, tag, ack, requeue)
+            else:
+                settle = self._dead_letter(tag, method, properties, body)
+            self._runtime.threadsafe(settle)
+
+    def _dead_letter(self, tag, method, properties, body):
+        try:
+            retry.dead_letter(
+                self._queue, method, properties, body, "rejeitada pelo handler"
+            )
+        except Exception as exc:
+            print(f"[{self._runtime.name}] falha na dead-letter: {exc!r}")
+            return partial(self._runtime.on_settled, tag, False, True)
+        return partial(self._runtime.on_settled, tag, True, False)
+
+
+class WorkerRuntime:
+    def __init__(
+        self,
+        handlers: list[QueueHandler],
+        name: str = "worker",
+        prefetch_count: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ):
+        self.handlers = handlers
+        self.name = name
+        self.concurrency = concurrency or settings.worker_concurrency
+        # Um lote inteiro precisa caber no prefetch para ser montado.
+        self._min_prefetch = max(
+            [self.concurrency] + [handler.batch_size for handler in handlers]
+        )
+        self.prefetch_count = max(
+            prefetch_count or settings.worker_prefetch_count, self._min_prefetch
+        )
+        self._ack_interval = settings.worker_ack_interval_ms / 1000
+        self._poll_interval = min(
+            [self._ack_interval]
+            + [
+                handler.batch_wait_ms / 1000
+                for handler in handlers
+                if handler.batch_size > 1 and handler.batch_wait_ms > 0
+            ]
+        )
+        self._batches: dict[str, list] = {}
+        self._batch_started: dict[str, float] = {}
+        self._ack_batch_size = settings.worker_ack_batch_size
+        self._tracker = AckTracker()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix=name
+        )
+        self._connection = None
+        self._channel = None
+        self._consumer_tags: list[str] = []
+        self._in_flight = 0
+        self._stopping = False
+        self._latency_ms: Optional[float] = None
+        self._last_prefetch_change = 0.0
+        self._last_flush = time.monotonic()
+
+    def threadsafe(self, callback):
+        self._connection.add_callback_threadsafe(callback)
+
+    def request_stop(self, *_args):
+        """Para de consumir e drena as mensagens em andamento."""
+        self._stopping = True
+
+    def _setup(self):
+        self._connection = get_connection()
+        self._channel = self._connection.channel()
+        declare_topology(self._channel)
+        for handler in self.handlers:
+            self._channel.queue_declare(
+                queue=handler.queue, durable=True, arguments=handler.arguments
+            )
+            for routing_key in handler.routing_keys:
+                self._channel.queue_bind(
+                    exchange=EXCHANGE_NAME, queue=handler.queue, routing_key=routing_key
+                )
+            retry.declare(self._channel, handler.queue)
+        # global_qos: o limite vale para o canal inteiro (o pool de threads é
+        # compartilhado entre as filas) e pode ser alterado em tempo real.
+        self._channel.basic_qos(prefetch_count=self.prefetch_count, global_qos=True)
+        for handler in self.handlers:
+            self._consumer_tags.append(
+                self._channel.basic_consume(
+                    queue=handler.queue,
+                    on_message_callback=partial(self._on_message, handler),
+                )
+            )
+
+    def _on_message(self, handler, _channel, method, properties, body):
+        retry.restore_routing_key(method, properties)
+        self._tracker.delivered(method.delivery_tag)
+        self._in_flight += 1
+        if handler.batch_size <= 1:
+            self._executor.submit(self.execute, handler, [(method, properties, body)])
+            return
+
+        pending = self._batches.setdefault(handler.queue, [])
+        if not pending:
+            self._batch_started[handler.queue] = time.monotonic()
+        pending.append((method, properties, body))
+        if len(pending) >= handler.batch_size:
+            self._dispatch_batch(handler)
+
+    def _dispatch_batch(self, handler: QueueHandler):
+        deliveries = self._batches.pop(handler.queue, None)
+        if deliveries:
+            self._executor.submit(self.execute, handler, deliveries)
+
+    def _dispatch_due_batches(self, force: bool = False):
+        now = time.monotonic()
+        for handler in self.handlers:
+            if handler.queue not in self._batches:
+                continue
+            waited = now - self._batch_started[handler.queue]
+            if force or waited >= handler.batch_wait_ms / 1000:
+                self._dispatch_batch(handler)
+
+    def execute(self, handler: QueueHandler, deliveries: list):
+        channel = DeliveryChannel(self, handler.queue, deliveries)
+        start = time.perf_counter()
+        try:
+            if handler.batch_size > 1:
+                handler.callback(channel, deliveries)
+            else:
+                handler.callback(channel, *deliveries[0])
+            if not channel.settled:
+                channel.basic_ack()
+        except Exception as exc:
+            print(f"[{self.name}] erro no handler de {handler.queue}: {exc}")
+            channel.schedule_retry(exc)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.threadsafe(partial(self._on_completed, len(deliveries), elapsed_ms))
+
+    def on_settled(self, delivery_tag: int, ack: bool, requeue: bool):
+        if ack:
+            self._tracker.ack(delivery_tag)
+            if self._tracker.unsent_acks >= self._ack_batch_size:
+                self._flush_acks()
+        else:
+            self._tracker.nack(self._channel, delivery_tag, requeue)
+
+    def _on_completed(self, count: int, elapsed_ms: float):
+        self._in_flight -= count
+        per_message_ms = elapsed_ms / count
+        if self._latency_ms is None:
+            self._latency_ms = per_message_ms
+        else:
+            self._latency_ms += 0.2 * (per_message_ms - self._latency_ms)
+
+    def _flush_acks(self):
+        self._tracker.flush(self._channel)
+        self._last_flush = time.monotonic()
+
+    def _adapt_prefetch(self):
+        if not settings.worker_adaptive_prefetch or self._latency_ms is None:
+            return
+        now = time.monotonic()
+        if now - self._last_prefetch_change < 1.0:
+            return
+        target = adaptive_prefetch(
+            self.concurrency,
+            self._latency_ms,
+            settings.worker_prefetch_buffer_ms,
+            max(settings.worker_prefetch_min, self._min_prefetch),
+            settings.worker_prefetch_max,
+        )
+        if abs(target - self.prefetch_count) >= max(1, self.prefetch_count // 4):
+            print(
+                f"[{self.name}] prefetch {self.prefetch_count} -> {target} "
+                f"(latência média {self._latency_ms:.1f}ms)"
+            )
+            self._channel.basic_qos(prefetch_count=target, global_qos=True)
+            self.prefetch_count = target
+            self._last_prefetch_change = now
+
+    def _wait_handlers(self):
+        """Espera os handlers em execução, até ``WORKER_DRAIN_TIMEOUT_S``.
+
+        Eles ainda agendam acks com ``add_callback_threadsafe``: a conexão
+        segue processando eventos e só é fechada depois.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        waiter = threading.Thread(
+            target=self._executor.shutdown, name=f"{self.name}-shutdown", daemon=True
+        )
+        waiter.start()
+        deadline = time.monotonic() + settings.worker_drain_timeout_s
+        while waiter.is_alive() and time.monotonic() < deadline:
+            if self._connection is None or not self._connection.is_open:
+                waiter.join(deadline - time.monotonic())
+                break
+            try:
+                self._connection.process_data_events(time_limit=self._poll_interval)
+            except Exception as exc:
+                print(f"[{self.name}] conexão perdida ao drenar: {exc!r}")
+                waiter.join(deadline - time.monotonic())
+                break
+        if waiter.is_alive():
+            print(f"[{self.name}] handlers ainda em execução ao fechar a conexão")
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.request_stop)
+            signal.signal(signal.SIGINT, self.request_stop)
+
+        self._setup()
+        queues = ", ".join(handler.queue for handler in self.handlers)
+        print(f"[{self.name}] aguardando mensagens em {queues}...")
+
+        drain_deadline = None
+        try:
+            while True:
+                self._connection.process_data_events(time_limit=self._poll_interval)
+
+                if self._stopping and drain_deadline is None:
+                    print(f"[{self.name}] encerrando, drenando {self._in_flight}...")
+                    for consumer_tag in self._consumer_tags:
+                        self._channel.basic_cancel(consumer_tag)
+                    drain_deadline = time.monotonic() + settings.worker_drain_timeout_s
+                self._dispatch_due_batches(force=drain_deadline is not None)
+
+                if time.monotonic() - self._last_flush >= self._ack_interval:
+                    self._flush_acks()
+                if drain_deadline is None:
+                    self._adapt_prefetch()
+                elif self._in_flight == 0 or time.monotonic() >= drain_deadline:
+                    break
+        finally:
+            self._wait_handlers()
+            # Entregas ainda sem ack voltam para a fila quando o canal fecha.
+            if self._channel is not None and self._channel.is_open:
+                self._flush_acks()
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        print(f"[{self.name}] encerrado.")
+
+
+def _idle_until_stopped(name: str):
+    stop = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_args: stop.set())
+        signal.signal(signal.SIGINT, lambda *_args: stop.set())
+    print(f"[{name}] MESSAGING_MODE=fused: as filas rodam no outbox_relay, ocioso.")
+    stop.wait()
+
+
+def run_worker(*queues: str, name: Optional[str] = None):
+    handlers = [get_handler(queue) for queue in queues]
+    name = name or handlers[0].queue
+    if settings.messaging_mode == "fused":
+        # Não sai para não entrar em loop de restart no orquestrador.
+        _idle_until_stopped(name)
+        return
+    WorkerRuntime(handlers, name=name).run()
@@ -0,0 +1,24 @@
+import time
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services.snapshot_service import build_snapshots
+
+
+def run():
+    interval = settings.stock_snapshot_interval_s
+    print("[snapshot_worker] gerando snapshots de saldo...")
+    while True:
+        started = time.monotonic()
+        db = SessionLocal()
+        try:
+            count = build_snapshots(db)
+            print(f"[snapshot_worker] {count} produtos com snapshot novo")
+        except Exception as exc:
+            print("[snapshot_worker] error:", exc)
+        finally:
+            db.close()
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    run()
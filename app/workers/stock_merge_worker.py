@@ -0,0 +1,35 @@
+from app.core.rabbitmq import decode
+from app.db.session import SessionLocal
+from app.services import stock_partitioning
+from app.workers.runtime import register, run_worker
+
+
+QUEUE_NAME = "stock_merge_queue"
+
+
+@register(
+    QUEUE_NAME,
+    routing_keys=[stock_partitioning.PART_RESERVED, stock_partitioning.PART_FAILED],
+)
+def callback(ch, method, properties, body):
+    data = decode(body, properties)
+    reserved = method.routing_key == stock_partitioning.PART_RESERVED
+    print("[stock_merge_worker] Recebido:", data)
+
+    db = SessionLocal()
+    try:
+        completed = stock_partitioning.merge_part(db, data, reserved)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    if completed:
+        print(f"[stock_merge_worker] pedido {data.get('order_id')} consolidado")
+    ch.basic_ack(delivery_tag=method.delivery_tag)
+
+
+if __name__ == "__main__":
+    run_worker(QUEUE_NAME, name="stock_merge_worker")
@@ -1,48 +1,248 @@
-import json
-from app.core.rabbitmq import EXCHANGE_NAME, get_connection, publish_event
-from app.services.stock_service import reserve_stock
+import threading
+import time
+from collections import defaultdict
+from app.core.config import settings
+from app.core.rabbitmq import decode, publish_many
+from app.db import partitions
+from app.db.session import SessionLocal
+from app.services import claim_check, stock_escrow, stock_partitioning
+from app.services.availability_service import stock_updated_event
+from app.services.stock_service import (
+    StockError,
+    release_stock,
+    reserve_stock,
+    reserve_stock_batch,
+)
+from app.workers.retry import PermanentError
+from app.workers.runtime import register, run_worker
 
 
 QUEUE_NAME = "stock_queue"
+ROUTING_KEYS = ["payment.completed"]
 
+# Serializa o processamento de cada shard dentro do processo: junto com o
+# x-single-active-consumer da fila, garante um único escritor por SKU.
+_shard_locks = defaultdict(threading.Lock)
 
-def callback(ch, method, _properties, body):
-    data = json.loads(body)
+
+def _is_int(value) -> bool:
+    # bool é subclasse de int: True/False não são IDs nem quantidades.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_valid_order(data) -> bool:
+    """Pedido com itens bem formados (ou com referência de claim-check)."""
+    if not isinstance(data, dict):
+        return False
+    if "items_ref" in data:
+        return True
+    items = data.get("items")
+    return isinstance(items, list) and all(
+        isinstance(item, dict)
+        and _is_int(item.get("product_id"))
+        and _is_int(item.get("quantity"))
+        for item in items
+    )
+
+
+def callback(ch, method, properties, body):
+    data = decode(body, properties)
     print("[stock_worker] Recebido:", data)
+    if not _is_valid_order(data):
+        raise PermanentError(f"pedido malformado: {data!r}")
 
     try:
-        reserve_stock(data["items"])
-        publish_event(
-            "order.processed",
-            {
-                "order_id": data.get("order_id"),
-                "email": data.get("email"),
-                "items": data.get("items", []),
-            },
-        )
-    except Exception as exc:
-        print("[stock_worker] error:", exc)
+        movements = reserve_stock(claim_check.load_items(data))
+    except StockError as exc:
+        # Recusa de negócio: repetir não muda o resultado.
+        print(f"[stock_worker] pedido {data.get('order_id')} rejeitado:", exc)
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        return
+    except LookupError as exc:
+        raise PermanentError(str(exc)) from exc
+    # Demais falhas (banco fora do ar, deadlock) sobem para o runtime, que
+    # agenda a retentativa fora da fila principal.
 
+    _publish_after_commit(
+        [
+            ("order.processed", claim_check.forward(data)),
+            stock_updated_event(movements),
+        ]
+    )
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
 
-if __name__ == "__main__":
-    connection = get_connection()
-    channel = connection.channel()
+def _publish_after_commit(events: list):
+    try:
+        publish_many(events)
+    except Exception as exc:
+        # A reserva já foi gravada: repetir a mensagem reservaria de novo.
+        print("[stock_worker] error ao publicar após a reserva:", exc)
+
+
+def _decode(ch, deliveries) -> list:
+    # Uma mensagem malformada é rejeitada sozinha: se chegasse ao lote, a
+    # falha derrubaria a transação de todos os pedidos.
+    batch = []
+    for method, properties, body in deliveries:
+        try:
+            data = decode(body, properties)
+        except ValueError as exc:
+            print("[stock_worker] mensagem inválida:", exc)
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            continue
+        if not _is_valid_order(data):
+            print("[stock_worker] pedido malformado:", data)
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            continue
+        batch.append((method, data))
+    return batch
 
-    channel.exchange_declare(
-        exchange=EXCHANGE_NAME, exchange_type="topic", durable=True
-    )
 
-    channel.queue_declare(queue=QUEUE_NAME, durable=True)
-    channel.queue_bind(
-        exchange=EXCHANGE_NAME,
-        queue=QUEUE_NAME,
-        routing_key="payment.completed",
+def _reserve_and_publish(ch, batch: list):
+    if not batch:
+        return
+    # Pedidos em claim-check têm as linhas buscadas de uma vez. Falha do lote
+    # inteiro (ex.: commit) sobe para o runtime, que agenda a retentativa.
+    orders = claim_check.load_many([data for _method, data in batch])
+    reserved = iter(
+        reserve_stock_batch(
+            [items for items in orders if not isinstance(items, Exception)]
+        )
     )
+    results = [
+        items if isinstance(items, Exception) else next(reserved) for items in orders
+    ]
+
+    events = []
+    movements = []
+    for (_method, data), result in zip(batch, results):
+        failed = isinstance(result, Exception)
+        if failed:
+            print(f"[stock_worker] pedido {data.get('order_id')} rejeitado:", result)
+        else:
+            movements.extend(result)
+        if len(data.get("parts", ())) > 1:
+            # Pedido dividido entre shards: o stock_merge_worker consolida.
+            events.append(
+                stock_partitioning.part_event(data, result if failed else None)
+            )
+        elif not failed:
+            events.append(("order.processed", claim_check.forward(data)))
+    if movements:
+        events.append(stock_updated_event(movements))
+    if events:
+        _publish_after_commit(events)
+
+    for method, _data in batch:
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+
+def batch_callback(ch, deliveries):
+    """Reserva um lote de pedidos em uma transação e confirma tudo após o commit."""
+    batch = _decode(ch, deliveries)
+    print(f"[stock_worker] Recebido lote com {len(batch)} pedidos")
+    _reserve_and_publish(ch, batch)
+
+
+def shard_batch_callback(ch, deliveries):
+    """Processa reservas e estornos de um shard, um lote por vez."""
+    batch = _decode(ch, deliveries)
+    if not batch:
+        return
+    shard = int(batch[0][0].routing_key.rsplit(".", 1)[1])
+    with _shard_locks[shard]:
+        reservations = []
+        for method, data in batch:
+            if not method.routing_key.startswith(stock_partitioning.RELEASE_PREFIX):
+                reservations.append((method, data))
+                continue
+            try:
+                movements = release_stock(data["items"])
+            except Exception as exc:
+                print("[stock_worker] error no estorno:", exc)
+                ch.schedule_retry(exc, delivery_tag=method.delivery_tag)
+                continue
+            _publish_after_commit([stock_updated_event(movements, sign=1)])
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+        print(f"[stock_worker] shard {shard}: lote com {len(reservations)} pedidos")
+        _reserve_and_publish(ch, reservations)
+
 
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue=QUEUE_NAME, on_message_callback=callback)
+def shard_callback(ch, method, properties, body):
+    shard_batch_callback(ch, [(method, properties, body)])
 
-    print("[stock_worker] Esperando mensagens...")
-    channel.start_consuming()
+
+def _register_handlers() -> list[str]:
+    batching = settings.stock_batch_size > 1
+    batch_options = {}
+    if batching:
+        batch_options = {
+            "batch_size": settings.stock_batch_size,
+            "batch_wait_ms": settings.stock_batch_wait_ms,
+        }
+
+    if settings.stock_partitions <= 0:
+        register(QUEUE_NAME, routing_keys=ROUTING_KEYS, **batch_options)(
+            batch_callback if batching else callback
+        )
+        return [QUEUE_NAME]
+
+    queues = []
+    for shard in stock_partitioning.owned_shards(
+        settings.stock_worker_shards, settings.stock_partitions
+    ):
+        queue = f"{QUEUE_NAME}.{shard}"
+        register(
+            queue,
+            routing_keys=[
+                f"{stock_partitioning.RESERVE_PREFIX}{shard}",
+                f"{stock_partitioning.RELEASE_PREFIX}{shard}",
+            ],
+            arguments={"x-single-active-consumer": True},
+            **batch_options,
+        )(shard_batch_callback if batching else shard_callback)
+        queues.append(queue)
+    return queues
+
+
+QUEUES = _register_handlers()
+
+
+PARTITION_CHECK_INTERVAL_S = 6 * 3600
+
+
+def _ensure_partitions():
+    db = SessionLocal()
+    try:
+        partitions.ensure_partitions(db, settings.stock_movement_partitions_ahead)
+    except Exception as exc:
+        # A partição DEFAULT recebe os movimentos até a próxima tentativa.
+        db.rollback()
+        print("[stock_worker] erro ao criar partições de movimentações:", exc)
+    finally:
+        db.close()
+
+
+def _partition_loop():
+    while True:
+        _ensure_partitions()
+        time.sleep(PARTITION_CHECK_INTERVAL_S)
+
+
+def start_background():
+    """Partições de movimentações e escrow (também usado no modo fused)."""
+    threading.Thread(target=_partition_loop, name="partitions", daemon=True).start()
+    stock_escrow.start()
+
+
+def stop_background():
+    stock_escrow.stop()
+
+
+if __name__ == "__main__":
+    start_background()
+    try:
+        run_worker(*QUEUES, name="stock_worker")
+    finally:
+        stop_background()
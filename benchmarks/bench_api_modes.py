@@ -0,0 +1,113 @@
+"""
+Benchmark de carga da API nos modos ``API_MODE=sync`` e ``API_MODE=async``.
+
+Sobe um uvicorn para cada modo (com o ``.env``/ambiente atual, ou seja,
+PostgreSQL e RabbitMQ reais), cria um produto e dispara ``POST /orders/``
+com ``--concurrency`` requisições simultâneas. Reporta requisições/s e
+latências p50/p99:
+
+    python -m benchmarks.bench_api_modes --requests 5000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def wait_ready(base_url: str, timeout_s: float = 30.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/openapi.json").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"API não respondeu em {base_url}")
+
+
+async def load(base_url: str, total: int, concurrency: int) -> tuple:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        product = await client.post(
+            "/products/", json={"name": "bench", "quantity_on_hand": 10**9}
+        )
+        order = {
+            "email": "bench@teste.com",
+            "items": [{"product_id": product.json()["product_id"], "quantity": 1}],
+        }
+        latencies = []
+        errors = 0
+        pending = iter(range(total))
+
+        async def user():
+            nonlocal errors
+            for _ in pending:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/orders/", json=order, timeout=30)
+                    errors += response.status_code != 201
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+
+def run_mode(mode: str, args) -> None:
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = {**os.environ, "API_MODE": mode, "AVAILABILITY_LISTENER_ENABLED": "false"}
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(args.port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+    try:
+        wait_ready(base_url)
+        latencies, errors, elapsed = asyncio.run(
+            load(base_url, args.requests, args.concurrency)
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+    cuts = statistics.quantiles(latencies, n=100)
+    print(
+        f"{mode:<6} {len(latencies) / elapsed:>8.0f} req/s  "
+        f"p50={cuts[49] * 1000:.1f}ms p99={cuts[98] * 1000:.1f}ms erros={errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        run_mode(mode, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark dos codecs de mensagem (``app/core/rabbitmq.py``).
+
+Mede encode/decode e tamanho do corpo de um ``order.created`` com N linhas
+para JSON e packed, com e sem zlib:
+
+    python -m benchmarks.bench_codecs --lines 1 10 100 1000 5000
+"""
+
+import argparse
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.core import rabbitmq
+
+
+def _payload(lines: int) -> dict:
+    return {
+        "order_id": 123456,
+        "email": "cliente@teste.com",
+        "items": [
+            {"product_id": 100_000 + i * 7, "quantity": 1 + i % 5} for i in range(lines)
+        ],
+    }
+
+
+def _time_per_op(fn, min_time: float = 0.2) -> float:
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / runs
+
+
+def run(lines: int, compress_min_bytes: int) -> dict:
+    payload = _payload(lines)
+    results = {}
+    for codec in rabbitmq.CODECS:
+        for threshold in (0, compress_min_bytes):
+            name = codec if not threshold else f"{codec}+zlib"
+            if name in results:
+                continue
+            with patch.object(
+                rabbitmq.settings, "rabbitmq_compress_min_bytes", threshold
+            ):
+                body, content_type, content_encoding = rabbitmq.encode(payload, codec)
+                properties = SimpleNamespace(
+                    content_type=content_type, content_encoding=content_encoding
+                )
+                assert rabbitmq.decode(body, properties) == payload
+                results[name] = {
+                    "bytes": len(body),
+                    "encode_us": _time_per_op(lambda: rabbitmq.encode(payload, codec))
+                    * 1e6,
+                    "decode_us": _time_per_op(lambda: rabbitmq.decode(body, properties))
+                    * 1e6,
+                }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--compress-min-bytes", type=int, default=1)
+    args = parser.parse_args()
+
+    for lines in args.lines:
+        results = run(lines, args.compress_min_bytes)
+        baseline = results["json"]
+        print(f"--- {lines} linhas")
+        for name, result in results.items():
+            total = result["encode_us"] + result["decode_us"]
+            print(
+                f"{name:<12} {result['bytes']:>9} bytes"
+                f" ({result['bytes'] / baseline['bytes']:>5.2f}x)"
+                f"  encode {result['encode_us']:>9.1f} us"
+                f"  decode {result['decode_us']:>9.1f} us"
+                f"  total {total:>9.1f} us"
+            )
+
+
+if __name__ == "__main__":
+    main()
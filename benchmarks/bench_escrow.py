@@ -0,0 +1,70 @@
+"""
+Benchmark do modo escrow em um único SKU quente (requer PostgreSQL).
+
+Roda as mesmas reservas concorrentes com ``STOCK_ESCROW_ENABLED`` desligado
+(toda reserva baixa a linha do produto) e ligado (reservas atendidas pela
+cota local, só gravando a movimentação):
+
+    python -m benchmarks.bench_escrow --threads 32 --orders 20000
+"""
+
+import argparse
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.session import DATABASE_URL
+from app.services import stock_escrow, stock_service
+from benchmarks.bench_reserve_contention import report, run_strategy, seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--block", type=int, default=500)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url, pool_size=args.threads + 4)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    product_ids = seed(session_factory, 1)
+
+    def session_gen():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    for enabled in (False, True):
+        with patch.multiple(
+            settings,
+            stock_escrow_enabled=enabled,
+            stock_escrow_block=args.block,
+            stock_escrow_interval_ms=50,
+        ), patch.object(stock_service, "get_db", side_effect=session_gen), patch.object(
+            stock_escrow, "SessionLocal", session_factory
+        ), patch(
+            "builtins.print"
+        ):
+            stock_escrow.start()
+            try:
+                stats, elapsed = run_strategy(
+                    stock_service.reserve_stock,
+                    args.threads,
+                    args.orders,
+                    product_ids,
+                    1,
+                )
+            finally:
+                stock_escrow.stop()
+        report("escrow" if enabled else "sem escrow", stats, elapsed)
+
+
+if __name__ == "__main__":
+    main()
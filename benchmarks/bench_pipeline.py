@@ -0,0 +1,301 @@
+"""
+Benchmark do pipeline completo (requer PostgreSQL; dispensa o RabbitMQ).
+
+Os pedidos são criados pelo ``order_service`` (pedido, itens e outbox),
+publicados pelo ``relay_once`` do ``outbox_relay`` e passam pelos workers
+order → payment → stock → notify, cada um em um ``WorkerRuntime`` próprio
+ligado ao broker em memória (``app/core/memory_broker.py``). Reporta
+pedidos/s, histogramas de latência por estágio (espera na fila e tempo no
+handler), a latência ponta a ponta e as transações no banco por estágio:
+
+    python -m benchmarks.bench_pipeline --orders 2000 --skus 64 --rtt-ms 0.2
+
+As variáveis de ambiente de sempre (``STOCK_BATCH_SIZE``, ``STOCK_PARTITIONS``,
+``RABBITMQ_CODEC``, ``WORKER_PREFETCH_COUNT``...) valem aqui, então cada
+mudança de desempenho pode ser medida com e sem ela.
+"""
+
+import argparse
+import bisect
+import dataclasses
+import math
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+from app.core import rabbitmq
+from app.core.config import settings
+from app.core.memory_broker import MemoryBroker
+from app.db.base import Base
+from app.db.session import SessionLocal, engine
+from app.services import order_service
+from app.workers import (
+    notify_worker,
+    order_worker,
+    outbox_relay,
+    payment_worker,
+    stock_merge_worker,
+    stock_worker,
+)
+from app.workers.runtime import WorkerRuntime, get_handler
+from benchmarks.bench_reserve_contention import seed
+
+_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, math.inf]
+
+
+def _stage(thread_name: str) -> str:
+    # Threads dos runtimes se chamam "<fila>_<n>"; as demais "<papel>_<n>".
+    return thread_name.rsplit("_", 1)[0]
+
+
+def _queues() -> list[str]:
+    queues = [order_worker.QUEUE_NAME, payment_worker.QUEUE_NAME, *stock_worker.QUEUES]
+    if settings.stock_partitions > 0:
+        queues.append(stock_merge_worker.QUEUE_NAME)
+    return queues + [notify_worker.QUEUE_NAME]
+
+
+class Recorder:
+    """Tempos dos handlers, conclusões e transações, por estágio."""
+
+    def __init__(self, orders: int):
+        self.orders = orders
+        self.created_at: dict[int, float] = {}
+        self.handler_ms: dict[str, list[float]] = defaultdict(list)
+        self.end_to_end_ms: list[float] = []
+        self.outcomes: Counter = Counter()
+        self.completed: set[int] = set()
+        self.duplicates = 0
+        self.commits: Counter = Counter()
+        self.rollbacks: Counter = Counter()
+        self.finished_at = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def timed(self, handler):
+        def callback(*args):
+            start = time.perf_counter()
+            try:
+                return handler.callback(*args)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                self.handler_ms[handler.queue].append(elapsed)
+
+        return dataclasses.replace(handler, callback=callback)
+
+    def completion(self, handler):
+        """Conta os pedidos que chegam ao notify (processado, recusado ou falho)."""
+
+        def callback(ch, method, properties, body):
+            handler.callback(ch, method, properties, body)
+            order_id = rabbitmq.decode(body, properties).get("order_id")
+            now = time.perf_counter()
+            with self._lock:
+                if order_id in self.completed:
+                    # Redelivery (at-least-once): o pedido já tinha chegado.
+                    self.duplicates += 1
+                    return
+                self.completed.add(order_id)
+                self.outcomes[method.routing_key] += 1
+                if order_id in self.created_at:
+                    self.end_to_end_ms.append((now - self.created_at[order_id]) * 1000)
+                if len(self.completed) >= self.orders:
+                    self.finished_at = now
+                    self.done.set()
+
+        return dataclasses.replace(handler, callback=callback)
+
+    def on_commit(self, _connection):
+        self.commits[_stage(threading.current_thread().name)] += 1
+
+    def on_rollback(self, _connection):
+        self.rollbacks[_stage(threading.current_thread().name)] += 1
+
+
+def _workload(orders: int, product_ids: list[int], items_per_order: int, rng):
+    return [
+        [
+            {"product_id": product_id, "quantity": 1}
+            for product_id in rng.sample(product_ids, items_per_order)
+        ]
+        for _ in range(orders)
+    ]
+
+
+def _relay(stop: threading.Event):
+    batch_size = settings.outbox_batch_size
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            relayed = outbox_relay.relay_once(db, batch_size)
+        except Exception:
+            # Como no outbox_relay: o lote fica no outbox para a próxima rodada.
+            relayed = 0
+        finally:
+            db.close()
+        if relayed < batch_size:
+            stop.wait(settings.outbox_poll_interval_ms / 1000)
+
+
+def run(args) -> tuple:
+    broker = MemoryBroker(
+        rtt_ms=args.rtt_ms,
+        connect_ms=args.connect_ms,
+        publish_failure_rate=args.publish_failure_rate,
+        redelivery_rate=args.redelivery_rate,
+        seed=args.seed,
+    )
+    recorder = Recorder(args.orders)
+    rng = random.Random(args.seed)
+    product_ids = seed(SessionLocal, args.skus)
+    workload = _workload(args.orders, product_ids, args.items_per_order, rng)
+
+    runtimes = []
+    for queue in _queues():
+        handler = recorder.timed(get_handler(queue))
+        if queue == notify_worker.QUEUE_NAME:
+            handler = recorder.completion(handler)
+        runtimes.append(
+            WorkerRuntime([handler], name=queue, concurrency=args.concurrency)
+        )
+
+    def create(items):
+        db = SessionLocal()
+        try:
+            order = order_service.create_order(db, items, "bench@teste.com")
+            recorder.created_at[order.order_id] = time.perf_counter()
+        finally:
+            db.close()
+
+    rabbitmq.use_connection_factory(broker.connect)
+    event.listen(engine, "commit", recorder.on_commit)
+    event.listen(engine, "rollback", recorder.on_rollback)
+    stop_relay = threading.Event()
+    relay = threading.Thread(target=_relay, args=(stop_relay,), name="relay_0")
+    threads = [
+        threading.Thread(target=runtime.run, name=f"{runtime.name}_loop")
+        for runtime in runtimes
+    ]
+    with patch("builtins.print"), patch.object(settings, "smtp_host", ""):
+        try:
+            for thread in threads:
+                thread.start()
+            with broker.cond:
+                broker.cond.wait_for(
+                    lambda: all(broker.consumer_count(queue) for queue in _queues()),
+                    timeout=10,
+                )
+
+            start = time.perf_counter()
+            relay.start()
+            with ThreadPoolExecutor(
+                args.producers, thread_name_prefix="producer"
+            ) as pool:
+                list(pool.map(create, workload))
+            finished = recorder.done.wait(args.timeout)
+            elapsed = (recorder.finished_at or time.perf_counter()) - start
+        finally:
+            stop_relay.set()
+            if relay.is_alive():
+                relay.join()
+            for runtime in runtimes:
+                runtime.request_stop()
+            for thread in threads:
+                thread.join()
+            event.remove(engine, "commit", recorder.on_commit)
+            event.remove(engine, "rollback", recorder.on_rollback)
+            rabbitmq.use_connection_factory(None)
+
+    return recorder, broker, elapsed, finished
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def histogram(name: str, samples: list[float], width: int = 40):
+    if not samples:
+        print(f"  {name:<10} sem amostras")
+        return
+    ordered = sorted(samples)
+    print(
+        f"  {name:<10} n={len(ordered):<7} p50={_percentile(ordered, 0.5):.2f}"
+        f"  p90={_percentile(ordered, 0.9):.2f}  p99={_percentile(ordered, 0.99):.2f}"
+        f"  max={ordered[-1]:.2f} ms"
+    )
+    counts = [0] * len(_BUCKETS_MS)
+    for sample in ordered:
+        counts[bisect.bisect_left(_BUCKETS_MS, sample)] += 1
+    peak = max(counts)
+    for bound, count in zip(_BUCKETS_MS, counts):
+        if count:
+            bar = "#" * math.ceil(width * count / peak)
+            print(f"    <= {bound:>6} ms {bar:<{width}} {count}")
+
+
+def report(args, recorder: Recorder, broker: MemoryBroker, elapsed, finished):
+    completed = len(recorder.completed)
+    print(
+        f"{completed}/{args.orders} pedidos em {elapsed:.2f}s:"
+        f" {completed / elapsed:.0f} pedidos/s"
+        + ("" if finished else f" (timeout de {args.timeout}s)")
+    )
+    print("  desfechos:", dict(recorder.outcomes), f"duplicados={recorder.duplicates}")
+
+    stats = broker.queue_stats()
+    for queue in _queues():
+        queue_stats = stats.get(queue, {})
+        retried = sum(
+            queue_stats.get("published", 0)
+            for name, queue_stats in stats.items()
+            if name.startswith(f"{queue}.retry.")
+        )
+        dead = stats.get(f"{queue}.dead", {}).get("ready", 0)
+        print(
+            f"--- {queue}: entregues={queue_stats.get('delivered', 0)}"
+            f" devolvidas={queue_stats.get('requeued', 0)}"
+            f" retry={retried} dead-letter={dead}"
+        )
+        histogram("fila", queue_stats.get("wait_ms", []))
+        histogram("handler", recorder.handler_ms[queue])
+    print("--- ponta a ponta (commit do pedido → notify)")
+    histogram("pedido", recorder.end_to_end_ms)
+
+    print("--- transações no banco (commits / rollbacks)")
+    for stage in sorted(set(recorder.commits) | set(recorder.rollbacks)):
+        commits = recorder.commits[stage]
+        print(
+            f"  {stage:<20} {commits:>8} / {recorder.rollbacks[stage]:<6}"
+            f" ({commits / max(completed, 1):.2f} commits/pedido)"
+        )
+    print(
+        f"  conexões ao broker: {broker.connections}, falhas injetadas: {broker.failures}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--skus", type=int, default=64)
+    parser.add_argument("--items-per-order", type=int, default=3)
+    parser.add_argument("--producers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--rtt-ms", type=float, default=0.0)
+    parser.add_argument("--connect-ms", type=float, default=0.0)
+    parser.add_argument("--publish-failure-rate", type=float, default=0.0)
+    parser.add_argument("--redelivery-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(engine)
+    report(args, *run(args))
+
+
+if __name__ == "__main__":
+    main()
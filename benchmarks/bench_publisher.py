@@ -0,0 +1,83 @@
+"""
+Benchmark de publicação: conexão por evento (comportamento antigo) vs. pool.
+
+Usa o broker em memória (``app/core/memory_broker.py``) com latência de
+handshake e de round trip configuráveis, então não precisa de RabbitMQ rodando:
+
+    python -m benchmarks.bench_publisher --events 2000 --handshake-ms 3 --rtt-ms 0.3
+"""
+
+import argparse
+import json
+import time
+
+import pika
+
+from app.core import rabbitmq
+from app.core.memory_broker import MemoryBroker
+
+
+def legacy_publish_event(routing_key: str, payload: dict):
+    """Cópia do publish_event original: uma conexão por evento."""
+    connection = rabbitmq.get_connection()
+    channel = connection.channel()
+    channel.exchange_declare(
+        exchange=rabbitmq.EXCHANGE_NAME, exchange_type="topic", durable=True
+    )
+    channel.basic_publish(
+        exchange=rabbitmq.EXCHANGE_NAME,
+        routing_key=routing_key,
+        body=json.dumps(payload),
+        properties=pika.BasicProperties(delivery_mode=2),
+    )
+    connection.close()
+
+
+def _payload(i: int) -> dict:
+    return {
+        "order_id": i,
+        "email": "cliente@teste.com",
+        "items": [{"product_id": 1, "quantity": 2}],
+    }
+
+
+def run(events: int, handshake_ms: float, rtt_ms: float) -> dict:
+    broker = MemoryBroker(rtt_ms=rtt_ms, connect_ms=handshake_ms)
+    results = {}
+    rabbitmq.use_connection_factory(broker.connect)
+    try:
+        start = time.perf_counter()
+        for i in range(events):
+            legacy_publish_event("order.created", _payload(i))
+        results["legacy (conexão por evento)"] = time.perf_counter() - start
+
+        rabbitmq.close_publisher()
+        start = time.perf_counter()
+        for i in range(events):
+            rabbitmq.publish_event("order.created", _payload(i))
+        results["pool publish_event"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rabbitmq.publish_many(("order.created", _payload(i)) for i in range(events))
+        results["pool publish_many"] = time.perf_counter() - start
+    finally:
+        rabbitmq.use_connection_factory(None)
+
+    return {name: events / elapsed for name, elapsed in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--handshake-ms", type=float, default=3.0)
+    parser.add_argument("--rtt-ms", type=float, default=0.3)
+    args = parser.parse_args()
+
+    rates = run(args.events, args.handshake_ms, args.rtt_ms)
+    baseline = rates["legacy (conexão por evento)"]
+    for name, rate in rates.items():
+        print(f"{name:<30} {rate:>12.0f} eventos/s  ({rate / baseline:>6.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
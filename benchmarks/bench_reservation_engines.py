@@ -0,0 +1,61 @@
+"""
+Benchmark das engines de reserva em SKUs quentes (requer PostgreSQL).
+
+Compara ``STOCK_RESERVATION_ENGINE=locking`` (SELECT ... FOR UPDATE e baixa
+pelo ORM) com ``conditional`` (UPDATE condicional com RETURNING):
+
+    python -m benchmarks.bench_reservation_engines --threads 32 --orders 5000 --skus 4
+"""
+
+import argparse
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.session import DATABASE_URL
+from app.services import stock_service
+from benchmarks.bench_reserve_contention import report, run_strategy, seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--skus", type=int, default=4)
+    parser.add_argument("--items-per-order", type=int, default=2)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url, pool_size=args.threads + 2)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    product_ids = seed(session_factory, args.skus)
+
+    def session_gen():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    for reservation_engine in ("locking", "conditional"):
+        with patch.object(
+            settings, "stock_reservation_engine", reservation_engine
+        ), patch.object(stock_service, "get_db", side_effect=session_gen), patch(
+            "builtins.print"
+        ):
+            stats, elapsed = run_strategy(
+                stock_service.reserve_stock,
+                args.threads,
+                args.orders,
+                product_ids,
+                args.items_per_order,
+            )
+        report(reservation_engine, stats, elapsed)
+
+
+if __name__ == "__main__":
+    main()
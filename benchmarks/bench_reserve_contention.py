@@ -0,0 +1,164 @@
+"""
+Benchmark de contenção na reserva de estoque (requer PostgreSQL).
+
+Vários reservadores concorrentes pedem SKUs sobrepostos, cada pedido com os
+itens em ordem aleatória. Compara a estratégia antiga (um SELECT ... FOR
+UPDATE por item, na ordem de chegada, sem retry) com ``reserve_stock``:
+
+    python -m benchmarks.bench_reserve_contention --threads 16 --orders 2000 --skus 8
+"""
+
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+
+from app.db import retry
+from app.db.base import Base
+from app.db.session import DATABASE_URL
+from app.models.product import Product
+from app.models.stock_movement import StockMovement
+from app.services import stock_service
+
+
+def legacy_reserve(db, items: list[dict]):
+    """Cópia da reserva original: um lock por item, na ordem recebida."""
+    try:
+        for item in items:
+            product = (
+                db.query(Product)
+                .filter(Product.product_id == item["product_id"])
+                .with_for_update()
+                .one()
+            )
+            product.quantity_on_hand -= item["quantity"]
+            db.add(
+                StockMovement(
+                    product_id=product.product_id,
+                    quantity=item["quantity"],
+                    movement_type="saida",
+                )
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def seed(session_factory, skus: int) -> list[int]:
+    db = session_factory()
+    try:
+        products = [
+            Product(name=f"bench-{i}", quantity_on_hand=10**9, average_cost=1.0)
+            for i in range(skus)
+        ]
+        db.add_all(products)
+        db.commit()
+        return [product.product_id for product in products]
+    finally:
+        db.close()
+
+
+def run_strategy(reserve, threads, orders, product_ids, items_per_order):
+    stats = {"ok": 0, "deadlocks": 0, "errors": 0}
+    lock = threading.Lock()
+    rng = random.Random(42)
+    workload = [
+        [
+            {"product_id": pid, "quantity": 1}
+            for pid in rng.sample(product_ids, items_per_order)
+        ]
+        for _ in range(orders)
+    ]
+
+    def work(items):
+        try:
+            reserve(items)
+            key = "ok"
+        except DBAPIError as exc:
+            key = "deadlocks" if retry.is_retryable(exc) else "errors"
+        except Exception:
+            key = "errors"
+        with lock:
+            stats[key] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(work, workload))
+    return stats, time.perf_counter() - start
+
+
+def report(name: str, stats: dict, elapsed: float, extra: str = ""):
+    print(
+        f"{name:<22} {stats['ok'] / elapsed:>9.0f} pedidos/s  "
+        f"ok={stats['ok']} deadlocks={stats['deadlocks']} erros={stats['errors']}"
+        f"{extra}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--skus", type=int, default=8)
+    parser.add_argument("--items-per-order", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url, pool_size=args.threads + 2)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    product_ids = seed(session_factory, args.skus)
+
+    def legacy(items):
+        db = session_factory()
+        try:
+            legacy_reserve(db, items)
+        finally:
+            db.close()
+
+    def session_gen():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    retries = {"count": 0}
+    real_is_retryable = retry.is_retryable
+
+    def counting_is_retryable(exc):
+        result = real_is_retryable(exc)
+        retries["count"] += result
+        return result
+
+    stats, elapsed = run_strategy(
+        legacy,
+        args.threads,
+        args.orders,
+        product_ids,
+        args.items_per_order,
+    )
+    report("legacy (lock por item)", stats, elapsed)
+
+    with patch.object(stock_service, "get_db", side_effect=session_gen), patch.object(
+        retry, "is_retryable", side_effect=counting_is_retryable
+    ), patch("builtins.print"):
+        stats, elapsed = run_strategy(
+            stock_service.reserve_stock,
+            args.threads,
+            args.orders,
+            product_ids,
+            args.items_per_order,
+        )
+    report("reserve_stock", stats, elapsed, f" retries={retries['count']}")
+
+
+if __name__ == "__main__":
+    main()
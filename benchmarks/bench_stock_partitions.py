@@ -0,0 +1,113 @@
+"""
+Benchmark da reserva particionada por shard (requer PostgreSQL).
+
+Simula o modo ``STOCK_PARTITIONS``: os pedidos são divididos por shard e
+cada shard tem uma fila em memória com um único consumidor (como o
+``x-single-active-consumer``), que reserva em lotes com
+``reserve_stock_batch``. Mede a vazão com 1, 2, 4 e 8 shards:
+
+    python -m benchmarks.bench_stock_partitions --orders 5000 --skus 64
+"""
+
+import argparse
+import queue
+import random
+import threading
+import time
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.session import DATABASE_URL
+from app.services import stock_service
+from app.services.stock_partitioning import split_items
+from benchmarks.bench_reserve_contention import report, seed
+
+_STOP = object()
+
+
+def run_shards(partitions, workload, batch_size):
+    stats = {"ok": 0, "deadlocks": 0, "errors": 0}
+    lock = threading.Lock()
+    queues = [queue.Queue() for _ in range(partitions)]
+
+    def consume(shard_queue):
+        done = False
+        while not done:
+            batch = [shard_queue.get()]
+            while len(batch) < batch_size:
+                try:
+                    batch.append(shard_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is _STOP:
+                batch.pop()
+                done = True
+            if not batch:
+                continue
+            results = stock_service.reserve_stock_batch(batch)
+            with lock:
+                for result in results:
+                    stats["errors" if isinstance(result, Exception) else "ok"] += 1
+
+    consumers = [
+        threading.Thread(target=consume, args=(shard_queue,)) for shard_queue in queues
+    ]
+    start = time.perf_counter()
+    for consumer in consumers:
+        consumer.start()
+    for items in workload:
+        for shard, part in split_items(items, partitions).items():
+            queues[shard].put(part)
+    for shard_queue in queues:
+        shard_queue.put(_STOP)
+    for consumer in consumers:
+        consumer.join()
+    return stats, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--skus", type=int, default=64)
+    parser.add_argument("--items-per-order", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--shards", default="1,2,4,8")
+    args = parser.parse_args()
+
+    shard_counts = [int(n) for n in args.shards.split(",")]
+    engine = create_engine(args.database_url, pool_size=max(shard_counts) + 2)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    product_ids = seed(session_factory, args.skus)
+
+    rng = random.Random(42)
+    workload = [
+        [
+            {"product_id": pid, "quantity": 1}
+            for pid in rng.sample(product_ids, args.items_per_order)
+        ]
+        for _ in range(args.orders)
+    ]
+
+    def session_gen():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    for partitions in shard_counts:
+        with patch.object(stock_service, "get_db", side_effect=session_gen), patch(
+            "builtins.print"
+        ):
+            stats, elapsed = run_shards(partitions, workload, args.batch_size)
+        # Com mais de um shard cada pedido vira várias partes.
+        report(f"{partitions} shard(s) (partes)", stats, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,25 @@
 Configuração compartilhada para todos os testes.
 """
 
+import os
+
+# O listener de stock.updated abre uma conexão com o RabbitMQ no startup da API.
+os.environ.setdefault("AVAILABILITY_LISTENER_ENABLED", "false")
+
 import pytest
 from unittest.mock import MagicMock, patch
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 from app.db.base import Base
-from app.db.session import get_db
+from app.api.routes import orders, products, stock
+from app.db.session import get_async_db, get_db
 from app.main import app
+from app.services import availability_service, claim_check, product_cache
 
 
 # SQLite em memória para testes
@@ -22,6 +32,15 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def reset_availability_cache():
+    """O banco é recriado a cada teste, então o cache também é descartado."""
+    availability_service.reset()
+    product_cache.clear()
+    claim_check.reset()
+    yield
+
+
 @pytest.fixture(scope="function")
 def db_session():
     """Cria uma sessão de banco de dados para testes."""
@@ -50,6 +69,38 @@ def client(db_session):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def async_session_factory(db_session):
+    """Sessões assíncronas (aiosqlite) sobre o mesmo banco de teste."""
+    # NullPool: o TestClient roda o event loop em outra thread.
+    async_engine = create_async_engine(
+        "sqlite+aiosqlite:///./test.db", poolclass=NullPool
+    )
+    yield async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+@pytest.fixture
+def async_client(db_session, async_session_factory):
+    """Cliente de teste com as rotas do API_MODE=async."""
+    async_app = FastAPI()
+    async_app.include_router(orders.async_router)
+    async_app.include_router(products.async_router)
+    async_app.include_router(stock.async_router)
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    def override_get_db():
+        yield db_session
+
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+    # Rotas que rodam no thread pool com a sessão síncrona nos dois modos.
+    async_app.dependency_overrides[get_db] = override_get_db
+    with TestClient(async_app) as test_client:
+        yield test_client
+
+
 @pytest.fixture
 def mock_publish_event():
     """Mock para publish_event do RabbitMQ."""
@@ -1,11 +1,17 @@
+import json
 from unittest.mock import patch
 import pytest
 
+from app.models.product import Product
+from app.models.outbox import OutboxEvent
+from app.repositories.product_repository import create_product as repo_create_product
+from app.services.stock_service import reserve_stock
+
 
 class TestOrdersAPI:
     """Testes de integração para /orders."""
 
-    @patch("app.services.order_service.publish_event")
+    @patch("app.core.rabbitmq.publish_event")
     def test_create_order_success(self, mock_publish, client, db_session):
         """Deve criar um pedido via API."""
         # Primeiro criar um produto para o pedido
@@ -32,7 +38,42 @@ class TestOrdersAPI:
         data = response.json()
         assert "order_id" in data
         assert data["status"] == "pending"
-        mock_publish.assert_called_once()
+        mock_publish.assert_not_called()
+        event = db_session.query(OutboxEvent).one()
+        assert event.payload["order_id"] == data["order_id"]
+
+    def test_create_order_rejects_unknown_product(self, client, db_session):
+        """Deve recusar na hora pedido com produto inexistente."""
+        client.post("/products/", json={"name": "Produto", "quantity_on_hand": 5})
+
+        response = client.post(
+            "/orders/",
+            json={
+                "email": "cliente@teste.com",
+                "items": [{"product_id": 999, "quantity": 1}],
+            },
+        )
+
+        assert response.status_code == 400
+        assert "999" in response.json()["detail"]
+        assert db_session.query(OutboxEvent).count() == 0
+
+    def test_create_order_rejects_insufficient_stock(self, client, db_session):
+        """Deve recusar na hora pedido acima do saldo."""
+        product = client.post(
+            "/products/", json={"name": "Produto", "quantity_on_hand": 1}
+        ).json()
+
+        response = client.post(
+            "/orders/",
+            json={
+                "email": "cliente@teste.com",
+                "items": [{"product_id": product["product_id"], "quantity": 2}],
+            },
+        )
+
+        assert response.status_code == 400
+        assert "Estoque insuficiente" in response.json()["detail"]
 
     def test_create_order_invalid_email(self, client):
         """Deve retornar erro para email inválido."""
@@ -66,8 +107,7 @@ class TestOrdersAPI:
 
         assert response.status_code == 422
 
-    @patch("app.services.order_service.publish_event")
-    def test_create_order_multiple_items(self, mock_publish, client, db_session):
+    def test_create_order_multiple_items(self, client, db_session):
         """Deve criar pedido com múltiplos itens."""
         # Criar produtos
         for i in range(3):
@@ -94,6 +134,226 @@ class TestOrdersAPI:
         assert response.status_code == 201
 
 
+class TestOrderItemsAPI:
+    """Testes de integração para as consultas de itens de pedido."""
+
+    def _order(self, client, product_id, quantity=1):
+        response = client.post(
+            "/orders/",
+            json={
+                "email": "cliente@teste.com",
+                "items": [{"product_id": product_id, "quantity": quantity}],
+            },
+        )
+        assert response.status_code == 201
+        return response.json()["order_id"]
+
+    def test_order_items(self, client, db_session):
+        """Deve devolver os itens do pedido."""
+        product = repo_create_product(db_session, "Produto", 10, 1.0).product_id
+        order_id = self._order(client, product, 3)
+
+        response = client.get(f"/orders/{order_id}/items")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "order_id": order_id,
+            "status": "pending",
+            "items": [{"product_id": product, "quantity": 3}],
+        }
+
+    def test_order_items_unknown_order(self, client, db_session):
+        """Deve devolver 404 para pedido inexistente."""
+        response = client.get("/orders/999/items")
+
+        assert response.status_code == 404
+
+    def test_orders_with_product(self, client, db_session):
+        """Deve listar só os pedidos com o produto, paginando por order_id."""
+        first = repo_create_product(db_session, "A", 10, 1.0).product_id
+        other = repo_create_product(db_session, "B", 10, 1.0).product_id
+        orders = [self._order(client, first), self._order(client, other)]
+        orders.append(self._order(client, first, 2))
+
+        page = client.get(f"/orders/?product_id={first}&limit=1").json()
+        rest = client.get(
+            f"/orders/?product_id={first}&after={page['next_cursor']}"
+        ).json()
+
+        assert [order["order_id"] for order in page["items"]] == [orders[0]]
+        assert [(o["order_id"], o["quantity"]) for o in rest["items"]] == [
+            (orders[2], 2)
+        ]
+        assert rest["next_cursor"] is None
+
+    def test_orders_with_product_requires_product_id(self, client):
+        """Deve exigir o filtro por produto."""
+        assert client.get("/orders/").status_code == 422
+
+
+class TestAsyncAPI:
+    """Testes de integração para as rotas do API_MODE=async."""
+
+    @patch("app.api.routes.orders.dispatch_outbox_async")
+    def test_create_order_async(self, mock_dispatch, async_client, db_session):
+        """Deve criar pedido e evento no outbox e agendar o despacho."""
+        product = async_client.post(
+            "/products/", json={"name": "Produto", "quantity_on_hand": 10}
+        )
+        assert product.status_code == 200
+
+        response = async_client.post(
+            "/orders/",
+            json={
+                "email": "cliente@teste.com",
+                "items": [{"product_id": product.json()["product_id"], "quantity": 2}],
+            },
+        )
+
+        assert response.status_code == 201
+        assert response.json()["status"] == "pending"
+        event = db_session.query(OutboxEvent).one()
+        assert event.payload["order_id"] == response.json()["order_id"]
+        mock_dispatch.assert_called_once_with([event.event_id])
+
+    @patch("app.api.routes.orders.dispatch_outbox_async")
+    def test_create_order_async_rejects_insufficient_stock(
+        self, mock_dispatch, async_client, db_session
+    ):
+        """Deve aplicar a checagem de disponibilidade também no modo async."""
+        product = async_client.post(
+            "/products/", json={"name": "Produto", "quantity_on_hand": 1}
+        ).json()
+
+        response = async_client.post(
+            "/orders/",
+            json={
+                "email": "cliente@teste.com",
+                "items": [{"product_id": product["product_id"], "quantity": 5}],
+            },
+        )
+
+        assert response.status_code == 400
+        assert db_session.query(OutboxEvent).count() == 0
+        mock_dispatch.assert_not_called()
+
+
+class TestOrderBatchAPI:
+    """Testes de integração para /orders/batch."""
+
+    def _products(self, client, *quantities):
+        return [
+            client.post(
+                "/products/", json={"name": f"P{q}", "quantity_on_hand": q}
+            ).json()["product_id"]
+            for q in quantities
+        ]
+
+    @patch("app.api.routes.orders.dispatch_outbox_async")
+    @patch("app.services.order_service.settings.order_batch_chunk_size", 2)
+    def test_batch_creates_orders_in_chunks(
+        self, mock_dispatch, async_client, db_session
+    ):
+        """Deve criar os pedidos válidos e rejeitar os demais por índice."""
+        first, scarce = self._products(async_client, 100, 1)
+        orders = [
+            {"email": "a@b.com", "items": [{"product_id": first, "quantity": 1}]},
+            {"email": "invalido", "items": [{"product_id": first, "quantity": 1}]},
+            {"email": "a@b.com", "items": [{"product_id": scarce, "quantity": 5}]},
+        ] + [
+            {"email": "a@b.com", "items": [{"product_id": first, "quantity": 2}]}
+            for _ in range(3)
+        ]
+
+        response = async_client.post("/orders/batch", json=orders)
+
+        assert response.status_code == 201
+        body = response.json()
+        assert (body["created"], body["rejected"]) == (4, 2)
+        assert [r["status"] for r in body["results"]] == [
+            "pending",
+            "rejected",
+            "rejected",
+            "pending",
+            "pending",
+            "pending",
+        ]
+        assert "Estoque insuficiente" in body["results"][2]["detail"]
+        events = db_session.query(OutboxEvent).order_by(OutboxEvent.event_id).all()
+        created_ids = [r["order_id"] for r in body["results"] if r["order_id"]]
+        assert [e.payload["order_id"] for e in events] == created_ids
+        items = async_client.get(f"/orders/?product_id={first}&limit=10").json()
+        assert [order["order_id"] for order in items["items"]] == created_ids
+        mock_dispatch.assert_called_once_with([e.event_id for e in events])
+
+    @patch("app.api.routes.orders.dispatch_outbox_async")
+    def test_batch_accepts_ndjson(self, _dispatch, async_client, db_session):
+        """Deve aceitar um pedido por linha (NDJSON)."""
+        (product,) = self._products(async_client, 10)
+        line = json.dumps(
+            {"email": "a@b.com", "items": [{"product_id": product, "quantity": 1}]}
+        )
+
+        response = async_client.post(
+            "/orders/batch",
+            content="\n".join([line, line]),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        assert response.status_code == 201
+        assert response.json()["created"] == 2
+
+    @patch("app.api.routes.orders.dispatch_outbox_async")
+    def test_batch_malformed_body_writes_nothing(
+        self, mock_dispatch, async_client, db_session
+    ):
+        """JSON malformado deve desfazer o lote inteiro."""
+        (product,) = self._products(async_client, 10)
+        order = {"email": "a@b.com", "items": [{"product_id": product, "quantity": 1}]}
+
+        response = async_client.post(
+            "/orders/batch",
+            content=json.dumps([order])[:-1],
+            headers={"Content-Type": "application/json"},
+        )
+
+        assert response.status_code == 400
+        assert db_session.query(OutboxEvent).count() == 0
+        mock_dispatch.assert_not_called()
+
+    @patch("app.db.session.create_async_engine")
+    def test_sync_batch_uses_sync_session(self, mock_engine, client, db_session):
+        """No modo sync o lote não depende do engine assíncrono."""
+        (product,) = self._products(client, 10)
+        order = {"email": "a@b.com", "items": [{"product_id": product, "quantity": 4}]}
+        scarce = {
+            "email": "a@b.com",
+            "items": [{"product_id": product, "quantity": 11}],
+        }
+
+        response = client.post("/orders/batch", json=[order, order, scarce])
+
+        assert response.status_code == 201
+        body = response.json()
+        assert (body["created"], body["rejected"]) == (2, 1)
+        assert "Estoque insuficiente" in body["results"][2]["detail"]
+        assert db_session.query(OutboxEvent).count() == 2
+        mock_engine.assert_not_called()
+
+    def test_sync_batch_malformed_body_writes_nothing(self, client, db_session):
+        (product,) = self._products(client, 10)
+        order = {"email": "a@b.com", "items": [{"product_id": product, "quantity": 1}]}
+
+        response = client.post(
+            "/orders/batch",
+            content=json.dumps([order])[:-1],
+            headers={"Content-Type": "application/json"},
+        )
+
+        assert response.status_code == 400
+        assert db_session.query(OutboxEvent).count() == 0
+
+
 class TestProductsAPI:
     """Testes de integração para /products."""
 
@@ -152,6 +412,129 @@ class TestProductsAPI:
         assert len(created_ids) == len(set(created_ids))
 
 
+class TestProductListAPI:
+    """Testes de integração para GET /products."""
+
+    @pytest.fixture
+    def catalogue(self, db_session):
+        for i in range(1, 8):
+            repo_create_product(
+                db_session, name=f"P{i}", quantity_on_hand=i * 10, average_cost=1.0
+            )
+
+    def test_keyset_pagination(self, client, catalogue):
+        """Deve percorrer o catálogo pelo cursor, sem repetir nem pular."""
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 3}
+            if cursor is not None:
+                params["after"] = cursor
+            page = client.get("/products/", params=params).json()
+            seen += [item["product_id"] for item in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert seen == list(range(1, 8))
+
+    def test_filters_and_projection(self, client, catalogue):
+        """Deve filtrar por quantidade e devolver só os campos pedidos."""
+        response = client.get(
+            "/products/",
+            params={"min_quantity": 20, "max_quantity": 40, "fields": "name"},
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "items": [
+                {"product_id": 2, "name": "P2"},
+                {"product_id": 3, "name": "P3"},
+                {"product_id": 4, "name": "P4"},
+            ],
+            "next_cursor": None,
+        }
+
+    def test_unknown_field(self, client, catalogue):
+        response = client.get("/products/", params={"fields": "name,senha"})
+
+        assert response.status_code == 400
+
+    @patch("app.services.product_service.settings.product_stream_chunk_size", 2)
+    def test_ndjson_export(self, client, catalogue):
+        """Deve exportar o catálogo inteiro em NDJSON, a partir do cursor."""
+        response = client.get(
+            "/products/",
+            params={"after": 2, "fields": "quantity_on_hand"},
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines == [
+            {"product_id": i, "quantity_on_hand": i * 10} for i in range(3, 8)
+        ]
+
+    def test_async_mode(self, async_client, catalogue):
+        """As rotas do modo async devem se comportar igual."""
+        page = async_client.get("/products/", params={"limit": 5}).json()
+        assert page["next_cursor"] == 5
+
+        response = async_client.get("/products/", params={"format": "ndjson"})
+        assert len(response.text.splitlines()) == 7
+
+
+class TestProductReadAPI:
+    """Testes de integração para GET /products/{id} com cache e ETag."""
+
+    def test_read_sets_etag_and_uses_cache(self, client, db_session):
+        product = repo_create_product(db_session, name="P", quantity_on_hand=5)
+
+        first = client.get(f"/products/{product.product_id}")
+        second = client.get(f"/products/{product.product_id}")
+
+        assert first.status_code == 200
+        assert first.json()["version"] == 1
+        assert first.headers["etag"] == f'"{product.product_id}-1"'
+        assert second.json() == first.json()
+        stats = client.get("/products/cache/stats").json()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    def test_if_none_match_returns_304(self, client, db_session):
+        product = repo_create_product(db_session, name="P", quantity_on_hand=5)
+        tag = client.get(f"/products/{product.product_id}").headers["etag"]
+
+        response = client.get(
+            f"/products/{product.product_id}", headers={"If-None-Match": tag}
+        )
+
+        assert response.status_code == 304
+        assert response.headers["etag"] == tag
+
+    @patch("app.services.stock_service.get_db")
+    def test_stock_change_bumps_version(self, mock_get_db, client, db_session):
+        """Reserva deve invalidar o cache e gerar um novo ETag."""
+        product = repo_create_product(db_session, name="P", quantity_on_hand=5)
+        tag = client.get(f"/products/{product.product_id}").headers["etag"]
+
+        def mock_db_gen():
+            yield db_session
+
+        mock_get_db.return_value = mock_db_gen()
+        reserve_stock([{"product_id": product.product_id, "quantity": 2}])
+
+        response = client.get(
+            f"/products/{product.product_id}", headers={"If-None-Match": tag}
+        )
+        assert response.status_code == 200
+        assert response.json()["quantity_on_hand"] == 3
+        assert response.headers["etag"] == f'"{product.product_id}-2"'
+
+    def test_missing_product(self, client, async_client):
+        assert client.get("/products/999").status_code == 404
+        assert async_client.get("/products/999").status_code == 404
+
+
 class TestAPIHealth:
     """Testes para verificar saúde da API."""
 
@@ -167,3 +550,114 @@ class TestAPIHealth:
         data = response.json()
         assert "openapi" in data
         assert "paths" in data
+
+
+class TestProductImportAPI:
+    """Testes de integração para POST /products/import."""
+
+    def test_import_csv(self, client, db_session):
+        body = "sku,name,quantity_on_hand,average_cost\nA,Produto A,3,1.5\nB,,1,1\n"
+
+        response = client.post(
+            "/products/import", content=body, headers={"Content-Type": "text/csv"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["rows"], data["imported"], data["rejected"]) == (2, 1, 1)
+        assert data["errors"][0]["line"] == 3
+        product = db_session.query(Product).filter_by(sku="A").one()
+        assert product.quantity_on_hand == 3
+
+    def test_import_ndjson_by_content_type(self, client, db_session):
+        response = client.post(
+            "/products/import",
+            content=b'{"sku": "N", "name": "N", "quantity_on_hand": 2}\n',
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        assert response.json()["imported"] == 1
+        assert db_session.query(Product).filter_by(sku="N").count() == 1
+
+
+class TestStockReceiptAPI:
+    """Testes de integração para POST /stock/receipts."""
+
+    def test_receipt(self, client, db_session):
+        product = repo_create_product(
+            db_session, name="P", quantity_on_hand=2, average_cost=1.0
+        )
+
+        response = client.post(
+            "/stock/receipts",
+            json={
+                "items": [
+                    {"product_id": product.product_id, "quantity": 2, "unit_cost": 3.0}
+                ]
+            },
+        )
+
+        assert response.status_code == 201
+        assert response.json()["products"] == [
+            {
+                "product_id": product.product_id,
+                "quantity_on_hand": 4,
+                "average_cost": 2.0,
+            }
+        ]
+
+    def test_receipt_unknown_product(self, client):
+        response = client.post(
+            "/stock/receipts",
+            json={"items": [{"product_id": 999, "quantity": 1, "unit_cost": 1.0}]},
+        )
+
+        assert response.status_code == 404
+
+    def test_receipt_rejects_non_positive_quantity(self, client):
+        response = client.post(
+            "/stock/receipts",
+            json={"items": [{"product_id": 1, "quantity": 0, "unit_cost": 1.0}]},
+        )
+
+        assert response.status_code == 422
+
+    def test_async_receipt(self, async_client, db_session):
+        product = repo_create_product(db_session, name="P", quantity_on_hand=0)
+
+        response = async_client.post(
+            "/stock/receipts",
+            json={
+                "items": [
+                    {"product_id": product.product_id, "quantity": 3, "unit_cost": 5.0}
+                ]
+            },
+        )
+
+        assert response.status_code == 201
+        assert response.json()["products"][0]["average_cost"] == 5.0
+
+
+class TestStockAtAPI:
+    """Testes de integração para GET /products/{id}/stock."""
+
+    def test_stock_at(self, client, db_session):
+        product = repo_create_product(db_session, name="P", quantity_on_hand=5)
+
+        response = client.get(f"/products/{product.product_id}/stock")
+
+        assert response.status_code == 200
+        assert response.json()["quantity"] == 5
+
+    def test_stock_before_any_movement(self, client, db_session):
+        product = repo_create_product(db_session, name="P", quantity_on_hand=5)
+
+        response = client.get(
+            f"/products/{product.product_id}/stock",
+            params={"at": "2000-01-01T00:00:00Z"},
+        )
+
+        assert response.json()["quantity"] == 0
+
+    def test_stock_unknown_product(self, client):
+        assert client.get("/products/999/stock").status_code == 404
@@ -1,20 +1,37 @@
 import json
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 import pytest
 
-from app.core.rabbitmq import publish_event, get_connection
+from pika.exceptions import AMQPConnectionError
+
+from app.core.rabbitmq import Publisher, close_publisher, publish_event, get_connection
 from app.workers.order_worker import callback as order_callback
 from app.workers.payment_worker import callback as payment_callback
 from app.workers.notify_worker import callback as notify_callback
 from app.workers.stock_worker import callback as stock_callback
+from app.workers.stock_worker import batch_callback as stock_batch_callback
+from app.workers.stock_worker import shard_batch_callback
 from app.workers.order_worker import QUEUE_NAME
+from app.workers.runtime import get_handler
+from app.workers.outbox_relay import relay_once
+from app.models.outbox import OutboxEvent
+from app.repositories import outbox_repository
+from app.repositories.stock_movement_repository import MovementRecord
+from app.services.email_service import EmailRejected
+from app.services.stock_service import InsufficientStockError
+from app.workers.retry import PermanentError
+
+
+def movement(product_id, quantity, movement_type="saida"):
+    return MovementRecord(1, product_id, quantity, movement_type, None)
 
 
 class TestOrderWorker:
     """Testes para order_worker."""
 
+    @patch("app.workers.order_worker._check_availability")
     @patch("app.workers.order_worker.publish_event")
-    def test_callback_processes_message(self, mock_publish):
+    def test_callback_processes_message(self, mock_publish, _check):
         """Deve processar mensagem e publicar payment.processing."""
 
         # Mock do channel
@@ -36,26 +53,54 @@ class TestOrderWorker:
         mock_publish.assert_called_once_with("payment.processing", data)
         ch.basic_ack.assert_called_once_with(delivery_tag="tag123")
 
-    @patch("app.workers.order_worker.get_connection")
-    def test_worker_connects_to_rabbitmq(self, mock_get_conn):
-        """Deve conectar ao RabbitMQ e declarar exchange/queue."""
-        mock_conn = MagicMock()
-        mock_channel = MagicMock()
-        mock_conn.channel.return_value = mock_channel
-        mock_get_conn.return_value = mock_conn
+    @patch("app.workers.order_worker._check_availability")
+    @patch("app.workers.order_worker.publish_event")
+    def test_callback_rejects_unavailable_order(self, mock_publish, mock_check):
+        """Deve publicar order.rejected sem passar pelo pagamento."""
+        mock_check.side_effect = InsufficientStockError("Estoque insuficiente")
+
+        ch = MagicMock()
+        method = MagicMock()
+        method.delivery_tag = "tag124"
+        data = {"order_id": 1, "email": "a@b.com", "items": [{"product_id": 1}]}
+
+        order_callback(ch, method, None, json.dumps(data).encode())
+
+        mock_publish.assert_called_once_with(
+            "order.rejected",
+            {"order_id": 1, "email": "a@b.com", "reason": "Estoque insuficiente"},
+        )
+        ch.basic_ack.assert_called_once_with(delivery_tag="tag124")
+
+    @patch("app.workers.order_worker._check_availability")
+    @patch("app.workers.order_worker.publish_event")
+    def test_callback_ignores_cache_failures(self, mock_publish, mock_check):
+        """Falha na checagem (ex.: banco fora) não deve barrar o pedido."""
+        mock_check.side_effect = Exception("banco indisponível")
+
+        data = {"order_id": 1, "items": [{"product_id": 1, "quantity": 1}]}
+        order_callback(MagicMock(), MagicMock(), None, json.dumps(data).encode())
+
+        mock_publish.assert_called_once_with("payment.processing", data)
+
+    def test_worker_registers_queue_handler(self):
+        """Deve registrar o handler da fila no runtime."""
+        handler = get_handler(QUEUE_NAME)
 
         assert QUEUE_NAME == "order_queue"
+        assert handler.routing_keys == ("order.created",)
+        assert handler.callback is order_callback
 
 
 class TestStockWorker:
     """Testes para stock_worker."""
 
     @patch("app.workers.stock_worker.reserve_stock")
-    @patch("app.workers.stock_worker.publish_event")
+    @patch("app.workers.stock_worker.publish_many")
     def test_callback_success(self, mock_publish, mock_reserve):
-        """Deve reservar estoque e publicar order.processed."""
+        """Deve reservar estoque e publicar order.processed e stock.updated."""
 
-        mock_reserve.return_value = [MagicMock()]
+        mock_reserve.return_value = [movement(1, 2)]
 
         ch = MagicMock()
         method = MagicMock()
@@ -72,16 +117,20 @@ class TestStockWorker:
 
         mock_reserve.assert_called_once_with(data["items"])
         mock_publish.assert_called_once()
-        call_args = mock_publish.call_args
-        assert call_args[0][0] == "order.processed"
+        events = mock_publish.call_args[0][0]
+        assert events[0][0] == "order.processed"
+        assert events[1] == (
+            "stock.updated",
+            {"deltas": [{"product_id": 1, "delta": -2}]},
+        )
         ch.basic_ack.assert_called_once()
 
     @patch("app.workers.stock_worker.reserve_stock")
-    @patch("app.workers.stock_worker.publish_event")
+    @patch("app.workers.stock_worker.publish_many")
     def test_callback_handles_error(self, mock_publish, mock_reserve):
-        """Deve tratar erro de reserva sem crashar."""
+        """Recusa de estoque é confirmada sem publicar e sem retry."""
 
-        mock_reserve.side_effect = Exception("Estoque insuficiente")
+        mock_reserve.side_effect = InsufficientStockError("Estoque insuficiente")
 
         ch = MagicMock()
         method = MagicMock()
@@ -96,6 +145,202 @@ class TestStockWorker:
         mock_publish.assert_not_called()
         ch.basic_ack.assert_called_once()
 
+    @patch("app.workers.stock_worker.reserve_stock")
+    @patch("app.workers.stock_worker.publish_many")
+    def test_callback_raises_transient_error(self, mock_publish, mock_reserve):
+        """Falha transitória sobe para o runtime agendar a retentativa."""
+        mock_reserve.side_effect = Exception("conexão perdida")
+        ch = MagicMock()
+        body = json.dumps({"order_id": 1, "items": []}).encode()
+
+        with pytest.raises(Exception, match="conexão perdida"):
+            stock_callback(ch, MagicMock(), None, body)
+
+        mock_publish.assert_not_called()
+        ch.basic_ack.assert_not_called()
+
+    @patch("app.workers.stock_worker.reserve_stock")
+    @patch("app.workers.stock_worker.publish_many")
+    def test_callback_acks_when_publish_fails_after_reserve(
+        self, mock_publish, mock_reserve
+    ):
+        """Com a reserva gravada, a mensagem não é repetida."""
+        mock_reserve.return_value = [movement(1, 2)]
+        mock_publish.side_effect = AMQPConnectionError()
+        ch = MagicMock()
+        body = json.dumps({"order_id": 1, "items": []}).encode()
+
+        stock_callback(ch, MagicMock(), None, body)
+
+        ch.basic_ack.assert_called_once()
+
+    @patch("app.workers.stock_worker.reserve_stock_batch")
+    @patch("app.workers.stock_worker.publish_many")
+    def test_batch_callback_acks_all_after_commit(self, mock_publish, mock_reserve):
+        """Deve reservar o lote, publicar só os aprovados e confirmar todos."""
+        mock_reserve.return_value = [
+            [movement(1, 1)],
+            Exception("Estoque insuficiente"),
+        ]
+
+        ch = MagicMock()
+        deliveries = []
+        for tag, order_id in ((1, 10), (2, 11)):
+            method = MagicMock()
+            method.delivery_tag = tag
+            data = {"order_id": order_id, "items": [{"product_id": 1, "quantity": 1}]}
+            deliveries.append((method, None, json.dumps(data).encode()))
+
+        stock_batch_callback(ch, deliveries)
+
+        mock_reserve.assert_called_once()
+        assert len(mock_reserve.call_args[0][0]) == 2
+        events = mock_publish.call_args[0][0]
+        assert [key for key, _payload in events] == ["order.processed", "stock.updated"]
+        assert events[0][1]["order_id"] == 10
+        assert events[1][1]["deltas"] == [{"product_id": 1, "delta": -1}]
+        assert ch.basic_ack.call_count == 2
+        ch.basic_nack.assert_not_called()
+
+    @patch("app.workers.stock_worker.claim_check.load_many")
+    @patch("app.workers.stock_worker.reserve_stock_batch")
+    @patch("app.workers.stock_worker.publish_many")
+    def test_batch_callback_loads_claim_check_items(
+        self, mock_publish, mock_reserve, mock_load
+    ):
+        """Deve buscar os itens referenciados e rejeitar só o pedido sem itens."""
+        items = [{"product_id": 1, "quantity": 1}]
+        mock_load.return_value = [items, LookupError("Itens não encontrados")]
+        mock_reserve.return_value = [[movement(1, 1)]]
+
+        ch = MagicMock()
+        deliveries = []
+        for tag, order_id in ((1, 10), (2, 11)):
+            method = MagicMock()
+            method.delivery_tag = tag
+            data = {
+                "order_id": order_id,
+                "items_ref": {"store": "db", "version": "v"},
+                "summary": {"lines": 1},
+            }
+            deliveries.append((method, None, json.dumps(data).encode()))
+
+        stock_batch_callback(ch, deliveries)
+
+        mock_reserve.assert_called_once_with([items])
+        events = mock_publish.call_args[0][0]
+        assert events[0] == (
+            "order.processed",
+            {
+                "order_id": 10,
+                "email": None,
+                "items_ref": {"store": "db", "version": "v"},
+                "summary": {"lines": 1},
+            },
+        )
+        assert ch.basic_ack.call_count == 2
+
+    @patch("app.workers.stock_worker.reserve_stock_batch")
+    @patch("app.workers.stock_worker.publish_many")
+    def test_batch_callback_rejects_malformed_order_alone(
+        self, mock_publish, mock_reserve
+    ):
+        """Pedido malformado é rejeitado sozinho; o resto do lote segue."""
+        mock_reserve.return_value = [[movement(1, 1)]]
+
+        ch = MagicMock()
+        deliveries = []
+        for tag, data in (
+            (1, {"order_id": 10, "items": [{"quantity": 1}]}),
+            (2, {"order_id": 11}),
+            (3, {"order_id": 12, "items": [{"product_id": 1, "quantity": 1}]}),
+        ):
+            method = MagicMock()
+            method.delivery_tag = tag
+            deliveries.append((method, None, json.dumps(data).encode()))
+
+        stock_batch_callback(ch, deliveries)
+
+        mock_reserve.assert_called_once_with([[{"product_id": 1, "quantity": 1}]])
+        ch.basic_nack.assert_has_calls(
+            [
+                call(delivery_tag=1, requeue=False),
+                call(delivery_tag=2, requeue=False),
+            ]
+        )
+        ch.basic_ack.assert_called_once_with(delivery_tag=3)
+
+    def test_callback_malformed_order_is_permanent(self):
+        """Sem itens válidos, a mensagem vai direto para a dead-letter."""
+        body = json.dumps({"order_id": 1, "items": [{"product_id": "x"}]}).encode()
+
+        with pytest.raises(PermanentError):
+            stock_callback(MagicMock(), MagicMock(), None, body)
+
+    def test_callback_boolean_quantity_is_malformed(self):
+        """True/False não valem como product_id ou quantidade."""
+        body = json.dumps(
+            {"order_id": 1, "items": [{"product_id": 1, "quantity": True}]}
+        ).encode()
+
+        with pytest.raises(PermanentError):
+            stock_callback(MagicMock(), MagicMock(), None, body)
+
+    @patch("app.workers.stock_worker.reserve_stock_batch")
+    @patch("app.workers.stock_worker.publish_many")
+    def test_batch_callback_raises_when_batch_fails(self, mock_publish, mock_reserve):
+        """Falha no commit do lote sobe para o runtime agendar a retentativa."""
+        mock_reserve.side_effect = Exception("conexão perdida")
+
+        ch = MagicMock()
+        method = MagicMock()
+        method.delivery_tag = 5
+        body = json.dumps({"order_id": 1, "items": []}).encode()
+
+        with pytest.raises(Exception, match="conexão perdida"):
+            stock_batch_callback(ch, [(method, None, body)])
+
+        mock_publish.assert_not_called()
+        ch.basic_nack.assert_not_called()
+        ch.basic_ack.assert_not_called()
+
+    @patch("app.workers.stock_worker.release_stock")
+    @patch("app.workers.stock_worker.reserve_stock_batch")
+    @patch("app.workers.stock_worker.publish_many")
+    def test_shard_batch_callback(self, mock_publish, mock_reserve, mock_release):
+        """Deve estornar releases e publicar resultado de partes do pedido."""
+        mock_reserve.return_value = [[movement(1, 1)]]
+        mock_release.return_value = [movement(1, 1, "estorno")]
+
+        ch = MagicMock()
+        release = MagicMock(delivery_tag=1, routing_key="stock.release.2")
+        reserve = MagicMock(delivery_tag=2, routing_key="stock.reserve.2")
+        items = [{"product_id": 1, "quantity": 1}]
+        deliveries = [
+            (release, None, json.dumps({"order_id": 1, "items": items}).encode()),
+            (
+                reserve,
+                None,
+                json.dumps(
+                    {"order_id": 2, "shard": 2, "parts": [0, 2], "items": items}
+                ).encode(),
+            ),
+        ]
+
+        shard_batch_callback(ch, deliveries)
+
+        mock_release.assert_called_once_with(items)
+        mock_reserve.assert_called_once_with([items])
+        released, reserved = mock_publish.call_args_list
+        assert released[0][0] == [
+            ("stock.updated", {"deltas": [{"product_id": 1, "delta": 1}]})
+        ]
+        assert [key for key, _payload in reserved[0][0]] == [
+            "stock.part.reserved",
+            "stock.updated",
+        ]
+        assert ch.basic_ack.call_count == 2
+
 
 class TestPaymentWorker:
     """Testes para payment_worker."""
@@ -120,6 +365,24 @@ class TestPaymentWorker:
         mock_publish.assert_called_once_with("payment.completed", data)
         ch.basic_ack.assert_called_once()
 
+    @patch("app.workers.payment_worker.settings.stock_partitions", 4)
+    @patch("app.workers.payment_worker.process_payment")
+    @patch("app.workers.payment_worker.publish_many")
+    def test_callback_routes_to_stock_shards(self, mock_publish_many, _process):
+        """No modo particionado deve publicar as partes por shard."""
+        ch = MagicMock()
+        method = MagicMock()
+        data = {
+            "order_id": 1,
+            "items": [{"product_id": pid, "quantity": 1} for pid in range(1, 9)],
+        }
+
+        payment_callback(ch, method, None, json.dumps(data).encode())
+
+        keys = [key for key, _payload in mock_publish_many.call_args[0][0]]
+        assert keys
+        assert all(key.startswith("stock.reserve.") for key in keys)
+
     @patch("app.workers.payment_worker.process_payment")
     @patch("app.workers.payment_worker.publish_event")
     def test_callback_failure(self, mock_publish, mock_process):
@@ -207,6 +470,88 @@ class TestNotifyWorker:
 
         mock_send_email.assert_called_once_with(3, "default@test.com")
 
+    @patch("app.workers.notify_worker.send_order_rejected_email")
+    def test_callback_order_rejected(self, mock_send_email):
+        """Deve avisar o cliente de pedido recusado."""
+        method = MagicMock()
+        method.routing_key = "order.rejected"
+        data = {"order_id": 4, "email": "a@b.com", "reason": "Estoque insuficiente"}
+
+        notify_callback(MagicMock(), method, None, json.dumps(data).encode())
+
+        mock_send_email.assert_called_once_with(4, "a@b.com", "Estoque insuficiente")
+
+    @patch("app.workers.notify_worker.send_order_processed_email")
+    def test_callback_raises_when_smtp_fails(self, mock_send_email):
+        """Falha no SMTP sobe para o runtime em vez de ser confirmada."""
+        mock_send_email.side_effect = ConnectionRefusedError()
+        ch = MagicMock()
+        method = MagicMock()
+        method.routing_key = "order.processed"
+
+        with pytest.raises(ConnectionRefusedError):
+            notify_callback(ch, method, None, b'{"order_id": 5, "email": "a@b.com"}')
+
+        ch.basic_ack.assert_not_called()
+
+    @patch("app.workers.notify_worker.send_order_processed_email")
+    def test_callback_rejected_email_is_permanent(self, mock_send_email):
+        """Recusa definitiva do SMTP vai direto para a dead-letter."""
+        mock_send_email.side_effect = EmailRejected("550 caixa inexistente")
+        method = MagicMock()
+        method.routing_key = "order.processed"
+
+        with pytest.raises(PermanentError):
+            notify_callback(
+                MagicMock(), method, None, b'{"order_id": 6, "email": "x@y.com"}'
+            )
+
+
+class TestOutboxRelay:
+    """Testes para outbox_relay."""
+
+    @patch("app.workers.outbox_relay.publish_many")
+    def test_relay_once_publishes_and_deletes_batch(
+        self, mock_publish_many, db_session
+    ):
+        """Deve publicar um lote em uma chamada e remover os eventos."""
+        for i in range(3):
+            outbox_repository.add_event(db_session, "order.created", {"order_id": i})
+        db_session.commit()
+
+        published = []
+        mock_publish_many.side_effect = lambda events: published.extend(events)
+
+        relayed = relay_once(db_session, batch_size=2)
+
+        assert relayed == 2
+        mock_publish_many.assert_called_once()
+        assert published == [
+            ("order.created", {"order_id": 0}),
+            ("order.created", {"order_id": 1}),
+        ]
+        assert db_session.query(OutboxEvent).count() == 1
+
+    @patch("app.workers.outbox_relay.publish_many")
+    def test_relay_once_keeps_events_when_publish_fails(
+        self, mock_publish_many, db_session
+    ):
+        """Eventos devem permanecer no outbox se a publicação falhar."""
+        outbox_repository.add_event(db_session, "order.created", {"order_id": 1})
+        db_session.commit()
+        mock_publish_many.side_effect = Exception("broker fora do ar")
+
+        with pytest.raises(Exception):
+            relay_once(db_session, batch_size=10)
+
+        assert db_session.query(OutboxEvent).count() == 1
+
+    @patch("app.workers.outbox_relay.publish_many")
+    def test_relay_once_empty_outbox(self, mock_publish_many, db_session):
+        """Não deve publicar nada com o outbox vazio."""
+        assert relay_once(db_session, batch_size=10) == 0
+        mock_publish_many.assert_not_called()
+
 
 class TestRabbitMQConnection:
     """Testes para conexão RabbitMQ."""
@@ -227,16 +572,84 @@ class TestRabbitMQConnection:
 
     @patch("app.core.rabbitmq.get_connection")
     def test_publish_event(self, mock_get_conn):
-        """Deve publicar evento no exchange."""
+        """Deve publicar eventos reaproveitando a mesma conexão."""
 
         mock_conn = MagicMock()
         mock_channel = MagicMock()
         mock_conn.channel.return_value = mock_channel
         mock_get_conn.return_value = mock_conn
 
+        close_publisher()
         payload = {"test": "data"}
         publish_event("test.event", payload)
+        publish_event("test.event", payload)
+        close_publisher()
 
+        mock_get_conn.assert_called_once()
         mock_channel.exchange_declare.assert_called_once()
-        mock_channel.basic_publish.assert_called_once()
+        mock_channel.tx_select.assert_called_once()
+        assert mock_channel.basic_publish.call_count == 2
+        assert mock_channel.tx_commit.call_count == 2
         mock_conn.close.assert_called_once()
+
+    @patch("app.core.rabbitmq.get_connection")
+    def test_publish_many_commits_in_batches(self, mock_get_conn):
+        """Deve confirmar os eventos em lotes de confirm_batch_size."""
+
+        mock_conn = MagicMock()
+        mock_channel = MagicMock()
+        mock_conn.channel.return_value = mock_channel
+        mock_get_conn.return_value = mock_conn
+
+        publisher = Publisher(pool_size=1, batch_size=2)
+        published = publisher.publish_many((f"test.{i}", {"i": i}) for i in range(5))
+        publisher.close()
+
+        assert published == 5
+        assert mock_channel.basic_publish.call_count == 5
+        assert mock_channel.tx_commit.call_count == 3
+
+    @patch("app.core.rabbitmq.time.sleep")
+    @patch("app.core.rabbitmq.get_connection")
+    def test_publish_reconnects_after_connection_loss(self, mock_get_conn, _sleep):
+        """Deve reconectar e republicar o lote quando a conexão cai."""
+
+        broken_conn = MagicMock()
+        broken_conn.channel.return_value.basic_publish.side_effect = (
+            AMQPConnectionError("conexão perdida")
+        )
+        healthy_conn = MagicMock()
+        healthy_channel = MagicMock()
+        healthy_conn.channel.return_value = healthy_channel
+        mock_get_conn.side_effect = [broken_conn, healthy_conn]
+
+        publisher = Publisher(pool_size=1, retries=1)
+        publisher.publish("test.event", {"test": "data"})
+
+        broken_conn.close.assert_called_once()
+        healthy_channel.basic_publish.assert_called_once()
+        healthy_channel.tx_commit.assert_called_once()
+        # o exchange só é declarado uma vez por processo
+        healthy_channel.exchange_declare.assert_not_called()
+
+    @patch("app.core.rabbitmq.get_connection")
+    def test_topology_is_declared_again_after_failure(self, mock_get_conn):
+        """Se a declaração do exchange falha, o próximo canal declara de novo."""
+
+        broken_conn = MagicMock()
+        broken_conn.channel.return_value.exchange_declare.side_effect = (
+            AMQPConnectionError("conexão perdida")
+        )
+        healthy_conn = MagicMock()
+        healthy_channel = MagicMock()
+        healthy_conn.channel.return_value = healthy_channel
+        mock_get_conn.side_effect = [broken_conn, healthy_conn]
+
+        publisher = Publisher(pool_size=1, retries=0)
+        with pytest.raises(AMQPConnectionError):
+            publisher.publish("test.event", {"test": "data"})
+        publisher.publish("test.event", {"test": "data"})
+
+        broken_conn.close.assert_called_once()
+        healthy_channel.exchange_declare.assert_called_once()
+        healthy_channel.basic_publish.assert_called_once()
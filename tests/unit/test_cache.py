@@ -0,0 +1,81 @@
+"""
+Testes unitários para os caches em memória.
+"""
+
+import pytest
+
+from app.core.cache import IdBitmap, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+    """Testes para TTLCache."""
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2, ttl_s=60)
+        cache.set(1, "a")
+        cache.set(2, "b")
+        cache.get(1)
+        cache.set(3, "c")
+
+        assert cache.get(2) is None
+        assert cache.get(1) == "a"
+        assert cache.get(3) == "c"
+
+    def test_entries_expire(self):
+        clock = FakeClock()
+        cache = TTLCache(maxsize=10, ttl_s=5, clock=clock)
+        cache.set(1, 10)
+
+        clock.now = 4.9
+        assert cache.get(1) == 10
+        clock.now = 5.0
+        assert cache.get(1) is None
+        assert len(cache) == 0
+
+    def test_adjust_only_touches_cached_entries(self):
+        cache = TTLCache(maxsize=10, ttl_s=5)
+        cache.set(1, 10)
+
+        assert cache.adjust(1, -3) is True
+        assert cache.adjust(2, -3) is False
+        assert cache.get(1) == 7
+        assert cache.get(2) is None
+
+    def test_stats_count_hits_and_misses(self):
+        cache = TTLCache(maxsize=10, ttl_s=5)
+        cache.set(1, "a")
+        cache.get(1)
+        cache.get(2)
+        cache.invalidate_many([1])
+        cache.get(1)
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 0)
+        assert stats["hit_ratio"] == pytest.approx(1 / 3)
+
+
+class TestIdBitmap:
+    """Testes para IdBitmap."""
+
+    def test_membership(self):
+        bitmap = IdBitmap([1, 8, 1000])
+        bitmap.add(9)
+
+        assert all(i in bitmap for i in (1, 8, 9, 1000))
+        assert all(i not in bitmap for i in (0, 2, 7, 999, 1001, 10**6))
+
+    def test_negative_ids_are_ignored(self):
+        bitmap = IdBitmap([1000])
+        bitmap.add(-1)
+
+        assert -1 not in bitmap
+        assert 1000 in bitmap
+        assert 1007 not in bitmap
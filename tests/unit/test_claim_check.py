@@ -0,0 +1,121 @@
+"""
+Testes do claim-check de itens de pedido.
+"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+from app.models.outbox import OutboxEvent
+from app.services import claim_check
+from app.services.order_service import create_order
+from tests.conftest import TestingSessionLocal
+
+ITEMS = [
+    {"product_id": 3, "quantity": 2},
+    {"product_id": 1, "quantity": 1},
+    {"product_id": 3, "quantity": 4},
+]
+
+
+@pytest.fixture
+def claim_db():
+    """Pedidos com 2+ linhas em claim-check, lidos do banco de teste."""
+    with patch.object(claim_check.settings, "claim_check_min_items", 2), patch.object(
+        claim_check.settings, "claim_check_store", "db"
+    ), patch.object(claim_check, "SessionLocal", TestingSessionLocal):
+        yield
+
+
+class TestClaimCheckPayload:
+    """Testes para o payload de order.created."""
+
+    def test_small_order_keeps_items(self, db_session):
+        """Abaixo do limite o evento leva os itens como antes."""
+        payload = claim_check.order_payload(1, "a@b.com", ITEMS[:1])
+
+        assert payload == {"order_id": 1, "email": "a@b.com", "items": ITEMS[:1]}
+
+    @patch.object(claim_check.settings, "claim_check_min_items", 0)
+    def test_zero_threshold_disables(self):
+        """CLAIM_CHECK_MIN_ITEMS=0 desliga o claim-check."""
+        assert "items" in claim_check.order_payload(1, "a@b.com", ITEMS * 1000)
+
+    def test_large_order_carries_reference(self, claim_db, db_session):
+        """Acima do limite o evento leva referência, versão e resumo."""
+        order = create_order(db_session, ITEMS, "a@b.com")
+
+        payload = db_session.query(OutboxEvent).one().payload
+        assert "items" not in payload
+        assert payload["order_id"] == order.order_id
+        assert payload["items_ref"]["store"] == "db"
+        assert len(payload["items_ref"]["version"]) == 64
+        assert payload["summary"] == {"lines": 3, "units": 7, "products": 2}
+
+    def test_forward_keeps_reference(self):
+        """Os workers repassam a referência sem carregar os itens."""
+        data = {
+            "order_id": 1,
+            "email": "a@b.com",
+            "items_ref": {"store": "db", "version": "v"},
+            "summary": {"lines": 3},
+            "shard": 0,
+        }
+
+        assert claim_check.forward(data) == {
+            "order_id": 1,
+            "email": "a@b.com",
+            "items_ref": {"store": "db", "version": "v"},
+            "summary": {"lines": 3},
+        }
+
+
+class TestClaimCheckLoad:
+    """Testes para a leitura dos itens referenciados."""
+
+    def test_load_many_from_db_in_one_query(self, claim_db, db_session):
+        """Deve buscar os itens de vários pedidos de uma vez e guardar no cache."""
+        first = create_order(db_session, ITEMS, "a@b.com")
+        second = create_order(db_session, ITEMS[:2], "a@b.com")
+        payloads = [event.payload for event in db_session.query(OutboxEvent)]
+        inline = {"order_id": 99, "items": ITEMS[:1]}
+
+        with patch.object(
+            claim_check, "_load_from_db", wraps=claim_check._load_from_db
+        ) as load:
+            loaded = claim_check.load_many(payloads + [inline])
+            again = claim_check.load_many(payloads)
+
+        assert loaded == [ITEMS, ITEMS[:2], ITEMS[:1]]
+        assert again == [ITEMS, ITEMS[:2]]
+        load.assert_called_once_with([first.order_id, second.order_id])
+
+    def test_missing_items_fail_only_that_order(self, claim_db, db_session):
+        """Pedido sem itens no armazenamento vira LookupError na sua posição."""
+        create_order(db_session, ITEMS, "a@b.com")
+        payload = db_session.query(OutboxEvent).one().payload
+        missing = {**payload, "order_id": 999}
+
+        loaded = claim_check.load_many([payload, missing])
+
+        assert loaded[0] == ITEMS
+        assert isinstance(loaded[1], LookupError)
+        with pytest.raises(LookupError):
+            claim_check.load_items(missing)
+
+    def test_blob_store_is_content_addressed(self, tmp_path):
+        """Mesmo conteúdo grava um único blob, lido de volta pela versão."""
+        with patch.object(
+            claim_check.settings, "claim_check_min_items", 2
+        ), patch.object(
+            claim_check.settings, "claim_check_store", "blob"
+        ), patch.object(
+            claim_check.settings, "claim_check_blob_dir", str(tmp_path)
+        ):
+            first = claim_check.order_payload(1, "a@b.com", ITEMS)
+            second = claim_check.order_payload(2, "a@b.com", ITEMS)
+
+            assert first["items_ref"] == second["items_ref"]
+            assert sum(len(files) for _root, _dirs, files in os.walk(tmp_path)) == 1
+            assert claim_check.load_many([first, second]) == [ITEMS, ITEMS]
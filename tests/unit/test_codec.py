@@ -0,0 +1,103 @@
+"""
+Testes dos codecs de mensagem do RabbitMQ.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core import rabbitmq
+from app.core.rabbitmq import JSON, PACKED, ZLIB, Publisher, decode, encode
+
+ORDER = {
+    "order_id": 7,
+    "email": "a@b.com",
+    "items": [{"product_id": 1, "quantity": 2}, {"product_id": 9, "quantity": 1}],
+}
+
+
+def properties(content_type=None, content_encoding=None):
+    return SimpleNamespace(content_type=content_type, content_encoding=content_encoding)
+
+
+class TestCodecs:
+    """Testes para encode/decode."""
+
+    @pytest.mark.parametrize("codec", ["json", "packed"])
+    def test_round_trip(self, codec):
+        """Os dois codecs devem devolver o mesmo payload."""
+        body, content_type, content_encoding = encode(ORDER, codec)
+
+        assert content_encoding is None
+        assert decode(body, properties(content_type)) == ORDER
+
+    def test_packed_is_smaller_for_item_lists(self):
+        """Listas de pares de inteiros viram um array compacto."""
+        order = {**ORDER, "items": ORDER["items"] * 500}
+
+        packed, content_type, _ = encode(order, "packed")
+        plain, _, _ = encode(order, "json")
+
+        assert content_type == PACKED
+        assert len(packed) * 3 < len(plain)
+        assert decode(packed, properties(PACKED)) == order
+
+    def test_packed_keeps_irregular_lists_in_header(self):
+        """Listas que não são pares de int32 seguem como JSON no cabeçalho."""
+        payload = {
+            "deltas": [{"product_id": 1, "delta": -3}],
+            "parts": [0, 2],
+            "items": [{"product_id": 1, "quantity": 2**40}],
+            "flags": [{"a": True, "b": 1}],
+        }
+
+        body, _, _ = encode(payload, "packed")
+
+        assert decode(body, properties(PACKED)) == payload
+
+    @patch.object(rabbitmq.settings, "rabbitmq_compress_min_bytes", 64)
+    def test_compresses_above_threshold(self):
+        """Corpos grandes vão com zlib; os pequenos, não."""
+        small = encode({"order_id": 1}, "json")
+        large = encode({**ORDER, "items": ORDER["items"] * 100}, "json")
+
+        assert small[2] is None
+        assert large[2] == ZLIB
+        assert decode(large[0], properties(JSON, ZLIB))["items"] == (
+            ORDER["items"] * 100
+        )
+
+    def test_missing_content_type_is_json(self):
+        """Mensagens de produtores antigos (sem content_type) são JSON."""
+        assert decode(b'{"order_id": 1}', None) == {"order_id": 1}
+
+    @pytest.mark.parametrize(
+        "body,props",
+        [
+            (b"\x01\x00", properties(PACKED)),
+            (b"nao-zlib", properties(JSON, ZLIB)),
+            (b"{}", properties("text/plain")),
+            (b"{}", properties(JSON, "br")),
+        ],
+    )
+    def test_invalid_messages_raise_value_error(self, body, props):
+        """Corpo ou propriedades inválidos viram ValueError."""
+        with pytest.raises(ValueError):
+            decode(body, props)
+
+    @patch.object(rabbitmq.settings, "rabbitmq_codec", "packed")
+    @patch("app.core.rabbitmq.get_connection")
+    def test_publisher_sets_content_type(self, mock_get_conn):
+        """O publisher anuncia o codec nas propriedades da mensagem."""
+        channel = MagicMock()
+        mock_get_conn.return_value.channel.return_value = channel
+
+        publisher = Publisher(pool_size=1)
+        publisher.publish("order.created", ORDER)
+        publisher.close()
+
+        sent = channel.basic_publish.call_args.kwargs
+        assert sent["properties"].content_type == PACKED
+        assert sent["properties"].delivery_mode == 2
+        assert decode(sent["body"], sent["properties"]) == ORDER
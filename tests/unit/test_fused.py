@@ -0,0 +1,259 @@
+"""
+Testes do modo fused (pipeline em processo).
+"""
+
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from app.core import rabbitmq
+from app.core.rabbitmq import topic_matches
+from app.repositories.stock_movement_repository import MovementRecord
+from app.workers import fused, runtime
+from app.workers.fused import FusedPipeline
+from app.workers.runtime import QueueHandler
+
+
+def handler(queue, routing_keys, callback, **options):
+    return QueueHandler(queue, tuple(routing_keys), callback, **options)
+
+
+@pytest.fixture
+def pipelines():
+    started = []
+
+    def start(handlers, **options):
+        pipeline = FusedPipeline(handlers, **options).start()
+        started.append(pipeline)
+        return pipeline
+
+    yield start
+    for pipeline in started:
+        pipeline.stop(timeout=1)
+    rabbitmq.use_local_bus(None)
+
+
+class TestTopicMatches:
+    """Testes para o casamento de routing keys do exchange topic."""
+
+    @pytest.mark.parametrize(
+        "pattern,routing_key,expected",
+        [
+            ("order.created", "order.created", True),
+            ("order.created", "order.processed", False),
+            ("stock.reserve.*", "stock.reserve.3", True),
+            ("stock.reserve.*", "stock.reserve", False),
+            ("stock.reserve.*", "stock.reserve.3.x", False),
+            ("stock.#", "stock", True),
+            ("stock.#", "stock.part.failed", True),
+            ("#.failed", "payment.failed", True),
+            ("*.failed", "stock.part.failed", False),
+            ("#", "qualquer.coisa", True),
+        ],
+    )
+    def test_matches_like_amqp(self, pattern, routing_key, expected):
+        assert topic_matches(pattern, routing_key) is expected
+
+
+class TestFusedPipeline:
+    """Testes para o FusedPipeline."""
+
+    def test_routes_by_topic(self, pipelines):
+        """Cada fila recebe só as routing keys dos seus bindings."""
+        received = []
+
+        def callback(name):
+            def on_message(_ch, method, properties, body):
+                received.append(
+                    (name, method.routing_key, rabbitmq.decode(body, properties))
+                )
+
+            return on_message
+
+        pipeline = pipelines(
+            [
+                handler("a", ["order.*"], callback("a")),
+                handler("b", ["order.processed", "payment.#"], callback("b")),
+            ]
+        )
+
+        pipeline.publish_many(
+            [
+                ("order.created", {"order_id": 1}),
+                ("order.processed", {"order_id": 1}),
+                ("payment.failed", {"order_id": 2}),
+                ("stock.updated", {}),
+            ]
+        )
+
+        assert pipeline.join(timeout=2)
+        assert sorted(received, key=lambda r: (r[0], r[1])) == [
+            ("a", "order.created", {"order_id": 1}),
+            ("a", "order.processed", {"order_id": 1}),
+            ("b", "order.processed", {"order_id": 1}),
+            ("b", "payment.failed", {"order_id": 2}),
+        ]
+
+    def test_full_queue_blocks_publisher(self, pipelines):
+        """Com a fila cheia, quem publica espera o consumidor (backpressure)."""
+        release = threading.Event()
+        pipeline = pipelines(
+            [handler("slow", ["x"], lambda *_args: release.wait(2))],
+            queue_size=1,
+            concurrency=1,
+        )
+        pipeline.publish_many([("x", {}), ("x", {})])  # 1 em execução + 1 na fila
+
+        done = threading.Event()
+        publisher = threading.Thread(
+            target=lambda: (pipeline.publish_many([("x", {})]), done.set())
+        )
+        publisher.start()
+
+        assert not done.wait(0.1)
+        release.set()
+        assert done.wait(2)
+        publisher.join()
+        assert pipeline.join(timeout=2)
+
+    def test_batch_handler_receives_batches(self, pipelines):
+        """Handlers com batch_size recebem as entregas agrupadas."""
+        sizes = []
+        pipeline = pipelines(
+            [
+                handler(
+                    "batch",
+                    ["x"],
+                    lambda _ch, deliveries: sizes.append(len(deliveries)),
+                    batch_size=10,
+                    batch_wait_ms=50,
+                )
+            ],
+            concurrency=1,
+        )
+
+        pipeline.publish_many([("x", {"i": i}) for i in range(25)])
+
+        assert pipeline.join(timeout=2)
+        assert sum(sizes) == 25
+        assert max(sizes) == 10
+
+    def test_nack_requeue_redelivers(self, pipelines):
+        """basic_nack(requeue=True) devolve a mensagem à fila."""
+        attempts = []
+
+        def flaky(ch, method, _properties, _body):
+            attempts.append(method.delivery_tag)
+            if len(attempts) == 1:
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+
+        pipeline = pipelines([handler("flaky", ["x"], flaky)])
+        pipeline.publish_many([("x", {})])
+
+        assert pipeline.join(timeout=2)
+        assert len(attempts) == 2
+
+    @patch.object(fused.settings, "worker_retry_base_delay_ms", 10)
+    @patch.object(fused.settings, "worker_retry_attempts", 2)
+    def test_handler_error_retries_with_backoff(self, pipelines):
+        """Erro no handler reentrega após os atrasos de retry, até esgotar."""
+        attempts = []
+
+        def failing(_ch, method, _properties, _body):
+            attempts.append(method.attempts)
+            raise ConnectionError("banco fora do ar")
+
+        pipeline = pipelines([handler("failing", ["x"], failing)])
+        with patch("builtins.print"):
+            pipeline.publish_many([("x", {})])
+            assert pipeline.join(timeout=2)
+
+        assert attempts == [0, 1, 2]
+
+    def test_stop_waits_for_running_handlers(self, pipelines):
+        """O loop só fecha depois dos handlers em execução (até o timeout)."""
+        started, release, published = threading.Event(), threading.Event(), []
+
+        def slow(ch, _method, _properties, _body):
+            started.set()
+            release.wait(5)
+            published.append(pipeline.publish_many([("y", {})]))
+
+        pipeline = pipelines(
+            [handler("slow", ["x"], slow), handler("other", ["y"], lambda *_: None)]
+        )
+        pipeline.publish_many([("x", {})])
+        assert started.wait(2)
+        # Solta o handler depois do timeout do join, dentro do da espera.
+        threading.Timer(0.75, release.set).start()
+
+        with patch("builtins.print"):
+            pipeline.stop(timeout=0.5)
+
+        assert published == [1]
+
+    def test_publish_uses_local_bus(self, pipelines):
+        """Com o pipeline instalado, publish_event não usa o broker."""
+        received = []
+        pipeline = pipelines(
+            [handler("q", ["order.created"], lambda *args: received.append(args[3]))]
+        )
+        rabbitmq.use_local_bus(pipeline)
+
+        with patch("app.core.rabbitmq.get_publisher") as get_publisher:
+            rabbitmq.publish_event("order.created", {"order_id": 5})
+
+        assert pipeline.join(timeout=2)
+        get_publisher.assert_not_called()
+        assert received == [{"order_id": 5}]
+
+
+class TestFusedWorkers:
+    """Os callbacks dos workers encadeados em um processo."""
+
+    @patch("app.workers.notify_worker.send_order_processed_email")
+    @patch("app.workers.stock_worker.reserve_stock_batch")
+    @patch("app.workers.order_worker._check_availability")
+    @patch("app.workers.fused.availability_service.apply_update")
+    def test_order_flows_through_all_stages(
+        self, apply_update, _check, reserve, send_email, pipelines
+    ):
+        """order.created percorre order → payment → stock → notify em memória."""
+        reserve.side_effect = lambda orders: [
+            [MovementRecord(1, item["product_id"], item["quantity"], "saida", None)]
+            for items in orders
+            for item in items
+        ]
+        pipeline = pipelines(fused.load_handlers())
+        rabbitmq.use_local_bus(pipeline)
+
+        rabbitmq.publish_event(
+            "order.created",
+            {
+                "order_id": 42,
+                "email": "a@b.com",
+                "items": [{"product_id": 7, "quantity": 2}],
+            },
+        )
+
+        assert pipeline.join(timeout=5)
+        reserve.assert_called_once_with([[{"product_id": 7, "quantity": 2}]])
+        send_email.assert_called_once_with(42, "a@b.com")
+        apply_update.assert_called_once_with(
+            {"deltas": [{"product_id": 7, "delta": -2}]}
+        )
+
+
+class TestRunWorkerFused:
+    """Workers avulsos no modo fused."""
+
+    @patch.object(runtime.settings, "messaging_mode", "fused")
+    @patch("app.workers.runtime._idle_until_stopped")
+    @patch("app.workers.runtime.WorkerRuntime")
+    def test_standalone_worker_stays_idle(self, worker_runtime, idle):
+        """Sem broker, o worker avulso não consome e não encerra."""
+        runtime.run_worker("notify_queue")
+
+        worker_runtime.assert_not_called()
+        idle.assert_called_once_with("notify_queue")
@@ -0,0 +1,52 @@
+"""
+Testes unitários para a leitura incremental de JSON.
+"""
+
+import json
+
+import pytest
+
+from app.core.json_stream import JSONStreamDecoder
+
+
+def decode(body: bytes, chunk_size: int) -> list:
+    decoder = JSONStreamDecoder()
+    items = []
+    for start in range(0, len(body), chunk_size):
+        items += decoder.feed(body[start : start + chunk_size])
+    decoder.close()
+    return items
+
+
+class TestJSONStreamDecoder:
+    """Testes para JSONStreamDecoder."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 17, 4096])
+    def test_array_split_anywhere(self, chunk_size):
+        orders = [
+            {"email": "ção@b.com", "items": [{"product_id": i}]} for i in range(20)
+        ]
+
+        assert decode(json.dumps(orders).encode(), chunk_size) == orders
+
+    def test_ndjson(self):
+        body = b'{"a": 1}\n{"a": 2}\n\n{"a": 3}'
+
+        assert decode(body, 4) == [{"a": 1}, {"a": 2}, {"a": 3}]
+
+    def test_items_are_yielded_before_the_body_ends(self):
+        decoder = JSONStreamDecoder()
+
+        assert decoder.feed(b'[{"a": 1}, {"a"') == [{"a": 1}]
+        assert decoder.feed(b": 2}]") == [{"a": 2}]
+
+    def test_numbers_split_between_chunks(self):
+        assert decode(b"[12, 345]", 2) == [12, 345]
+
+    @pytest.mark.parametrize("body", [b"[{}", b"[{},]", b"[{} {}]", b"[] {}", b'{"a":'])
+    def test_malformed_body(self, body):
+        with pytest.raises(ValueError):
+            decode(body, 2)
+
+    def test_empty_array(self):
+        assert decode(b" [ ] ", 1) == []
@@ -0,0 +1,270 @@
+"""
+Testes do broker AMQP em memória.
+"""
+
+import threading
+from unittest.mock import patch
+
+import pytest
+from pika.exceptions import AMQPConnectionError, ChannelClosedByBroker
+
+from app.core import rabbitmq
+from app.core.memory_broker import MemoryBroker
+from app.workers.runtime import QueueHandler, WorkerRuntime
+
+
+@pytest.fixture
+def broker():
+    broker = MemoryBroker()
+    rabbitmq.use_connection_factory(broker.connect)
+    yield broker
+    rabbitmq.use_connection_factory(None)
+
+
+def declare(broker, queue, *routing_keys, **options):
+    channel = broker.connect().channel()
+    rabbitmq.declare_topology(channel)
+    channel.queue_declare(queue=queue, durable=True, **options)
+    for routing_key in routing_keys:
+        channel.queue_bind(
+            exchange=rabbitmq.EXCHANGE_NAME, queue=queue, routing_key=routing_key
+        )
+    return channel
+
+
+def drain(connection, received, expected):
+    while len(received) < expected:
+        connection.process_data_events(time_limit=1)
+
+
+class TestMemoryBroker:
+    """Testes para o MemoryBroker."""
+
+    def test_topic_routing(self, broker):
+        """Cada fila recebe as routing keys dos seus bindings."""
+        declare(broker, "orders", "order.*")
+        declare(broker, "failures", "#.failed")
+
+        rabbitmq.publish_many(
+            [
+                ("order.created", {"order_id": 1}),
+                ("payment.failed", {"order_id": 2}),
+                ("stock.part.failed", {"order_id": 3}),
+            ]
+        )
+
+        assert broker.message_count("orders") == 1
+        assert broker.message_count("failures") == 2
+
+    def test_prefetch_limits_unacked(self, broker):
+        """Com prefetch N, só N entregas ficam sem ack no canal."""
+        channel = declare(broker, "q", "x")
+        channel.basic_qos(prefetch_count=2)
+        received = []
+        channel.basic_consume(
+            "q", lambda _ch, method, _props, _body: received.append(method)
+        )
+        rabbitmq.publish_many([("x", {"i": i}) for i in range(5)])
+
+        channel._connection.process_data_events()
+        assert len(received) == 2
+
+        channel.basic_ack(delivery_tag=received[-1].delivery_tag, multiple=True)
+        channel._connection.process_data_events()
+        assert len(received) == 4
+        assert broker.queue_stats()["q"]["acked"] == 2
+
+    def test_nack_requeue_redelivers(self, broker):
+        """Nack com requeue devolve a mensagem marcada como redelivered."""
+        channel = declare(broker, "q", "x")
+        received = []
+        channel.basic_consume(
+            "q", lambda _ch, method, _props, body: received.append((method, body))
+        )
+        rabbitmq.publish_event("x", {"i": 1})
+
+        drain(channel._connection, received, 1)
+        channel.basic_nack(delivery_tag=received[0][0].delivery_tag, requeue=True)
+        drain(channel._connection, received, 2)
+
+        assert not received[0][0].redelivered
+        assert received[1][0].redelivered
+        assert received[1][1] == received[0][1]
+
+    def test_closed_connection_requeues_unacked(self, broker):
+        """Entregas sem ack voltam para a fila quando a conexão cai."""
+        channel = declare(broker, "q", "x")
+        received = []
+        channel.basic_consume("q", lambda *args: received.append(args))
+        rabbitmq.publish_many([("x", {"i": i}) for i in range(3)])
+        drain(channel._connection, received, 3)
+
+        channel._connection.close()
+
+        stats = broker.queue_stats()["q"]
+        assert stats["ready"] == 3
+        assert stats["unacked"] == 0
+        assert stats["requeued"] == 3
+
+    def test_unknown_delivery_tag_closes_channel(self, broker):
+        """Ack de tag desconhecida fecha o canal, como no RabbitMQ."""
+        channel = declare(broker, "q", "x")
+
+        with pytest.raises(ChannelClosedByBroker):
+            channel.basic_ack(delivery_tag=42)
+
+        assert channel.is_closed
+
+    def test_exclusive_queue_removed_with_connection(self, broker):
+        """Filas exclusivas somem quando a conexão dona fecha."""
+        channel = broker.connect().channel()
+        result = channel.queue_declare(queue="", exclusive=True, auto_delete=True)
+        name = result.method.queue
+
+        channel._connection.close()
+
+        assert name not in broker.queue_stats()
+
+    def test_consume_inactivity_timeout(self, broker):
+        """consume() devolve (None, None, None) quando não há mensagens."""
+        channel = declare(broker, "q", "x")
+        rabbitmq.publish_event("x", {"i": 1})
+
+        messages = channel.consume("q", auto_ack=True, inactivity_timeout=0.01)
+        method, properties, body = next(messages)
+        assert rabbitmq.decode(body, properties) == {"i": 1}
+        assert next(messages) == (None, None, None)
+        messages.close()
+
+        assert broker.consumer_count("q") == 0
+
+    def test_tx_rollback_discards(self, broker):
+        """Mensagens de uma transação só entram no commit."""
+        channel = declare(broker, "q", "x")
+        channel.tx_select()
+        channel.basic_publish(
+            exchange=rabbitmq.EXCHANGE_NAME, routing_key="x", body=b"1"
+        )
+        assert broker.message_count("q") == 0
+
+        channel.tx_rollback()
+        channel.tx_commit()
+        assert broker.message_count("q") == 0
+
+        channel.basic_publish(
+            exchange=rabbitmq.EXCHANGE_NAME, routing_key="x", body=b"2"
+        )
+        channel.tx_commit()
+        assert broker.message_count("q") == 1
+
+    def test_publish_failure_exhausts_retries(self, broker):
+        """Falha injetada derruba a conexão e o Publisher tenta de novo."""
+        declare(broker, "q", "x")
+        broker.publish_failure_rate = 1.0
+        connections = broker.connections
+
+        publisher = rabbitmq.Publisher(pool_size=1, retries=2)
+        with pytest.raises(AMQPConnectionError):
+            publisher.publish("x", {"i": 1})
+
+        assert broker.failures == 3
+        assert broker.connections - connections == 3
+        assert broker.message_count("q") == 0
+
+    def test_expired_messages_are_dead_lettered(self, broker):
+        """x-message-ttl vence e a mensagem vai para o x-dead-letter-exchange."""
+        declare(broker, "target", "y")
+        channel = declare(
+            broker,
+            "delay",
+            "x",
+            arguments={
+                "x-message-ttl": 10,
+                "x-dead-letter-exchange": rabbitmq.EXCHANGE_NAME,
+                "x-dead-letter-routing-key": "y",
+            },
+        )
+        rabbitmq.publish_event("x", {"i": 1})
+        assert broker.message_count("target") == 0
+
+        assert broker.wait_idle(timeout=0.05) is False
+        method, properties, body = channel.basic_get("target", auto_ack=True)
+
+        assert rabbitmq.decode(body, properties) == {"i": 1}
+        assert method.routing_key == "y"
+        [death] = properties.headers["x-death"]
+        assert (death["queue"], death["reason"]) == ("delay", "expired")
+
+    def test_lost_acks_redeliver(self, broker):
+        """Com redelivery_rate=1 todo ack se perde e a mensagem volta."""
+        channel = declare(broker, "q", "x")
+        broker.redelivery_rate = 1.0
+        received = []
+        channel.basic_consume("q", lambda _ch, method, *_: received.append(method))
+        rabbitmq.publish_event("x", {"i": 1})
+
+        drain(channel._connection, received, 1)
+        channel.basic_ack(delivery_tag=received[0].delivery_tag)
+        drain(channel._connection, received, 2)
+
+        assert received[1].redelivered
+
+
+class TestWorkerRuntimeOnMemoryBroker:
+    """O runtime dos workers rodando contra o broker em memória."""
+
+    def test_consumes_and_acks(self, broker):
+        received = []
+        runtime = WorkerRuntime(
+            [
+                QueueHandler(
+                    "q",
+                    ("order.*",),
+                    lambda _ch, _method, props, body: received.append(
+                        rabbitmq.decode(body, props)
+                    ),
+                )
+            ],
+            name="test",
+            concurrency=2,
+        )
+        thread = threading.Thread(target=runtime.run)
+        thread.start()
+        try:
+            with broker.cond:
+                broker.cond.wait_for(lambda: broker.consumer_count("q"), timeout=2)
+
+            rabbitmq.publish_many([("order.created", {"i": i}) for i in range(50)])
+
+            assert broker.wait_idle(timeout=2)
+        finally:
+            runtime.request_stop()
+            thread.join(timeout=5)
+
+        assert sorted(message["i"] for message in received) == list(range(50))
+        assert broker.queue_stats()["q"]["acked"] == 50
+
+    @patch("app.workers.runtime.settings.worker_drain_timeout_s", 0.5)
+    def test_stop_waits_for_running_handlers(self, broker):
+        """A conexão só fecha depois dos handlers em execução."""
+        started, release = threading.Event(), threading.Event()
+
+        def slow(_ch, _method, _props, _body):
+            started.set()
+            release.wait(5)
+
+        runtime = WorkerRuntime([QueueHandler("q", ("x",), slow)], name="test")
+        thread = threading.Thread(target=runtime.run)
+        thread.start()
+        try:
+            with broker.cond:
+                broker.cond.wait_for(lambda: broker.consumer_count("q"), timeout=2)
+            rabbitmq.publish_event("x", {})
+            assert started.wait(2)
+            runtime.request_stop()
+            # Solta o handler depois do prazo de drenagem, dentro da espera.
+            threading.Timer(0.75, release.set).start()
+        finally:
+            thread.join(timeout=5)
+
+        assert broker.queue_stats()["q"]["acked"] == 1
@@ -0,0 +1,201 @@
+"""
+Testes da manutenção de partições de stock_movements.
+"""
+
+from datetime import date, datetime, timezone
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+from sqlalchemy import delete
+
+from app.db import partitions
+from app.models.product import Product
+from app.models.stock_movement import StockMovement
+from app.services import ledger_service
+from app.services.cost_service import replay_average_costs
+from app.services.snapshot_service import build_snapshots, stock_at
+
+
+def postgres_session():
+    db = MagicMock()
+    db.get_bind.return_value.dialect.name = "postgresql"
+    return db
+
+
+def executed(db) -> list[str]:
+    return [str(call.args[0]) for call in db.execute.call_args_list]
+
+
+class TestPartitionNames:
+    """Testes para os nomes das partições mensais."""
+
+    def test_partition_month(self):
+        assert partitions.partition_month("stock_movements_y2026m03") == date(
+            2026, 3, 1
+        )
+        assert partitions.partition_month("stock_movements_default") is None
+
+
+class TestPartitionMaintenance:
+    """Testes para criação e arquivamento de partições."""
+
+    def test_noop_outside_postgres(self, db_session):
+        partitions.ensure_partitions(db_session, 3)
+
+        assert partitions.movement_partitions(db_session) == []
+        assert partitions.archive_partitions(db_session, date(2030, 1, 1)) == []
+
+    def test_ensure_calls_database_function(self):
+        db = postgres_session()
+
+        partitions.ensure_partitions(db, 2)
+
+        assert executed(db) == ["SELECT stock_movements_ensure_partitions(:months)"]
+        assert db.execute.call_args.args[1] == {"months": 2}
+        db.commit.assert_called_once()
+
+    def test_archive_moves_only_older_months(self):
+        db = postgres_session()
+        attached = [
+            ("stock_movements_y2025m11", date(2025, 11, 1)),
+            ("stock_movements_y2025m12", date(2025, 12, 1)),
+            ("stock_movements_y2026m01", date(2026, 1, 1)),
+        ]
+
+        with patch.object(
+            partitions, "movement_partitions", return_value=attached
+        ), patch.object(ledger_service, "carry_forward") as carry:
+            archived = partitions.archive_partitions(db, date(2026, 1, 1))
+
+        assert carry.call_args_list == [
+            call(
+                db,
+                "stock_movements_y2025m11",
+                datetime(2025, 12, 1, tzinfo=timezone.utc),
+            ),
+            call(
+                db,
+                "stock_movements_y2025m12",
+                datetime(2026, 1, 1, tzinfo=timezone.utc),
+            ),
+        ]
+        assert archived == ["stock_movements_y2025m11", "stock_movements_y2025m12"]
+        statements = executed(db)
+        assert (
+            'ALTER TABLE stock_movements DETACH PARTITION "stock_movements_y2025m11"'
+            in statements
+        )
+        assert (
+            'ALTER TABLE "stock_movements_y2025m12" SET SCHEMA "archive"' in statements
+        )
+        assert not any("y2026m01" in statement for statement in statements)
+        assert db.commit.call_count == 2
+
+    def test_archive_to_dump_drops_partition(self, tmp_path):
+        db = postgres_session()
+        attached = [("stock_movements_y2025m11", date(2025, 11, 1))]
+
+        with patch.object(
+            partitions, "movement_partitions", return_value=attached
+        ), patch.object(partitions, "_dump") as dump, patch.object(
+            ledger_service, "carry_forward"
+        ):
+            partitions.archive_partitions(db, date(2026, 1, 1), dump_dir=str(tmp_path))
+
+        dump.assert_called_once_with(db, "stock_movements_y2025m11", str(tmp_path))
+        assert 'DROP TABLE "stock_movements_y2025m11"' in executed(db)
+
+    def test_incomplete_partition_is_not_detached(self):
+        db = postgres_session()
+        attached = [("stock_movements_y2025m11", date(2025, 11, 1))]
+
+        with patch.object(
+            partitions, "movement_partitions", return_value=attached
+        ), patch.object(ledger_service, "carry_forward", side_effect=ValueError):
+            with pytest.raises(ValueError):
+                partitions.archive_partitions(db, date(2026, 1, 1))
+
+        assert not any("DETACH" in statement for statement in executed(db))
+        db.rollback.assert_called_once()
+
+
+def move(db, product_id, quantity, movement_type, created_at, unit_cost=None):
+    db.add(
+        StockMovement(
+            product_id=product_id,
+            quantity=quantity,
+            movement_type=movement_type,
+            unit_cost=unit_cost,
+            created_at=created_at,
+        )
+    )
+    db.commit()
+
+
+def history(db):
+    return db.execute(
+        StockMovement.__table__.select()
+        .with_only_columns(
+            StockMovement.product_id,
+            StockMovement.quantity,
+            StockMovement.movement_type,
+            StockMovement.unit_cost,
+        )
+        .order_by(
+            StockMovement.product_id,
+            StockMovement.created_at,
+            StockMovement.movement_id,
+        )
+    )
+
+
+class TestCarryForward:
+    """Testes para a abertura gravada antes de arquivar um mês."""
+
+    cutoff = datetime(2026, 2, 1)
+
+    def archive(self, db):
+        """Simula o DETACH: some tudo que é anterior ao corte."""
+        db.execute(delete(StockMovement).where(StockMovement.created_at < self.cutoff))
+        db.commit()
+
+    def test_ledger_keeps_balance_and_cost_after_archiving(self, db_session):
+        product = Product(name="Arquivado")
+        db_session.add(product)
+        db_session.commit()
+        pid = product.product_id
+        move(db_session, pid, 10, "entrada", datetime(2026, 1, 5), 2.0)
+        move(db_session, pid, 10, "entrada", datetime(2026, 1, 10), 4.0)
+        move(db_session, pid, 5, "saida", datetime(2026, 1, 20))
+        with patch("app.services.snapshot_service.settings.stock_snapshot_lag_s", 0):
+            build_snapshots(db_session, now=datetime(2026, 1, 25))
+            build_snapshots(db_session, now=datetime(2026, 2, 4))
+
+            carried = ledger_service.carry_forward(
+                db_session, "stock_movements", self.cutoff
+            )
+            db_session.commit()
+            self.archive(db_session)
+            move(db_session, pid, 1, "estorno", datetime(2026, 2, 6))
+            # O snapshot de janeiro foi descartado: parte da abertura.
+            build_snapshots(db_session, now=datetime(2026, 2, 10))
+
+        assert carried == 1
+        assert list(replay_average_costs(history(db_session))) == [(pid, 3.0)]
+        assert stock_at(db_session, pid, datetime(2026, 2, 4))["quantity"] == 15
+        balance = stock_at(db_session, pid, datetime(2026, 2, 10))
+        assert balance == {
+            "product_id": pid,
+            "at": datetime(2026, 2, 10),
+            "quantity": 16,
+            "snapshot_at": datetime(2026, 2, 10),
+        }
+
+    def test_refuses_history_without_opening(self, db_session):
+        product = Product(name="Legado")
+        db_session.add(product)
+        db_session.commit()
+        move(db_session, product.product_id, 3, "saida", datetime(2026, 1, 5))
+
+        with pytest.raises(ValueError):
+            ledger_service.carry_forward(db_session, "stock_movements", self.cutoff)
@@ -0,0 +1,142 @@
+"""
+Testes unitários para a conciliação de saldo com o razão de movimentações.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from app.models.product import Product
+from app.models.stock_discrepancy import StockDiscrepancy
+from app.models.stock_lease import StockLease
+from app.models.stock_reconciliation_state import StockReconciliationState
+from app.repositories.product_repository import create_product
+from app.repositories.stock_movement_repository import MovementRow, insert_movements
+from app.services import ledger_service, reconciliation_service
+from app.services.reconciliation_service import run_reconciliation
+from app.services.snapshot_service import build_snapshots
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture(autouse=True)
+def no_lag():
+    with patch.multiple(
+        "app.services.reconciliation_service.settings",
+        stock_reconciliation_lag_s=0,
+        stock_reconciliation_chunk_size=2,
+    ), patch("app.services.snapshot_service.settings.stock_snapshot_lag_s", 0):
+        yield
+
+
+def later() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=1)
+
+
+def reconcile(db, **kwargs):
+    return run_reconciliation(db, workers=1, now=later(), **kwargs)
+
+
+def drift(db, product, delta):
+    """Altera o saldo sem movimentação, como uma edição manual."""
+    product.quantity_on_hand += delta
+    db.commit()
+
+
+class TestReconciliation:
+    """Testes para run_reconciliation."""
+
+    def test_full_run_reports_drift(self, db_session):
+        ok = create_product(db_session, name="OK", quantity_on_hand=5)
+        bad = create_product(db_session, name="Bad", quantity_on_hand=5)
+        drift(db_session, bad, -2)
+
+        run = reconcile(db_session)
+
+        assert (run.status, run.products_checked, run.discrepancies) == ("done", 2, 1)
+        discrepancy = db_session.query(StockDiscrepancy).one()
+        assert (discrepancy.product_id, discrepancy.difference) == (bad.product_id, -2)
+        assert (discrepancy.quantity_on_hand, discrepancy.ledger_quantity) == (3, 5)
+        state = db_session.get(StockReconciliationState, ok.product_id)
+        assert state.balanced and state.last_movement_id == run.movement_watermark
+
+    def test_incremental_run_checks_moved_and_pending_products(self, db_session):
+        products = [
+            create_product(db_session, name=f"P{i}", quantity_on_hand=10)
+            for i in range(4)
+        ]
+        drift(db_session, products[0], 1)
+        reconcile(db_session)
+
+        insert_movements(db_session, [MovementRow(products[1].product_id, 3, "saida")])
+        products[1].quantity_on_hand -= 3
+        db_session.commit()
+        run = reconcile(db_session)
+
+        # products[1] movimentado + products[0] ainda divergente.
+        assert (run.products_checked, run.discrepancies) == (2, 1)
+
+        drift(db_session, products[0], -1)
+        assert reconcile(db_session).discrepancies == 0
+        assert reconcile(db_session).products_checked == 0
+
+    def test_ledger_starts_from_snapshot(self, db_session):
+        product = create_product(db_session, name="P", quantity_on_hand=10)
+        build_snapshots(db_session, now=datetime.utcnow())
+        insert_movements(db_session, [MovementRow(product.product_id, 4, "saida")])
+        product.quantity_on_hand -= 4
+        db_session.commit()
+
+        run = reconcile(db_session, full=True)
+
+        assert run.discrepancies == 0
+
+    def test_legacy_product_balances_after_opening_backfill(self, db_session):
+        """Produto anterior à abertura no razão: só a saída foi registrada."""
+        product = Product(name="Legado", quantity_on_hand=8)
+        db_session.add(product)
+        db_session.flush()
+        insert_movements(db_session, [MovementRow(product.product_id, 2, "saida")])
+        db_session.commit()
+        assert reconcile(db_session).discrepancies == 1
+
+        ledger_service.backfill_openings(db_session)
+        db_session.commit()
+        run = reconcile(db_session)
+
+        # A abertura tem movement_id novo: a rodada incremental reconfere.
+        assert (run.products_checked, run.discrepancies) == (1, 0)
+        state = db_session.get(StockReconciliationState, product.product_id)
+        assert state.balanced
+
+    def test_unconsumed_lease_units_are_not_drift(self, db_session):
+        product = create_product(db_session, name="Hot", quantity_on_hand=100)
+        lease = StockLease(
+            product_id=product.product_id, holder="w", granted=20, returned=0
+        )
+        db_session.add(lease)
+        db_session.flush()
+        insert_movements(
+            db_session, [MovementRow(product.product_id, 5, "saida", lease.lease_id)]
+        )
+        product.quantity_on_hand -= 20
+        db_session.commit()
+
+        assert reconcile(db_session).discrepancies == 0
+
+    def test_ranges_in_parallel(self, db_session):
+        for i in range(5):
+            create_product(db_session, name=f"P{i}", quantity_on_hand=1)
+        drift(db_session, db_session.query(Product).first(), 3)
+
+        with patch.object(
+            reconciliation_service, "ProcessPoolExecutor", ThreadPoolExecutor
+        ), patch.object(reconciliation_service, "SessionLocal", TestingSessionLocal):
+            run = run_reconciliation(db_session, workers=2, now=later())
+
+        assert (run.products_checked, run.discrepancies) == (5, 1)
+
+    def test_split_covers_range(self):
+        assert reconciliation_service._split(1, 10, 3) == [(1, 4), (5, 8), (9, 10)]
+        assert reconciliation_service._split(5, 5, 8) == [(5, 5)]
@@ -2,11 +2,26 @@
 Testes unitários para os repositories.
 """
 
+from datetime import datetime
+
 import pytest
-from app.repositories.order_repository import create_order
+from app.repositories.order_repository import (
+    add_items,
+    create_order,
+    item_rows,
+    list_order_items,
+    list_orders_with_product,
+)
 from app.repositories.product_repository import create_product
 from app.models.order import Order
 from app.models.product import Product
+from app.models.stock_movement import StockMovement
+from app.repositories.stock_movement_repository import (
+    MovementRecord,
+    MovementRow,
+    insert_movements,
+    movements_csv,
+)
 
 
 class TestOrderRepository:
@@ -48,6 +63,42 @@ class TestOrderRepository:
         assert order1.order_id != order2.order_id
         assert order2.order_id != order3.order_id
 
+    def test_items_keep_request_order(self, db_session):
+        """Deve numerar as linhas na ordem recebida, sem somar produtos repetidos."""
+        order = create_order(db_session)
+        items = [
+            {"product_id": 7, "quantity": 2},
+            {"product_id": 3, "quantity": 1},
+            {"product_id": 7, "quantity": 4},
+        ]
+
+        add_items(db_session, item_rows(order.order_id, items))
+
+        assert list_order_items(db_session, order.order_id) == items
+
+    def test_orders_with_product_pages_by_order_id(self, db_session):
+        """Deve somar a quantidade do produto por pedido e paginar por cursor."""
+        orders = [create_order(db_session) for _ in range(3)]
+        add_items(
+            db_session,
+            item_rows(orders[0].order_id, [{"product_id": 1, "quantity": 2}])
+            + item_rows(orders[1].order_id, [{"product_id": 2, "quantity": 5}])
+            + item_rows(
+                orders[2].order_id,
+                [{"product_id": 1, "quantity": 1}, {"product_id": 1, "quantity": 3}],
+            ),
+        )
+
+        first = list_orders_with_product(db_session, 1, limit=1)
+        rest = list_orders_with_product(
+            db_session, 1, after=first[0]["order_id"], limit=10
+        )
+
+        assert [(row["order_id"], row["quantity"]) for row in first + rest] == [
+            (orders[0].order_id, 2),
+            (orders[2].order_id, 4),
+        ]
+
 
 class TestProductRepository:
     """Testes para product_repository."""
@@ -92,3 +143,61 @@ class TestProductRepository:
 
         assert p1.product_id != p2.product_id
         assert p1.name != p2.name
+
+
+class TestStockMovementRepository:
+    """Testes para stock_movement_repository."""
+
+    def test_insert_movements_returns_records_in_order(self, db_session):
+        """Deve gravar em lote e devolver registros imutáveis na ordem dada."""
+        first = create_product(db_session, name="A", quantity_on_hand=10)
+        second = create_product(db_session, name="B", quantity_on_hand=10)
+
+        records = insert_movements(
+            db_session,
+            [
+                MovementRow(second.product_id, 2, "saida"),
+                MovementRow(first.product_id, 5, "entrada"),
+            ],
+        )
+        db_session.commit()
+
+        assert [(r.product_id, r.quantity, r.movement_type) for r in records] == [
+            (second.product_id, 2, "saida"),
+            (first.product_id, 5, "entrada"),
+        ]
+        assert records[0].movement_id < records[1].movement_id
+        stored = db_session.get(StockMovement, records[1].movement_id)
+        assert stored.product_id == first.product_id
+        with pytest.raises(AttributeError):
+            records[0].quantity = 1
+
+    def test_insert_movements_does_not_track_orm_objects(self, db_session):
+        """Nenhuma instância deve ir para o identity map da sessão."""
+        product = create_product(db_session, name="A")
+
+        insert_movements(db_session, [MovementRow(product.product_id, 1, "saida")])
+
+        assert not any(
+            isinstance(obj, StockMovement) for obj in db_session.identity_map.values()
+        )
+
+    def test_insert_movements_empty(self, db_session):
+        assert insert_movements(db_session, []) == []
+
+    def test_movements_csv_matches_copy_columns(self):
+        """O CSV do COPY deve seguir a ordem das colunas."""
+        created_at = datetime(2026, 1, 2, 3, 4, 5)
+        buffer = movements_csv(
+            [
+                MovementRecord(7, 1, 3, "saida", created_at),
+                MovementRecord(8, 1, 2, "saida", created_at, lease_id=4),
+                MovementRecord(9, 1, 5, "entrada", created_at, unit_cost=2.5),
+            ]
+        )
+
+        assert buffer.read() == (
+            "7,1,3,saida,,,2026-01-02T03:04:05\r\n"
+            "8,1,2,saida,4,,2026-01-02T03:04:05\r\n"
+            "9,1,5,entrada,,2.5,2026-01-02T03:04:05\r\n"
+        )
@@ -0,0 +1,183 @@
+"""
+Testes da topologia de retry e dead-letter dos workers.
+"""
+
+import threading
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pika
+import pytest
+
+from app.core import rabbitmq
+from app.core.config import settings
+from app.core.memory_broker import MemoryBroker
+from app.workers import retry
+from app.workers.retry import PermanentError
+from app.workers.runtime import QueueHandler, WorkerRuntime
+
+
+@pytest.fixture
+def broker():
+    broker = MemoryBroker()
+    rabbitmq.use_connection_factory(broker.connect)
+    with patch.multiple(
+        settings,
+        worker_retry_attempts=2,
+        worker_retry_base_delay_ms=10,
+        worker_retry_backoff_factor=2,
+    ):
+        yield broker
+    rabbitmq.use_connection_factory(None)
+
+
+@contextmanager
+def running(broker, callback):
+    runtime = WorkerRuntime(
+        [QueueHandler("q", ("order.*",), callback)], name="test", concurrency=2
+    )
+    thread = threading.Thread(target=runtime.run)
+    thread.start()
+    try:
+        with broker.cond:
+            broker.cond.wait_for(lambda: broker.consumer_count("q"), timeout=2)
+        yield runtime
+        waiting = ["q"] + [retry.tier_queue("q", delay) for delay in retry.delays_ms()]
+        assert broker.wait_idle(timeout=5, queues=waiting)
+    finally:
+        runtime.request_stop()
+        thread.join(timeout=5)
+
+
+def dead_letters(broker, queue="q") -> list:
+    channel = broker.connect().channel()
+    messages = []
+    while True:
+        method, properties, body = channel.basic_get(retry.dead_letter_queue(queue))
+        if method is None:
+            return messages
+        messages.append((properties.headers, body))
+
+
+class TestRetryTopology:
+    """Testes para as filas de espera e a dead-letter."""
+
+    def test_delays_grow_exponentially(self, broker):
+        assert retry.delays_ms() == [10, 20]
+
+    def test_failed_message_waits_and_returns_with_count(self, broker):
+        """Cada falha passa pelo próximo nível de espera e volta à fila."""
+        attempts = []
+
+        def flaky(_ch, method, properties, _body):
+            attempts.append((method.routing_key, retry.retry_count(properties)))
+            if len(attempts) < 3:
+                raise ConnectionError("banco fora do ar")
+
+        with running(broker, flaky):
+            rabbitmq.publish_event("order.created", {"order_id": 1})
+
+        assert attempts == [
+            ("order.created", 0),
+            ("order.created", 1),
+            ("order.created", 2),
+        ]
+        stats = broker.queue_stats()
+        assert stats["q.retry.10ms"]["expired"] == 1
+        assert stats["q.retry.20ms"]["expired"] == 1
+        assert stats["q.dead"]["published"] == 0
+
+    def test_exhausted_retries_go_to_dead_letter(self, broker):
+        """Esgotadas as tentativas, a mensagem fica em <fila>.dead."""
+        calls = []
+
+        def failing(*_args):
+            calls.append(1)
+            raise ConnectionError("SMTP fora do ar")
+
+        with running(broker, failing):
+            rabbitmq.publish_event("order.created", {"order_id": 2})
+
+        assert len(calls) == 3
+        [(headers, body)] = dead_letters(broker)
+        assert headers[retry.RETRY_COUNT] == 2
+        assert headers[retry.ORIGINAL_ROUTING_KEY] == "order.created"
+        assert "SMTP fora do ar" in headers[retry.LAST_ERROR]
+        assert rabbitmq.decode(body) == {"order_id": 2}
+
+    def test_permanent_error_skips_retries(self, broker):
+        calls = []
+
+        def poison(*_args):
+            calls.append(1)
+            raise PermanentError("pedido inexistente")
+
+        with running(broker, poison):
+            rabbitmq.publish_event("order.created", {"order_id": 3})
+
+        assert len(calls) == 1
+        assert len(dead_letters(broker)) == 1
+
+    def test_unreadable_body_goes_to_dead_letter(self, broker):
+        """Corpo que não decodifica é veneno: sem retentativas."""
+        calls = []
+
+        def decoding(_ch, _method, properties, body):
+            calls.append(1)
+            rabbitmq.decode(body, properties)
+
+        with running(broker, decoding):
+            channel = broker.connect().channel()
+            channel.basic_publish(
+                exchange=rabbitmq.EXCHANGE_NAME,
+                routing_key="order.created",
+                body=b"{nao e json",
+                properties=pika.BasicProperties(content_type=rabbitmq.JSON),
+            )
+
+        assert len(calls) == 1
+        assert dead_letters(broker)[0][1] == b"{nao e json"
+
+
+class TestReplay:
+    """Testes para o replay da dead-letter."""
+
+    def _fill_dead_letter(self, broker, count):
+        channel = broker.connect().channel()
+        channel.queue_declare(queue="q", durable=True)
+        retry.declare(channel, "q")
+        for i in range(count):
+            channel.basic_publish(
+                exchange=retry.retry_exchange("q"),
+                routing_key=retry.DEAD,
+                body=f'{{"i": {i}}}'.encode(),
+                properties=pika.BasicProperties(
+                    headers={
+                        retry.RETRY_COUNT: 2,
+                        retry.ORIGINAL_ROUTING_KEY: "order.created",
+                    }
+                ),
+            )
+
+    def test_replay_returns_messages_with_reset_count(self, broker):
+        self._fill_dead_letter(broker, 3)
+
+        with patch("builtins.print"):
+            assert retry.replay("q", limit=2) == 2
+
+        assert broker.message_count("q.dead") == 1
+        channel = broker.connect().channel()
+        method, properties, body = channel.basic_get("q", auto_ack=True)
+        assert rabbitmq.decode(body, properties) == {"i": 0}
+        assert retry.retry_count(properties) == 0
+        retry.restore_routing_key(method, properties)
+        assert method.routing_key == "order.created"
+
+    def test_dry_run_keeps_messages(self, broker):
+        self._fill_dead_letter(broker, 2)
+
+        with patch("builtins.print"):
+            assert retry.replay("q", dry_run=True) == 2
+
+        assert broker.message_count("q.dead") == 2
+        assert broker.message_count("q") == 0
@@ -0,0 +1,247 @@
+"""
+Testes unitários para o runtime dos workers.
+"""
+
+from unittest.mock import MagicMock, call, patch
+
+from app.workers.runtime import (
+    AckTracker,
+    QueueHandler,
+    WorkerRuntime,
+    adaptive_prefetch,
+)
+
+
+def make_runtime(callback):
+    runtime = WorkerRuntime([QueueHandler("q", ("k",), callback)], concurrency=2)
+    runtime._connection = MagicMock()
+    runtime._connection.add_callback_threadsafe.side_effect = lambda cb: cb()
+    runtime._channel = MagicMock()
+    return runtime
+
+
+def make_method(delivery_tag):
+    method = MagicMock()
+    method.delivery_tag = delivery_tag
+    return method
+
+
+class TestAckTracker:
+    """Testes para AckTracker."""
+
+    def test_flush_acks_contiguous_prefix_with_multiple(self):
+        """Deve enviar um único ack cumulativo para o prefixo resolvido."""
+        channel = MagicMock()
+        tracker = AckTracker()
+        for tag in (1, 2, 3, 4):
+            tracker.delivered(tag)
+
+        tracker.ack(2)
+        tracker.ack(1)
+        tracker.ack(4)
+
+        assert tracker.flush(channel) == 2
+        channel.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+        assert len(tracker) == 2
+
+        tracker.ack(3)
+        tracker.flush(channel)
+        channel.basic_ack.assert_called_with(delivery_tag=4, multiple=True)
+        assert len(tracker) == 0
+        assert tracker.unsent_acks == 0
+
+    def test_nack_is_sent_individually_and_skipped_by_ack(self):
+        """Nacks vão na hora e não são cobertos pelo ack cumulativo."""
+        channel = MagicMock()
+        tracker = AckTracker()
+        for tag in (1, 2, 3):
+            tracker.delivered(tag)
+
+        tracker.ack(1)
+        tracker.nack(channel, 3, requeue=False)
+        tracker.ack(2)
+        tracker.flush(channel)
+
+        channel.basic_nack.assert_called_once_with(
+            delivery_tag=3, multiple=False, requeue=False
+        )
+        channel.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+
+    def test_flush_without_resolved_prefix_sends_nothing(self):
+        """Não deve enviar ack enquanto a entrega mais antiga não terminar."""
+        channel = MagicMock()
+        tracker = AckTracker()
+        tracker.delivered(1)
+        tracker.delivered(2)
+        tracker.ack(2)
+
+        assert tracker.flush(channel) == 0
+        channel.basic_ack.assert_not_called()
+
+
+class TestAdaptivePrefetch:
+    """Testes para o cálculo do prefetch adaptativo."""
+
+    def test_fast_handlers_get_larger_prefetch(self):
+        fast = adaptive_prefetch(4, latency_ms=2, buffer_ms=100, minimum=1, maximum=256)
+        slow = adaptive_prefetch(
+            4, latency_ms=500, buffer_ms=100, minimum=1, maximum=256
+        )
+
+        assert fast > slow
+        assert slow == 8
+
+    def test_prefetch_is_bounded(self):
+        assert (
+            adaptive_prefetch(4, latency_ms=0.01, buffer_ms=100, minimum=1, maximum=64)
+            == 64
+        )
+        assert (
+            adaptive_prefetch(4, latency_ms=10_000, buffer_ms=1, minimum=1, maximum=64)
+            == 8
+        )
+
+
+class TestWorkerRuntime:
+    """Testes para a execução dos handlers."""
+
+    def test_execute_auto_acks_when_handler_returns(self):
+        """Handler que retorna sem ack deve ter a entrega confirmada."""
+        runtime = make_runtime(lambda ch, method, props, body: None)
+        runtime._tracker.delivered(1)
+
+        runtime.execute(runtime.handlers[0], [(make_method(1), None, b"{}")])
+        runtime._flush_acks()
+
+        runtime._channel.basic_ack.assert_called_once_with(
+            delivery_tag=1, multiple=True
+        )
+
+    @patch("app.workers.retry.rabbitmq.republish")
+    def test_execute_schedules_retry_when_handler_raises(self, republish):
+        """Handler que levanta exceção: a entrega vai para o retry e é confirmada."""
+
+        def failing(ch, method, props, body):
+            raise RuntimeError("falha")
+
+        runtime = make_runtime(failing)
+        runtime._tracker.delivered(7)
+
+        runtime.execute(runtime.handlers[0], [(make_method(7), None, b"{}")])
+        runtime._flush_acks()
+
+        exchange, routing_key, body, properties = republish.call_args.args
+        assert (exchange, routing_key, body) == ("q.retry", "1000", b"{}")
+        assert properties.headers["x-retry-count"] == 1
+        runtime._channel.basic_nack.assert_not_called()
+        runtime._channel.basic_ack.assert_called_once_with(
+            delivery_tag=7, multiple=True
+        )
+
+    @patch("app.workers.retry.rabbitmq.republish")
+    def test_execute_requeues_when_retry_publish_fails(self, republish):
+        """Sem conseguir publicar no retry, a entrega volta para a fila."""
+        republish.side_effect = ConnectionError("broker fora")
+
+        def failing(ch, method, props, body):
+            raise RuntimeError("falha")
+
+        runtime = make_runtime(failing)
+        runtime._tracker.delivered(7)
+
+        runtime.execute(runtime.handlers[0], [(make_method(7), None, b"{}")])
+
+        runtime._channel.basic_nack.assert_called_once_with(
+            delivery_tag=7, multiple=False, requeue=True
+        )
+
+    @patch("app.workers.retry.rabbitmq.republish")
+    def test_nack_without_requeue_goes_to_dead_letter(self, republish):
+        """Nack sem requeue do handler guarda a entrega em <fila>.dead."""
+
+        def rejecting(ch, method, props, body):
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+
+        runtime = make_runtime(rejecting)
+        runtime._tracker.delivered(2)
+
+        runtime.execute(runtime.handlers[0], [(make_method(2), None, b"{}")])
+
+        assert republish.call_args.args[:2] == ("q.retry", "dead")
+        runtime._channel.basic_nack.assert_not_called()
+        assert runtime._tracker.unsent_acks == 1
+
+    def test_handler_ack_is_forwarded_once(self):
+        """O ack feito pelo próprio handler não deve ser duplicado."""
+
+        def acking(ch, method, props, body):
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+
+        runtime = make_runtime(acking)
+        runtime._tracker.delivered(3)
+
+        runtime.execute(runtime.handlers[0], [(make_method(3), None, b"{}")])
+
+        assert runtime._tracker.unsent_acks == 1
+
+    @patch("app.workers.runtime.get_connection")
+    def test_setup_declares_queue_and_global_prefetch(self, mock_get_conn):
+        """Deve declarar fila, bindings, retry e prefetch do canal."""
+        runtime = WorkerRuntime(
+            [QueueHandler("q", ("a.b", "c.d"), MagicMock())],
+            prefetch_count=10,
+            concurrency=2,
+        )
+        channel = mock_get_conn.return_value.channel.return_value
+
+        runtime._setup()
+
+        channel.queue_declare.assert_any_call(queue="q", durable=True, arguments=None)
+        channel.queue_declare.assert_any_call(queue="q.dead", durable=True)
+        channel.queue_bind.assert_any_call(
+            exchange="stock_events", queue="q", routing_key="a.b"
+        )
+        channel.queue_bind.assert_any_call(
+            exchange="stock_events", queue="q", routing_key="c.d"
+        )
+        channel.exchange_declare.assert_any_call(
+            exchange="q.retry", exchange_type="direct", durable=True
+        )
+        channel.basic_qos.assert_called_once_with(prefetch_count=10, global_qos=True)
+        channel.basic_consume.assert_called_once()
+
+    def test_batches_dispatch_when_full_or_expired(self):
+        """Deve montar lotes por tamanho ou por tempo de espera."""
+        received = []
+        runtime = WorkerRuntime(
+            [
+                QueueHandler(
+                    "q",
+                    ("k",),
+                    lambda ch, deliveries: received.append(len(deliveries)),
+                    batch_size=3,
+                    batch_wait_ms=0,
+                )
+            ],
+            concurrency=1,
+        )
+        runtime._connection = MagicMock()
+        runtime._connection.add_callback_threadsafe.side_effect = lambda cb: cb()
+        runtime._channel = MagicMock()
+        runtime._executor = MagicMock()
+        runtime._executor.submit.side_effect = lambda fn, *args: fn(*args)
+        handler = runtime.handlers[0]
+
+        for tag in range(1, 5):
+            runtime._on_message(handler, None, make_method(tag), None, b"{}")
+        assert received == [3]
+
+        runtime._dispatch_due_batches()
+        assert received == [3, 1]
+        assert runtime._in_flight == 0
+        assert runtime.prefetch_count >= 3
+
+        runtime._flush_acks()
+        runtime._channel.basic_ack.assert_called_once_with(
+            delivery_tag=4, multiple=True
+        )
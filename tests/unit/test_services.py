@@ -2,27 +2,63 @@
 Testes unitários para os services.
 """
 
+import asyncio
+import io
+
 import pytest
-from unittest.mock import patch, MagicMock
-from app.services.order_service import create_order
+from unittest.mock import AsyncMock, patch, MagicMock
+from app.services.order_service import create_order, dispatch_outbox_async
 from app.services.product_service import create_product
-from app.services.stock_service import reserve_stock
+from app.services.product_import import import_products
+from app.services.cost_service import (
+    recompute_average_costs,
+    replay_average_costs,
+)
+from app.core.config import settings
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+from app.db.retry import run_with_retry
+from app.services import ledger_service, stock_service
+from app.services.stock_service import (
+    InsufficientStockError,
+    ProductNotFoundError,
+    release_stock,
+    receive_stock,
+    reserve_stock,
+    reserve_stock_batch,
+)
 from app.services.payment_service import process_payment
+from app.services import availability_service
+from app.services.availability_service import (
+    apply_update,
+    check_availability,
+    stock_updated_event,
+)
 from app.services.email_service import (
     send_email,
     send_order_processed_email,
     send_payment_failed_email,
 )
+from app.models.order import Order
+from app.models.order_item import OrderItem
+from app.models.outbox import OutboxEvent
 from app.models.product import Product
+from app.models.stock_movement import StockMovement
 from app.repositories.product_repository import create_product as repo_create_product
+from app.repositories.stock_movement_repository import MovementRecord
+from app.repositories import stock_lease_repository
+
+
+class DeadlockDetected(Exception):
+    pgcode = "40P01"
 
 
 class TestOrderService:
     """Testes para order_service."""
 
-    @patch("app.services.order_service.publish_event")
-    def test_create_order_publishes_event(self, mock_publish, db_session):
-        """Deve criar pedido e publicar evento order.created."""
+    @patch("app.core.rabbitmq.publish_event")
+    def test_create_order_writes_outbox_event(self, mock_publish, db_session):
+        """Deve criar pedido e gravar order.created no outbox, sem publicar."""
         items = [{"product_id": 1, "quantity": 2}]
         email = "cliente@teste.com"
 
@@ -30,15 +66,14 @@ class TestOrderService:
 
         assert order is not None
         assert order.order_id is not None
-        mock_publish.assert_called_once()
-        call_args = mock_publish.call_args
-        assert call_args[0][0] == "order.created"
-        assert call_args[0][1]["order_id"] == order.order_id
-        assert call_args[0][1]["email"] == email
-        assert call_args[0][1]["items"] == items
-
-    @patch("app.services.order_service.publish_event")
-    def test_create_order_with_multiple_items(self, mock_publish, db_session):
+        mock_publish.assert_not_called()
+        event = db_session.query(OutboxEvent).one()
+        assert event.routing_key == "order.created"
+        assert event.payload["order_id"] == order.order_id
+        assert event.payload["email"] == email
+        assert event.payload["items"] == items
+
+    def test_create_order_with_multiple_items(self, db_session):
         """Deve criar pedido com múltiplos itens."""
         items = [
             {"product_id": 1, "quantity": 2},
@@ -46,11 +81,73 @@ class TestOrderService:
             {"product_id": 3, "quantity": 1},
         ]
 
-        order = create_order(db_session, items, "test@test.com")
+        create_order(db_session, items, "test@test.com")
 
-        payload = mock_publish.call_args[0][1]
+        payload = db_session.query(OutboxEvent).one().payload
         assert len(payload["items"]) == 3
 
+    def test_create_order_writes_items(self, db_session):
+        """Deve gravar os itens na mesma transação do pedido."""
+        items = [
+            {"product_id": 1, "quantity": 2},
+            {"product_id": 2, "quantity": 5},
+        ]
+
+        order = create_order(db_session, items, "test@test.com")
+
+        rows = (
+            db_session.query(OrderItem.product_id, OrderItem.quantity)
+            .filter(OrderItem.order_id == order.order_id)
+            .order_by(OrderItem.line)
+            .all()
+        )
+        assert [tuple(row) for row in rows] == [(1, 2), (2, 5)]
+
+    def test_create_order_rolls_back_order_and_event(self, db_session):
+        """Pedido e evento devem ser descartados juntos em caso de erro."""
+        with patch(
+            "app.services.order_service.outbox_repository.add_event",
+            side_effect=Exception("falha"),
+        ):
+            with pytest.raises(Exception):
+                create_order(db_session, [], "test@test.com")
+
+        assert db_session.query(Order).count() == 0
+        assert db_session.query(OutboxEvent).count() == 0
+
+
+class TestOutboxDispatch:
+    """Testes para o despacho imediato do outbox (modo async)."""
+
+    def _dispatch(self, session_factory, publisher, event_ids):
+        with patch("app.services.order_service.async_session", session_factory), patch(
+            "app.services.order_service.get_async_publisher", return_value=publisher
+        ):
+            asyncio.run(dispatch_outbox_async(event_ids))
+
+    def test_publishes_and_deletes_events(self, db_session, async_session_factory):
+        create_order(db_session, [{"product_id": 1, "quantity": 1}], "a@b.com")
+        event = db_session.query(OutboxEvent).one()
+        publisher = AsyncMock()
+
+        self._dispatch(async_session_factory, publisher, [event.event_id])
+
+        events = list(publisher.publish_many.call_args[0][0])
+        assert [key for key, _payload in events] == ["order.created"]
+        db_session.expire_all()
+        assert db_session.query(OutboxEvent).count() == 0
+
+    def test_failure_leaves_event_for_relay(self, db_session, async_session_factory):
+        create_order(db_session, [{"product_id": 1, "quantity": 1}], "a@b.com")
+        event = db_session.query(OutboxEvent).one()
+        publisher = AsyncMock()
+        publisher.publish_many.side_effect = ConnectionError("broker fora")
+
+        self._dispatch(async_session_factory, publisher, [event.event_id])
+
+        db_session.expire_all()
+        assert db_session.query(OutboxEvent).count() == 1
+
 
 class TestProductService:
     """Testes para product_service."""
@@ -71,6 +168,256 @@ class TestProductService:
         assert product.average_cost == 2500.00
 
 
+class TestProductImport:
+    """Testes para a importação em massa de produtos."""
+
+    def test_csv_import_upserts_and_writes_entries(self, db_session):
+        """Reimportar um SKU soma o saldo e recalcula o custo médio."""
+        existing = repo_create_product(
+            db_session, name="Antigo", quantity_on_hand=10, average_cost=2.0, sku="A1"
+        )
+        body = (
+            "sku,name,quantity_on_hand,average_cost\n"
+            "A1,Caneta azul,30,4.0\n"
+            "B2,Caderno,5,\n"
+            "C3,,1,1.0\n"
+            "D4,Lápis,-1,1.0\n"
+        ).encode()
+
+        with patch.object(settings, "product_import_chunk_size", 1):
+            report = import_products(db_session, io.BytesIO(body), "csv")
+
+        assert (report.rows, report.imported, report.rejected) == (4, 2, 2)
+        assert [error["line"] for error in report.errors] == [4, 5]
+        db_session.refresh(existing)
+        assert existing.name == "Caneta azul"
+        assert existing.quantity_on_hand == 40
+        assert existing.average_cost == pytest.approx(3.5)
+        assert existing.version == 2
+        created = db_session.query(Product).filter_by(sku="B2").one()
+        assert (created.quantity_on_hand, created.average_cost) == (5, 0.0)
+        entries = db_session.query(StockMovement).filter_by(movement_type="entrada")
+        assert sorted((m.product_id, m.quantity, m.unit_cost) for m in entries) == [
+            (existing.product_id, 10, 2.0),  # saldo inicial do create_product
+            (existing.product_id, 30, 4.0),
+            (created.product_id, 5, 0.0),
+        ]
+
+    def test_ndjson_merges_repeated_sku_in_chunk(self, db_session):
+        """Linhas repetidas do mesmo SKU no bloco viram um único upsert."""
+        body = b"\n".join(
+            [
+                b'{"sku": "X", "name": "X", "quantity_on_hand": 2, "average_cost": 1}',
+                b"{invalido",
+                b"",
+                b'{"sku": "X", "name": "X2", "quantity_on_hand": 2, "average_cost": 3}',
+            ]
+        )
+        progress = []
+
+        report = import_products(
+            db_session, io.BytesIO(body), "ndjson", on_progress=progress.append
+        )
+
+        assert (report.rows, report.imported, report.rejected) == (3, 2, 1)
+        assert report.errors[0]["line"] == 2
+        assert len(progress) == 1
+        product = db_session.query(Product).filter_by(sku="X").one()
+        assert (product.name, product.quantity_on_hand) == ("X2", 4)
+        assert product.average_cost == pytest.approx(2.0)
+
+    def test_unknown_format_raises(self, db_session):
+        with pytest.raises(ValueError):
+            import_products(db_session, io.BytesIO(b""), "xml")
+
+
+class TestStockReceipts:
+    """Testes para entradas de estoque e custo médio ponderado."""
+
+    def test_receipt_updates_quantity_and_average_cost(self, db_session):
+        product = repo_create_product(
+            db_session, name="P", quantity_on_hand=10, average_cost=2.0
+        )
+        pid = product.product_id
+
+        result = receive_stock(
+            db_session,
+            [
+                {"product_id": pid, "quantity": 5, "unit_cost": 4.0},
+                {"product_id": pid, "quantity": 5, "unit_cost": 6.0},
+            ],
+        )
+
+        assert result == [
+            {"product_id": pid, "quantity_on_hand": 20, "average_cost": 3.5}
+        ]
+        db_session.expire_all()
+        assert db_session.get(Product, pid).version == 2
+        entry = (
+            db_session.query(StockMovement)
+            .filter_by(movement_type="entrada")
+            .order_by(StockMovement.movement_id.desc())
+            .first()
+        )
+        assert (entry.quantity, entry.unit_cost) == (10, 5.0)
+
+    def test_unknown_product_rolls_back_receipt(self, db_session):
+        product = repo_create_product(db_session, name="P", quantity_on_hand=1)
+
+        with pytest.raises(ProductNotFoundError):
+            receive_stock(
+                db_session,
+                [
+                    {"product_id": product.product_id, "quantity": 1, "unit_cost": 1},
+                    {"product_id": 999, "quantity": 1, "unit_cost": 1},
+                ],
+            )
+
+        db_session.expire_all()
+        assert db_session.get(Product, product.product_id).quantity_on_hand == 1
+
+    def test_postgres_receipt_is_single_update(self):
+        sql = str(
+            stock_service._receipt_stmt({1: (5, 2.0), 2: (1, 3.0)}, {1: 4}).compile(
+                dialect=postgresql.dialect()
+            )
+        )
+
+        assert sql.startswith("UPDATE products SET")
+        assert "average_cost=CASE" in sql
+        assert "FROM (VALUES" in sql
+
+    def test_replay_average_costs(self):
+        history = [
+            (1, 10, "entrada", 2.0),
+            (1, 4, "saida", None),
+            (1, 6, "entrada", 4.0),
+            (1, 2, "estorno", None),
+            (2, 0, "abertura", 5.0),
+            (2, 3, "entrada", None),
+            (2, 3, "saida", None),
+            (2, 1, "entrada", 7.0),
+            (3, 2, "saida", None),
+            (3, 5, "entrada", 4.0),
+            (4, 3, "entrada", None),
+        ]
+
+        assert list(replay_average_costs(history)) == [
+            (1, 3.0),
+            (2, 7.0),
+            (3, None),
+            (4, None),
+        ]
+
+    def test_recompute_fixes_diverging_costs(self, db_session):
+        product = repo_create_product(
+            db_session, name="P", quantity_on_hand=10, average_cost=2.0
+        )
+        receive_stock(
+            db_session,
+            [{"product_id": product.product_id, "quantity": 10, "unit_cost": 4.0}],
+        )
+        product.average_cost = 99.0
+        db_session.commit()
+
+        assert recompute_average_costs(db_session) == 1
+        db_session.refresh(product)
+        assert product.average_cost == pytest.approx(3.0)
+        assert recompute_average_costs(db_session) == 0
+
+    def _legacy_product(self, db_session, quantity_on_hand, average_cost):
+        """Produto anterior à abertura no razão: só a saída foi registrada."""
+        product = Product(
+            name="Legado", quantity_on_hand=quantity_on_hand, average_cost=average_cost
+        )
+        db_session.add(product)
+        db_session.flush()
+        db_session.add(
+            StockMovement(
+                product_id=product.product_id, quantity=2, movement_type="saida"
+            )
+        )
+        db_session.commit()
+        return product
+
+    def test_recompute_skips_history_without_opening(self, db_session):
+        """Razão incompleto nunca vira custo gravado."""
+        product = self._legacy_product(db_session, 8, 12.5)
+
+        with patch("builtins.print"):
+            assert recompute_average_costs(db_session) == 0
+
+        db_session.refresh(product)
+        assert product.average_cost == 12.5
+
+    def test_backfill_openings_closes_legacy_ledger(self, db_session):
+        product = self._legacy_product(db_session, 8, 12.5)
+        repo_create_product(db_session, name="Novo", quantity_on_hand=3)
+
+        assert ledger_service.backfill_openings(db_session) == 1
+        db_session.commit()
+
+        first = (
+            db_session.query(StockMovement)
+            .filter_by(product_id=product.product_id)
+            .order_by(StockMovement.created_at, StockMovement.movement_id)
+            .first()
+        )
+        assert (first.movement_type, first.quantity, first.unit_cost) == (
+            "abertura",
+            10,
+            12.5,
+        )
+        assert ledger_service.backfill_openings(db_session) == 0
+        product.average_cost = 99.0
+        db_session.commit()
+        assert recompute_average_costs(db_session) == 1
+        db_session.refresh(product)
+        assert product.average_cost == 12.5
+
+    def _lease_units(self, db_session, product, granted, consumed):
+        lease_id, _ = stock_lease_repository.grant(
+            db_session, product.product_id, "w1", granted
+        )
+        db_session.add(
+            StockMovement(
+                product_id=product.product_id,
+                quantity=consumed,
+                movement_type="saida",
+                lease_id=lease_id,
+            )
+        )
+        db_session.commit()
+
+    def test_receipt_weights_units_held_in_escrow(self, db_session):
+        """As unidades em leases entram no saldo ponderado, como no razão."""
+        product = repo_create_product(
+            db_session, name="P", quantity_on_hand=10, average_cost=2.0
+        )
+        self._lease_units(db_session, product, granted=4, consumed=1)
+
+        [result] = receive_stock(
+            db_session,
+            [{"product_id": product.product_id, "quantity": 10, "unit_cost": 4.0}],
+        )
+
+        # 6 no saldo + 3 ainda na lease, a 2.0; mais 10 a 4.0.
+        assert result["average_cost"] == pytest.approx(58 / 19)
+        assert recompute_average_costs(db_session) == 0
+
+    def test_import_weights_units_held_in_escrow(self, db_session):
+        product = repo_create_product(
+            db_session, name="P", quantity_on_hand=10, average_cost=2.0, sku="A1"
+        )
+        self._lease_units(db_session, product, granted=4, consumed=1)
+        body = b"sku,name,quantity_on_hand,average_cost\nA1,P,10,4.0\n"
+
+        import_products(db_session, io.BytesIO(body), "csv")
+
+        db_session.refresh(product)
+        assert product.average_cost == pytest.approx(58 / 19)
+
+
 class TestStockService:
     """Testes para stock_service."""
 
@@ -134,6 +481,287 @@ class TestStockService:
 
         assert "não encontrado" in str(exc_info.value)
 
+    @patch("app.services.stock_service.get_db")
+    def test_reserve_stock_batch_isolates_failing_order(self, mock_get_db, db_session):
+        """Pedido com falha não deve desfazer os demais do lote."""
+        product = repo_create_product(
+            db_session, name="Produto", quantity_on_hand=10, average_cost=10.0
+        )
+
+        def mock_db_gen():
+            yield db_session
+
+        mock_get_db.return_value = mock_db_gen()
+
+        pid = product.product_id
+        results = reserve_stock_batch(
+            [
+                [{"product_id": pid, "quantity": 3}],
+                [
+                    {"product_id": pid, "quantity": 2},
+                    {"product_id": 999, "quantity": 1},
+                ],
+                [{"product_id": pid, "quantity": 50}],
+                [{"product_id": pid, "quantity": 4}],
+            ]
+        )
+
+        assert not isinstance(results[0], Exception)
+        assert "não encontrado" in str(results[1])
+        assert "Estoque insuficiente" in str(results[2])
+        assert not isinstance(results[3], Exception)
+
+        db_session.expire_all()
+        assert db_session.get(Product, pid).quantity_on_hand == 3
+        assert (
+            db_session.query(StockMovement).filter_by(movement_type="saida").count()
+            == 2
+        )
+
+    @patch("app.services.stock_service.get_db")
+    def test_reserve_stock_merges_duplicate_products(self, mock_get_db, db_session):
+        """Itens repetidos devem ser somados antes da validação."""
+        product = repo_create_product(
+            db_session, name="Produto", quantity_on_hand=5, average_cost=10.0
+        )
+
+        def mock_db_gen():
+            yield db_session
+
+        mock_get_db.return_value = mock_db_gen()
+
+        items = [
+            {"product_id": product.product_id, "quantity": 3},
+            {"product_id": product.product_id, "quantity": 3},
+        ]
+
+        with pytest.raises(InsufficientStockError):
+            reserve_stock(items)
+
+        db_session.refresh(product)
+        assert product.quantity_on_hand == 5
+
+    @patch("app.db.retry.time.sleep")
+    @patch("app.services.stock_service.get_db")
+    def test_reserve_stock_retries_on_deadlock(
+        self, mock_get_db, _mock_sleep, db_session
+    ):
+        """Deve repetir a transação quando o banco detecta deadlock."""
+        product = repo_create_product(
+            db_session, name="Produto", quantity_on_hand=10, average_cost=10.0
+        )
+
+        def mock_db_gen():
+            yield db_session
+
+        mock_get_db.return_value = mock_db_gen()
+
+        real_lock = stock_service._lock_products
+        calls = []
+
+        def flaky_lock(db, product_ids):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError("SELECT ...", {}, DeadlockDetected())
+            return real_lock(db, product_ids)
+
+        with patch.object(stock_service, "_lock_products", side_effect=flaky_lock):
+            movements = reserve_stock(
+                [{"product_id": product.product_id, "quantity": 4}]
+            )
+
+        assert len(calls) == 2
+        assert len(movements) == 1
+        db_session.refresh(product)
+        assert product.quantity_on_hand == 6
+
+    @patch("app.services.stock_service.get_db")
+    def test_release_stock_returns_units(self, mock_get_db, db_session):
+        """Deve devolver as unidades e registrar movimento de estorno."""
+        product = repo_create_product(
+            db_session, name="Produto", quantity_on_hand=3, average_cost=10.0
+        )
+
+        def mock_db_gen():
+            yield db_session
+
+        mock_get_db.return_value = mock_db_gen()
+
+        movements = release_stock([{"product_id": product.product_id, "quantity": 2}])
+
+        assert movements[0].movement_type == "estorno"
+        db_session.refresh(product)
+        assert product.quantity_on_hand == 5
+
+
+@patch("app.services.stock_service.settings.stock_reservation_engine", "conditional")
+class TestConditionalReservation:
+    """Testes para a reserva por UPDATE condicional."""
+
+    @pytest.fixture(autouse=True)
+    def use_test_session(self, db_session):
+        def mock_db_gen():
+            yield db_session
+
+        with patch("app.services.stock_service.get_db", side_effect=mock_db_gen):
+            yield
+
+    def test_reserve_stock_decrements_without_row_lock(self, db_session):
+        """Deve baixar o estoque e gravar as movimentações em lote."""
+        first = repo_create_product(db_session, name="A", quantity_on_hand=10)
+        second = repo_create_product(db_session, name="B", quantity_on_hand=5)
+
+        movements = reserve_stock(
+            [
+                {"product_id": second.product_id, "quantity": 2},
+                {"product_id": first.product_id, "quantity": 4},
+                {"product_id": second.product_id, "quantity": 1},
+            ]
+        )
+
+        assert [(m.product_id, m.quantity) for m in movements] == [
+            (first.product_id, 4),
+            (second.product_id, 3),
+        ]
+        db_session.expire_all()
+        assert db_session.get(Product, first.product_id).quantity_on_hand == 6
+        assert db_session.get(Product, second.product_id).quantity_on_hand == 2
+
+    def test_unmatched_row_means_insufficient_stock(self, db_session):
+        """Sem linha atualizada, o pedido inteiro deve ser desfeito."""
+        first = repo_create_product(db_session, name="A", quantity_on_hand=10)
+        second = repo_create_product(db_session, name="B", quantity_on_hand=1)
+
+        with pytest.raises(InsufficientStockError):
+            reserve_stock(
+                [
+                    {"product_id": first.product_id, "quantity": 4},
+                    {"product_id": second.product_id, "quantity": 2},
+                ]
+            )
+
+        db_session.expire_all()
+        assert db_session.get(Product, first.product_id).quantity_on_hand == 10
+        assert (
+            db_session.query(StockMovement).filter_by(movement_type="saida").count()
+            == 0
+        )
+
+    def test_unknown_product_is_reported(self, db_session):
+        with pytest.raises(ProductNotFoundError):
+            reserve_stock([{"product_id": 999, "quantity": 1}])
+
+    def test_postgres_uses_single_update_from_values(self):
+        """No Postgres o pedido inteiro deve ser um único UPDATE ... FROM VALUES."""
+        stmt = stock_service._conditional_decrement_stmt({1: 2, 3: 4})
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+        assert "FROM (VALUES" in sql
+        assert "quantity_on_hand >= v.quantity" in sql
+        assert "RETURNING products.product_id" in sql
+
+
+class TestDbRetry:
+    """Testes para run_with_retry."""
+
+    def test_non_retryable_error_is_raised_immediately(self):
+        fn = MagicMock(side_effect=OperationalError("SELECT 1", {}, Exception()))
+
+        with pytest.raises(OperationalError):
+            run_with_retry(fn, attempts=3)
+
+        assert fn.call_count == 1
+
+    @patch("app.db.retry.time.sleep")
+    def test_gives_up_after_attempts(self, mock_sleep):
+        fn = MagicMock(side_effect=OperationalError("SELECT 1", {}, DeadlockDetected()))
+
+        with pytest.raises(OperationalError):
+            run_with_retry(fn, attempts=3)
+
+        assert fn.call_count == 3
+        assert mock_sleep.call_count == 2
+
+
+class TestAvailabilityService:
+    """Testes para o cache de disponibilidade."""
+
+    def test_unknown_product_is_rejected_from_bitmap(self, db_session):
+        repo_create_product(db_session, name="A", quantity_on_hand=5)
+        repo_create_product(db_session, name="B", quantity_on_hand=5)
+        db_session.query(Product).filter(Product.product_id == 1).delete()
+        db_session.commit()
+
+        with pytest.raises(ProductNotFoundError):
+            check_availability(db_session, [{"product_id": 1, "quantity": 1}])
+        # Acima do maior ID carregado pode ser produto novo: consulta o banco.
+        with pytest.raises(ProductNotFoundError):
+            check_availability(db_session, [{"product_id": 50, "quantity": 1}])
+        check_availability(db_session, [{"product_id": 2, "quantity": 5}])
+
+    @patch("app.services.availability_service._IDS_PAGE", 2)
+    @patch("app.services.availability_service.settings.availability_ids_refresh_s", 0)
+    def test_refresh_loads_only_new_ids(self, db_session):
+        """A recarga deve buscar só IDs acima do maior já carregado."""
+        for name in "ABC":
+            repo_create_product(db_session, name=name, quantity_on_hand=5)
+        known, upper = availability_service._ensure_known_ids(db_session)
+        assert upper == 3
+        assert all(product_id in known for product_id in (1, 2, 3))
+
+        db_session.query(Product).filter(Product.product_id == 1).delete()
+        db_session.commit()
+        repo_create_product(db_session, name="D", quantity_on_hand=5)
+        known, upper = availability_service._ensure_known_ids(db_session)
+
+        assert upper == 4
+        assert 1 in known and 4 in known
+        # O ID removido segue no bitmap; a leitura do saldo o recusa.
+        with pytest.raises(ProductNotFoundError):
+            check_availability(db_session, [{"product_id": 1, "quantity": 1}])
+
+    def test_product_created_after_load_is_found(self, db_session):
+        repo_create_product(db_session, name="A", quantity_on_hand=5)
+        check_availability(db_session, [{"product_id": 1, "quantity": 1}])
+        product = repo_create_product(db_session, name="B", quantity_on_hand=3)
+
+        check_availability(
+            db_session, [{"product_id": product.product_id, "quantity": 3}]
+        )
+
+    def test_updates_adjust_cached_quantities(self, db_session):
+        product = repo_create_product(db_session, name="A", quantity_on_hand=5)
+        items = [{"product_id": product.product_id, "quantity": 2}]
+        check_availability(db_session, items)
+
+        # Baixa de 4 unidades feita pelo stock_worker em outro processo.
+        product.quantity_on_hand = 1
+        db_session.commit()
+        movements = [MovementRecord(1, product.product_id, 4, "saida", None)]
+        _key, payload = stock_updated_event(movements)
+        apply_update(payload)
+
+        assert availability_service._cache.get(product.product_id) == 1
+        with pytest.raises(InsufficientStockError):
+            check_availability(db_session, items)
+
+    def test_insufficient_stock_is_confirmed_in_database(self, db_session):
+        product = repo_create_product(db_session, name="A", quantity_on_hand=1)
+        items = [{"product_id": product.product_id, "quantity": 3}]
+
+        with pytest.raises(InsufficientStockError):
+            check_availability(db_session, items)
+
+        product.quantity_on_hand = 10
+        db_session.commit()
+        check_availability(db_session, items)
+
+    @patch(
+        "app.services.availability_service.settings.availability_cache_enabled", False
+    )
+    def test_disabled_cache_accepts_everything(self, db_session):
+        check_availability(db_session, [{"product_id": 123, "quantity": 1}])
+
 
 class TestPaymentService:
     """Testes para payment_service."""
@@ -0,0 +1,119 @@
+"""
+Testes unitários para os snapshots de saldo.
+"""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+
+from app.models.product import Product
+from app.models.stock_movement import StockMovement
+from app.models.stock_snapshot import StockSnapshot
+from app.services.snapshot_service import build_snapshots, stock_at
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def at(minutes: int) -> datetime:
+    return T0 + timedelta(minutes=minutes)
+
+
+@pytest.fixture(autouse=True)
+def no_lag():
+    with patch("app.services.snapshot_service.settings.stock_snapshot_lag_s", 0):
+        yield
+
+
+@pytest.fixture
+def products(db_session):
+    first, second = Product(name="A"), Product(name="B")
+    db_session.add_all([first, second])
+    db_session.commit()
+    return first.product_id, second.product_id
+
+
+def move(db, product_id, quantity, movement_type, minutes):
+    db.add(
+        StockMovement(
+            product_id=product_id,
+            quantity=quantity,
+            movement_type=movement_type,
+            created_at=at(minutes),
+        )
+    )
+    db.commit()
+
+
+class TestSnapshotBuild:
+    """Testes para a geração incremental de snapshots."""
+
+    def test_incremental_build_only_touches_moved_products(self, db_session, products):
+        first, second = products
+        move(db_session, first, 10, "entrada", 1)
+        move(db_session, first, 3, "saida", 2)
+        move(db_session, second, 5, "entrada", 3)
+
+        assert build_snapshots(db_session, now=at(5)) == 2
+
+        move(db_session, first, 1, "estorno", 6)
+        assert build_snapshots(db_session, now=at(10)) == 1
+        assert build_snapshots(db_session, now=at(10)) == 0
+
+        rows = db_session.query(StockSnapshot).order_by(
+            StockSnapshot.product_id, StockSnapshot.snapshot_at
+        )
+        assert [(row.product_id, row.quantity) for row in rows] == [
+            (first, 7),
+            (first, 8),
+            (second, 5),
+        ]
+
+    def test_lag_leaves_recent_movements_for_next_run(self, db_session, products):
+        first, _second = products
+        move(db_session, first, 4, "entrada", 9)
+
+        with patch("app.services.snapshot_service.settings.stock_snapshot_lag_s", 120):
+            assert build_snapshots(db_session, now=at(10)) == 0
+            assert build_snapshots(db_session, now=at(12)) == 1
+
+
+class TestStockAt:
+    """Testes para o saldo em uma data."""
+
+    def test_balance_combines_snapshot_and_later_movements(self, db_session, products):
+        first, second = products
+        move(db_session, first, 10, "entrada", 1)
+        build_snapshots(db_session, now=at(5))
+        move(db_session, first, 4, "saida", 7)
+        move(db_session, first, 2, "saida", 9)
+
+        balance = stock_at(db_session, first, at(8))
+
+        assert balance["quantity"] == 6
+        assert balance["snapshot_at"] == at(5)
+        assert stock_at(db_session, first, at(0))["quantity"] == 0
+        assert stock_at(db_session, first, at(3))["snapshot_at"] is None
+        assert stock_at(db_session, first, at(3))["quantity"] == 10
+        assert stock_at(db_session, second, at(8))["quantity"] == 0
+
+    def test_aware_timestamp_is_converted_to_utc(self, db_session, products):
+        first, _second = products
+        move(db_session, first, 10, "entrada", 1)
+        local = (at(2) - timedelta(hours=3)).replace(
+            tzinfo=timezone(timedelta(hours=-3))
+        )
+
+        assert stock_at(db_session, first, local)["quantity"] == 10
+
+    def test_balance_before_retained_ledger_is_unknown(self, db_session, products):
+        first, _second = products
+        move(db_session, first, 7, "abertura", 10)
+        move(db_session, first, 2, "saida", 12)
+
+        assert stock_at(db_session, first, at(5))["quantity"] is None
+        assert stock_at(db_session, first, at(10))["quantity"] == 7
+        assert stock_at(db_session, first, at(15))["quantity"] == 5
+
+    def test_unknown_product(self, db_session):
+        assert stock_at(db_session, 999, at(0)) is None
@@ -0,0 +1,216 @@
+"""
+Testes unitários para o modo escrow de SKUs quentes.
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from app.models.product import Product
+from app.models.stock_lease import StockLease
+from app.models.stock_movement import StockMovement
+from app.repositories import stock_lease_repository
+from app.repositories.product_repository import create_product
+from app.services import stock_service
+from app.services.stock_escrow import Escrow
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def escrow_settings():
+    with patch.multiple(
+        "app.services.stock_escrow.settings",
+        stock_escrow_enabled=True,
+        stock_escrow_hot_rate=10.0,
+        stock_escrow_block=20,
+        stock_escrow_stale_s=30,
+    ):
+        yield
+
+
+@pytest.fixture
+def escrow(escrow_settings, db_session):
+    clock = FakeClock()
+    instance = Escrow(holder="worker-a", clock=clock)
+    instance.clock = clock
+
+    def mock_db_gen():
+        yield db_session
+
+    with patch.object(stock_service, "escrow", instance), patch.object(
+        stock_service, "get_db", side_effect=lambda: mock_db_gen()
+    ):
+        yield instance
+
+
+def heat_up(escrow, db_session, product_id, reservations=20):
+    escrow.record([product_id] * reservations)
+    escrow.clock.now += 1
+    escrow.maintain(db_session)
+
+
+class TestEscrowQuota:
+    """Testes para a cota em memória."""
+
+    def test_take_only_covers_whole_items(self, escrow, db_session):
+        product = create_product(db_session, name="Hot", quantity_on_hand=100)
+        heat_up(escrow, db_session, product.product_id)
+
+        taken = escrow.take({product.product_id: 15, 999: 1})
+        assert list(taken) == [product.product_id]
+        assert escrow.take({product.product_id: 6}) == {}
+
+        escrow.give_back(taken, {product.product_id: 15})
+        assert escrow.take({product.product_id: 20}) == taken
+
+
+class TestEscrowLeases:
+    """Testes para concessão, uso e devolução das leases."""
+
+    def test_hot_product_gets_a_lease(self, escrow, db_session):
+        product = create_product(db_session, name="Hot", quantity_on_hand=100)
+
+        heat_up(escrow, db_session, product.product_id)
+
+        db_session.refresh(product)
+        assert product.quantity_on_hand == 80
+        lease = db_session.query(StockLease).one()
+        assert (lease.holder, lease.granted, lease.status) == ("worker-a", 20, "active")
+
+    def test_cold_product_is_not_leased(self, escrow, db_session):
+        product = create_product(db_session, name="Cold", quantity_on_hand=100)
+
+        heat_up(escrow, db_session, product.product_id, reservations=2)
+
+        assert db_session.query(StockLease).count() == 0
+
+    def test_reservation_is_served_from_quota(self, escrow, db_session):
+        product = create_product(db_session, name="Hot", quantity_on_hand=100)
+        heat_up(escrow, db_session, product.product_id)
+
+        movements = stock_service.reserve_stock(
+            [{"product_id": product.product_id, "quantity": 3}]
+        )
+
+        lease = db_session.query(StockLease).one()
+        assert movements[0].lease_id == lease.lease_id
+        db_session.refresh(product)
+        assert product.quantity_on_hand == 80  # linha do produto intocada
+
+    def test_failed_transaction_returns_units_to_quota(self, escrow, db_session):
+        product = create_product(db_session, name="Hot", quantity_on_hand=100)
+        heat_up(escrow, db_session, product.product_id)
+
+        with patch.object(
+            stock_service, "insert_movements", side_effect=RuntimeError("falha")
+        ):
+            with pytest.raises(RuntimeError):
+                stock_service.reserve_stock(
+                    [{"product_id": product.product_id, "quantity": 20}]
+                )
+
+        assert escrow.take({product.product_id: 20})
+
+    def test_cooled_product_returns_unused_units(self, escrow, db_session):
+        product = create_product(db_session, name="Hot", quantity_on_hand=100)
+        heat_up(escrow, db_session, product.product_id)
+        stock_service.reserve_stock([{"product_id": product.product_id, "quantity": 5}])
+
+        escrow.clock.now += 1
+        escrow.maintain(db_session)  # sem reservas: o produto esfria
+
+        db_session.refresh(product)
+        assert product.quantity_on_hand == 95
+        lease = db_session.query(StockLease).one()
+        assert (lease.returned, lease.status) == (15, "closed")
+        assert (
+            db_session.query(StockMovement).filter_by(movement_type="saida").count()
+            == 1
+        )
+
+    def test_stale_lease_of_other_worker_is_reclaimed(self, escrow, db_session):
+        product = create_product(db_session, name="Hot", quantity_on_hand=80)
+        db_session.add(
+            StockLease(
+                product_id=product.product_id,
+                holder="worker-b",
+                granted=20,
+                renewed_at=datetime.utcnow() - timedelta(seconds=60),
+            )
+        )
+        db_session.commit()
+
+        escrow.maintain(db_session)
+
+        assert db_session.get(Product, product.product_id).quantity_on_hand == 100
+        assert db_session.query(StockLease).one().status == "closed"
+
+    def test_quota_expires_without_renewal(self, escrow, db_session):
+        """Sem renovar a tempo, a reserva usa a linha do produto."""
+        product = create_product(db_session, name="Hot", quantity_on_hand=100)
+        heat_up(escrow, db_session, product.product_id)
+        # Metade de STOCK_ESCROW_STALE_S sem renovação bem-sucedida.
+        escrow.clock.now += 15
+
+        movements = stock_service.reserve_stock(
+            [{"product_id": product.product_id, "quantity": 3}]
+        )
+
+        assert movements[0].lease_id is None
+        db_session.refresh(product)
+        assert product.quantity_on_hand == 77
+
+    def test_reclaimed_lease_is_dropped_on_renewal(self, escrow, db_session):
+        product = create_product(db_session, name="Hot", quantity_on_hand=100)
+        heat_up(escrow, db_session, product.product_id)
+        lease = db_session.query(StockLease).one()
+        # Outro worker considerou a lease abandonada e devolveu o saldo.
+        stock_lease_repository.close(db_session, lease.lease_id)
+        db_session.commit()
+
+        escrow.record([product.product_id] * 20)
+        escrow.clock.now += 1
+        escrow.maintain(db_session)
+
+        leases = db_session.query(StockLease).order_by(StockLease.lease_id).all()
+        assert [row.status for row in leases] == ["closed", "active"]
+        assert escrow.take({product.product_id: 1}) == {
+            product.product_id: leases[1].lease_id
+        }
+
+    def test_renewed_lease_is_not_reclaimed(self, escrow, db_session):
+        """O close de lease abandonada confere a renovação sob o lock."""
+        product = create_product(db_session, name="Hot", quantity_on_hand=100)
+        heat_up(escrow, db_session, product.product_id)
+        lease = db_session.query(StockLease).one()
+
+        returned = stock_lease_repository.close(
+            db_session,
+            lease.lease_id,
+            renewed_before=datetime.utcnow() - timedelta(seconds=30),
+        )
+
+        assert returned == 0
+        assert db_session.query(StockLease).one().status == "active"
+
+    def test_rate_counts_only_committed_reservations(self, escrow, db_session):
+        product = create_product(db_session, name="Hot", quantity_on_hand=100)
+
+        with patch.object(
+            stock_service, "insert_movements", side_effect=RuntimeError("falha")
+        ):
+            with pytest.raises(RuntimeError):
+                stock_service.reserve_stock(
+                    [{"product_id": product.product_id, "quantity": 1}]
+                )
+        stock_service.reserve_stock([{"product_id": product.product_id, "quantity": 1}])
+
+        assert escrow._counts == {product.product_id: 1}
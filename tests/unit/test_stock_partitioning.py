@@ -0,0 +1,108 @@
+"""
+Testes unitários para o particionamento das reservas de estoque.
+"""
+
+import pytest
+
+from app.models.outbox import OutboxEvent
+from app.repositories.order_repository import create_order
+from app.services.stock_partitioning import (
+    jump_hash,
+    merge_part,
+    owned_shards,
+    part_event,
+    reservation_events,
+    split_items,
+)
+
+
+class TestJumpHash:
+    """Testes para jump_hash."""
+
+    def test_shards_are_in_range_and_deterministic(self):
+        for key in range(1, 500):
+            shard = jump_hash(key, 8)
+            assert 0 <= shard < 8
+            assert jump_hash(key, 8) == shard
+
+    def test_growing_partitions_moves_few_keys(self):
+        """Ao ir de 4 para 5 shards, só ~1/5 das chaves deve mudar."""
+        keys = range(1, 10_001)
+        moved = sum(jump_hash(key, 4) != jump_hash(key, 5) for key in keys)
+
+        assert 0.15 < moved / len(keys) < 0.25
+
+    def test_single_partition(self):
+        assert {jump_hash(key, 1) for key in range(100)} == {0}
+
+
+class TestSplit:
+    """Testes para a divisão do pedido em shards."""
+
+    def test_owned_shards(self):
+        assert owned_shards("", 4) == [0, 1, 2, 3]
+        assert owned_shards("0, 2-3", 4) == [0, 2, 3]
+        with pytest.raises(ValueError):
+            owned_shards("5", 4)
+
+    def test_reservation_events_cover_all_items(self):
+        items = [{"product_id": pid, "quantity": 1} for pid in range(1, 21)]
+        data = {"order_id": 7, "email": "a@b.com", "items": items}
+
+        events = reservation_events(data, partitions=4)
+
+        shards = [payload["shard"] for _key, payload in events]
+        assert [key for key, _payload in events] == [
+            f"stock.reserve.{shard}" for shard in shards
+        ]
+        assert all(payload["parts"] == shards for _key, payload in events)
+        routed = [item for _key, payload in events for item in payload["items"]]
+        assert sorted(i["product_id"] for i in routed) == list(range(1, 21))
+        assert split_items(items, 4).keys() == set(shards)
+
+
+class TestMergePart:
+    """Testes para a consolidação de pedidos divididos."""
+
+    def _part(self, order_id, shard, items):
+        return {
+            "order_id": order_id,
+            "email": "a@b.com",
+            "shard": shard,
+            "parts": [0, 1],
+            "items": items,
+        }
+
+    def test_all_parts_reserved_emits_order_processed(self, db_session):
+        order = create_order(db_session)
+        first = self._part(order.order_id, 0, [{"product_id": 1, "quantity": 1}])
+        second = self._part(order.order_id, 1, [{"product_id": 2, "quantity": 3}])
+
+        assert merge_part(db_session, first, reserved=True) is False
+        assert merge_part(db_session, first, reserved=True) is False  # reentrega
+        assert merge_part(db_session, second, reserved=True) is True
+        db_session.commit()
+
+        event = db_session.query(OutboxEvent).one()
+        assert event.routing_key == "order.processed"
+        assert event.payload["items"] == first["items"] + second["items"]
+
+    def test_failed_part_releases_reserved_parts(self, db_session):
+        order = create_order(db_session)
+        reserved = self._part(order.order_id, 0, [{"product_id": 1, "quantity": 1}])
+        failed = self._part(order.order_id, 1, [{"product_id": 2, "quantity": 3}])
+
+        merge_part(db_session, reserved, reserved=True)
+        assert merge_part(db_session, failed, reserved=False) is True
+        db_session.commit()
+
+        event = db_session.query(OutboxEvent).one()
+        assert event.routing_key == "stock.release.0"
+        assert event.payload["items"] == reserved["items"]
+
+    def test_part_event_routing(self):
+        part = self._part(1, 0, [])
+        assert part_event(part)[0] == "stock.part.reserved"
+        key, payload = part_event(part, Exception("Estoque insuficiente"))
+        assert key == "stock.part.failed"
+        assert payload["reason"] == "Estoque insuficiente"